@@ -378,7 +378,7 @@ class AutomationRenameHosts(Automation):
             actions.append("logwatch")
 
         # SNMP walks
-        if self._rename_host_file(cmk.utils.paths.snmpwalks_dir, oldname, newname):
+        if self._rename_snmp_walk(oldname, newname):
             actions.append("snmpwalk")
 
         # HW/SW-Inventory
@@ -409,6 +409,17 @@ class AutomationRenameHosts(Automation):
 
         return actions
 
+    def _rename_snmp_walk(self, oldname: str, newname: str) -> int:
+        # The OID index of a walk (see StoredWalkIndex) is moved along with the walk. An
+        # index left over by a former host with the new name must not be used again.
+        old_index, new_index = ".%s.idx" % oldname, ".%s.idx" % newname
+        if not self._rename_host_file(cmk.utils.paths.snmpwalks_dir, oldname, newname):
+            self._remove_host_file(cmk.utils.paths.snmpwalks_dir, old_index)
+            return 0
+        if not self._rename_host_file(cmk.utils.paths.snmpwalks_dir, old_index, new_index):
+            self._remove_host_file(cmk.utils.paths.snmpwalks_dir, new_index)
+        return 1
+
     def _rename_host_dir(self, basedir: str, oldname: str, newname: str) -> int:
         if os.path.exists(basedir + "/" + oldname):
             if os.path.exists(basedir + "/" + newname):
@@ -425,6 +436,10 @@ class AutomationRenameHosts(Automation):
             return 1
         return 0
 
+    def _remove_host_file(self, basedir: str, name: str) -> None:
+        if os.path.exists(basedir + "/" + name):
+            os.remove(basedir + "/" + name)
+
     # This functions could be moved out of Check_MK.
     def _omd_rename_host(self, oldname: str, newname: str) -> List[str]:
         oldregex = self._escape_name_for_regex_matching(oldname)
@@ -4,7 +4,7 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-from typing import Any, Dict, List, Optional, Tuple, TypeVar, Union
+from typing import Any, Dict, List, MutableMapping, Optional, Tuple, TypeVar, Union
 
 from cmk.utils.type_defs import CheckPluginName, HostName, Item, SectionName
 
@@ -20,7 +20,7 @@ SectionCacheInfo = Dict[SectionName, Tuple[int, int]]
 AgentSectionContent = List[List[str]]
 AgentPersistedSection = Tuple[int, int, AgentSectionContent]
 AgentPersistedSections = Dict[SectionName, AgentPersistedSection]
-AgentSections = Dict[SectionName, AgentSectionContent]
+AgentSections = MutableMapping[SectionName, AgentSectionContent]
 
 PiggybackRawData = Dict[HostName, List[bytes]]
 ParsedSectionContent = Any
@@ -136,6 +136,7 @@ def do_check(
         if ipaddress is None and not host_config.is_cluster:
             ipaddress = ip_lookup.lookup_ip_address(host_config)
 
+        item_state.set_item_state_format(config.item_state_format)
         item_state.load(hostname)
 
         # When monitoring Checkmk clusters, the cluster nodes are responsible for fetching all
@@ -240,7 +241,7 @@ def do_check(
             ]
 
             for phase, times in phase_times.items():
-                if phase in ["agent", "snmp", "ds"]:
+                if phase in ["agent", "snmp", "ds", "prediction"]:
                     t = times[4] - sum(times[:4])  # real time - CPU time
                     perfdata.append("cmk_time_%s=%.3f" % (phase, t))
         else:
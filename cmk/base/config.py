@@ -1369,6 +1369,9 @@ special_agent_info: Dict[str, SpecialAgentInfoFunction] = {}
 _check_variables: Dict[str, List[Any]] = {}
 # keeps the default values of all the check variables
 _check_variable_defaults: Dict[str, Any] = {}
+# The files to load for each loaded legacy plugin (the includes first). Plugins are
+# known by the names of their checks, active checks and by the name of their file.
+_legacy_plugin_files: Dict[str, List[str]] = {}
 _all_checks_loaded = False
 
 # workaround: set of check-groups that are to be treated as service-checks even if
@@ -1402,7 +1405,7 @@ def load_all_checks(get_check_api_context: GetCheckApiContext) -> None:
     agent_based_register.load_all_plugins()
 
     # LEGACY CHECK PLUGINS
-    filelist = get_plugin_paths(str(cmk.utils.paths.local_checks_dir), cmk.utils.paths.checks_dir)
+    filelist = _legacy_plugin_paths()
     load_checks(get_check_api_context, filelist)
 
     _all_checks_loaded = True
@@ -1417,6 +1420,7 @@ def _initialize_data_structures() -> None:
     _check_variable_defaults.clear()
 
     _check_contexts.clear()
+    _legacy_plugin_files.clear()
     check_info.clear()
     check_includes.clear()
     precompile_params.clear()
@@ -1465,7 +1469,7 @@ def load_checks(get_check_api_context: GetCheckApiContext, filelist: List[str])
             known_checks = set(check_info)
             known_active_checks = set(active_check_info)
 
-            load_check_includes(f, check_context)
+            include_paths = load_check_includes(f, check_context)
 
             load_precompiled_plugin(f, check_context)
             loaded_files.add(file_name)
@@ -1489,6 +1493,9 @@ def load_checks(get_check_api_context: GetCheckApiContext, filelist: List[str])
         for check_plugin_name in new_active_checks:
             _check_contexts[check_plugin_name] = check_context
 
+        for plugin_name in new_checks | new_active_checks | {file_name}:
+            _legacy_plugin_files[plugin_name] = include_paths + [f]
+
         # Collect all variables that the check file did introduce compared to the
         # default check context
         new_check_vars = {}
@@ -1549,6 +1556,123 @@ def any_check_loaded() -> bool:
     return bool(_check_contexts)
 
 
+def load_checks_of_hosts(get_check_api_context: GetCheckApiContext,
+                         hostnames: List[HostName]) -> None:
+    """Load only the legacy checks needed by the given hosts
+
+    The needed check plugins and their files are looked up in the manifest written while
+    precompiling the host checks. All checks are loaded in case there is no manifest, it
+    does not know one of the hosts or in case the check plugins, the configuration, the
+    autochecks or the discovered labels of the hosts have been changed since then."""
+    file_names = _needed_legacy_plugin_files(hostnames)
+    if file_names is None:
+        load_all_checks(get_check_api_context)
+        return
+
+    _initialize_data_structures()
+    agent_based_register.load_all_plugins()
+    load_checks(get_check_api_context, file_names)
+
+
+_LEGACY_PLUGIN_MANIFEST_VERSION = 2
+
+# Path, mtime and size of the files the manifest depends on
+FileFingerprints = List[Tuple[str, int, int]]
+
+
+def save_legacy_plugin_manifest(
+        needed_plugin_names: Dict[HostName, Set[CheckPluginNameStr]]) -> None:
+    """Save the legacy check plugins needed by the hosts for load_checks_of_hosts()
+
+    Only the files of the currently loaded plugins are known to the manifest. Hosts
+    needing other plugins will load all checks."""
+    config_cache = get_config_cache()
+    hosts = {}
+    for hostname, plugin_names in needed_plugin_names.items():
+        # The check table of a cluster depends on the autochecks of the nodes
+        nodes = config_cache.get_host_config(hostname).nodes or []
+        hosts[hostname] = (
+            sorted(plugin_names),
+            _file_fingerprints(_host_file_paths([hostname] + nodes)),
+        )
+
+    store.makedirs(cmk.utils.paths.precompiled_checks_dir)
+    store.save_object_to_file(
+        _legacy_plugin_manifest_path(),
+        {
+            "version": _LEGACY_PLUGIN_MANIFEST_VERSION,
+            "checks": _file_fingerprints(_legacy_plugin_paths()),
+            "config": _file_fingerprints(_get_config_file_paths(with_conf_d=True)),
+            "plugins": _legacy_plugin_files,
+            "hosts": hosts,
+        },
+        fast=True,
+    )
+
+
+def _needed_legacy_plugin_files(hostnames: List[HostName]) -> Optional[List[str]]:
+    try:
+        manifest = store.load_object_from_file(_legacy_plugin_manifest_path())
+    except (MKGeneralException, ValueError, EOFError, TypeError):
+        return None
+
+    if not manifest or manifest["version"] != _LEGACY_PLUGIN_MANIFEST_VERSION:
+        return None
+
+    if (manifest["checks"] != _file_fingerprints(_legacy_plugin_paths()) or
+            manifest["config"] != _file_fingerprints(_get_config_file_paths(with_conf_d=True))):
+        return None
+
+    file_names: Dict[str, None] = OrderedDict()
+    for hostname in hostnames:
+        if hostname not in manifest["hosts"]:
+            return None
+
+        plugin_names, host_file_fingerprints = manifest["hosts"][hostname]
+        if host_file_fingerprints != _file_fingerprints(
+            [path for path, _mtime, _size in host_file_fingerprints]):
+            return None
+
+        for plugin_name in plugin_names:
+            if plugin_name not in manifest["plugins"]:
+                return None
+            file_names.update((f, None) for f in manifest["plugins"][plugin_name])
+
+    return list(file_names)
+
+
+def _legacy_plugin_manifest_path() -> Path:
+    return Path(cmk.utils.paths.precompiled_checks_dir, "manifest")
+
+
+def _legacy_plugin_paths() -> List[str]:
+    return get_plugin_paths(str(cmk.utils.paths.local_checks_dir), cmk.utils.paths.checks_dir)
+
+
+def _host_file_paths(hostnames: List[HostName]) -> List[str]:
+    """The autochecks and the discovered labels of the hosts
+
+    The discovered labels are used in the conditions of the rules, e.g. of the enforced
+    services."""
+    paths = []
+    for hostname in hostnames:
+        paths.append(os.path.join(cmk.utils.paths.autochecks_dir, hostname + ".mk"))
+        paths.append(str(cmk.utils.paths.discovered_host_labels_dir / (hostname + ".mk")))
+    return paths
+
+
+def _file_fingerprints(paths: Iterable[Union[str, Path]]) -> FileFingerprints:
+    fingerprints = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            fingerprints.append((str(path), -1, -1))
+            continue
+        fingerprints.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return fingerprints
+
+
 # Constructs a new check context dictionary. It contains the whole check API.
 def new_check_context(get_check_api_context: GetCheckApiContext) -> CheckContext:
     # Add the data structures where the checks register with Check_MK
@@ -1573,9 +1697,11 @@ def new_check_context(get_check_api_context: GetCheckApiContext) -> CheckContext
 # Load the definitions of the required include files for this check
 # Working with imports when specifying the includes would be much cleaner,
 # sure. But we need to deal with the current check API.
-def load_check_includes(check_file_path: str, check_context: CheckContext) -> None:
+def load_check_includes(check_file_path: str, check_context: CheckContext) -> List[str]:
+    include_file_paths = []
     for include_file_name in cached_includes_of_plugin(check_file_path):
         include_file_path = check_include_file_path(include_file_name)
+        include_file_paths.append(include_file_path)
         try:
             load_precompiled_plugin(include_file_path, check_context)
         except MKTerminate:
@@ -1586,6 +1712,7 @@ def load_check_includes(check_file_path: str, check_context: CheckContext) -> No
             if cmk.utils.debug.enabled():
                 raise
             continue
+    return include_file_paths
 
 
 def check_include_file_path(include_file_name: str) -> str:
@@ -7,15 +7,20 @@
 
 import base64
 import errno
+import hashlib
+import io
+import multiprocessing
 import os
 import py_compile
 import sys
 import tempfile
-from typing import Any, Dict, IO, List, Optional, Set, Tuple, Union
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
 
 from six import ensure_binary, ensure_str
 
 import cmk.utils.paths
+import cmk.utils.store as store
 import cmk.utils.tty as tty
 from cmk.utils.check_utils import maincheckify, section_name_of
 from cmk.utils.exceptions import MKGeneralException
@@ -40,6 +45,7 @@ import cmk.base.check_api_utils as check_api_utils
 import cmk.base.config as config
 import cmk.base.core_config as core_config
 import cmk.base.data_sources as data_sources
+import cmk.base.incremental_core_config as incremental_core_config
 import cmk.base.ip_lookup as ip_lookup
 
 from cmk.base.check_utils import ServiceID
@@ -64,16 +70,27 @@ class NagiosCore(core_config.MonitoringCore):
         while the monitoring is running.
         """
         tmp_path = None
+        host_objects = None
         try:
+            if config.incremental_core_config:
+                host_objects = incremental_core_config.HostObjectCache(
+                    Path(cmk.utils.paths.var_dir, "core", "nagios_host_objects.cache"),
+                    Path(cmk.utils.paths.nagios_objects_file),
+                    incremental_core_config.HostConfigFingerprints(config.get_config_cache()))
+
+            # The offsets of the host objects are counted in UTF-8 encoded bytes
             with tempfile.NamedTemporaryFile(
                     "w",
+                    encoding="utf-8",
                     dir=os.path.dirname(cmk.utils.paths.nagios_objects_file),
                     prefix=".%s.new" % os.path.basename(cmk.utils.paths.nagios_objects_file),
                     delete=False) as tmp:
                 tmp_path = tmp.name
                 os.chmod(tmp.name, 0o660)
-                create_config(tmp, hostnames=None)
-                os.rename(tmp.name, cmk.utils.paths.nagios_objects_file)
+                create_config(tmp, hostnames=None, host_objects=host_objects)
+            os.rename(tmp.name, cmk.utils.paths.nagios_objects_file)
+            if host_objects is not None:
+                host_objects.save()
 
         except Exception:
             # In case an exception happens cleanup the tempfile created for writing
@@ -85,6 +102,10 @@ class NagiosCore(core_config.MonitoringCore):
                     pass
             raise
 
+        finally:
+            if host_objects is not None:
+                host_objects.close()
+
     def precompile(self) -> None:
         out.output("Precompiling host checks...")
         precompile_hostchecks()
@@ -116,13 +137,37 @@ class NagiosConfig:
         self.active_checks_to_define: Set[CheckPluginNameStr] = set()
         self.custom_commands_to_define: Set[CoreCommandName] = set()
         self.hostcheck_commands_to_define: List[Tuple[CoreCommand, str]] = []
+        # Number of bytes written so far
+        self.position = 0
 
     def write(self, x: str) -> None:
         # TODO: Something seems to be mixed up in our call sites...
-        self._outfile.write(ensure_str(x))
+        x = ensure_str(x)
+        self._outfile.write(x)
+        self.position += len(x) if x.isascii() else len(x.encode("utf-8"))
+
+    def defines(self) -> incremental_core_config.HostDefines:
+        return {
+            "hostgroups": sorted(self.hostgroups_to_define),
+            "servicegroups": sorted(self.servicegroups_to_define),
+            "contactgroups": sorted(self.contactgroups_to_define),
+            "checknames": sorted(str(n) for n in self.checknames_to_define),
+            "active_checks": sorted(self.active_checks_to_define),
+            "custom_commands": sorted(self.custom_commands_to_define),
+        }
 
+    def add_defines(self, defines: incremental_core_config.HostDefines) -> None:
+        self.hostgroups_to_define.update(defines["hostgroups"])
+        self.servicegroups_to_define.update(defines["servicegroups"])
+        self.contactgroups_to_define.update(defines["contactgroups"])
+        self.checknames_to_define.update(CheckPluginName(n) for n in defines["checknames"])
+        self.active_checks_to_define.update(defines["active_checks"])
+        self.custom_commands_to_define.update(defines["custom_commands"])
 
-def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None:
+
+def create_config(outfile: IO[str],
+                  hostnames: Optional[List[HostName]],
+                  host_objects: Optional[incremental_core_config.HostObjectCache] = None) -> None:
     if config.host_notification_periods != []:
         core_config.warning(
             "host_notification_periods is not longer supported. Please use extra_host_conf['notification_period'] instead."
@@ -152,7 +197,10 @@ def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None
     _output_conf_header(cfg)
 
     for hostname in sorted(hostnames):
-        _create_nagios_config_host(cfg, config_cache, hostname)
+        if host_objects is None:
+            _create_nagios_config_host(cfg, config_cache, hostname)
+        else:
+            _create_nagios_config_host_incremental(cfg, config_cache, hostname, host_objects)
 
     _create_nagios_config_contacts(cfg, hostnames)
     _create_nagios_config_hostgroups(cfg)
@@ -174,11 +222,55 @@ def _output_conf_header(cfg: NagiosConfig) -> None:
 """)
 
 
+def _host_objects_header(hostname: HostName) -> str:
+    return ("\n# ----------------------------------------------------\n"
+            "# %s\n"
+            "# ----------------------------------------------------\n" % hostname)
+
+
+def _create_nagios_config_host_incremental(
+        cfg: NagiosConfig, config_cache: ConfigCache, hostname: HostName,
+        host_objects: incremental_core_config.HostObjectCache) -> None:
+    """Copy the objects of the host from the previous configuration if its inputs did not change
+
+    Hosts producing warnings, failed IP lookups or host check commands (which are numbered
+    across all hosts) are always generated again."""
+    num_warnings = len(core_config.g_configuration_warnings)
+    num_failed_ip_lookups = len(core_config.failed_ip_lookups())
+
+    fingerprint = host_objects.fingerprint(hostname)
+    cached = None if fingerprint is None else host_objects.get(hostname, fingerprint)
+    if cached is not None:
+        objects, defines = cached
+        if objects.startswith(ensure_binary(_host_objects_header(hostname))):
+            console.vverbose("Reusing objects of host %s\n" % hostname)
+            offset = cfg.position
+            cfg.write(ensure_str(objects))
+            cfg.add_defines(defines)
+            host_objects.add(hostname, fingerprint, offset, cfg.position - offset, defines)
+            return
+
+    host_outfile = io.StringIO()
+    host_cfg = NagiosConfig(host_outfile, [hostname])
+    host_cfg.hostcheck_commands_to_define = cfg.hostcheck_commands_to_define
+    num_hostcheck_commands = len(cfg.hostcheck_commands_to_define)
+    _create_nagios_config_host(host_cfg, config_cache, hostname)
+
+    offset = cfg.position
+    cfg.write(host_outfile.getvalue())
+    defines = host_cfg.defines()
+    cfg.add_defines(defines)
+
+    if (fingerprint is not None and
+            len(cfg.hostcheck_commands_to_define) == num_hostcheck_commands and
+            len(core_config.g_configuration_warnings) == num_warnings and
+            len(core_config.failed_ip_lookups()) == num_failed_ip_lookups):
+        host_objects.add(hostname, fingerprint, offset, cfg.position - offset, defines)
+
+
 def _create_nagios_config_host(cfg: NagiosConfig, config_cache: ConfigCache,
                                hostname: HostName) -> None:
-    cfg.write("\n# ----------------------------------------------------\n")
-    cfg.write("# %s\n" % hostname)
-    cfg.write("# ----------------------------------------------------\n")
+    cfg.write(_host_objects_header(hostname))
     host_attrs = core_config.get_host_attributes(hostname, config_cache)
     if config.generate_hostconf:
         host_spec = _create_nagios_host_spec(cfg, config_cache, hostname, host_attrs)
@@ -917,6 +1009,22 @@ def _find_check_plugins(checktype: CheckPluginNameStr) -> List[str]:
     return paths
 
 
+IPAddresses = Dict[HostName, Optional[HostAddress]]
+
+# Fingerprint of the inputs, the needed legacy checks and whether a host check file exists
+PrecompiledHostCheckEntry = Tuple[str, List[CheckPluginNameStr], bool]
+
+_PRECOMPILE_CACHE_VERSION = 1
+
+PrecompileResult = NamedTuple("PrecompileResult", [
+    ("hostname", HostName),
+    ("fingerprint", Optional[str]),
+    ("needed_legacy_check_plugin_names", Set[CheckPluginNameStr]),
+    ("regenerated", bool),
+    ("error", Optional[str]),
+])
+
+
 def precompile_hostchecks() -> None:
     console.verbose("Creating precompiled host check config...\n")
     config.PackedConfig().save()
@@ -925,33 +1033,155 @@ def precompile_hostchecks() -> None:
         os.makedirs(cmk.utils.paths.precompiled_hostchecks_dir)
 
     config_cache = config.get_config_cache()
+    precompiler = HostCheckPrecompiler(config_cache)
 
     console.verbose("Precompiling host checks...\n")
-    for host in config_cache.all_active_hosts():
+    needed_legacy_check_plugin_names: Dict[HostName, Set[CheckPluginNameStr]] = {}
+    num_regenerated = 0
+    for result in precompiler.precompile(sorted(config_cache.all_active_hosts())):
+        if result.error is not None:
+            console.error("Error precompiling checks for host %s: %s\n" %
+                          (result.hostname, result.error))
+            sys.exit(5)
+        needed_legacy_check_plugin_names[result.hostname] = result.needed_legacy_check_plugin_names
+        num_regenerated += result.regenerated
+    precompiler.save()
+
+    console.verbose("Host checks: %d regenerated, %d reused\n" %
+                    (num_regenerated, len(needed_legacy_check_plugin_names) - num_regenerated))
+
+    # Make "cmk --check" load only the legacy checks needed by the host
+    config.save_legacy_plugin_manifest(needed_legacy_check_plugin_names)
+
+
+# The precompiler of the current run, inherited by the forked worker processes
+_active_precompiler: Optional["HostCheckPrecompiler"] = None
+
+
+def _precompile_hostcheck_in_worker(hostname: HostName) -> PrecompileResult:
+    assert _active_precompiler is not None
+    return _active_precompiler.precompile_host(hostname)
+
+
+class HostCheckPrecompiler:
+    """Precompile the host checks in parallel and reuse the ones with unchanged inputs
+
+    A host check is only byte-compiled again in case its generated source changed. With
+    the incremental core config the inputs of a host check are condensed to a
+    fingerprint: the configuration of the host (see incremental_core_config) and the IP
+    addresses written to the host check. Hosts with an unchanged fingerprint keep their
+    host check without generating it again."""
+    def __init__(self, config_cache: ConfigCache) -> None:
+        super(HostCheckPrecompiler, self).__init__()
+        self._config_cache = config_cache
+        self._cache_path = Path(cmk.utils.paths.var_dir, "core", "precompiled_hostchecks.cache")
+        self._fingerprints: Optional[incremental_core_config.HostConfigFingerprints] = None
+        self._previous_hosts: Dict[HostName, PrecompiledHostCheckEntry] = {}
+        self._hosts: Dict[HostName, PrecompiledHostCheckEntry] = {}
+
+        if config.incremental_core_config:
+            self._fingerprints = incremental_core_config.HostConfigFingerprints(config_cache)
+            cache = store.load_object_from_file(self._cache_path, default={})
+            if cache.get("version") == _PRECOMPILE_CACHE_VERSION:
+                self._previous_hosts = cache["hosts"]
+
+    def precompile(self, hostnames: List[HostName]) -> Iterator[PrecompileResult]:
+        """Precompile the host checks of the given hosts, the results are yielded unordered"""
+        for result in self._precompile(hostnames):
+            if result.fingerprint is not None:
+                self._hosts[result.hostname] = (
+                    result.fingerprint,
+                    sorted(result.needed_legacy_check_plugin_names),
+                    os.path.lexists(_compiled_hostcheck_path(result.hostname)),
+                )
+            yield result
+
+    def _precompile(self, hostnames: List[HostName]) -> Iterator[PrecompileResult]:
+        num_processes = min(
+            max(1, config.precompile_hostchecks_max_processes or os.cpu_count() or 1),
+            len(hostnames))
+        if num_processes <= 1:
+            for hostname in hostnames:
+                yield self.precompile_host(hostname)
+            return
+
+        global _active_precompiler
+        if self._fingerprints is not None:
+            self._fingerprints.prepare()
+        _active_precompiler = self
+        try:
+            with multiprocessing.get_context("fork").Pool(num_processes) as pool:
+                yield from pool.imap_unordered(_precompile_hostcheck_in_worker,
+                                               hostnames,
+                                               chunksize=max(1,
+                                                             len(hostnames) // (num_processes * 4)))
+        finally:
+            _active_precompiler = None
+
+    def precompile_host(self, hostname: HostName) -> PrecompileResult:
         try:
-            _precompile_hostcheck(config_cache, host)
+            fingerprint = self._fingerprint(hostname)
+            entry = self._previous_hosts.get(hostname)
+            if (fingerprint is not None and entry is not None and entry[0] == fingerprint and
+                    os.path.lexists(_compiled_hostcheck_path(hostname)) == entry[2]):
+                console.verbose("%s%s%-16s%s: (unchanged configuration)\n",
+                                tty.bold,
+                                tty.blue,
+                                hostname,
+                                tty.normal,
+                                stream=sys.stderr)
+                return PrecompileResult(hostname, fingerprint, set(entry[1]), False, None)
+
+            needed_legacy_check_plugin_names, regenerated = _precompile_hostcheck(
+                self._config_cache, hostname)
+            return PrecompileResult(hostname, fingerprint, needed_legacy_check_plugin_names,
+                                    regenerated, None)
         except Exception as e:
             if cmk.utils.debug.enabled():
                 raise
-            console.error("Error precompiling checks for host %s: %s\n" % (host, e))
-            sys.exit(5)
+            return PrecompileResult(hostname, None, set(), False, "%s" % e)
+
+    def _fingerprint(self, hostname: HostName) -> Optional[str]:
+        if self._fingerprints is None:
+            return None
+
+        host_fingerprint = self._fingerprints.fingerprint(hostname)
+        if host_fingerprint is None:
+            return None
+
+        host_config = self._config_cache.get_host_config(hostname)
+        return hashlib.sha256(
+            repr((
+                host_fingerprint,
+                _get_needed_ip_addresses(self._config_cache, host_config),
+                cmk.utils.paths.precompiled_hostchecks_dir,
+            )).encode("utf-8")).hexdigest()
+
+    def save(self) -> None:
+        if self._fingerprints is None:
+            return
+        store.save_object_to_file(self._cache_path, {
+            "version": _PRECOMPILE_CACHE_VERSION,
+            "hosts": self._hosts,
+        },
+                                  fast=True)
+
 
+def _compiled_hostcheck_path(hostname: HostName) -> str:
+    return cmk.utils.paths.precompiled_hostchecks_dir + "/" + hostname
 
-def _precompile_hostcheck(config_cache: ConfigCache, hostname: HostName) -> None:
+
+def _precompile_hostcheck(config_cache: ConfigCache,
+                          hostname: HostName) -> Tuple[Set[CheckPluginNameStr], bool]:
+    """Returns the needed legacy checks and whether the host check has been regenerated"""
     host_config = config_cache.get_host_config(hostname)
 
     console.verbose("%s%s%-16s%s:", tty.bold, tty.blue, hostname, tty.normal, stream=sys.stderr)
 
     check_api_utils.set_hostname(hostname)
 
-    compiled_filename = cmk.utils.paths.precompiled_hostchecks_dir + "/" + hostname
+    compiled_filename = _compiled_hostcheck_path(hostname)
     source_filename = compiled_filename + ".py"
-    for fname in [compiled_filename, source_filename]:
-        try:
-            os.remove(fname)
-        except OSError as e:
-            if e.errno != errno.ENOENT:
-                raise
 
     (needed_legacy_check_plugin_names, needed_agent_based_check_plugin_names,
      needed_agent_based_inventory_plugin_names) = _get_needed_plugin_names(host_config)
@@ -962,7 +1192,13 @@ def _precompile_hostcheck(config_cache: ConfigCache, hostname: HostName) -> None
             needed_agent_based_inventory_plugin_names,
     )):
         console.verbose("(no Check_MK checks)\n")
-        return
+        for fname in [compiled_filename, source_filename]:
+            try:
+                os.remove(fname)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+        return needed_legacy_check_plugin_names, False
 
     output = open(source_filename + ".new", "w")
     output.write("#!/usr/bin/env python3\n")
@@ -1043,38 +1279,7 @@ if '-d' in sys.argv:
 
     output.write("config.load_packed_config()\n")
 
-    # IP addresses
-    needed_ipaddresses, needed_ipv6addresses, = {}, {}
-    if host_config.is_cluster:
-        if host_config.nodes is None:
-            raise TypeError()
-
-        for node in host_config.nodes:
-            node_config = config_cache.get_host_config(node)
-            if node_config.is_ipv4_host:
-                needed_ipaddresses[node] = ip_lookup.lookup_ipv4_address(node_config)
-
-            if node_config.is_ipv6_host:
-                needed_ipv6addresses[node] = ip_lookup.lookup_ipv6_address(node_config)
-
-        try:
-            if host_config.is_ipv4_host:
-                needed_ipaddresses[hostname] = ip_lookup.lookup_ipv4_address(host_config)
-        except Exception:
-            pass
-
-        try:
-            if host_config.is_ipv6_host:
-                needed_ipv6addresses[hostname] = ip_lookup.lookup_ipv6_address(host_config)
-        except Exception:
-            pass
-    else:
-        if host_config.is_ipv4_host:
-            needed_ipaddresses[hostname] = ip_lookup.lookup_ipv4_address(host_config)
-
-        if host_config.is_ipv6_host:
-            needed_ipv6addresses[hostname] = ip_lookup.lookup_ipv6_address(host_config)
-
+    needed_ipaddresses, needed_ipv6addresses = _get_needed_ip_addresses(config_cache, host_config)
     output.write("config.ipaddresses = %r\n\n" % needed_ipaddresses)
     output.write("config.ipv6addresses = %r\n\n" % needed_ipv6addresses)
 
@@ -1104,11 +1309,11 @@ if '-d' in sys.argv:
     # compile python (either now or delayed), but only if the source
     # code has not changed. The Python compilation is the most costly
     # operation here.
-    if os.path.exists(source_filename):
+    if os.path.exists(source_filename) and os.path.lexists(compiled_filename):
         if open(source_filename).read() == open(source_filename + ".new").read():
             console.verbose(" (%s is unchanged)\n", source_filename, stream=sys.stderr)
             os.remove(source_filename + ".new")
-            return
+            return needed_legacy_check_plugin_names, False
         console.verbose(" (new content)", stream=sys.stderr)
 
     os.rename(source_filename + ".new", source_filename)
@@ -1121,6 +1326,45 @@ if '-d' in sys.argv:
         os.symlink(hostname + ".py", compiled_filename)
 
     console.verbose(" ==> %s.\n", compiled_filename, stream=sys.stderr)
+    return needed_legacy_check_plugin_names, True
+
+
+def _get_needed_ip_addresses(config_cache: ConfigCache,
+                             host_config: HostConfig) -> Tuple[IPAddresses, IPAddresses]:
+    hostname = host_config.hostname
+    needed_ipaddresses: IPAddresses = {}
+    needed_ipv6addresses: IPAddresses = {}
+    if host_config.is_cluster:
+        if host_config.nodes is None:
+            raise TypeError()
+
+        for node in host_config.nodes:
+            node_config = config_cache.get_host_config(node)
+            if node_config.is_ipv4_host:
+                needed_ipaddresses[node] = ip_lookup.lookup_ipv4_address(node_config)
+
+            if node_config.is_ipv6_host:
+                needed_ipv6addresses[node] = ip_lookup.lookup_ipv6_address(node_config)
+
+        try:
+            if host_config.is_ipv4_host:
+                needed_ipaddresses[hostname] = ip_lookup.lookup_ipv4_address(host_config)
+        except Exception:
+            pass
+
+        try:
+            if host_config.is_ipv6_host:
+                needed_ipv6addresses[hostname] = ip_lookup.lookup_ipv6_address(host_config)
+        except Exception:
+            pass
+    else:
+        if host_config.is_ipv4_host:
+            needed_ipaddresses[hostname] = ip_lookup.lookup_ipv4_address(host_config)
+
+        if host_config.is_ipv6_host:
+            needed_ipv6addresses[hostname] = ip_lookup.lookup_ipv6_address(host_config)
+
+    return needed_ipaddresses, needed_ipv6addresses
 
 
 def _get_needed_plugin_names(
@@ -100,8 +100,7 @@ class ABCHostSections(Generic[TRawData, TSections, TPersistedSections, TSectionC
     #       Would this be correct here?
     def update(self, host_sections: "ABCHostSections") -> None:
         """Update this host info object with the contents of another one"""
-        for section_name, section_content in host_sections.sections.items():
-            self._extend_section(section_name, section_content)
+        self._extend_sections(host_sections.sections)
 
         for hostname, raw_lines in host_sections.piggybacked_raw_data.items():
             self.piggybacked_raw_data.setdefault(hostname, []).extend(raw_lines)
@@ -133,6 +132,10 @@ class ABCHostSections(Generic[TRawData, TSections, TPersistedSections, TSectionC
             logger.debug("Using persisted section %r", section_name)
             self._add_cached_section(section_name, *entry)
 
+    def _extend_sections(self, sections: TSections) -> None:
+        for section_name, section_content in sections.items():
+            self._extend_section(section_name, section_content)
+
     def _extend_section(
         self,
         section_name: SectionName,
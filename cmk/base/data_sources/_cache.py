@@ -27,7 +27,7 @@ class SectionStore(Generic[TPersistedSections]):
             return
 
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        store.save_object_to_file(self.path, {str(k): v for k, v in sections.items()}, pretty=False)
+        store.save_object_to_file(self.path, {str(k): v for k, v in sections.items()}, fast=True)
         self._logger.debug("Stored persisted sections: %s", ", ".join(str(s) for s in sections))
 
     # TODO: This is not race condition free when modifying the data. Either remove
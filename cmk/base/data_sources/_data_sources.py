@@ -263,6 +263,7 @@ def update_host_sections(
         cmk.utils.piggyback.store_piggyback_raw_data(
             hostname,
             host_sections.piggybacked_raw_data,
+            spool=config.piggyback_store == "spool",
         )
 
     return result
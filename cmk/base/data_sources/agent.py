@@ -5,9 +5,13 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import abc
+import collections.abc
+import itertools
+import logging
+import re
 import time
 from pathlib import Path
-from typing import cast, Dict, Final, List, Optional, Tuple
+from typing import cast, Dict, Final, Iterator, List, NamedTuple, Optional, Tuple
 
 from six import ensure_binary, ensure_str
 
@@ -53,10 +57,124 @@ from ._abstract import (
 
 __all__ = ["AgentConfigurator", "AgentHostSections", "AgentChecker"]
 
+# A line of the agent output which starts a section or the data of a piggybacked host
+_HEADER_LINE = re.compile(rb"^[ \t\r\x0b\x0c]*<<<[^\n]*>>>[ \t\r\x0b\x0c]*$", re.MULTILINE)
+
+
+class RawSectionChunk(NamedTuple):
+    """Lines of a section in the raw agent output which have not been parsed yet"""
+    raw_data: AgentRawData
+    begin: int
+    end: int
+    encoding: Optional[str]
+    separator: Optional[str]
+    strip: bool
+
+    def parse(self) -> AgentSectionContent:
+        encoding = "utf-8" if self.encoding is None else self.encoding
+        separator = self.separator
+        strip = self.strip
+        section_content: AgentSectionContent = []
+        for line in self.raw_data[self.begin:self.end].split(b"\n"):
+            stripped_line = line.strip()
+            if stripped_line == b'':
+                continue
+
+            decoded_line = ensure_str_with_fallback(
+                stripped_line if strip else line.rstrip(b"\r"),
+                encoding=encoding,
+                fallback="latin-1",
+            )
+            section_content.append(decoded_line.split(separator))
+        return section_content
+
+
+class LazyAgentSections(collections.abc.MutableMapping):
+    """The sections of an agent output which are parsed when they are accessed first
+
+    The agent parser only records where the lines of the sections are. Most hosts send
+    a lot more sections than the plugins of the host need, decoding and splitting all
+    their lines would be a waste of time."""
+    def __init__(self, sections: Optional[Dict[SectionName, AgentSectionContent]] = None) -> None:
+        super().__init__()
+        # The content of each section is the parsed part of the section, the raw chunks
+        # of a section are always parsed and added in one go
+        self._sections: Dict[SectionName, AgentSectionContent] = dict(sections or {})
+        self._raw_chunks: Dict[SectionName, List[RawSectionChunk]] = {}
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+    def __iter__(self) -> Iterator[SectionName]:
+        return iter(self._sections)
+
+    def __contains__(self, section_name: object) -> bool:
+        return section_name in self._sections
+
+    def __getitem__(self, section_name: SectionName) -> AgentSectionContent:
+        section_content = self._sections[section_name]
+        raw_chunks = self._raw_chunks.pop(section_name, None)
+        if raw_chunks:
+            for raw_chunk in raw_chunks:
+                section_content.extend(raw_chunk.parse())
+        return section_content
+
+    def __setitem__(self, section_name: SectionName, section_content: AgentSectionContent) -> None:
+        self._sections[section_name] = section_content
+        self._raw_chunks.pop(section_name, None)
+
+    def __delitem__(self, section_name: SectionName) -> None:
+        del self._sections[section_name]
+        self._raw_chunks.pop(section_name, None)
+
+    def add_section(self, section_name: SectionName) -> None:
+        self._sections.setdefault(section_name, [])
+
+    def add_raw_chunk(self, section_name: SectionName, raw_chunk: RawSectionChunk) -> None:
+        self.add_section(section_name)
+        self._raw_chunks.setdefault(section_name, []).append(raw_chunk)
+
+    def is_parsed(self, section_name: SectionName) -> bool:
+        return section_name not in self._raw_chunks
+
+    def parse_sections(self) -> None:
+        for section_name in list(self._raw_chunks):
+            self.__getitem__(section_name)
+
+    def extend_sections(self, sections: AgentSections) -> None:
+        """Append the lines of the given sections without parsing them"""
+        if not isinstance(sections, LazyAgentSections):
+            for section_name, section_content in sections.items():
+                self._sections.setdefault(section_name, []).extend(section_content)
+            return
+
+        for section_name, section_content in sections._sections.items():
+            self.add_section(section_name)
+            if section_content:
+                self[section_name].extend(section_content)
+            for raw_chunk in sections._raw_chunks.get(section_name, []):
+                self.add_raw_chunk(section_name, raw_chunk)
+
 
 class AgentHostSections(ABCHostSections[AgentRawData, AgentSections, AgentPersistedSections,
                                         AgentSectionContent]):
-    pass
+    def __init__(
+        self,
+        sections: Optional[AgentSections] = None,
+        cache_info: Optional[SectionCacheInfo] = None,
+        piggybacked_raw_data: Optional[PiggybackRawData] = None,
+        persisted_sections: Optional[AgentPersistedSections] = None,
+    ) -> None:
+        super().__init__(sections, cache_info, piggybacked_raw_data, persisted_sections)
+        self.sections = (sections if isinstance(sections, LazyAgentSections) else
+                         LazyAgentSections(sections))
+
+    def _extend_sections(self, sections: AgentSections) -> None:
+        assert isinstance(self.sections, LazyAgentSections)
+        self.sections.extend_sections(sections)
 
 
 class AgentConfigurator(ABCConfigurator[AgentRawData, AgentHostSections]):
@@ -105,7 +223,8 @@ class AgentConfigurator(ABCConfigurator[AgentRawData, AgentHostSections]):
         return AgentChecker(self)
 
     def make_parser(self) -> "AgentParser":
-        return AgentParser(self.hostname, self._logger)
+        # Only a part of the sections is needed in case the relevant raw sections are known
+        return AgentParser(self.hostname, self._logger, lazy=self.selected_raw_sections is not None)
 
 
 class AgentSummarizer(ABCSummarizer[AgentHostSections]):
@@ -288,14 +407,22 @@ class AgentSummarizerDefault(AgentSummarizer):
 
 
 class AgentParser(ABCParser[AgentRawData, AgentHostSections]):
-    """A parser for agent data."""
+    """A parser for agent data.
+
+    In lazy mode the lines of the sections are only decoded and split when the section
+    is accessed first (see LazyAgentSections). Otherwise all sections are parsed at once.
+    """
 
     # TODO(ml): Refactor, we should structure the code so that we have one
     #   function per attribute in AgentHostSections (AgentHostSections.sections,
     #   AgentHostSections.cache_info, AgentHostSections.piggybacked_raw_data,
     #   and AgentHostSections.persisted_sections) and a few simple helper functions.
-    #   Moreover, the main loop of the parser (at `for line in raw_data.split(b"\n")`)
+    #   Moreover, the main loop of the parser (at `for header in ...`)
     #   is an FSM and shoule be written as such.  (See CMK-5004)
+    def __init__(self, hostname: HostName, logger: logging.Logger, *, lazy: bool = False) -> None:
+        super().__init__(hostname, logger)
+        self.lazy = lazy
+
     def parse(
         self,
         raw_data: AgentRawData,
@@ -313,10 +440,14 @@ class AgentParser(ABCParser[AgentRawData, AgentHostSections]):
     ) -> AgentHostSections:
         """Split agent output in chunks, splits lines by whitespaces.
 
+        Only the header lines are looked at one by one, the lines between them are
+        handled as a whole: They are added to the piggybacked data or recorded as raw
+        chunk of the current section.
+
         Returns a HostSections() object.
         """
         hostname = self.hostname
-        sections: AgentSections = {}
+        sections = LazyAgentSections()
         # Unparsed info for other hosts. A dictionary, indexed by the piggybacked host name.
         # The value is a list of lines which were received for this host.
         piggybacked_raw_data: PiggybackRawData = {}
@@ -327,35 +458,63 @@ class AgentParser(ABCParser[AgentRawData, AgentHostSections]):
 
         # handle sections with option persist(...)
         persisted_sections: AgentPersistedSections = {}
-        section_content: Optional[AgentSectionContent] = None
+        persisted_times: Dict[SectionName, Tuple[int, int]] = {}
+        section_name: Optional[SectionName] = None
         section_options: Dict[str, Optional[str]] = {}
         agent_cache_info: SectionCacheInfo = {}
         separator: Optional[str] = None
         encoding = None
-        for line in raw_data.split(b"\n"):
-            line = line.rstrip(b"\r")
-            stripped_line = line.strip()
+        # The lines following the last header line (including the line break ending it)
+        begin = 0
+        for header in itertools.chain(_HEADER_LINE.finditer(raw_data), [None]):
+            end = len(raw_data) if header is None else header.start()
+
+            if piggybacked_hostname:  # processing data for an other host
+                # The lines between the line breaks ending the last header line and
+                # preceding the next one
+                lines = raw_data[begin:end].split(b"\n")[1:]
+                if header is not None:
+                    lines.pop()
+                if lines:
+                    piggybacked_raw_data.setdefault(piggybacked_hostname, []).extend(
+                        line.rstrip(b"\r") for line in lines)
+
+            elif section_name is not None and end - begin > 1:
+                sections.add_raw_chunk(
+                    section_name,
+                    RawSectionChunk(
+                        raw_data,
+                        begin,
+                        end,
+                        encoding,
+                        separator,
+                        section_options.get("nostrip") is None,
+                    ))
+
+            if header is None:
+                break
+            begin = header.end()
+
+            stripped_line = header.group().strip()
             if stripped_line[:4] == b'<<<<' and stripped_line[-4:] == b'>>>>':
                 piggybacked_hostname =\
                     AgentParser._get_sanitized_and_translated_piggybacked_hostname(stripped_line, hostname)
 
             elif piggybacked_hostname:  # processing data for an other host
-                if stripped_line[:3] == b'<<<' and stripped_line[-3:] == b'>>>':
-                    line = AgentParser._add_cached_info_to_piggybacked_section_header(
-                        stripped_line, piggybacked_cached_at, piggybacked_cache_age)
-                piggybacked_raw_data.setdefault(piggybacked_hostname, []).append(line)
+                piggybacked_raw_data.setdefault(piggybacked_hostname, []).append(
+                    AgentParser._add_cached_info_to_piggybacked_section_header(
+                        stripped_line, piggybacked_cached_at, piggybacked_cache_age))
 
             # Found normal section header
             # section header has format <<<name:opt1(args):opt2:opt3(args)>>>
-            elif stripped_line[:3] == b'<<<' and stripped_line[-3:] == b'>>>':
+            else:
                 section_name, section_options = AgentParser._parse_section_header(
                     stripped_line[3:-3])
 
                 if section_name is None:
                     self._logger.warning("Ignoring invalid raw section: %r" % stripped_line)
-                    section_content = None
                     continue
-                section_content = sections.setdefault(section_name, [])
+                sections.add_section(section_name)
 
                 raw_separator = section_options.get("sep")
                 if raw_separator is None:
@@ -370,7 +529,7 @@ class AgentParser(ABCParser[AgentRawData, AgentHostSections]):
                     cached_at = int(time.time())  # Estimate age of the data
                     cache_interval = int(until - cached_at)
                     agent_cache_info[section_name] = (cached_at, cache_interval)
-                    persisted_sections[section_name] = (cached_at, until, section_content)
+                    persisted_times[section_name] = (cached_at, until)
 
                 raw_cached = section_options.get("cached")
                 if raw_cached is not None:
@@ -380,18 +539,13 @@ class AgentParser(ABCParser[AgentRawData, AgentHostSections]):
                 # The section data might have a different encoding
                 encoding = section_options.get("encoding")
 
-            elif stripped_line != b'':
-                if section_content is None:
-                    continue
-
-                raw_nostrip = section_options.get("nostrip")
-                if raw_nostrip is None:
-                    line = stripped_line
-
-                decoded_line = ensure_str_with_fallback(
-                    line, encoding=("utf-8" if encoding is None else encoding), fallback="latin-1")
+        # The persisted sections are stored right away, they need to be parsed
+        for persisted_section_name, (cached_at, until) in persisted_times.items():
+            persisted_sections[persisted_section_name] = (cached_at, until,
+                                                          sections[persisted_section_name])
 
-                section_content.append(decoded_line.split(separator))
+        if not self.lazy:
+            sections.parse_sections()
 
         return AgentHostSections(
             sections,
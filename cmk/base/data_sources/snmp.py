@@ -183,6 +183,7 @@ class SNMPConfigurator(ABCConfigurator[SNMPRawData, SNMPHostSections]):
             },
             "use_snmpwalk_cache": self.use_snmpwalk_cache,
             "snmp_config": self.snmp_config._asdict(),
+            "max_parallel_walks": config.snmp_max_parallel_walks,
         }
 
     def make_checker(self) -> "SNMPChecker":
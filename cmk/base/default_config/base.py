@@ -27,15 +27,23 @@ snmp_ports: _List = []
 tcp_connect_timeout = 5.0
 tcp_connect_timeouts: _List = []
 use_dns_cache = True  # prevent DNS by using own cache file
+# Number of DNS lookups executed in parallel and the timeout of each lookup in seconds
+# when updating the DNS cache
+dns_cache_update_max_parallel_lookups = 50
+dns_cache_update_lookup_timeout = 5.0
 delay_precompile = False  # delay Python compilation to Nagios execution
+# Number of processes precompiling the host checks in parallel (None: one per CPU)
+precompile_hostchecks_max_processes: _Optional[int] = None
 restart_locking = "abort"  # also possible: "wait", None
 check_submission = "file"  # alternative: "pipe"
+item_state_format = "binary"  # alternative: "repr"
 agent_min_version = 0  # warn, if plugin has not at least version
 default_host_group = 'check_mk'
 
 check_max_cachefile_age = 0  # per default do not use cache files when checking
 cluster_max_cachefile_age = 90  # secs.
 piggyback_max_cachefile_age = 3600  # secs
+piggyback_store = "files"  # alternative: "spool"
 # Ruleset for translating piggyback host names
 piggyback_translation: _List = []
 # Ruleset for translating service descriptions
@@ -68,6 +76,8 @@ snmp_limit_oid_range: _List = []
 # Ruleset to customize bulk size
 snmp_bulk_size: _List = []
 record_inline_snmp_stats = False
+# Number of SNMP walks of a host that are executed in parallel (classic SNMP only)
+snmp_max_parallel_walks = 4
 snmp_default_community = 'public'
 snmp_communities: _List = []
 # override the rule based configuration
@@ -119,6 +129,8 @@ passive_service_template_perf = 'check_mk_passive_perf'
 summary_service_template = 'check_mk_summarized'
 service_dependency_template = 'check_mk'
 generate_hostconf = True
+# Only regenerate the core objects of hosts whose configuration inputs changed
+incremental_core_config = False
 generate_dummy_commands = True
 dummy_check_commandline = 'echo "ERROR - you did an active check on this service - please disable active checks" && exit 1'
 nagios_illegal_chars = '`;~!$%^&*|\'"<>?,()='
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Reuse the objects of unchanged hosts when creating the core configuration
+
+The inputs the objects of a host are generated from are condensed to a fingerprint:
+
+* a digest of all global settings (everything which is neither a ruleset nor a
+  host specific setting), the Checkmk version and the local check plugins,
+* the host attributes and the host specific settings,
+* the rules matching the host and
+* the autochecks of the host.
+
+The fingerprints and the location of the host objects in the generated file are saved
+after each run. During the next run the objects of hosts with an unchanged fingerprint
+are copied from the previous file instead of computing them again.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import cmk.utils.paths
+import cmk.utils.store as store
+import cmk.utils.version as cmk_version
+from cmk.utils.log import console
+from cmk.utils.type_defs import HostName
+
+import cmk.base.config as config
+import cmk.base.core_config as core_config
+from cmk.base.config import ConfigCache
+
+# Defined objects of a host: Name of the set to define -> names
+HostDefines = Dict[str, List[str]]
+# Fingerprint, offset and length of the objects, defined objects
+HostObjectsEntry = Tuple[str, int, int, HostDefines]
+
+_CACHE_VERSION = 1
+
+# These settings are only looked up for the host in question
+_HOST_VARIABLE_NAMES = [
+    "host_paths",
+    "host_tags",
+    "host_labels",
+    "host_attributes",
+    "ipaddresses",
+    "ipv6addresses",
+    "explicit_snmp_communities",
+    "management_snmp_credentials",
+    "management_ipmi_credentials",
+    "management_protocol",
+]
+
+# These settings are covered by the host attributes and the cluster relations
+_TOPOLOGY_VARIABLE_NAMES = [
+    "all_hosts",
+    "clusters",
+    "explicit_host_conf",
+]
+
+
+class HostConfigFingerprints:
+    """Compute the fingerprints of the configuration inputs of the hosts"""
+    def __init__(self, config_cache: ConfigCache) -> None:
+        super(HostConfigFingerprints, self).__init__()
+        self._config_cache = config_cache
+        self._global_digest: Optional[bytes] = None
+        self._rule_digests: Optional[Dict[HostName, List[bytes]]] = None
+
+    def fingerprint(self, hostname: HostName) -> Optional[str]:
+        """Returns None for hosts which objects must always be generated
+
+        The objects of clusters depend on the services and attributes of their nodes."""
+        host_config = self._config_cache.get_host_config(hostname)
+        if host_config.is_cluster:
+            return None
+
+        self.prepare()
+        assert self._global_digest is not None and self._rule_digests is not None
+
+        digest = hashlib.sha256(self._global_digest)
+        attributes = core_config.get_host_attributes(hostname, self._config_cache)
+        digest.update(repr(sorted(attributes.items())).encode("utf-8"))
+        digest.update(repr(self._host_settings(hostname)).encode("utf-8"))
+        digest.update(b"".join(self._rule_digests.get(hostname, [])))
+        digest.update(_read_file(Path(cmk.utils.paths.autochecks_dir, hostname + ".mk")))
+        return digest.hexdigest()
+
+    def prepare(self) -> None:
+        """Compute the digests shared by all hosts, e.g. before forking worker processes"""
+        if self._global_digest is None:
+            self._global_digest = self._compute_global_digest()
+        if self._rule_digests is None:
+            self._rule_digests = self._compute_rule_digests()
+
+    def _host_settings(self, hostname: HostName) -> List[Any]:
+        settings: List[Any] = [
+            getattr(config, varname, {}).get(hostname) for varname in _HOST_VARIABLE_NAMES
+        ]
+        settings.append({
+            varname: values[hostname]
+            for varname, values in config.explicit_host_conf.items()
+            if hostname in values
+        })
+        settings.append(self._config_cache.clusters_of(hostname))
+        return settings
+
+    def _compute_global_digest(self) -> bytes:
+        digest = hashlib.sha256(cmk_version.__version__.encode("utf-8"))
+        for varname, value in _config_variables():
+            if varname in _HOST_VARIABLE_NAMES or varname in _TOPOLOGY_VARIABLE_NAMES:
+                continue
+            if _is_ruleset(value) or _is_ruleset_dict(value):
+                continue
+            digest.update(("%s=%r\n" % (varname, value)).encode("utf-8"))
+
+        for path, mtime_ns, size in _local_plugin_files():
+            digest.update(("%s %d %d\n" % (path, mtime_ns, size)).encode("utf-8"))
+        return digest.digest()
+
+    def _compute_rule_digests(self) -> Dict[HostName, List[bytes]]:
+        """Collect a digest of each rule for the hosts it matches
+
+        The digest covers the position and the value of the rule and the conditions
+        which are not evaluated for the host, like the service conditions."""
+        optimizer = self._config_cache.ruleset_matcher.ruleset_optimizer
+        rule_digests: Dict[HostName, List[bytes]] = {}
+        for ruleset_name, ruleset in _rulesets():
+            for index, rule in enumerate(ruleset):
+                if "disabled" in rule.get("options", {}):
+                    continue
+
+                condition = rule["condition"]
+                rule_digest = hashlib.sha256(
+                    repr((ruleset_name, index, rule["value"],
+                          sorted((key, repr(value))
+                                 for key, value in condition.items()
+                                 if not key.startswith("host_")))).encode("utf-8")).digest()
+                for hostname in optimizer.all_matching_hosts(condition, with_foreign_hosts=True):
+                    rule_digests.setdefault(hostname, []).append(rule_digest)
+        return rule_digests
+
+
+def _config_variables() -> Iterator[Tuple[str, Any]]:
+    for varname in sorted(config.get_variable_names()):
+        value = getattr(config, varname, None)
+        if not callable(value):
+            yield varname, value
+
+    for varname, value in sorted(config.get_check_variables().items()):
+        yield varname, value
+
+
+def _rulesets() -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    for varname, value in _config_variables():
+        if varname in _HOST_VARIABLE_NAMES or varname in _TOPOLOGY_VARIABLE_NAMES:
+            continue
+        if _is_ruleset(value):
+            yield varname, value
+        elif _is_ruleset_dict(value):
+            for key, ruleset in value.items():
+                yield "%s[%r]" % (varname, key), ruleset
+
+
+def _is_ruleset(value: Any) -> bool:
+    return isinstance(value, list) and all(
+        isinstance(rule, dict) and "condition" in rule and "value" in rule for rule in value)
+
+
+def _is_ruleset_dict(value: Any) -> bool:
+    """Some settings are dictionaries of rulesets, e.g. checkgroup_parameters"""
+    return isinstance(value, dict) and bool(value) and all(
+        _is_ruleset(ruleset) for ruleset in value.values())
+
+
+def _local_plugin_files() -> Iterator[Tuple[str, int, int]]:
+    for base_dir in [
+            cmk.utils.paths.local_checks_dir,
+            str(cmk.utils.paths.local_agent_based_plugins_dir)
+    ]:
+        for dirpath, _dirnames, filenames in sorted(os.walk(base_dir)):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_mtime_ns, stat.st_size
+
+
+def _read_file(path: Path) -> bytes:
+    try:
+        with path.open("rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+class HostObjectCache:
+    """Objects of the hosts in the previously generated configuration file
+
+    The objects are read from the previous configuration file. It is looked up at the
+    given path and at the path of the backup the restart creates (<path>.save). The file
+    is only used in case it is unchanged since it was written."""
+    def __init__(self, cache_path: Path, config_path: Path,
+                 fingerprints: HostConfigFingerprints) -> None:
+        super(HostObjectCache, self).__init__()
+        self._cache_path = cache_path
+        self._config_path = config_path
+        self._fingerprints = fingerprints
+        self._previous_hosts: Dict[HostName, HostObjectsEntry] = {}
+        self._previous_config: Optional[BinaryIO] = None
+        self._hosts: Dict[HostName, HostObjectsEntry] = {}
+        self._load()
+
+    def _load(self) -> None:
+        cache = store.load_object_from_file(self._cache_path, default={})
+        if cache.get("version") != _CACHE_VERSION:
+            return
+
+        for path in [self._config_path, Path("%s.save" % self._config_path)]:
+            try:
+                f = path.open("rb")
+            except FileNotFoundError:
+                continue
+            stat = os.fstat(f.fileno())
+            if (stat.st_size, stat.st_mtime_ns) != (cache["size"], cache["mtime_ns"]):
+                f.close()
+                continue
+            # Keep the file open: The new configuration file replaces it while we read from it
+            self._previous_config = f
+            self._previous_hosts = cache["hosts"]
+            return
+        console.vverbose("No previous configuration file matching %s found\n" % self._cache_path)
+
+    def fingerprint(self, hostname: HostName) -> Optional[str]:
+        return self._fingerprints.fingerprint(hostname)
+
+    def get(self, hostname: HostName, fingerprint: str) -> Optional[Tuple[bytes, HostDefines]]:
+        """Returns the objects of the host in case its fingerprint did not change"""
+        entry = self._previous_hosts.get(hostname)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        assert self._previous_config is not None
+        _fingerprint, offset, length, defines = entry
+        return os.pread(self._previous_config.fileno(), length, offset), defines
+
+    def add(self, hostname: HostName, fingerprint: str, offset: int, length: int,
+            defines: HostDefines) -> None:
+        """Remember the location of the objects of a host in the new configuration file"""
+        self._hosts[hostname] = (fingerprint, offset, length, defines)
+
+    def save(self) -> None:
+        """Save the locations of the host objects once the new file is in place"""
+        stat = self._config_path.stat()
+        store.save_object_to_file(self._cache_path, {
+            "version": _CACHE_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hosts": self._hosts,
+        },
+                                  fast=True)
+
+    def close(self) -> None:
+        if self._previous_config is not None:
+            self._previous_config.close()
+        self._previous_config = None
+        self._previous_hosts = {}
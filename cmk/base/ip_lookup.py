@@ -6,8 +6,11 @@
 
 import errno
 import os
+import queue
 import socket
-from typing import AnyStr, cast, Dict, List, Optional, Tuple, Union
+import threading
+import time
+from typing import AnyStr, cast, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 from six import ensure_str
 
@@ -26,6 +29,12 @@ IPLookupCacheId = Tuple[HostName, int]
 NewIPLookupCache = Dict[IPLookupCacheId, str]
 LegacyIPLookupCache = Dict[str, str]
 UpdateDNSCacheResult = Tuple[int, List[HostName]]
+DNSLookupResult = NamedTuple("DNSLookupResult", [
+    ("address", Optional[HostAddress]),
+    ("error", Optional[str]),
+    ("duration", float),
+    ("timed_out", bool),
+])
 
 _fake_dns: Optional[HostAddress] = None
 _enforce_localhost = False
@@ -65,6 +74,20 @@ def lookup_mgmt_board_ip_address(host_config: config.HostConfig) -> Optional[Hos
 def lookup_ip_address(host_config: config.HostConfig,
                       family: Optional[int] = None,
                       for_mgmt_board: bool = False) -> Optional[HostAddress]:
+    if family is None:  # choose primary family
+        family = 6 if host_config.is_ipv6_primary else 4
+
+    ipa = _lookup_ip_address_without_dns(host_config, family, for_mgmt_board)
+    if ipa:
+        return ipa
+
+    return cached_dns_lookup(host_config.hostname, family, host_config.is_no_ip_host)
+
+
+def _lookup_ip_address_without_dns(host_config: config.HostConfig,
+                                   family: int,
+                                   for_mgmt_board: bool = False) -> Optional[HostAddress]:
+    """Returns the address of the host in case it is known without asking the DNS"""
     # Quick hack, where all IP addresses are faked (--fake-dns)
     if _fake_dns:
         return _fake_dns
@@ -72,9 +95,6 @@ def lookup_ip_address(host_config: config.HostConfig,
     if config.fake_dns:
         return config.fake_dns
 
-    if family is None:  # choose primary family
-        family = 6 if host_config.is_ipv6_primary else 4
-
     # Honor simulation mode und usewalk hosts. Never contact the network.
     if config.simulation_mode or _enforce_localhost or (host_config.is_usewalk_host and
                                                         host_config.is_snmp_host):
@@ -107,7 +127,7 @@ def lookup_ip_address(host_config: config.HostConfig,
     if host_config.is_dyndns_host:
         return hostname
 
-    return cached_dns_lookup(hostname, family, host_config.is_no_ip_host)
+    return None
 
 
 # Variables needed during the renaming of hosts (see automation.py)
@@ -135,8 +155,7 @@ def cached_dns_lookup(hostname: HostName, family: int, is_no_ip_host: bool) -> O
 
     # Now do the actual DNS lookup
     try:
-        ipa = socket.getaddrinfo(hostname, None, family == 4 and socket.AF_INET or
-                                 socket.AF_INET6)[0][4][0]
+        ipa = _dns_lookup(hostname, family)
 
         # Update our cached address if that has changed or was missing
         if ipa != cached_ip:
@@ -162,6 +181,11 @@ def cached_dns_lookup(hostname: HostName, family: int, is_no_ip_host: bool) -> O
                                      (family, hostname, e))
 
 
+def _dns_lookup(hostname: HostName, family: int) -> str:
+    return socket.getaddrinfo(hostname, None, family == 4 and socket.AF_INET or
+                              socket.AF_INET6)[0][4][0]
+
+
 class IPLookupCache(cmk.base.caching.DictCache):
     def __init__(self) -> None:
         super(IPLookupCache, self).__init__()
@@ -263,32 +287,135 @@ def update_dns_cache() -> UpdateDNSCacheResult:
     console.verbose("Cleaning up existing DNS cache...\n")
     _clear_ip_lookup_cache(ip_lookup_cache)
 
-    console.verbose("Updating DNS cache...\n")
+    # Only the hosts without a configured address need to be resolved. They are resolved
+    # in parallel, all other work is done here, because the configuration is not thread safe.
+    dns_lookups: List[IPLookupCacheId] = []
     for hostname, family in _get_dns_cache_lookup_hosts(config_cache):
         host_config = config_cache.get_host_config(hostname)
-        console.verbose("%s (IPv%d)..." % (hostname, family))
-        try:
-            ip = lookup_ip_address(host_config, family)
-            console.verbose("%s\n" % ip)
+        if (_lookup_ip_address_without_dns(host_config, family) is None and
+                not host_config.is_no_ip_host):
+            dns_lookups.append((hostname, family))
 
-        except (MKTerminate, MKTimeout):
-            # We should be more specific with the exception handler below, then we
-            # could drop this special handling here
-            raise
+    console.verbose("Updating DNS cache...\n")
+    results = _resolve_concurrently(dns_lookups, config.dns_cache_update_max_parallel_lookups,
+                                    config.dns_cache_update_lookup_timeout)
 
-        except Exception as e:
+    cache = _config_cache.get_dict("cached_dns_lookup")
+    for cache_id in dns_lookups:
+        hostname, family = cache_id
+        result = results[cache_id]
+        cache[cache_id] = result.address
+        if result.address is None:
             failed.append(hostname)
-            console.verbose("lookup failed: %s\n" % e)
+            console.verbose("%s (IPv%d)...lookup failed: %s\n" % (hostname, family, result.error))
             if cmk.utils.debug.enabled():
-                raise
+                raise MKIPAddressLookupError("Failed to lookup IPv%d address of %s via DNS: %s" %
+                                             (family, hostname, result.error))
             continue
 
+        console.verbose("%s (IPv%d)...%s\n" % (hostname, family, result.address))
+        ip_lookup_cache.update_cache(cache_id, result.address)
+
+    console.verbose(_dns_lookup_summary(results))
+
     ip_lookup_cache.persist_on_update = True
     ip_lookup_cache.save_persisted()
 
     return len(ip_lookup_cache), failed
 
 
+def _resolve_concurrently(lookups: Sequence[IPLookupCacheId], max_parallel: int,
+                          timeout: float) -> Dict[IPLookupCacheId, DNSLookupResult]:
+    """Resolve the addresses with at most max_parallel lookups running at a time
+
+    A lookup taking longer than timeout seconds is treated as failed. getaddrinfo() can
+    not be interrupted, so the thread executing it is left behind and replaced by a new
+    one to keep hanging lookups from reducing the concurrency.
+    """
+    todo: "queue.Queue[IPLookupCacheId]" = queue.Queue()
+    for cache_id in lookups:
+        todo.put(cache_id)
+    done: "queue.Queue[Tuple[IPLookupCacheId, DNSLookupResult]]" = queue.Queue()
+    # The lookups being executed: the start time and the event to stop the thread afterwards
+    running: Dict[IPLookupCacheId, Tuple[float, threading.Event]] = {}
+    lock = threading.Lock()
+
+    def worker(retired: threading.Event) -> None:
+        while not retired.is_set():
+            try:
+                cache_id = todo.get_nowait()
+            except queue.Empty:
+                return
+
+            started = time.monotonic()
+            with lock:
+                running[cache_id] = started, retired
+
+            try:
+                address: Optional[str] = _dns_lookup(*cache_id)
+                error = None
+            except Exception as e:
+                address, error = None, "%s" % e
+
+            with lock:
+                running.pop(cache_id, None)
+            done.put((cache_id, DNSLookupResult(address, error, time.monotonic() - started, False)))
+
+    def start_worker() -> None:
+        thread = threading.Thread(target=worker, args=(threading.Event(),))
+        thread.daemon = True
+        thread.start()
+
+    for _unused in range(min(max(1, max_parallel), len(lookups))):
+        start_worker()
+
+    results: Dict[IPLookupCacheId, DNSLookupResult] = {}
+    while len(results) < len(lookups):
+        with lock:
+            oldest_start = min((started for started, _retired in running.values()),
+                               default=time.monotonic())
+        try:
+            cache_id, result = done.get(timeout=max(0.0, oldest_start + timeout - time.monotonic()))
+        except queue.Empty:
+            now = time.monotonic()
+            with lock:
+                timed_out = [(cache_id, started, retired)
+                             for cache_id, (started, retired) in running.items()
+                             if now - started >= timeout]
+                for cache_id, _started, _retired in timed_out:
+                    del running[cache_id]
+
+            for cache_id, started, retired in timed_out:
+                results[cache_id] = DNSLookupResult(None, "Timed out after %.1f seconds" % timeout,
+                                                    now - started, True)
+                retired.set()
+                start_worker()
+            continue
+
+        results.setdefault(cache_id, result)
+
+    return results
+
+
+def _dns_lookup_summary(results: Dict[IPLookupCacheId, DNSLookupResult]) -> str:
+    durations = sorted(result.duration for result in results.values())
+    if not durations:
+        return "No DNS lookups needed\n"
+
+    return ("%d DNS lookups, %d failed (%d timed out), latency: %s\n" % (
+        len(results),
+        sum(1 for result in results.values() if result.address is None),
+        sum(1 for result in results.values() if result.timed_out),
+        ", ".join("%s %.1f ms" % (name, _percentile(durations, percent) * 1000)
+                  for name, percent in [("p50", 50), ("p90", 90), ("p99", 99), ("max", 100)]),
+    ))
+
+
+def _percentile(sorted_values: List[float], percent: int) -> float:
+    """Nearest-rank percentile of the given non empty list"""
+    return sorted_values[max(0, -(-len(sorted_values) * percent // 100) - 1)]
+
+
 def _clear_ip_lookup_cache(ip_lookup_cache: IPLookupCache) -> None:
     """Clear the persisted AND in memory cache"""
     try:
@@ -19,9 +19,14 @@ Do not store long-time things here. Also do not store complex
 structures like log files or stuff.
 """
 
+import abc
+import ast
+import marshal
 import os
+import struct
 import traceback
-from typing import Any, AnyStr, Dict, List, Optional, Tuple, Union
+from pathlib import Path
+from typing import Any, AnyStr, Dict, List, Optional, Tuple, Type, Union
 
 import cmk.utils.cleanup
 import cmk.utils.paths
@@ -48,75 +53,251 @@ class MKCounterWrapped(MKException):
     pass
 
 
-class CachedItemStates:
+def _item_state_path(hostname: HostName) -> Path:
+    return Path(cmk.utils.paths.counters_dir, hostname)
+
+
+def _apply_changes(item_states: ItemStates, updated_item_states: ItemStates,
+                   removed_item_state_keys: List[ItemStateKey]) -> None:
+    # Remove obsolete keys
+    for key in removed_item_state_keys:
+        try:
+            del item_states[key]
+        except KeyError:
+            pass
+
+    # Add updated keys
+    item_states.update(updated_item_states)
+
+
+class ABCItemStateStore(metaclass=abc.ABCMeta):
+    """Persists the item states of a host between two check cycles"""
+    @abc.abstractmethod
+    def load(self, hostname: HostName) -> ItemStates:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def save(self, hostname: HostName, item_states: ItemStates, updated_item_states: ItemStates,
+             removed_item_state_keys: List[ItemStateKey]) -> None:
+        """Write the modifications (update/remove) made since the last load to disk"""
+        raise NotImplementedError()
+
+
+class ReprItemStateStore(ABCItemStateStore):
+    """Stores the item states as Python literal which is rewritten completely on each save
+
+    Files written by the BinaryItemStateStore are read and converted to the Python
+    literal on the next save, so the format can be switched back."""
     def __init__(self) -> None:
+        super(ReprItemStateStore, self).__init__()
+        # timestamp of last modification
+        self._last_mtime: Optional[float] = None
+
+    def load(self, hostname: HostName) -> ItemStates:
+        filename = _item_state_path(hostname)
+        try:
+            # TODO: refactoring. put these two values into a named tuple
+            item_states = _parse_item_states(store.load_bytes_from_file(filename, lock=True))[0]
+            self._last_mtime = os.stat(str(filename)).st_mtime
+        finally:
+            store.release_lock(filename)
+        return item_states
+
+    # TODO: self._last_mtime needs be updated accordingly after the save_object_to_file operation
+    #       right now, the current mechanism is sufficient enough, since the save() function is only
+    #       called as the final operation, just before the lifecycle of the CachedItemState ends
+    def save(self, hostname: HostName, item_states: ItemStates, updated_item_states: ItemStates,
+             removed_item_state_keys: List[ItemStateKey]) -> None:
+        """If the data on disk has been changed in the meantime, the cached data is updated from
+        disk. Afterwards only the actual modifications (update/remove) are applied to the updated
+        cached data before it is written back to disk.
+        """
+        filename = _item_state_path(hostname)
+        try:
+            store.aquire_lock(filename)
+            last_mtime = os.stat(str(filename)).st_mtime
+            if last_mtime != self._last_mtime:
+                item_states = _parse_item_states(store.load_bytes_from_file(filename))[0]
+                _apply_changes(item_states, updated_item_states, removed_item_state_keys)
+
+            store.save_object_to_file(filename, item_states, pretty=False)
+        except Exception:
+            raise MKGeneralException("Cannot write to %s: %s" % (filename, traceback.format_exc()))
+        finally:
+            store.release_lock(filename)
+
+
+_BINARY_MAGIC = b"CMKSTATE"
+_BINARY_VERSION = 1
+# magic, format version
+_BINARY_HEADER = struct.Struct("<8sH")
+# record type, length of the marshaled payload
+_BINARY_RECORD = struct.Struct("<BI")
+_RECORD_SNAPSHOT = 1
+_RECORD_CHANGES = 2
+_MARSHAL_VERSION = 4
+
+
+class BinaryItemStateStore(ABCItemStateStore):
+    """Stores the item states as marshaled snapshot followed by a log of changes
+
+    A save appends only the updated and removed keys of the current check cycle to the
+    log. Once the log has grown bigger than the snapshot, the file is compacted into a
+    new snapshot. Files written by the ReprItemStateStore are read and converted to the
+    binary format on the next save.
+    """
+    # Don't compact small files on every check cycle
+    min_compaction_size = 64 * 1024
+
+    def __init__(self) -> None:
+        super(BinaryItemStateStore, self).__init__()
+        self._snapshot_size = 0
+        self._needs_compaction = False
+
+    def load(self, hostname: HostName) -> ItemStates:
+        filename = _item_state_path(hostname)
+        try:
+            content = store.load_bytes_from_file(filename, lock=True)
+        finally:
+            store.release_lock(filename)
+
+        item_states, self._snapshot_size, self._needs_compaction = _parse_item_states(content)
+        return item_states
+
+    def save(self, hostname: HostName, item_states: ItemStates, updated_item_states: ItemStates,
+             removed_item_state_keys: List[ItemStateKey]) -> None:
+        filename = _item_state_path(hostname)
+        try:
+            store.aquire_lock(filename)
+            with filename.open("rb+") as f:
+                is_binary = f.read(_BINARY_HEADER.size) == _binary_header()
+                size = f.seek(0, os.SEEK_END)
+                if (is_binary and not self._needs_compaction and
+                        size <= max(2 * self._snapshot_size, self.min_compaction_size)):
+                    # Concurrent writers are serialized by the lock, so the log is
+                    # applied in the order the changes have been made.
+                    f.write(
+                        _pack_record(_RECORD_CHANGES,
+                                     (updated_item_states, removed_item_state_keys)))
+                    return
+
+            self._compact(filename, updated_item_states, removed_item_state_keys)
+        except Exception:
+            raise MKGeneralException("Cannot write to %s: %s" % (filename, traceback.format_exc()))
+        finally:
+            store.release_lock(filename)
+
+    def _compact(self, filename: Path, updated_item_states: ItemStates,
+                 removed_item_state_keys: List[ItemStateKey]) -> None:
+        # Always start from the data on disk. It may have been modified by others
+        # since it has been loaded.
+        item_states = _parse_item_states(store.load_bytes_from_file(filename))[0]
+        _apply_changes(item_states, updated_item_states, removed_item_state_keys)
+
+        snapshot = _pack_record(_RECORD_SNAPSHOT, item_states)
+        store.save_bytes_to_file(filename, _binary_header() + snapshot)
+        self._snapshot_size = len(snapshot)
+        self._needs_compaction = False
+
+
+def _binary_header() -> bytes:
+    return _BINARY_HEADER.pack(_BINARY_MAGIC, _BINARY_VERSION)
+
+
+def _pack_record(record_type: int, data: Any) -> bytes:
+    payload = marshal.dumps(data, _MARSHAL_VERSION)
+    return _BINARY_RECORD.pack(record_type, len(payload)) + payload
+
+
+def _parse_item_states(content: bytes) -> Tuple[ItemStates, int, bool]:
+    """Returns the item states, the size of the snapshot and whether or not
+    the file needs to be compacted on the next save"""
+    if not content:
+        return {}, 0, True
+
+    if not content.startswith(_BINARY_MAGIC):
+        # Migrate files written by the ReprItemStateStore
+        return ast.literal_eval(content.decode("utf-8")), 0, True
+
+    if _BINARY_HEADER.unpack_from(content)[1] != _BINARY_VERSION:
+        # The item states are only kept in tmpfs. Simply start over.
+        return {}, 0, True
+
+    item_states: ItemStates = {}
+    snapshot_size = 0
+    offset = _BINARY_HEADER.size
+    while offset < len(content):
+        if offset + _BINARY_RECORD.size > len(content):
+            # Incomplete record, e.g. the writing process has been killed
+            return item_states, snapshot_size, True
+
+        record_type, length = _BINARY_RECORD.unpack_from(content, offset)
+        start = offset + _BINARY_RECORD.size
+        offset = start + length
+        if offset > len(content):
+            return item_states, snapshot_size, True
+
+        data = marshal.loads(content[start:offset])
+        if record_type == _RECORD_SNAPSHOT:
+            item_states = data
+            snapshot_size = offset - start + _BINARY_RECORD.size
+        elif record_type == _RECORD_CHANGES:
+            _apply_changes(item_states, *data)
+        else:
+            raise MKGeneralException("Invalid item state record type %r" % record_type)
+
+    return item_states, snapshot_size, False
+
+
+_ITEM_STATE_STORES: Dict[str, Type[ABCItemStateStore]] = {
+    "repr": ReprItemStateStore,
+    "binary": BinaryItemStateStore,
+}
+
+
+def make_item_state_store(item_state_format: str) -> ABCItemStateStore:
+    try:
+        return _ITEM_STATE_STORES[item_state_format]()
+    except KeyError:
+        raise MKGeneralException("Invalid item state format: %r" % item_state_format)
+
+
+class CachedItemStates:
+    def __init__(self, item_state_store: Optional[ABCItemStateStore] = None) -> None:
         super(CachedItemStates, self).__init__()
+        self._store = item_state_store or BinaryItemStateStore()
         self.reset()
 
     def reset(self) -> None:
         self._item_states: ItemStates = {}
         self._item_state_prefix: ItemStateKey = ()
-        # timestamp of last modification
-        self._last_mtime: Optional[float] = None
         self._removed_item_state_keys: List[ItemStateKey] = []
         self._updated_item_states: ItemStates = {}
 
+    def set_store(self, item_state_store: ABCItemStateStore) -> None:
+        self._store = item_state_store
+
     def clear_all_item_states(self) -> None:
         removed_item_state_keys = list(self._item_states.keys())
         self.reset()
         self._removed_item_state_keys = removed_item_state_keys
 
     def load(self, hostname: HostName) -> None:
-        filename = cmk.utils.paths.counters_dir + "/" + hostname
-        try:
-            # TODO: refactoring. put these two values into a named tuple
-            self._item_states = store.load_object_from_file(
-                filename,
-                default={},
-                lock=True,
-            )
-            self._last_mtime = os.stat(filename).st_mtime
-        finally:
-            store.release_lock(filename)
+        self._item_states = self._store.load(hostname)
 
-    # TODO: self._last_mtime needs be updated accordingly after the save_object_to_file operation
-    #       right now, the current mechanism is sufficient enough, since the save() function is only
-    #       called as the final operation, just before the lifecycle of the CachedItemState ends
     def save(self, hostname: HostName) -> None:
         """ The job of the save function is to update the item state on disk.
-        It simply returns, if it detects that the data wasn't changed at all since the last loading
-        If the data on disk has been changed in the meantime, the cached data is updated from disk.
-        Afterwards only the actual modifications (update/remove) are applied to the updated cached
-        data before it is written back to disk.
+        It simply returns, if it detects that the data wasn't changed at all since the last loading.
+        Otherwise the actual modifications (update/remove) are handed over to the store.
         """
-        filename = cmk.utils.paths.counters_dir + "/" + hostname
         if not self._removed_item_state_keys and not self._updated_item_states:
             return
 
-        try:
-            if not os.path.exists(cmk.utils.paths.counters_dir):
-                os.makedirs(cmk.utils.paths.counters_dir)
-
-            store.aquire_lock(filename)
-            last_mtime = os.stat(filename).st_mtime
-            if last_mtime != self._last_mtime:
-                self._item_states = store.load_object_from_file(filename, default={})
-
-                # Remove obsolete keys
-                for key in self._removed_item_state_keys:
-                    try:
-                        del self._item_states[key]
-                    except KeyError:
-                        pass
-
-                # Add updated keys
-                self._item_states.update(self._updated_item_states)
+        if not os.path.exists(cmk.utils.paths.counters_dir):
+            os.makedirs(cmk.utils.paths.counters_dir)
 
-            store.save_object_to_file(filename, self._item_states, pretty=False)
-        except Exception:
-            raise MKGeneralException("Cannot write to %s: %s" % (filename, traceback.format_exc()))
-        finally:
-            store.release_lock(filename)
+        self._store.save(hostname, self._item_states, self._updated_item_states,
+                         self._removed_item_state_keys)
 
     def clear_item_state(self, user_key: str) -> None:
         key = self.get_unique_item_state_key(user_key)
@@ -167,6 +348,11 @@ def save(hostname: HostName) -> None:
     _cached_item_states.save(hostname)
 
 
+def set_item_state_format(item_state_format: str) -> None:
+    """Select the format used to persist the item states ("binary" or "repr")"""
+    _cached_item_states.set_store(make_item_state_store(item_state_format))
+
+
 def set_item_state(user_key: str, state: Any) -> None:
     """Store arbitrary values until the next execution of a check.
 
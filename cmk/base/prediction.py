@@ -23,6 +23,7 @@ from cmk.utils.type_defs import HostName, ServiceName, MetricName
 from cmk.utils.prediction import (
     Timestamp,
     Timegroup,
+    TimeSeries,
     TimeSeriesValues,
     Seconds,
     TimeWindow,
@@ -32,6 +33,8 @@ from cmk.utils.prediction import (
     EstimatedLevels,
 )
 
+import cmk.base.cpu_tracking as cpu_tracking
+
 logger = logging.getLogger("cmk.prediction")
 
 GroupByFunction = Callable[[Timestamp], Tuple[Timegroup, Timestamp]]
@@ -41,6 +44,15 @@ DataStatValue = Optional[float]
 DataStat = List[DataStatValue]
 DataStats = List[DataStat]
 PredictionParameters = Dict[str, Any]
+PrefetchKey = Tuple[HostName, ServiceName, MetricName, ConsolidationFunctionName,
+                    Tuple[Tuple[Timestamp, Timestamp], ...]]
+
+# Maximum number of data points fetched per time slice
+MAX_ENTRIES_PER_SLICE = 400
+
+# Time series of metrics which have been fetched together with the time series of another
+# metric of the same service. They are used by the next predictions of these metrics.
+_prefetched_time_series: Dict[PrefetchKey, Tuple[TimeSeries, Optional[TimeSeries]]] = {}
 
 # TODO: This is somehow related to cmk.utils.prediction.PreditionInfo,
 # but using this *instead* of PredicionInfo (==Dict) is not possible.
@@ -172,23 +184,36 @@ def retrieve_grouped_data_from_rrd(
 
 def data_stats(slices: List[TimeSeriesValues]) -> DataStats:
     "Statistically summarize all the upsampled RRD data"
-
-    descriptors: DataStats = []
-
-    for time_column in zip(*slices):
-        point_line = [x for x in time_column if x is not None]
-        if point_line:
-            average = sum(point_line) / float(len(point_line))
-            descriptors.append([
-                average,
-                min(point_line),
-                max(point_line),
-                stdev(point_line, average),
-            ])
-        else:
-            descriptors.append([None, None, None, None])
-
-    return descriptors
+    # Only needed when predictions are (re-)computed, which is rare compared to the number
+    # of processes importing this module.
+    import numpy as np  # type: ignore[import] # pylint: disable=import-outside-toplevel
+
+    num_points = min((len(time_slice) for time_slice in slices), default=0)
+    if not num_points:
+        return []
+
+    # One row per slice, missing values are NaN
+    points = np.array([time_slice[:num_points] for time_slice in slices], dtype=float)
+    valid = ~np.isnan(points)
+    samples = valid.sum(axis=0)
+    divisor = np.maximum(samples, 1)
+
+    averages = np.where(valid, points, 0.0).sum(axis=0) / divisor
+    minima = np.where(valid, points, np.inf).min(axis=0)
+    maxima = np.where(valid, points, -np.inf).max(axis=0)
+    squares = np.where(valid, points**2, 0.0).sum(axis=0)
+    # See stdev() for the single data-point case
+    stdevs = np.where(
+        samples == 1,
+        np.abs(averages),
+        np.sqrt(np.abs(squares - averages**2 * samples) / np.maximum(samples - 1, 1)),
+    )
+
+    return [
+        [average, minimum, maximum, deviation] if num_samples else [None, None, None, None]
+        for num_samples, average, minimum, maximum, deviation in zip(
+            samples.tolist(), averages.tolist(), minima.tolist(), maxima.tolist(), stdevs.tolist())
+    ]
 
 
 def calculate_data_for_prediction(time_windows: TimeSlices,
@@ -206,6 +231,73 @@ def calculate_data_for_prediction(time_windows: TimeSlices,
     }
 
 
+def bulk_rrd_datacolumn(
+    hostname: HostName,
+    service_description: ServiceName,
+    dsname: MetricName,
+    cf: ConsolidationFunctionName,
+    time_windows: TimeSlices,
+    other_dsnames: List[MetricName],
+) -> RRDColumnFunction:
+    """Partial helper function to get the rrd data of all time slices at once
+
+    The youngest slice is fetched in its own (finest) resolution. The older slices are cut
+    out of a single time series covering all of them. The time series of the other metrics
+    of the service are fetched with the same livestatus query and kept for their
+    predictions."""
+    youngest, older = _get_time_series(hostname, service_description, dsname, cf, time_windows,
+                                       other_dsnames)
+
+    def time_boundaries(fromtime: Timestamp, untiltime: Timestamp) -> TimeSeries:
+        if (fromtime, untiltime) == time_windows[0]:
+            return youngest
+        if older is None:
+            return cmk.utils.prediction.get_rrd_data(hostname, service_description, dsname, cf,
+                                                     fromtime, untiltime)
+        return older.cut(fromtime, untiltime)
+
+    return time_boundaries
+
+
+def _get_time_series(
+    hostname: HostName,
+    service_description: ServiceName,
+    dsname: MetricName,
+    cf: ConsolidationFunctionName,
+    time_windows: TimeSlices,
+    other_dsnames: List[MetricName],
+) -> Tuple[TimeSeries, Optional[TimeSeries]]:
+    key: PrefetchKey = (hostname, service_description, dsname, cf, tuple(time_windows))
+    prefetched = _prefetched_time_series.pop(key, None)
+    if prefetched is not None:
+        logger.log(VERBOSE, "Using time series fetched together with other metrics")
+        return prefetched
+
+    # Only keep the time series of one service at a time
+    if any(k[:2] != key[:2] for k in _prefetched_time_series):
+        _prefetched_time_series.clear()
+
+    queries = [(dsname, cf, time_windows[0][0], time_windows[0][1], MAX_ENTRIES_PER_SLICE)]
+    if len(time_windows) > 1:
+        older_from, older_until = time_windows[-1][0], time_windows[1][1]
+        slice_length = time_windows[0][1] - time_windows[0][0]
+        num_spans = int(math.ceil((older_until - older_from) / float(slice_length)))
+        queries.append((dsname, cf, older_from, older_until, MAX_ENTRIES_PER_SLICE * num_spans))
+
+    dsnames = [dsname] + [n for n in other_dsnames if n != dsname]
+    time_series = cmk.utils.prediction.get_bulk_rrd_data(
+        hostname, service_description,
+        [(name,) + query[1:] for name in dsnames for query in queries])
+
+    for index, name in enumerate(dsnames):
+        metric_time_series = time_series[index * len(queries):(index + 1) * len(queries)]
+        _prefetched_time_series[key[:2] + (name,) + key[3:]] = (
+            metric_time_series[0],
+            metric_time_series[1] if len(metric_time_series) > 1 else None,
+        )
+    return _prefetched_time_series.pop(key)
+
+
 def save_predictions(pred_file: str, info: PredictionInfo, data_for_pred: PredictionData) -> None:
     with open(pred_file + '.info', "w") as fname:
         json.dump(info, fname)
@@ -235,7 +327,11 @@ def is_prediction_up2date(pred_file: str, timegroup: Timegroup,
     last_info = cmk.utils.prediction.retrieve_data_for_prediction(pred_file + ".info", timegroup)
     if last_info is None:
         return False
+    return _is_prediction_info_up2date(last_info, timegroup, params)
 
+
+def _is_prediction_info_up2date(last_info: PredictionInfo, timegroup: Timegroup,
+                                params: PredictionParameters) -> bool:
     period_info = prediction_periods[params["period"]]
     now = time.time()
     if last_info["time"] + cast(int, period_info["valid"]) * cast(int, period_info["slice"]) < now:
@@ -250,6 +346,63 @@ def is_prediction_up2date(pred_file: str, timegroup: Timegroup,
     return True
 
 
+def _other_outdated_dsnames(hostname: HostName, service_description: ServiceName,
+                            dsname: MetricName, cf: ConsolidationFunctionName, timegroup: Timegroup,
+                            params: PredictionParameters) -> List[MetricName]:
+    """Find the other metrics of the service needing a prediction of the same time slices"""
+    pred_dir = cmk.utils.prediction.predictions_dir(hostname, service_description, dsname)
+    service_dir, metric_dir_name = os.path.split(pred_dir)
+
+    dsnames = []
+    for other_dir_name in sorted(os.listdir(service_dir)):
+        info_file = os.path.join(service_dir, other_dir_name, timegroup + ".info")
+        if other_dir_name == metric_dir_name or not os.path.exists(info_file):
+            continue
+
+        last_info = cmk.utils.prediction.retrieve_data_for_prediction(info_file, timegroup)
+        if last_info is None or last_info.get("cf") != cf:
+            continue
+
+        last_params = last_info.get("params", {})
+        if (last_params.get("period"), last_params.get("horizon")) != (params["period"],
+                                                                       params["horizon"]):
+            continue
+
+        if not _is_prediction_info_up2date(last_info, timegroup, params):
+            dsnames.append(last_info["dsname"])
+    return dsnames
+
+
+def compute_prediction(
+    hostname: HostName,
+    service_description: ServiceName,
+    dsname: MetricName,
+    params: PredictionParameters,
+    cf: ConsolidationFunctionName,
+    now: Timestamp,
+    timegroup: Timegroup,
+) -> Tuple[PredictionInfo, PredictionData]:
+    period_info = prediction_periods[params["period"]]
+    time_windows = time_slices(now, int(params["horizon"] * 86400), period_info, timegroup)
+
+    other_dsnames = _other_outdated_dsnames(hostname, service_description, dsname, cf, timegroup,
+                                            params)
+    rrd_datacolumn = bulk_rrd_datacolumn(hostname, service_description, dsname, cf, time_windows,
+                                         other_dsnames)
+
+    data_for_pred = calculate_data_for_prediction(time_windows, rrd_datacolumn)
+
+    info: PredictionInfo = {
+        u"time": now,
+        u"range": time_windows[0],
+        u"cf": cf,
+        u"dsname": dsname,
+        u"slice": period_info["slice"],
+        u"params": params,
+    }
+    return info, data_for_pred
+
+
 # cf: consilidation function (MAX, MIN, AVERAGE)
 # levels_factor: this multiplies all absolute levels. Usage for example
 # in the cpu.loads check the multiplies the levels by the number of CPU
@@ -284,21 +437,15 @@ def get_levels(
         logger.log(VERBOSE, "Calculating prediction data for time group %s", timegroup)
         cmk.utils.prediction.clean_prediction_files(pred_file, force=True)
 
-        time_windows = time_slices(now, int(params["horizon"] * 86400), period_info, timegroup)
-
-        rrd_datacolumn = cmk.utils.prediction.rrd_datacolum(hostname, service_description, dsname,
-                                                            cf)
-
-        data_for_pred = calculate_data_for_prediction(time_windows, rrd_datacolumn)
-
-        info: PredictionInfo = {
-            u"time": now,
-            u"range": time_windows[0],
-            u"cf": cf,
-            u"dsname": dsname,
-            u"slice": period_info["slice"],
-            u"params": params,
-        }
+        start_time = time.time()
+        cpu_tracking.push_phase("prediction")
+        try:
+            info, data_for_pred = compute_prediction(hostname, service_description, dsname, params,
+                                                     cf, now, timegroup)
+        finally:
+            cpu_tracking.pop_phase()
+        logger.log(VERBOSE, "Calculated prediction data for time group %s in %.3f sec", timegroup,
+                   time.time() - start_time)
         save_predictions(pred_file, info, data_for_pred)
 
     # Find reference value in data_for_pred
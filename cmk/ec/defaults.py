@@ -34,6 +34,7 @@ def default_config() -> Dict[str, Any]:
         "actions": [],
         "debug_rules": False,
         "rule_optimizer": True,
+        "event_workers": 0,  # 0: create the events and match the rules in the event server
         "log_level": {
             "cmk.mkeventd": logging.INFO,
             "cmk.mkeventd.EventServer": logging.INFO,
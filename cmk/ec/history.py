@@ -17,6 +17,7 @@ from cmk.utils.log import VERBOSE
 from cmk.utils.render import date_and_time
 
 from .actions import quote_shell_string
+from .history_index import HistoryFileIndex, index_path
 from .query import QueryGET
 from .settings import Settings
 
@@ -36,6 +37,8 @@ class History:
         self._lock = threading.Lock()
         self._mongodb = MongoDB()
         self._active_history_period = ActiveHistoryPeriod()
+        # The index of the history file which is currently written
+        self._active_index: Optional[HistoryFileIndex] = None
         self.reload_configuration(config)
 
     def reload_configuration(self, config: Dict[str, Any]) -> None:
@@ -296,10 +299,13 @@ def _reload_configuration_files(history: History) -> None:
 
 def _flush_files(history: History) -> None:
     _expire_logfiles(history._settings, history._config, history._logger, history._lock, True)
+    with history._lock:
+        history._active_index = None
 
 
 def _housekeeping_files(history: History) -> None:
     _expire_logfiles(history._settings, history._config, history._logger, history._lock, False)
+    _update_history_indexes(history)
 
 
 # Make a new entry in the event history. Each entry is tab-separated line
@@ -323,9 +329,20 @@ def _add_files(history: History, event: Dict[str, Any], what: str, who: str, add
             for colname, defval in history._event_columns
         ]
 
-        with get_logfile(history._config, history._settings.paths.history_dir.value,
-                         history._active_history_period).open(mode='ab') as f:
-            f.write(b"\t".join(columns) + b"\n")
+        path = get_logfile(history._config, history._settings.paths.history_dir.value,
+                           history._active_history_period)
+        line = b"\t".join(columns) + b"\n"
+        with path.open(mode='ab') as f:
+            offset = f.tell()
+            f.write(line)
+
+        try:
+            _active_history_index(history, path).add_line(offset, line)
+        except Exception as e:
+            if history._settings.options.debug:
+                raise
+            history._logger.exception("Error indexing history file %s: %s" % (path, e))
+            history._active_index = None
 
 
 def quote_tab(col: Any) -> bytes:
@@ -410,12 +427,83 @@ def _expire_logfiles(settings: Settings, config: Dict[str, Any], logger: Logger,
                     logger.info("Deleting log file %s (age %s)" %
                                 (path, date_and_time(path.stat().st_mtime)))
                     path.unlink()
+                    try:
+                        index_path(path).unlink()
+                    except FileNotFoundError:
+                        pass
         except Exception as e:
             if settings.options.debug:
                 raise
             logger.exception("Error expiring log files: %s" % e)
 
 
+def _history_file_index(history: History, path: Path) -> HistoryFileIndex:
+    index = HistoryFileIndex(path, [name for name, _default in history._history_columns[1:]])
+    index.load()
+    index.update()
+    return index
+
+
+def _active_history_index(history: History, path: Path) -> HistoryFileIndex:
+    """Returns the index of the history file which is written (call it with the lock held)"""
+    index = history._active_index
+    if index is None or index.log_path != path:
+        if index is not None and index.dirty:
+            index.save()  # The history period changed, the previous file is complete
+        index = history._active_index = _history_file_index(history, path)
+    return index
+
+
+# Index the history files which were written since the last housekeeping and the files
+# written by versions without history indexes
+def _update_history_indexes(history: History) -> None:
+    try:
+        with history._lock:
+            if history._active_index is not None and history._active_index.dirty:
+                history._active_index.save()
+            active_path = None if history._active_index is None else history._active_index.log_path
+
+        for path in history._settings.paths.history_dir.value.glob('*.log'):
+            if path == active_path:
+                continue
+            try:
+                if index_path(path).stat().st_mtime >= path.stat().st_mtime:
+                    continue
+            except FileNotFoundError:
+                pass
+            index = _history_file_index(history, path)
+            if index.dirty:
+                history._logger.log(VERBOSE, "Indexed history file %s (%d lines)", path, len(index))
+                index.save()
+    except Exception as e:
+        if history._settings.options.debug:
+            raise
+        history._logger.exception("Error indexing history files: %s" % e)
+
+
+def _indexed_lines(history: History, path: Path,
+                   query: QueryGET) -> Tuple[Optional[HistoryFileIndex], Optional[List[int]]]:
+    """Returns the index of the history file and the lines which may match the query
+
+    The lines are None in case the index can not narrow down the lines to read."""
+    try:
+        with history._lock:
+            index = history._active_index
+            if index is not None and index.log_path == path:
+                index.update()
+                return index, index.matching_lines(query.filters)
+
+        index = _history_file_index(history, path)
+        if index.dirty:
+            index.save()
+        return index, index.matching_lines(query.filters)
+    except Exception as e:
+        if history._settings.options.debug:
+            raise
+        history._logger.exception("Error using the index of history file %s: %s" % (path, e))
+        return None, None
+
+
 def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[Any]:
     filters, limit = query.filters, query.limit
     history_entries: List[Any] = []
@@ -501,7 +589,13 @@ def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[An
                     history._logger.info("Skipping logfile %s.log because of time filter" % ts)
                 continue  # skip this file
 
-        new_entries = _parse_history_file(history, path, query, greptexts, limit, history._logger)
+        index, line_numbers = _indexed_lines(history, path, query)
+        if index is None or line_numbers is None:
+            new_entries = _parse_history_file(history, path, query, greptexts, limit,
+                                              history._logger)
+        else:
+            new_entries = _parse_history_lines(history, path, index.read_lines(line_numbers), query,
+                                               limit, history._logger)
         history_entries += new_entries
         if limit is not None:
             limit -= len(new_entries)
@@ -511,8 +605,6 @@ def _get_files(history: History, logger: Logger, query: QueryGET) -> Iterable[An
 
 def _parse_history_file(history: History, path: Path, query: Any, greptexts: List[str],
                         limit: Optional[int], logger: Logger) -> List[Any]:
-    entries: List[Any] = []
-    line_no = 0
     # If we have greptexts we pre-filter the file using the extremely
     # fast GNU Grep
     # Revert lines from the log file to have the newer lines processed first
@@ -523,11 +615,18 @@ def _parse_history_file(history: History, path: Path, query: Any, greptexts: Lis
     if grep.stdout is None:
         raise Exception("Huh? stdout vanished...")
 
-    for line in grep.stdout:
-        line_no += 1
+    entries = _parse_history_lines(history, path, enumerate(grep.stdout, 1), query, limit, logger)
+    if limit is not None and len(entries) > limit:
+        grep.kill()
+        grep.wait()
+    return entries
+
+
+def _parse_history_lines(history: History, path: Path, lines: Iterable[Tuple[int, bytes]],
+                         query: Any, limit: Optional[int], logger: Logger) -> List[Any]:
+    entries: List[Any] = []
+    for line_no, line in lines:
         if limit is not None and len(entries) > limit:
-            grep.kill()
-            grep.wait()
             break
 
         try:
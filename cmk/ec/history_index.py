@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Sidecar indexes of the event history files
+
+Each history file <period>.log gets an index file <period>.idx. It holds
+
+* a columnar snapshot of the offsets, the lengths, the history times and the event ids
+  of all lines of the file and
+* the lines of each event id, host name and rule id (postings).
+
+Queries with filters on the history time or with equality filters on one of the
+indexed columns seek straight to the lines which may match instead of scanning the
+whole file. An index covers its history file up to a known size, lines appended later
+are indexed when the index is used the next time.
+"""
+
+import array
+import bisect
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import cmk.utils.store as store
+
+_INDEX_VERSION = 1
+# The beginning of a history file and the end of its indexed part, used to detect changed
+# files
+_HEAD_SIZE = 64
+_TAIL_SIZE = 64
+
+# column name, operator name, predicate, argument
+Filter = Tuple[str, str, Callable[[Any], Any], Any]
+
+_TIME_COLUMN = "history_time"
+_POSTING_COLUMNS = ["event_id", "event_host", "event_rule_id"]
+
+
+def index_path(log_path: Path) -> Path:
+    return log_path.with_suffix(".idx")
+
+
+class HistoryFileIndex:
+    """The index of a single history file
+
+    The column names are the names of the columns of the lines in the history file,
+    which are the history columns without the history_line column."""
+    def __init__(self, log_path: Path, column_names: Sequence[str]) -> None:
+        super().__init__()
+        self.log_path = log_path
+        self.path = index_path(log_path)
+        self._time_column = column_names.index(_TIME_COLUMN)
+        self._event_id_column = column_names.index("event_id")
+        self._host_column = column_names.index("event_host")
+        self._rule_id_column = column_names.index("event_rule_id")
+        self._clear()
+
+    def _clear(self) -> None:
+        self._size = 0
+        self._head = b""
+        self._tail = b""
+        self._offsets = array.array("Q")
+        self._lengths = array.array("I")
+        self._times = array.array("d")
+        self._times_sorted = True
+        self._event_ids = array.array("q")
+        # Column name -> value -> line numbers
+        self._postings: Dict[str, Dict[Any, array.array]] = {
+            column_name: {} for column_name in _POSTING_COLUMNS
+        }
+        self.dirty = True
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def load(self) -> None:
+        """Load the index file in case it belongs to the history file"""
+        data = store.load_object_from_file(self.path, default={})
+        if data.get("version") != _INDEX_VERSION:
+            return
+
+        self._size = data["size"]
+        self._head = data["head"]
+        self._tail = data["tail"]
+        self._offsets = _array("Q", data["offsets"])
+        self._lengths = _array("I", data["lengths"])
+        self._times = _array("d", data["times"])
+        self._times_sorted = data["times_sorted"]
+        self._event_ids = _array("q", data["event_ids"])
+        self._postings = {
+            column_name: {
+                value: _array("I", lines) for value, lines in postings.items()
+            } for column_name, postings in data["postings"].items()
+        }
+        self.dirty = False
+
+    def save(self) -> None:
+        store.save_object_to_file(self.path, {
+            "version": _INDEX_VERSION,
+            "size": self._size,
+            "head": self._head,
+            "tail": self._tail,
+            "offsets": self._offsets.tobytes(),
+            "lengths": self._lengths.tobytes(),
+            "times": self._times.tobytes(),
+            "times_sorted": self._times_sorted,
+            "event_ids": self._event_ids.tobytes(),
+            "postings": {
+                column_name: {
+                    value: lines.tobytes() for value, lines in postings.items()
+                } for column_name, postings in self._postings.items()
+            },
+        },
+                                  fast=True)
+        self.dirty = False
+
+    def update(self) -> None:
+        """Index the lines which were appended to the history file since the last update
+
+        The index is built from scratch in case the history file was replaced."""
+        try:
+            f = self.log_path.open("rb")
+        except FileNotFoundError:
+            if self._size:
+                self._clear()
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            head = f.read(_HEAD_SIZE)
+            f.seek(self._size - len(self._tail))
+            if (size < self._size or head[:len(self._head)] != self._head or
+                    f.read(len(self._tail)) != self._tail):
+                self._clear()
+            elif size == self._size:
+                return
+            if len(self._head) < _HEAD_SIZE:
+                self._head = head
+
+            f.seek(self._size)
+            data = f.read(size - self._size)
+
+        # Only index complete lines, the rest will be indexed with the next update
+        end = data.rfind(b"\n") + 1
+        offset = self._size
+        for line in data[:end].splitlines(keepends=True):
+            self._add_line(offset, line)
+            offset += len(line)
+        self._size = offset
+        self._tail = (self._tail + data[:end])[-_TAIL_SIZE:]
+        self.dirty = True
+
+    def add_line(self, offset: int, line: bytes) -> None:
+        """Add a line which was just appended to the history file"""
+        if offset != self._size:
+            self.update()  # The index does not cover the whole file yet
+            return
+
+        if not self._size:
+            self._head = line[:_HEAD_SIZE]
+        self._add_line(offset, line)
+        self._size += len(line)
+        self._tail = (self._tail + line)[-_TAIL_SIZE:]
+        self.dirty = True
+
+    def _add_line(self, offset: int, line: bytes) -> None:
+        columns = line.rstrip(b"\n").split(b"\t")
+        try:
+            history_time = float(columns[self._time_column])
+            event_id = int(columns[self._event_id_column])
+            host = columns[self._host_column].decode("utf-8")
+            rule_id = columns[self._rule_id_column].decode("utf-8")
+        except (IndexError, ValueError):
+            return  # Invalid lines are skipped when reading the history anyway
+
+        line_number = len(self._offsets)
+        self._offsets.append(offset)
+        self._lengths.append(len(line))
+        if self._times and history_time < self._times[-1]:
+            self._times_sorted = False
+        self._times.append(history_time)
+        self._event_ids.append(event_id)
+        for column_name, value in [("event_id", event_id), ("event_host", host),
+                                   ("event_rule_id", rule_id)]:
+            self._postings[column_name].setdefault(value, array.array("I")).append(line_number)
+
+    def matching_lines(self, filters: Sequence[Filter]) -> Optional[List[int]]:
+        """Returns the numbers of the lines which may match the filters
+
+        The lines are in ascending order. None is returned in case no filter can be
+        answered by the index."""
+        lines: Optional[Sequence[int]] = None
+        for column_name, operator_name, _predicate, argument in filters:
+            if column_name in self._postings and operator_name in ["=", "in"]:
+                values = argument if operator_name == "in" else [argument]
+                posting_lines = self._posting_lines(column_name, values)
+                lines = posting_lines if lines is None else sorted(
+                    set(lines).intersection(posting_lines))
+
+        time_filters = [f for f in filters if f[0] == _TIME_COLUMN]
+        if lines is None and not time_filters:
+            return None
+
+        begin, end = 0, len(self._times)
+        for _column_name, operator_name, predicate, argument in time_filters:
+            if not self._times_sorted:
+                break
+            if operator_name in (">", ">="):
+                find = bisect.bisect_right if operator_name == ">" else bisect.bisect_left
+                begin = max(begin, find(self._times, argument))
+            elif operator_name in ("<", "<="):
+                find = bisect.bisect_left if operator_name == "<" else bisect.bisect_right
+                end = min(end, find(self._times, argument))
+
+        if lines is None:
+            lines = range(begin, end)
+        elif (begin, end) != (0, len(self._times)):
+            lines = [line for line in lines if begin <= line < end]
+
+        times = self._times
+        return [
+            line for line in lines if all(
+                predicate(times[line]) for _c, _o, predicate, _a in time_filters)
+        ]
+
+    def _posting_lines(self, column_name: str, values: Sequence[Any]) -> Sequence[int]:
+        postings = self._postings[column_name]
+        if len(values) == 1:
+            return postings.get(values[0], array.array("I"))
+        return sorted(set().union(*(postings.get(value, ()) for value in values)))
+
+    def read_lines(self, line_numbers: Sequence[int]) -> Iterator[Tuple[int, bytes]]:
+        """Read the given lines, the newest first
+
+        Yields the number of each line counted from the end of the file and the line."""
+        num_lines = len(self._offsets)
+        with self.log_path.open("rb") as f:
+            fd = f.fileno()
+            for line_number in reversed(line_numbers):
+                yield (num_lines - line_number,
+                       os.pread(fd, self._lengths[line_number], self._offsets[line_number]))
+
+
+def _array(typecode: str, data: bytes) -> array.array:
+    a = array.array(typecode)
+    a.frombytes(data)
+    return a
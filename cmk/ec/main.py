@@ -13,9 +13,12 @@
 
 import abc
 import ast
+import collections
 import errno
 import json
 from logging import Logger, getLogger
+import multiprocessing
+import multiprocessing.pool
 import os
 from pathlib import Path
 import pprint
@@ -28,7 +31,21 @@ import threading
 import time
 import traceback
 from types import FrameType
-from typing import Any, AnyStr, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+from typing import (
+    Any,
+    AnyStr,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
 
 from six import ensure_binary
 
@@ -51,6 +68,7 @@ from .actions import do_notify, do_event_action, do_event_actions, event_has_ope
 from .crash_reporting import ECCrashReport, CrashReportStore
 from .history import ActiveHistoryPeriod, History, scrub_string, quote_tab, get_logfile
 from .query import MKClientError, Query, QueryGET
+from .rule_index import build_rule_indexes, RuleIndex
 from .rule_packs import load_config as load_config_using
 from .settings import FileDescriptor, PortNumber, Settings, settings as create_settings
 from .snmp import SNMPTrapEngine
@@ -485,6 +503,8 @@ class Perfcounters:
         "messages",
         "rule_tries",
         "rule_hits",
+        "rule_index_hits",
+        "rule_index_misses",
         "drops",
         "overflows",
         "events",
@@ -513,9 +533,9 @@ class Perfcounters:
 
         self._logger = logger.getChild("Perfcounters")
 
-    def count(self, counter: str) -> None:
+    def count(self, counter: str, value: int = 1) -> None:
         with self._lock:
-            self._counters[counter] += 1
+            self._counters[counter] += value
 
     def count_time(self, counter: str, ptime: float) -> None:
         with self._lock:
@@ -587,7 +607,252 @@ class Perfcounters:
 #   '----------------------------------------------------------------------'
 
 
-class EventServer(ECServerThread):
+class EventMatches(NamedTuple):
+    """The rules matching an event and the effort needed to find them"""
+    # The matching rules and their results: All "skip rule pack" rules which matched and
+    # the rule which finished the matching (if any)
+    matches: List[Tuple[Dict[str, Any], Any]]
+    rule_tries: int
+    rule_index_hits: int
+    rule_index_misses: int
+
+
+# Event, ids of the matching rules and their results, effort counters and the time spent
+# in the worker
+WorkerResult = Tuple[Dict[str, Any], List[Tuple[str, Any]], Tuple[int, int, int], float]
+
+
+class EventMatcher:
+    """Creates the events from the lines and finds the matching rules
+
+    Only reads the configuration and the compiled rules, so the event workers can do the
+    same without the event server (see EventWorkerMatcher)."""
+    _logger: Logger
+    _config: Dict[str, Any]
+    _rules: List[Any]
+    _rule_index: Dict[int, Dict[int, RuleIndex]]
+    _rule_matcher: "RuleMatcher"
+    _event_creator: "EventCreator"
+
+    def create_event_from_line(self, line, address):
+        line = line.rstrip()
+        if self._config["debug_rules"]:
+            if address:
+                self._logger.info(u"Processing message from %r: '%s'" % (address, line))
+            else:
+                self._logger.info(u"Processing message '%s'" % line)
+
+        return self._event_creator.create_event_from_line(line, address)
+
+    def do_translate_hostname(self, event):
+        try:
+            event["host"] = self.translate_hostname(event["host"])
+        except Exception as e:
+            if self._config["debug_rules"]:
+                self._logger.exception('Unable to parse host "%s" (%s)' % (event.get("host"), e))
+            event["host"] = ""
+
+    # Translate a hostname if this is configured. We are
+    # *really* sorry: this code snipped is copied from modules/check_mk_base.py.
+    # There is still no common library. Please keep this in sync with the
+    # original code
+    def translate_hostname(self, backedhost):
+        translation = self._config["hostname_translation"]
+
+        # Here comes the original code from modules/check_mk_base.py
+        if translation:
+            # 1. Case conversion
+            caseconf = translation.get("case")
+            if caseconf == "upper":
+                backedhost = backedhost.upper()
+            elif caseconf == "lower":
+                backedhost = backedhost.lower()
+
+            # 2. Drop domain part (not applied to IP addresses!)
+            if translation.get("drop_domain") and backedhost:
+                # only apply if first part does not convert successfully into an int
+                firstpart = backedhost.split(".", 1)[0]
+                try:
+                    int(firstpart)
+                except Exception:
+                    backedhost = firstpart
+
+            # 3. Regular expression conversion
+            if "regex" in translation:
+                for regex, subst in translation["regex"]:
+                    if not regex.endswith('$'):
+                        regex += '$'
+                    rcomp = cmk.utils.regex.regex(regex)
+                    mo = rcomp.match(backedhost)
+                    if mo:
+                        backedhost = subst
+                        for nr, text in enumerate(mo.groups()):
+                            backedhost = backedhost.replace("\\%d" % (nr + 1), text)
+                        break
+
+            # 4. Explicity mapping
+            for from_host, to_host in translation.get("mapping", []):
+                if from_host == backedhost:
+                    backedhost = to_host
+                    break
+
+        return backedhost
+
+    def match_event(
+            self, event: Dict[str, Any],
+            event_rule_matches: Callable[[Dict[str, Any], Dict[str, Any]], Any]) -> EventMatches:
+        """Find the rules matching the event without changing any state
+
+        The matching ends with the first rule which is not a "skip rule pack" rule. This
+        is the part of the event processing which may be done by the event workers."""
+        # Rule optimizer
+        rule_index_hits = rule_index_misses = 0
+        if self._config["rule_optimizer"]:
+            rule_index = self._rule_index.get(event["facility"], {}).get(event["priority"])
+            if rule_index is None:
+                rule_candidates = []
+            else:
+                rule_candidates = rule_index.candidates(event)
+                rule_index_hits = len(rule_candidates)
+                rule_index_misses = len(rule_index) - len(rule_candidates)
+        else:
+            rule_candidates = self._rules
+
+        matches = []
+        rule_tries = 0
+        skip_pack = None
+        for rule in rule_candidates:
+            if skip_pack and rule["pack"] == skip_pack:
+                continue  # still in the rule pack that we want to skip
+            skip_pack = None  # new pack, reset skipping
+
+            rule_tries += 1
+            try:
+                result = event_rule_matches(rule, event)
+            except Exception as e:
+                self._logger.exception('  Exception during matching:\n%s' % e)
+                result = False
+
+            if result:  # A tuple with (True/False, {match_info}).. O.o
+                matches.append((rule, result))
+                if rule.get("drop") != "skip_pack":
+                    break
+                skip_pack = rule["pack"]
+
+        return EventMatches(matches, rule_tries, rule_index_hits, rule_index_misses)
+
+    def event_rule_matches_unlocked(self, rule, event):
+        result = self._rule_matcher.event_rule_matches_non_inverted(rule, event)
+        if rule.get("invert_matching"):
+            if result is False:
+                result = False, {}
+                if self._config["debug_rules"]:
+                    self._logger.info("  Rule would not match, but due to inverted matching does.")
+            else:
+                result = False
+                if self._config["debug_rules"]:
+                    self._logger.info("  Rule would match, but due to inverted matching does not.")
+
+        return result
+
+
+class EventWorkerMatcher(EventMatcher):
+    """The part of the event server needed to match the events in an event worker"""
+    def __init__(self, config: Dict[str, Any], rules: List[Any],
+                 rule_index: Dict[int, Dict[int, RuleIndex]]) -> None:
+        super().__init__()
+        self._logger = getLogger("cmk.mkeventd.EventServer")
+        self._config = config
+        self._rules = rules
+        self._rule_index = rule_index
+        self._rule_matcher = RuleMatcher(self._logger, config)
+        self._event_creator = EventCreator(self._logger, config)
+
+
+EventWorkerState = Tuple[
+    Optional[str],  # log file (None: stderr)
+    int,  # log level
+    Dict[str, Any],  # configuration
+    List[Any],  # compiled rules
+    Dict[int, Dict[int, RuleIndex]],  # rule indexes
+]
+
+# Set in the worker processes only
+_g_worker_matcher: Optional[EventWorkerMatcher] = None
+
+
+def _initialize_event_worker(log_file: Optional[str], log_level: int, config: Dict[str, Any],
+                             rules: List[Any], rule_index: Dict[int, Dict[int, RuleIndex]]) -> None:
+    global _g_worker_matcher
+    # The worker processes are terminated by the pool, all other signals are handled by
+    # the event server
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for signum in [signal.SIGHUP, signal.SIGINT, signal.SIGQUIT]:
+        signal.signal(signum, signal.SIG_IGN)
+
+    if log_file is None:
+        log.setup_logging_handler(sys.stderr)
+    else:
+        log.open_log(log_file)
+    log.logger.setLevel(log_level)
+    _g_worker_matcher = EventWorkerMatcher(config, rules, rule_index)
+
+
+def _match_lines_in_worker(lines: List[str], address: Optional[Any]) -> List[WorkerResult]:
+    """Executed in the worker processes"""
+    matcher = _g_worker_matcher
+    assert matcher is not None
+    results = []
+    for line in lines:
+        started = time.time()
+        try:
+            event = matcher.create_event_from_line(line, address)
+            matcher.do_translate_hostname(event)
+            event_matches = matcher.match_event(event, matcher.event_rule_matches_unlocked)
+        except Exception as e:
+            getLogger("cmk.mkeventd").exception(
+                'Exception handling a log line (skipping this one): %s' % e)
+            continue
+        results.append((event, [(rule["id"], result) for rule, result in event_matches.matches],
+                        (event_matches.rule_tries, event_matches.rule_index_hits,
+                         event_matches.rule_index_misses), time.time() - started))
+    return results
+
+
+class EventWorkerPool:
+    """Worker processes creating the events and matching the rules
+
+    The workers get the rules which were compiled at the time the pool was started. Only
+    the parsing and the matching is done in parallel. The event server applies the
+    results to the event status in the order in which the lines were received.
+
+    The workers are started by a fork server, which is a fresh process. The event server
+    is multithreaded and holds locks and sockets, none of them may end up in a worker."""
+    def __init__(self, num_workers: int, rules_generation: int,
+                 worker_state: EventWorkerState) -> None:
+        super().__init__()
+        self.num_workers = num_workers
+        self.rules_generation = rules_generation
+        # Limit the number of submitted lines to keep the latency and the memory bounded
+        self.max_pending_lines = num_workers * 1024
+        context = multiprocessing.get_context("forkserver")
+        # The fork server must not import the main module: It would be the mkeventd
+        context.set_forkserver_preload(["cmk.ec.main"])
+        self._pool = context.Pool(num_workers,
+                                  initializer=_initialize_event_worker,
+                                  initargs=worker_state)
+
+    def submit(self, lines: List[str],
+               address: Optional[Any]) -> "multiprocessing.pool.AsyncResult":
+        """The lines are processed as one task to save the communication overhead"""
+        return self._pool.apply_async(_match_lines_in_worker, (lines, address))
+
+    def terminate(self) -> None:
+        self._pool.terminate()
+        self._pool.join()
+
+
+class EventServer(ECServerThread, EventMatcher):
     month_names = {
         "Jan": 1,
         "Feb": 2,
@@ -640,6 +905,14 @@ class EventServer(ECServerThread):
         self._message_period = ActiveHistoryPeriod()
         self._rule_matcher = RuleMatcher(self._logger, config)
         self._event_creator = EventCreator(self._logger, config)
+        # Incremented with each compilation of the rules, see EventWorkerPool
+        self._rules_generation = 0
+        self._worker_pool: Optional[EventWorkerPool] = None
+        # Lines submitted to the workers:
+        # (number of lines, rules generation, result)
+        self._pending_lines: Deque[Tuple[int, int, multiprocessing.pool.AsyncResult]] = \
+            collections.deque()
+        self._num_pending_lines = 0
 
         # HACK for testing: The real fix would involve breaking up these huge
         # class monsters.
@@ -846,9 +1119,12 @@ class EventServer(ECServerThread):
         client_sockets: Dict[int, Tuple[socket.socket, Any, bytes]] = {}
         select_timeout = 1
         while not self._terminate_event.is_set():
+            self._update_worker_pool()
             try:
-                readable = select.select(listen_list + list(client_sockets.keys()), [], [],
-                                         select_timeout)[0]
+                # Poll for the results of the workers while lines are pending
+                readable = select.select(
+                    listen_list + list(client_sockets.keys()), [], [],
+                    min(select_timeout, 0.01) if self._pending_lines else select_timeout)[0]
             except select.error as e:
                 if e.args[0] != errno.EINTR:
                     raise
@@ -960,6 +1236,38 @@ class EventServer(ECServerThread):
             except StopIteration:
                 select_timeout = 1  # restore default select timeout
 
+            self._handle_pending_lines(block=False)
+
+        self._stop_worker_pool()
+
+    def _update_worker_pool(self) -> None:
+        """(Re)start the workers in case the rules or the number of workers changed"""
+        num_workers = self._config.get("event_workers", 0)
+        pool = self._worker_pool
+        wanted = (num_workers, self._rules_generation)
+        if pool is not None and (pool.num_workers, pool.rules_generation) == wanted:
+            return
+
+        self._stop_worker_pool()
+        if num_workers:
+            # Start the workers with a consistent set of compiled rules
+            with self._lock_configuration:
+                self._logger.info("Starting %d event workers" % num_workers)
+                self._worker_pool = EventWorkerPool(num_workers, self._rules_generation,
+                                                    self._event_worker_state())
+
+    def _event_worker_state(self) -> EventWorkerState:
+        log_file = None if self.settings.options.foreground else str(
+            self.settings.paths.log_file.value)
+        return log_file, log.logger.level, self._config, self._rules, self._rule_index
+
+    def _stop_worker_pool(self) -> None:
+        if self._worker_pool is None:
+            return
+        self._handle_pending_lines(block=True)
+        self._worker_pool.terminate()
+        self._worker_pool = None
+
     # Processes incoming data, just a wrapper between the real data and the
     # handler function to record some statistics etc.
     def process_raw_data(self, handler):
@@ -976,6 +1284,11 @@ class EventServer(ECServerThread):
     # Takes several lines of messages, handles encoding and processes them separated
     def process_raw_lines(self, data: bytes, address: Optional[Any] = None) -> None:
         lines = data.splitlines()
+        if self._worker_pool is not None:
+            decoded_lines = [scrub_and_decode(line_bytes.rstrip()) for line_bytes in lines]
+            self._submit_lines(self._worker_pool, [line for line in decoded_lines if line], address)
+            return
+
         for line_bytes in lines:
             line = scrub_and_decode(line_bytes.rstrip())
             if line:
@@ -989,6 +1302,62 @@ class EventServer(ECServerThread):
                     self._logger.exception('Exception handling a log line (skipping this one): %s' %
                                            e)
 
+    def _submit_lines(self, worker_pool: EventWorkerPool, lines: List[str],
+                      address: Optional[Any]) -> None:
+        if not lines:
+            return
+        self._perfcounters.count("messages", len(lines))
+        # In replication slave mode (when not took over), ignore all events
+        if is_replication_slave(self._config) and self._slave_status["mode"] == "sync":
+            if self.settings.options.debug:
+                self._logger.info("Replication: we are in slave mode, ignoring event")
+            return
+
+        while self._pending_lines and self._num_pending_lines >= worker_pool.max_pending_lines:
+            self._handle_pending_lines_of_task(*self._pending_lines.popleft())
+        self._pending_lines.append(
+            (len(lines), worker_pool.rules_generation, worker_pool.submit(lines, address)))
+        self._num_pending_lines += len(lines)
+
+    def _handle_pending_lines(self, block: bool) -> None:
+        """Apply the results of the workers in the order the lines were submitted"""
+        while self._pending_lines:
+            if not block and not self._pending_lines[0][2].ready():
+                return
+            self._handle_pending_lines_of_task(*self._pending_lines.popleft())
+
+    def _handle_pending_lines_of_task(self, num_lines: int, rules_generation: int,
+                                      async_result: multiprocessing.pool.AsyncResult) -> None:
+        self._num_pending_lines -= num_lines
+        try:
+            worker_results = async_result.get()
+        except Exception as e:
+            self._logger.exception('Exception handling %d log lines (skipping them): %s' %
+                                   (num_lines, e))
+            return
+
+        for event, rule_results, (rule_tries, rule_index_hits,
+                                  rule_index_misses), worker_time in worker_results:
+            applied = time.time()
+            try:
+                with self._lock_configuration:
+                    if rules_generation == self._rules_generation:
+                        event_matches: Optional[EventMatches] = EventMatches([
+                            (self._rule_by_id[rule_id], result) for rule_id, result in rule_results
+                        ], rule_tries, rule_index_hits, rule_index_misses)
+                    else:
+                        event_matches = None
+
+                if event_matches is None:
+                    # The rules were reloaded in the meantime: Match the event again
+                    event_matches = self.match_event(event, self.event_rule_matches)
+                self.process_translated_event(event, event_matches)
+            except Exception as e:
+                self._logger.exception('Exception handling a log line (skipping this one): %s' % e)
+            # The time spent on the line by the worker and the event server, without the
+            # time waiting for a worker
+            self._perfcounters.count_time("processing", worker_time + time.time() - applied)
+
     def do_housekeeping(self) -> None:
         with self._event_status.lock:
             with self._lock_configuration:
@@ -1267,10 +1636,12 @@ class EventServer(ECServerThread):
     # Precompile regular expressions and similar stuff. Also convert legacy
     # "rules" parameter into new "rule_packs" parameter
     def compile_rules(self, legacy_rules, rule_packs):
+        self._rules_generation += 1
         self._rules = []
         self._rule_by_id = {}
         # Speedup-Hash for rule execution
         self._rule_hash: Dict[int, Dict[int, Any]] = {}
+        self._rule_index: Dict[int, Dict[int, RuleIndex]] = {}
         count_disabled = 0
         count_rules = 0
         count_unspecific = 0
@@ -1337,6 +1708,7 @@ class EventServer(ECServerThread):
         self._logger.info("Compiled %d active rules (ignoring %d disabled rules)" %
                           (count_rules, count_disabled))
         if self._config["rule_optimizer"]:
+            self._rule_index = build_rule_indexes(self._rule_hash)
             self._logger.info(
                 "Rule hash: %d rules - %d hashed, %d unspecific" %
                 (len(self._rules), len(self._rules) - count_unspecific, count_unspecific))
@@ -1411,142 +1783,122 @@ class EventServer(ECServerThread):
                                (100.0 * count / float(total_count))))
 
     def process_line(self, line, address):
-        line = line.rstrip()
-        if self._config["debug_rules"]:
-            if address:
-                self._logger.info(u"Processing message from %r: '%s'" % (address, line))
-            else:
-                self._logger.info(u"Processing message '%s'" % line)
-
-        event = self._event_creator.create_event_from_line(line, address)
-        self.process_event(event)
+        self.process_event(self.create_event_from_line(line, address))
 
     def process_event(self, event):
         self.do_translate_hostname(event)
+        self.process_translated_event(event, self.match_event(event, self.event_rule_matches))
 
+    def process_translated_event(self, event: Dict[str, Any], event_matches: EventMatches) -> None:
+        """Apply the rules matching the event to the event status"""
         # Log all incoming messages into a syslog-like text file if that is enabled
         if self._config["log_messages"]:
             self.log_message(event)
 
-        # Rule optimizer
         if self._config["rule_optimizer"]:
             self._hash_stats[event["facility"]][event["priority"]] += 1
-            rule_candidates = self._rule_hash.get(event["facility"], {}).get(event["priority"], [])
-        else:
-            rule_candidates = self._rules
+            self._perfcounters.count("rule_index_hits", event_matches.rule_index_hits)
+            self._perfcounters.count("rule_index_misses", event_matches.rule_index_misses)
+        self._perfcounters.count("rule_tries", event_matches.rule_tries)
 
-        skip_pack = None
-        for rule in rule_candidates:
-            if skip_pack and rule["pack"] == skip_pack:
-                continue  # still in the rule pack that we want to skip
-            skip_pack = None  # new pack, reset skipping
+        for rule, result in event_matches.matches:
+            self._perfcounters.count("rule_hits")
+            cancelling, match_groups = result
 
-            try:
-                result = self.event_rule_matches(rule, event)
-            except Exception as e:
-                self._logger.exception('  Exception during matching:\n%s' % e)
-                result = False
+            if self._config["debug_rules"]:
+                self._logger.info("  matching groups:\n%s" % pprint.pformat(match_groups))
 
-            if result:  # A tuple with (True/False, {match_info}).. O.o
-                self._perfcounters.count("rule_hits")
-                cancelling, match_groups = result
+            self._event_status.count_rule_match(rule["id"])
+            if self._config["log_rulehits"]:
+                self._logger.info("Rule '%s/%s' hit by message %s/%s - '%s'." %
+                                  (rule["pack"], rule["id"], SyslogFacility(event["facility"]),
+                                   SyslogPriority(event["priority"]), event["text"]))
 
-                if self._config["debug_rules"]:
-                    self._logger.info("  matching groups:\n%s" % pprint.pformat(match_groups))
+            if rule.get("drop"):
+                if rule["drop"] == "skip_pack":
+                    if self._config["debug_rules"]:
+                        self._logger.info("  skipping this rule pack (%s)" % rule["pack"])
+                    continue
+                self._perfcounters.count("drops")
+                return
 
-                self._event_status.count_rule_match(rule["id"])
-                if self._config["log_rulehits"]:
-                    self._logger.info("Rule '%s/%s' hit by message %s/%s - '%s'." %
-                                      (rule["pack"], rule["id"], SyslogFacility(event["facility"]),
-                                       SyslogPriority(event["priority"]), event["text"]))
+            if cancelling:
+                self._event_status.cancel_events(self, self._event_columns, event, match_groups,
+                                                 rule)
+                return
 
-                if rule.get("drop"):
-                    if rule["drop"] == "skip_pack":
-                        skip_pack = rule["pack"]
-                        if self._config["debug_rules"]:
-                            self._logger.info("  skipping this rule pack (%s)" % skip_pack)
-                        continue
-                    self._perfcounters.count("drops")
-                    return
-
-                if cancelling:
-                    self._event_status.cancel_events(self, self._event_columns, event, match_groups,
-                                                     rule)
-                    return
-
-                # Remember the rule id that this event originated from
-                event["rule_id"] = rule["id"]
-
-                # Attach optional contact group information for visibility
-                # and eventually for notifications
-                self._add_rule_contact_groups_to_event(rule, event)
-
-                # Store groups from matching this event. In order to make
-                # persistence easier, we do not safe them as list but join
-                # them on ASCII-1.
-                event["match_groups"] = match_groups.get("match_groups_message", ())
-                event["match_groups_syslog_application"] = match_groups.get(
-                    "match_groups_syslog_application", ())
-                self.rewrite_event(rule, event, match_groups)
-
-                # Lookup the monitoring core hosts and add the core host
-                # name to the event when one can be matched.
-                #
-                # Needs to be done AFTER event rewriting, because the rewriting
-                # may change the "host" field.
-                #
-                # For the moment we have no rule/condition matching on this
-                # field. So we only add the core host info for matched events.
-                self._add_core_host_to_new_event(event)
-
-                if "count" in rule:
-                    count = rule["count"]
-                    # Check if a matching event already exists that we need to
-                    # count up. If the count reaches the limit, the event will
-                    # be opened and its rule actions performed.
-                    existing_event = \
-                        self._event_status.count_event(self, event, rule, count)
-                    if existing_event:
-                        if "delay" in rule:
-                            if self._config["debug_rules"]:
-                                self._logger.info("Event opening will be delayed for %d seconds" %
-                                                  rule["delay"])
-                            existing_event["delay_until"] = time.time() + rule["delay"]
-                            existing_event["phase"] = "delayed"
-                        else:
-                            event_has_opened(self._history, self.settings, self._config,
-                                             self._logger, self, self._event_columns, rule,
-                                             existing_event)
+            # Remember the rule id that this event originated from
+            event["rule_id"] = rule["id"]
 
-                        self._history.add(existing_event, "COUNTREACHED")
+            # Attach optional contact group information for visibility
+            # and eventually for notifications
+            self._add_rule_contact_groups_to_event(rule, event)
 
-                        if "delay" not in rule and rule.get("autodelete"):
-                            existing_event["phase"] = "closed"
-                            self._history.add(existing_event, "AUTODELETE")
-                            with self._event_status.lock:
-                                self._event_status.remove_event(existing_event)
-                elif "expect" in rule:
-                    self._event_status.count_expected_event(self, event)
-                else:
+            # Store groups from matching this event. In order to make
+            # persistence easier, we do not safe them as list but join
+            # them on ASCII-1.
+            event["match_groups"] = match_groups.get("match_groups_message", ())
+            event["match_groups_syslog_application"] = match_groups.get(
+                "match_groups_syslog_application", ())
+            self.rewrite_event(rule, event, match_groups)
+
+            # Lookup the monitoring core hosts and add the core host
+            # name to the event when one can be matched.
+            #
+            # Needs to be done AFTER event rewriting, because the rewriting
+            # may change the "host" field.
+            #
+            # For the moment we have no rule/condition matching on this
+            # field. So we only add the core host info for matched events.
+            self._add_core_host_to_new_event(event)
+
+            if "count" in rule:
+                count = rule["count"]
+                # Check if a matching event already exists that we need to
+                # count up. If the count reaches the limit, the event will
+                # be opened and its rule actions performed.
+                existing_event = \
+                    self._event_status.count_event(self, event, rule, count)
+                if existing_event:
                     if "delay" in rule:
                         if self._config["debug_rules"]:
                             self._logger.info("Event opening will be delayed for %d seconds" %
                                               rule["delay"])
-                        event["delay_until"] = time.time() + rule["delay"]
-                        event["phase"] = "delayed"
+                        existing_event["delay_until"] = time.time() + rule["delay"]
+                        existing_event["phase"] = "delayed"
                     else:
-                        event["phase"] = "open"
+                        event_has_opened(self._history, self.settings, self._config, self._logger,
+                                         self, self._event_columns, rule, existing_event)
 
-                    if self.new_event_respecting_limits(event):
-                        if event["phase"] == "open":
-                            event_has_opened(self._history, self.settings, self._config,
-                                             self._logger, self, self._event_columns, rule, event)
-                            if rule.get("autodelete"):
-                                event["phase"] = "closed"
-                                self._history.add(event, "AUTODELETE")
-                                with self._event_status.lock:
-                                    self._event_status.remove_event(event)
-                return
+                    self._history.add(existing_event, "COUNTREACHED")
+
+                    if "delay" not in rule and rule.get("autodelete"):
+                        existing_event["phase"] = "closed"
+                        self._history.add(existing_event, "AUTODELETE")
+                        with self._event_status.lock:
+                            self._event_status.remove_event(existing_event)
+            elif "expect" in rule:
+                self._event_status.count_expected_event(self, event)
+            else:
+                if "delay" in rule:
+                    if self._config["debug_rules"]:
+                        self._logger.info("Event opening will be delayed for %d seconds" %
+                                          rule["delay"])
+                    event["delay_until"] = time.time() + rule["delay"]
+                    event["phase"] = "delayed"
+                else:
+                    event["phase"] = "open"
+
+                if self.new_event_respecting_limits(event):
+                    if event["phase"] == "open":
+                        event_has_opened(self._history, self.settings, self._config, self._logger,
+                                         self, self._event_columns, rule, event)
+                        if rule.get("autodelete"):
+                            event["phase"] = "closed"
+                            self._history.add(event, "AUTODELETE")
+                            with self._event_status.lock:
+                                self._event_status.remove_event(event)
+            return
 
         # End of loop over rules.
         if self._config["archive_orphans"]:
@@ -1600,22 +1952,8 @@ class EventServer(ECServerThread):
     # if matched regex groups in either text (normal) or match_ok (cancelling)
     # match.
     def event_rule_matches(self, rule, event):
-        self._perfcounters.count("rule_tries")
         with self._lock_configuration:
-            result = self._rule_matcher.event_rule_matches_non_inverted(rule, event)
-            if rule.get("invert_matching"):
-                if result is False:
-                    result = False, {}
-                    if self._config["debug_rules"]:
-                        self._logger.info(
-                            "  Rule would not match, but due to inverted matching does.")
-                else:
-                    result = False
-                    if self._config["debug_rules"]:
-                        self._logger.info(
-                            "  Rule would match, but due to inverted matching does not.")
-
-            return result
+            return self.event_rule_matches_unlocked(rule, event)
 
     # Rewrite texts and compute other fields in the event
     def rewrite_event(self, rule, event, groups, set_first=True):
@@ -1657,60 +1995,6 @@ class EventServer(ECServerThread):
         if "set_contact" in rule and "contact" not in event:
             event["contact"] = replace_groups(rule["set_contact"], event.get("contact", ""), groups)
 
-    # Translate a hostname if this is configured. We are
-    # *really* sorry: this code snipped is copied from modules/check_mk_base.py.
-    # There is still no common library. Please keep this in sync with the
-    # original code
-    def translate_hostname(self, backedhost):
-        translation = self._config["hostname_translation"]
-
-        # Here comes the original code from modules/check_mk_base.py
-        if translation:
-            # 1. Case conversion
-            caseconf = translation.get("case")
-            if caseconf == "upper":
-                backedhost = backedhost.upper()
-            elif caseconf == "lower":
-                backedhost = backedhost.lower()
-
-            # 2. Drop domain part (not applied to IP addresses!)
-            if translation.get("drop_domain") and backedhost:
-                # only apply if first part does not convert successfully into an int
-                firstpart = backedhost.split(".", 1)[0]
-                try:
-                    int(firstpart)
-                except Exception:
-                    backedhost = firstpart
-
-            # 3. Regular expression conversion
-            if "regex" in translation:
-                for regex, subst in translation["regex"]:
-                    if not regex.endswith('$'):
-                        regex += '$'
-                    rcomp = cmk.utils.regex.regex(regex)
-                    mo = rcomp.match(backedhost)
-                    if mo:
-                        backedhost = subst
-                        for nr, text in enumerate(mo.groups()):
-                            backedhost = backedhost.replace("\\%d" % (nr + 1), text)
-                        break
-
-            # 4. Explicity mapping
-            for from_host, to_host in translation.get("mapping", []):
-                if from_host == backedhost:
-                    backedhost = to_host
-                    break
-
-        return backedhost
-
-    def do_translate_hostname(self, event):
-        try:
-            event["host"] = self.translate_hostname(event["host"])
-        except Exception as e:
-            if self._config["debug_rules"]:
-                self._logger.exception('Unable to parse host "%s" (%s)' % (event.get("host"), e))
-            event["host"] = ""
-
     def log_message(self, event):
         try:
             with get_logfile(self._config, self.settings.paths.messages_dir.value,
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Pre-filter for the rules to check for an event
+
+The rule optimizer of the event server already groups the rules by syslog facility
+and priority. The RuleIndex narrows such a group further down using conditions which
+can be checked a lot cheaper than the full rule matching:
+
+* Rules with a literal host name are only candidates for events of that host.
+* Rules with a message pattern are only candidates in case the event text contains
+  the literals which are required by the pattern (or by the cancelling pattern).
+
+The candidates keep the order of the rules, so the first matching rule is still the
+same one. The full rule matching is performed for all candidates.
+"""
+
+import heapq
+import sre_constants
+import sre_parse
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple, Union
+
+Rule = Dict[str, Any]
+# Literals required by a message pattern and whether or not the pattern is a plain
+# string. Plain strings are compared case insensitive to the complete text, literals of
+# regular expressions are only used for ASCII texts.
+MessageLiterals = Tuple[Tuple[str, ...], bool]
+# Position of the rule, the rule and the message literals of which one needs to be found
+# in the event text (None: no message condition to check)
+IndexEntry = Tuple[int, Rule, Optional[List[MessageLiterals]]]
+# The message literals of the rules by the id() of the rule
+MessageLiteralsCache = Dict[int, Optional[List[MessageLiterals]]]
+
+
+def build_rule_indexes(
+        rule_hash: Dict[int, Dict[int, List[Rule]]]) -> Dict[int, Dict[int, "RuleIndex"]]:
+    """Create the indexes of all facility/priority groups of the rule optimizer
+
+    A rule is usually part of many groups. Its patterns are only analyzed once."""
+    literals_cache: MessageLiteralsCache = {}
+    return {
+        facility: {
+            prio: RuleIndex(rules, literals_cache) for prio, rules in prio_hash.items()
+        } for facility, prio_hash in rule_hash.items()
+    }
+
+
+class RuleIndex:
+    def __init__(self,
+                 rules: Iterable[Rule],
+                 literals_cache: Optional[MessageLiteralsCache] = None) -> None:
+        super().__init__()
+        if literals_cache is None:
+            literals_cache = {}
+        self._num_rules = 0
+        self._generic_rules: List[IndexEntry] = []
+        self._rules_by_host: Dict[str, List[IndexEntry]] = {}
+
+        for position, rule in enumerate(rules):
+            self._num_rules += 1
+            if rule.get("invert_matching"):
+                self._generic_rules.append((position, rule, None))
+                continue
+
+            try:
+                message_literals = literals_cache[id(rule)]
+            except KeyError:
+                message_literals = literals_cache[id(rule)] = _message_literals(rule)
+
+            entry = (position, rule, message_literals)
+            host = rule.get("match_host")
+            if isinstance(host, str):
+                self._rules_by_host.setdefault(host, []).append(entry)
+            else:
+                self._generic_rules.append(entry)
+
+    def __len__(self) -> int:
+        return self._num_rules
+
+    def candidates(self, event: Dict[str, Any]) -> List[Rule]:
+        """Returns the rules which may match the event in the order of the rules"""
+        host_rules = self._rules_by_host.get(event["host"].lower())
+        if host_rules:
+            entries: Iterable[IndexEntry] = heapq.merge(self._generic_rules,
+                                                        host_rules,
+                                                        key=lambda e: e[0])
+        else:
+            entries = self._generic_rules
+
+        text = event["text"].lower()
+        is_ascii = text.isascii()
+        found: Dict[str, bool] = {}
+
+        candidates = []
+        for _position, rule, message_literals in entries:
+            if message_literals is not None and not _contains_any_of(text, is_ascii,
+                                                                     message_literals, found):
+                continue
+            candidates.append(rule)
+        return candidates
+
+
+def _contains_any_of(text: str, is_ascii: bool, message_literals: List[MessageLiterals],
+                     found: Dict[str, bool]) -> bool:
+    for literals, is_plain in message_literals:
+        if not is_plain and not is_ascii:
+            return True  # Case insensitive matching of non ASCII texts is not covered
+
+        if all(_contains(text, literal, found) for literal in literals):
+            return True
+    return False
+
+
+def _contains(text: str, literal: str, found: Dict[str, bool]) -> bool:
+    try:
+        return found[literal]
+    except KeyError:
+        is_found = found[literal] = literal in text
+        return is_found
+
+
+def _message_literals(rule: Rule) -> Optional[List[MessageLiterals]]:
+    """A rule can only match in case its message or its cancelling message matches"""
+    if "match" not in rule:
+        return None  # Every message matches
+
+    message_literals = []
+    for key in ["match", "match_ok"]:
+        if key not in rule:
+            continue
+        required_literals = _required_literals(rule[key])
+        if required_literals is None:
+            return None
+        message_literals.append(required_literals)
+    return message_literals
+
+
+def _required_literals(pattern: Union[str, Pattern[str]]) -> Optional[MessageLiterals]:
+    if isinstance(pattern, str):
+        return (pattern,), True
+
+    try:
+        literals = _regex_literals(sre_parse.parse(pattern.pattern, pattern.flags))
+    except (sre_constants.error, RecursionError):
+        return None
+
+    if not literals:
+        return None
+    # Check the most selective literal first
+    return tuple(
+        sorted({literal.lower() for literal in literals},
+               key=lambda literal: (-len(literal), literal))), False
+
+
+def _regex_literals(parsed: Any) -> List[str]:
+    """Returns ASCII strings which are part of every text matched by the regex"""
+    literals: List[str] = []
+    current: List[str] = []
+
+    def finish_literal():
+        if current:
+            literals.append("".join(current))
+            del current[:]
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL and av < 128:
+            current.append(chr(av))
+        elif op is sre_constants.AT:
+            continue  # Anchors do not consume characters
+        elif op is sre_constants.SUBPATTERN:
+            # Plain groups: The content is part of the sequence
+            _group, _add_flags, _del_flags, sub_pattern = av
+            sub_literals = _regex_literals(sub_pattern)
+            if len(sub_literals) == 1 and _is_literal_sequence(sub_pattern):
+                current.append(sub_literals[0])
+            else:
+                finish_literal()
+                literals.extend(sub_literals)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            finish_literal()
+            min_repeat, _max_repeat, sub_pattern = av
+            if min_repeat >= 1:
+                literals.extend(_regex_literals(sub_pattern))
+        else:
+            finish_literal()
+    finish_literal()
+    return literals
+
+
+def _is_literal_sequence(parsed: Any) -> bool:
+    return all(
+        (op is sre_constants.LITERAL and av < 128) or op is sre_constants.AT for op, av in parsed)
@@ -17,6 +17,7 @@ from cmk.snmplib.type_defs import SNMPHostConfig, SNMPRawData, SNMPTable, SNMPTr
 
 from . import factory
 from ._base import ABCFileCache, ABCFetcher
+from .snmp_backend import ClassicSNMPBackend
 
 __all__ = ["SNMPFetcher", "SNMPFileCache"]
 
@@ -38,11 +39,13 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
         oid_infos: Dict[SectionName, List[SNMPTree]],
         use_snmpwalk_cache: bool,
         snmp_config: SNMPHostConfig,
+        max_parallel_walks: int,
     ) -> None:
         super().__init__(file_cache, logging.getLogger("cmk.fetchers.snmp"))
         self._oid_infos = oid_infos
         self._use_snmpwalk_cache = use_snmpwalk_cache
         self._snmp_config = snmp_config
+        self._max_parallel_walks = max_parallel_walks
 
     @classmethod
     def from_json(cls, serialized: Dict[str, Any]) -> 'SNMPFetcher':
@@ -54,6 +57,8 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
             },
             serialized["use_snmpwalk_cache"],
             SNMPHostConfig(**serialized["snmp_config"]),
+            # Not contained in configurations serialized by older versions
+            serialized.get("max_parallel_walks", 1),
         )
 
     def __enter__(self) -> 'SNMPFetcher':
@@ -64,6 +69,17 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
         pass
 
     def _fetch_from_io(self) -> SNMPRawData:
+        backend = factory.backend(self._snmp_config)
+        walk_cache = snmp_table.prefetch_snmp_walks(
+            self._oid_infos,
+            self._use_snmpwalk_cache,
+            backend=backend,
+            # The classic backend runs a process per walk. Other backends
+            # are not known to be thread safe.
+            max_parallel_walks=(self._max_parallel_walks
+                                if isinstance(backend, ClassicSNMPBackend) else 1),
+        )
+
         fetched_data: SNMPRawData = {}
         for section_name, oid_info in self._oid_infos.items():
             self._logger.debug("%s: Fetching data", section_name)
@@ -72,7 +88,8 @@ class SNMPFetcher(ABCFetcher[SNMPRawData]):
             # and fetches a separate snmp table.
             get_snmp = partial(snmp_table.get_snmp_table_cached
                                if self._use_snmpwalk_cache else snmp_table.get_snmp_table,
-                               backend=factory.backend(self._snmp_config))
+                               backend=backend,
+                               walk_cache=walk_cache)
             # branch: List[SNMPTree]
             fetched_section_data: List[SNMPTable] = []
             for entry in oid_info:
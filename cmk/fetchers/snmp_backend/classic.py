@@ -7,7 +7,8 @@
 import os
 import signal
 import subprocess
-from typing import List, Optional
+import threading
+from typing import List, Optional, Set
 
 from six import ensure_str
 
@@ -15,7 +16,14 @@ import cmk.utils.tty as tty
 from cmk.utils.exceptions import MKGeneralException, MKSNMPError, MKTimeout
 from cmk.utils.log import console
 
-from cmk.snmplib.type_defs import ABCSNMPBackend, OID, SNMPContextName, SNMPRawValue, SNMPRowInfo
+from cmk.snmplib.type_defs import (
+    ABCSNMPBackend,
+    OID,
+    SNMPContextName,
+    SNMPHostConfig,
+    SNMPRawValue,
+    SNMPRowInfo,
+)
 
 from ._utils import strip_snmp_value
 
@@ -23,6 +31,13 @@ __all__ = ["ClassicSNMPBackend"]
 
 
 class ClassicSNMPBackend(ABCSNMPBackend):
+    def __init__(self, snmp_config: SNMPHostConfig) -> None:
+        super(ClassicSNMPBackend, self).__init__(snmp_config)
+        # The walks may be executed by several threads, see prefetch_snmp_walks()
+        self._walk_lock = threading.Lock()
+        self._walk_processes: Set[subprocess.Popen] = set()
+        self._walks_cancelled = False
+
     def get(self,
             oid: OID,
             context_name: Optional[SNMPContextName] = None) -> Optional[SNMPRawValue]:
@@ -103,12 +118,16 @@ class ClassicSNMPBackend(ABCSNMPBackend):
         exitstatus = None
         rowinfo: SNMPRowInfo = []
         try:
-            snmp_process = subprocess.Popen(command,
-                                            close_fds=True,
-                                            stdin=open(os.devnull),
-                                            stdout=subprocess.PIPE,
-                                            stderr=subprocess.PIPE,
-                                            encoding="utf-8")
+            with self._walk_lock:
+                if self._walks_cancelled:
+                    raise MKSNMPError("SNMP walks of %s have been cancelled" % ipaddress)
+                snmp_process = subprocess.Popen(command,
+                                                close_fds=True,
+                                                stdin=open(os.devnull),
+                                                stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE,
+                                                encoding="utf-8")
+                self._walk_processes.add(snmp_process)
 
             rowinfo = self._get_rowinfo_from_snmp_process(snmp_process)
 
@@ -124,6 +143,8 @@ class ClassicSNMPBackend(ABCSNMPBackend):
             # Normally these pipes getting closed after p.communicate finishes
             # Closing them a second time in a OK scenario won't hurt neither..
             if snmp_process:
+                with self._walk_lock:
+                    self._walk_processes.discard(snmp_process)
                 exitstatus = snmp_process.wait()
                 if snmp_process.stderr:
                     error = snmp_process.stderr.read()
@@ -138,6 +159,13 @@ class ClassicSNMPBackend(ABCSNMPBackend):
                               (ipaddress, ensure_str(error).strip(), exitstatus))
         return rowinfo
 
+    def cancel_walks(self) -> None:
+        with self._walk_lock:
+            self._walks_cancelled = True
+            # The processes are not waited for before they are removed, so they still exist
+            for snmp_process in self._walk_processes:
+                os.kill(snmp_process.pid, signal.SIGTERM)
+
     def _get_rowinfo_from_snmp_process(self, snmp_process: subprocess.Popen) -> SNMPRowInfo:
         if snmp_process.stdout is None:
             raise TypeError()
@@ -5,22 +5,190 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """Abstract classes and types."""
 
-from typing import List, Optional, Tuple
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
-from six import ensure_binary, ensure_str
+from six import ensure_str
 
 import cmk.utils.agent_simulator as agent_simulator
+import cmk.utils.cleanup
 import cmk.utils.paths
+import cmk.utils.store as store
 from cmk.utils.exceptions import MKGeneralException, MKSNMPError
 from cmk.utils.log import console
-from cmk.utils.type_defs import CheckPluginNameStr
+from cmk.utils.type_defs import CheckPluginNameStr, HostName
 
-import cmk.snmplib.snmp_cache as snmp_cache
 from cmk.snmplib.type_defs import ABCSNMPBackend, OID, SNMPContextName, SNMPRawValue, SNMPRowInfo
 
 from ._utils import strip_snmp_value
 
-__all__ = ["StoredWalkSNMPBackend"]
+__all__ = ["StoredWalkSNMPBackend", "StoredWalkIndex"]
+
+_INDEX_MAGIC = b"CMKWIDX1"
+# magic, mtime (ns) and size of the indexed walk file, number of entries
+_INDEX_HEADER = struct.Struct("<8sqqI")
+# offset and length of the encoded OID in the key area,
+# offset and length of the line in the walk file
+_INDEX_ENTRY = struct.Struct("<IHQI")
+
+
+class StoredWalkIndex:
+    """Sorted OID index of a stored walk file
+
+    The index is stored next to the walk file and is built again once the mtime or size
+    of the walk file changes. It consists of a header, a table of fixed size entries sorted
+    by OID and an area holding the encoded OIDs. An OID is encoded as a sequence of big
+    endian 32 bit integers, so comparing two encoded OIDs byte wise is equal to comparing
+    them numerically and a sub tree lookup is a simple prefix check.
+
+    Both files are accessed through mmap, so a lookup only touches the pages it needs.
+    """
+    def __init__(self, walk_path: Path) -> None:
+        self._walk_path = walk_path
+        self._index_path = walk_path.with_name(".%s.idx" % walk_path.name)
+        self._walk: Union[bytes, mmap.mmap] = b""
+        self._index: Union[bytes, mmap.mmap] = b""
+        self._num_entries = 0
+        self._keys_offset = 0
+        self._open()
+
+    @property
+    def index_path(self) -> Path:
+        return self._index_path
+
+    def close(self) -> None:
+        for data in (self._walk, self._index):
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self._walk = self._index = b""
+
+    def _open(self) -> None:
+        try:
+            stat = self._walk_path.stat()
+        except OSError:
+            raise MKSNMPError("No snmpwalk file %s" % self._walk_path)
+
+        self._walk = _map_file(self._walk_path)
+
+        index = _map_file(self._index_path) if self._index_path.exists() else b""
+        if not self._is_valid_index(index, stat):
+            if isinstance(index, mmap.mmap):
+                index.close()
+            index = self._build_index(stat)
+
+        self._index = index
+        self._num_entries = _INDEX_HEADER.unpack_from(index)[3]
+        self._keys_offset = _INDEX_HEADER.size + self._num_entries * _INDEX_ENTRY.size
+
+    @staticmethod
+    def _is_valid_index(index: Union[bytes, mmap.mmap], stat: os.stat_result) -> bool:
+        if len(index) < _INDEX_HEADER.size:
+            return False
+        magic, mtime_ns, size, _num_entries = _INDEX_HEADER.unpack_from(index)
+        return magic == _INDEX_MAGIC and mtime_ns == stat.st_mtime_ns and size == stat.st_size
+
+    def _build_index(self, stat: os.stat_result) -> Union[bytes, mmap.mmap]:
+        console.vverbose("  Building OID index %s\n" % self._index_path)
+        entries = sorted(_parse_walk_lines(self._walk))
+
+        keys = bytearray()
+        table = bytearray()
+        for key, line_offset, line_length in entries:
+            table += _INDEX_ENTRY.pack(len(keys), len(key), line_offset, line_length)
+            keys += key
+
+        content = (_INDEX_HEADER.pack(_INDEX_MAGIC, stat.st_mtime_ns, stat.st_size, len(entries)) +
+                   bytes(table) + bytes(keys))
+        try:
+            store.save_bytes_to_file(self._index_path, content)
+            return _map_file(self._index_path)
+        except (MKGeneralException, OSError) as e:
+            # E.g. read only walk directories. Continue with the index held in memory.
+            console.vverbose("  Cannot write OID index %s: %s\n" % (self._index_path, e))
+            return content
+
+    def _entry(self, position: int) -> Tuple[int, int, int, int]:
+        return _INDEX_ENTRY.unpack_from(self._index,
+                                        _INDEX_HEADER.size + position * _INDEX_ENTRY.size)
+
+    def _key(self, position: int) -> bytes:
+        key_offset, key_length, _line_offset, _line_length = self._entry(position)
+        start = self._keys_offset + key_offset
+        return self._index[start:start + key_length]
+
+    def _bisect_left(self, key: bytes) -> int:
+        low, high = 0, self._num_entries
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, oid: OID, include_exact: bool = True) -> Iterator[Tuple[OID, bytes]]:
+        """Yield OID and raw value of all lines in the sub tree of the given OID"""
+        prefix = _encode_oid(oid)
+        for position in range(self._bisect_left(prefix), self._num_entries):
+            key = self._key(position)
+            if not key.startswith(prefix):
+                break
+            if not include_exact and key == prefix:
+                continue
+
+            _key_offset, _key_length, line_offset, line_length = self._entry(position)
+            parts = self._walk[line_offset:line_offset + line_length].split(None, 1)
+            yield ensure_str(parts[0]).lstrip("."), parts[1] if len(parts) > 1 else b""
+
+
+def _map_file(path: Path) -> Union[bytes, mmap.mmap]:
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # Empty files can not be mapped
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _parse_walk_lines(walk: Union[bytes, mmap.mmap]) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield the encoded OID, offset and length of all lines starting with an OID
+
+    Lines not starting with a dot are continuations of multi line values and are skipped
+    like the bisection of the former line based lookup did."""
+    offset = 0
+    size = len(walk)
+    while offset < size:
+        end = walk.find(b"\n", offset)
+        if end == -1:
+            end = size
+        if walk[offset:offset + 1] == b".":
+            oid = walk[offset:end].split(None, 1)[0]
+            try:
+                yield _encode_oid(ensure_str(oid)), offset, end - offset
+            except MKGeneralException:
+                pass
+        offset = end + 1
+
+
+def _encode_oid(oid: OID) -> bytes:
+    try:
+        components = [int(c) for c in oid.strip(".").split(".")]
+        return struct.pack(">%dI" % len(components), *components)
+    except (ValueError, struct.error):
+        raise MKGeneralException("Invalid OID %s" % oid)
+
+
+_g_walk_indexes: Dict[HostName, StoredWalkIndex] = {}
+
+
+def cleanup_walk_indexes() -> None:
+    for index in _g_walk_indexes.values():
+        index.close()
+    _g_walk_indexes.clear()
+
+
+cmk.utils.cleanup.register_cleanup(cleanup_walk_indexes)
 
 
 class StoredWalkSNMPBackend(ABCSNMPBackend):
@@ -51,90 +219,22 @@ class StoredWalkSNMPBackend(ABCSNMPBackend):
             oid_prefix = oid
             dot_star = False
 
-        if snmp_cache.host_cache_contains(self.config.hostname):
-            lines = snmp_cache.host_cache_get(self.config.hostname)
-        else:
-            path = cmk.utils.paths.snmpwalks_dir + "/" + self.config.hostname
-            console.vverbose("  Loading %s from %s\n" % (oid, path))
-            try:
-                lines = open(path).readlines()
-            except IOError:
-                raise MKSNMPError("No snmpwalk file %s" % path)
-            snmp_cache.host_cache_set(self.config.hostname, lines)
-
-        begin = 0
-        end = len(lines)
-        hit = None
-        while end - begin > 0:
-            current = (begin + end) // 2
-            # skip over values including newlines to the next oid
-            while not lines[current].startswith(".") and current < end:
-                current += 1
-            parts = lines[current].split(None, 1)
-            comp = parts[0]
-            hit = StoredWalkSNMPBackend._compare_oids(oid_prefix, comp)
-            if hit == 0:
+        rowinfo: List[Tuple[OID, SNMPRawValue]] = []
+        for found_oid, raw_value in self._get_index(oid).lookup(oid_prefix,
+                                                                include_exact=not dot_star):
+            # FIXME: This encoding ping-pong os horrible...
+            value = ensure_str(agent_simulator.process(raw_value))
+            # Fix for missing starting oids
+            rowinfo.append(('.' + found_oid, strip_snmp_value(value)))
+            if dot_star:
                 break
-            if hit == 1:  # we are too low
-                begin = current + 1
-            else:
-                end = current
-
-        if hit != 0:
-            return []  # not found
-
-        rowinfo = StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current, -1)
-        rowinfo.reverse()
-        rowinfo += StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current + 1, 1)
-
-        if dot_star:
-            return [rowinfo[0]]
 
         return rowinfo
 
-    @staticmethod
-    def _compare_oids(a: OID, b: OID) -> int:
-        aa = StoredWalkSNMPBackend._to_bin_string(a)
-        bb = StoredWalkSNMPBackend._to_bin_string(b)
-        if len(aa) <= len(bb) and bb[:len(aa)] == aa:
-            result = 0
-        else:
-            result = (aa > bb) - (aa < bb)
-        return result
-
-    @staticmethod
-    def _to_bin_string(oid: OID) -> Tuple[int, ...]:
-        try:
-            return tuple(map(int, oid.strip(".").split(".")))
-        except Exception:
-            raise MKGeneralException("Invalid OID %s" % oid)
-
-    @staticmethod
-    def _collect_until(oid: OID, oid_prefix: OID, lines: List[str], index: int,
-                       direction: int) -> SNMPRowInfo:
-        rows = []
-        # Handle case, where we run after the end of the lines list
-        if index >= len(lines):
-            if direction > 0:
-                return []
-            index -= 1
-        while True:
-            line = lines[index]
-            parts = line.split(None, 1)
-            o = parts[0]
-            if o.startswith('.'):
-                o = o[1:]
-            if o == oid or o.startswith(oid_prefix + "."):
-                if len(parts) > 1:
-                    # FIXME: This encoding ping-pong os horrible...
-                    value = ensure_str(agent_simulator.process(ensure_binary(parts[1])))
-                else:
-                    value = ""
-                # Fix for missing starting oids
-                rows.append(('.' + o, strip_snmp_value(value)))
-                index += direction
-                if index < 0 or index >= len(lines):
-                    break
-            else:
-                break
-        return rows
+    def _get_index(self, oid: OID) -> StoredWalkIndex:
+        index = _g_walk_indexes.get(self.config.hostname)
+        if index is None:
+            path = Path(cmk.utils.paths.snmpwalks_dir, self.config.hostname)
+            console.vverbose("  Loading %s from %s\n" % (oid, path))
+            index = _g_walk_indexes[self.config.hostname] = StoredWalkIndex(path)
+        return index
@@ -12,11 +12,13 @@ import pprint
 import time
 import os
 import marshal
+import mmap
 import fcntl
 import multiprocessing
+from collections.abc import Mapping
 from contextlib import contextmanager
 import traceback
-from typing import Any, Dict, List, Optional, Set, Tuple, Type, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Type, Union
 
 from six import ensure_binary
 from livestatus import SiteId, LivestatusRow
@@ -178,6 +180,13 @@ g_services_by_hostname: Dict[HostName, List[Tuple[SiteId, Tuple[Any, Any, Any, A
 g_remaining_refs: List[Tuple[BIHostSpec, Any, Any]] = []
 # dictionary with hosts and its compiled services
 g_compiled_services_leafes: Dict[BIHostSpec, Set[ServiceName]] = {}
+# The hosts, host names and host matchers (host spec, required tags, honor site) the
+# currently compiled aggregation depends on. A change of one of these hosts or a changed
+# host which has one of these names or matches one of these matchers requires a
+# recompilation of the aggregation.
+g_dependent_hosts: Set[BIHostSpec] = set()
+g_dependent_host_names: Set[HostName] = set()
+g_dependent_host_matchers: Set[Tuple[Any, Tuple[str, ...], bool]] = set()
 
 g_tree_cache: Dict[str, Any] = {}
 g_config_information = None  # for invalidating cache after config change
@@ -343,14 +352,19 @@ class JobWorker(multiprocessing.Process):
         return bool(self._compilation_finished.value)
 
     def get_compiled_aggregations(self):
-        return self._recv_pipe.recv()
+        # The worker only sends the path of the file containing the compiled data
+        result_filepath = self._recv_pipe.recv()
+        try:
+            return marshal_load_data(result_filepath)
+        finally:
+            os.unlink(result_filepath)
 
     def get_compilation_errors(self):
         return self._recv_error_pipe.recv()
 
     def run(self):
-        new_data = {}
         for job in self._jobs:
+            new_data = {}
             try:
                 start_time = time.time()
                 log("[%s] ###################################### Compiling %r" % (
@@ -373,14 +387,20 @@ class JobWorker(multiprocessing.Process):
 
                 self._compiled_aggr.append((job, new_data))
 
+        # The compiled data is handed over in a file, which is much faster than
+        # pickling large amounts of data through the pipe
+        result_filepath = "%s/bi_cache_worker.%d" % (get_cache_dir(), os.getpid())
+        with open(result_filepath, "wb") as result_file:
+            marshal.dump(self._compiled_aggr, result_file)
+
         # Notify the parent process that there is data to read
         self._compilation_finished.value = 1
 
-        log("[%s] Send BI data to pipe, size %d" % (
+        log("[%s] Send BI data file to pipe, size %d" % (
             self._parent_pid,
-            len(repr(self._compiled_aggr)),
+            os.stat(result_filepath).st_size,
         ))
-        self._send_pipe.send(self._compiled_aggr)
+        self._send_pipe.send(result_filepath)
         log("[%s] Send ERROR data to pipe, size %d" % (
             self._parent_pid,
             len(repr(self._compilation_errors)),
@@ -397,6 +417,12 @@ class JobWorker(multiprocessing.Process):
         global g_services
         global g_services_items
         global g_services_by_hostname
+        global g_dependent_hosts
+        global g_dependent_host_names
+        global g_dependent_host_matchers
+        g_dependent_hosts = set()
+        g_dependent_host_names = set()
+        g_dependent_host_matchers = set()
 
         # Prepare service globals for this job
         if aggr_type == AGGR_MULTI:
@@ -527,6 +553,10 @@ class JobWorker(multiprocessing.Process):
                         group,
                         aggr_hash,
                     ))
+
+        new_data["dependent_hosts"] = g_dependent_hosts
+        new_data["dependent_host_names"] = g_dependent_host_names
+        new_data["dependent_host_matchers"] = g_dependent_host_matchers
         return new_data
 
 
@@ -599,7 +629,12 @@ def marshal_save_data(filepath, data):
 
 def marshal_load_data(filepath):
     with open(filepath, "rb") as f:
-        return marshal.load(f)
+        try:
+            mapped_file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files can not be mapped
+            raise EOFError("EOF read where object expected")
+        with mapped_file:
+            return marshal.loads(mapped_file)
 
 
 # This class allows you to load and save python data
@@ -1022,9 +1057,16 @@ class BIJobManager:
                 g_bi_cache_manager.load_cachefile()
                 return
 
-            log("Do compilation, discarding old caches")
-            self._queued_jobs = self._get_all_jobs()
-            self._prepare_compilation(discard_old_cache=True)
+            services = g_bi_sitedata_manager.get_data()["services"]
+            if g_bi_cache_manager.update_compiled_data(current_sitestats, services):
+                log("Do incremental compilation, keeping unaffected aggregations")
+                self._queued_jobs = self._get_missing_jobs_after_update()
+                self._prepare_compilation()
+            else:
+                log("Do compilation, discarding old caches")
+                self._queued_jobs = self._get_all_jobs()
+                self._prepare_compilation(discard_old_cache=True)
+                g_bi_cache_manager.set_host_digests(services)
             self._set_compilation_info(current_sitestats)
 
             error_info = ""
@@ -1076,6 +1118,15 @@ class BIJobManager:
 
         return jobs
 
+    def _get_missing_jobs_after_update(self) -> List[Dict[str, Any]]:
+        if g_bi_sitedata_manager is None:
+            raise Exception("_get_missing_jobs_after_update: g_bi_sitedata_manager is None")
+        all_hosts = g_bi_sitedata_manager.get_all_hosts()
+        return [{
+            "id": aggr_id,
+            "info": info
+        } for aggr_id, info in self.get_missing_jobs(None, None, all_hosts).items()]
+
     # Returns True if compilation was done
     def compile_all_jobs(self):
         return self._compile_jobs_parallel()
@@ -1089,12 +1140,63 @@ class BIJobManager:
         return self._compilation_info
 
 
+# Number of shards the single host aggregations are distributed over
+BI_CACHE_HOST_SHARDS = 256
+
+
+# Read-only view of one of the reference indices of the compiled trees
+# (e.g. "affected_services_ref"). The indices only contain the hashes of the
+# aggregations, which are resolved to the trees when a key is accessed. This
+# only loads the cache shards containing the requested aggregations, looking
+# up keys ("in") does not load any shard at all.
+class BIAggregationRefs(Mapping):
+    def __init__(self, refs: Dict[Any, List[Any]], get_aggregation: Callable[[str], Any]) -> None:
+        super(BIAggregationRefs, self).__init__()
+        self._refs = refs
+        self._get_aggregation = get_aggregation
+
+    def __getitem__(self, key):
+        resolved = []
+        for ref in self._refs[key]:
+            # The forest only contains the hashes, all others (group, hash) pairs
+            if isinstance(ref, tuple):
+                aggr = self._get_aggregation(ref[1])
+                if aggr is not None:
+                    resolved.append((ref[0], aggr))
+            else:
+                aggr = self._get_aggregation(ref)
+                if aggr is not None:
+                    resolved.append(aggr)
+        return resolved
+
+    def __contains__(self, key):
+        return key in self._refs
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._refs)
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+
+# The compiled trees are stored in several files:
+# - bi_cache_index_info:  Info about the compiled trees (small file)
+# - bi_cache_index:       The index of the compiled trees. It contains the hashes of
+#                         the aggregations by group, host and service and the name of
+#                         the shard of each aggregation, but no trees.
+# - bi_cache_shard.*:     The trees. Aggregations of a single host are sharded by the
+#                         name of the host, all others by aggregation group.
+# The shards are loaded when the aggregations are accessed, so a page which shows
+# the aggregations of one host only needs to load a single shard. The files of the
+# former unsharded cache (bi_cache, bi_cache_info) are not used anymore.
 class BICacheManager:
     def __init__(self):
-        # Contains compiled trees
-        self._bicache_file = BICacheFile(filepath="%s/bi_cache" % get_cache_dir())
+        # Contains the index of the compiled trees
+        self._bicache_file = BICacheFile(filepath="%s/bi_cache_index" % get_cache_dir())
         # Contains info about compiled trees (small file)
         self._bicacheinfo_file = BICacheFile(filepath="%s_info" % self._bicache_file.get_filepath())
+        # Contains the compiled trees, by shard name
+        self._shard_files: Dict[str, BICacheFile] = {}
         self.reset_cached_data()
 
         super(BICacheManager, self).__init__()
@@ -1109,9 +1211,11 @@ class BICacheManager:
             "affected_services": {},
             "compiled_host_aggr": {},
             "compiled_multi_aggr": {},
+            "host_digests": {},
 
             # Parameters to slim the cache file
             "aggr_ref": {},
+            "aggr_shards": {},
             "forest_ref": {},
             "aggregations_by_hostname_ref": {},
             "host_aggregations_ref": {},
@@ -1119,12 +1223,62 @@ class BICacheManager:
             "affected_services_ref": {},
         }
 
+    @staticmethod
+    def _get_shard_name(group, aggr):
+        req_hosts = aggr["reqhosts"]
+        if len(req_hosts) == 1:
+            host_hash = hashlib.md5(ensure_binary(req_hosts[0][1])).hexdigest()
+            return "host.%03d" % (int(host_hash, 16) % BI_CACHE_HOST_SHARDS)
+        return "group.%s" % hashlib.md5(ensure_binary(group)).hexdigest()
+
+    def _get_shard_file(self, shard_name):
+        if shard_name not in self._shard_files:
+            self._shard_files[shard_name] = BICacheFile(filepath="%s/bi_cache_shard.%s" %
+                                                        (get_cache_dir(), shard_name))
+        return self._shard_files[shard_name]
+
+    def _get_shard_names(self):
+        return [
+            filename.split(".", 1)[1]
+            for filename in os.listdir(get_cache_dir())
+            if filename.startswith("bi_cache_shard.")
+        ]
+
+    def get_aggregation(self, aggr_hash):
+        aggr = self._compiled_trees["aggr_ref"].get(aggr_hash)
+        if aggr is not None:
+            return aggr
+
+        shard_name = self._compiled_trees["aggr_shards"].get(aggr_hash)
+        if shard_name is None:
+            return None
+
+        # The shard might have been truncated in the meantime by a new compilation
+        shard = self._get_shard_file(shard_name).load()
+        return shard.get(aggr_hash) if shard else None
+
+    def _link_aggregations(self):
+        for what in [
+                "forest",
+                "aggregations_by_hostname",
+                "host_aggregations",
+                "affected_hosts",
+                "affected_services",
+        ]:
+            self._compiled_trees[what] = BIAggregationRefs(self._compiled_trees["%s_ref" % what],
+                                                           self.get_aggregation)
+
     # Resets everything the class knows of
     def reset_cached_data(self):
         # The actual compiled data
         self._compiled_trees = BICacheManager.empty_compiled_tree()
+        self._link_aggregations()
+        # Shards containing aggregations which have not been saved yet
+        self._dirty_shards: Set[str] = set()
         self._bicache_file.clear_cache()
         self._bicacheinfo_file.clear_cache()
+        for shard_file in self._shard_files.values():
+            shard_file.clear_cache()
 
     # Clears just the cachefile cached data if it is no longer required (e.g. fully compiled)
     def discard_cachefile_data(self):
@@ -1137,6 +1291,8 @@ class BICacheManager:
     def truncate_cachefiles(self):
         self._bicache_file.truncate()
         self._bicacheinfo_file.truncate()
+        for shard_name in self._get_shard_names():
+            self._get_shard_file(shard_name).truncate()
 
     def get_online_sites(self):
         cacheinfo_content = self.get_bicacheinfo()
@@ -1188,36 +1344,12 @@ class BICacheManager:
             log("Cachefile has no new data - Sitestats also valid")
             return True
 
-        def reinstiate_references(cachefile_content):
-            self._compiled_trees = cachefile_content
-            self._compiled_trees["forest"] = {}
-
-            for what in [
-                    "aggregations_by_hostname",
-                    "host_aggregations",
-                    "affected_hosts",
-                    "affected_services",
-            ]:
-                self._compiled_trees[what] = {}
-                for key, values in self._compiled_trees["%s_ref" % what].items():
-                    self._compiled_trees[what].setdefault(key, [])
-                    for value in values:
-                        new_value = value
-                        if isinstance(value[1], str):  # a reference
-                            new_value = self._compiled_trees["aggr_ref"][value[1]]
-                        self._compiled_trees[what][key].append((value[0], new_value))
-
-            for key, values in self._compiled_trees["forest_ref"].items():
-                self._compiled_trees["forest"][key] = []
-                for aggr in values:
-                    new_value = aggr
-                    if isinstance(aggr, str):
-                        new_value = self._compiled_trees["aggr_ref"][aggr]
-                    self._compiled_trees["forest"][key].append(new_value)
-
         cachefile_content = self._bicache_file.load()
         if cachefile_content:
-            reinstiate_references(cachefile_content)
+            # The trees are not part of the index, they are loaded from the shards on demand
+            self._compiled_trees = cachefile_content
+            self._compiled_trees["aggr_ref"] = {}
+            self._link_aggregations()
 
         return True
 
@@ -1263,7 +1395,7 @@ class BICacheManager:
 
     def _save_cachefile(self):
         keys_for_cachefile = [
-            "aggr_ref",
+            "aggr_shards",
             "forest_ref",
             "aggregations_by_hostname_ref",
             "host_aggregations_ref",
@@ -1272,58 +1404,222 @@ class BICacheManager:
             "compiled_host_aggr",
             "compiled_multi_aggr",
             "compiled_all",
+            "host_digests",
         ]
         cache_to_dump = {}
         for what in keys_for_cachefile:
             cache_to_dump[what] = self._compiled_trees.get(what)
 
         start_time = time.time()
+        # Save the shards first, the index must not refer to unknown aggregations. The
+        # aggregations which have not been compiled by this process are taken from the shard.
+        shards: Dict[str, Dict[str, Any]] = {name: {} for name in self._dirty_shards}
+        for aggr_hash, shard_name in self._compiled_trees["aggr_shards"].items():
+            if shard_name in shards:
+                aggr = self.get_aggregation(aggr_hash)
+                if aggr is not None:
+                    shards[shard_name][aggr_hash] = aggr
+        for shard_name, shard in shards.items():
+            self._get_shard_file(shard_name).save(shard)
+        self._dirty_shards.clear()
+
         self._bicache_file.save(cache_to_dump)
-        log("SAVED CACHEFILE, took %.4f sec" % (time.time() - start_time))
+        log("SAVED CACHEFILE (%d shards), took %.4f sec" % (len(shards), time.time() - start_time))
 
     def get_compiled_all(self):
         info = self.get_compiled_trees()
         return info.get('compiled_all', False) if info else False
 
     def _merge_compiled_data(self, job, new_data):
-        # Rendering related parameters
+        # Rendering related parameters. The resolved data (e.g. "forest") is linked to these references
         for what in [
                 "affected_hosts",
                 "aggregations_by_hostname",
                 "host_aggregations",
                 "affected_services",
+                "forest",
         ]:
             for key, ref_values in new_data.get("%s_ref" % what, {}).items():
                 self._compiled_trees["%s_ref" % what].setdefault(key, []).extend(ref_values)
 
-                self._compiled_trees[what].setdefault(key, [])
-                for ref_value in ref_values:
-                    ident, ref_value = ref_value
-                    linked_aggr = new_data["aggr_ref"][ref_value]
-                    self._compiled_trees[what][key].append((ident, linked_aggr))
-
-        for key, ref_values in new_data.get("forest_ref", {}).items():
-            self._compiled_trees["forest_ref"].setdefault(key, []).extend(ref_values)
-
-            for ref_value in ref_values:
-                linked_aggr = new_data["aggr_ref"][ref_value]
-                self._compiled_trees["forest"].setdefault(key, []).append(linked_aggr)
-
         # Rendering related parameters
         self._compiled_trees["aggr_ref"].update(new_data.get("aggr_ref", {}))
+        for group, ref_values in new_data.get("forest_ref", {}).items():
+            for ref_value in ref_values:
+                if ref_value in self._compiled_trees["aggr_shards"]:
+                    continue
+                shard_name = self._get_shard_name(group, new_data["aggr_ref"][ref_value])
+                self._compiled_trees["aggr_shards"][ref_value] = shard_name
+                self._dirty_shards.add(shard_name)
 
         # Cache related parameters
         job_id = job["id"]
         aggr_type, _idx, _aggr_groups = job_id
 
         if aggr_type == AGGR_HOST:
-            self._compiled_trees["compiled_host_aggr"].setdefault(job_id,
-                                                                  {"compiled_hosts": set([])})
-            self._compiled_trees["compiled_host_aggr"][job_id]["compiled_hosts"].update(
-                new_data["compiled_hosts"])
+            # Host aggregations depend on the hosts they contain
+            compiled_host_aggr = self._compiled_trees["compiled_host_aggr"].setdefault(
+                job_id, {"compiled_hosts": set([])})
+            compiled_host_aggr["compiled_hosts"].update(new_data["compiled_hosts"])
+            aggr_hosts = compiled_host_aggr.setdefault("aggr_hosts", {})
+            for aggr_hash, aggr in new_data.get("aggr_ref", {}).items():
+                aggr_hosts[aggr_hash] = aggr["reqhosts"]
         else:
-            self._compiled_trees["compiled_multi_aggr"].setdefault(job_id, {})
-            self._compiled_trees["compiled_multi_aggr"][job_id]["compiled"] = True
+            # Multi host aggregations depend on the hosts they contain and all hosts which
+            # match the host specifications of their rules
+            self._compiled_trees["compiled_multi_aggr"][job_id] = {
+                "compiled": True,
+                "aggrs": set(new_data.get("aggr_ref", {})),
+                "dependent_hosts": new_data.get("dependent_hosts"),
+                "dependent_host_names": new_data.get("dependent_host_names"),
+                "dependent_host_matchers": new_data.get("dependent_host_matchers"),
+            }
+
+    def set_host_digests(self, services):
+        self._compiled_trees["host_digests"] = get_host_digests(services)
+
+    def _read_cachefile(self, bicache_file):
+        # Reads the file without touching the cached data of the file
+        filepath = bicache_file.get_filepath()
+        with BILock(filepath, shared=True):
+            try:
+                return marshal_load_data(filepath)
+            except (OSError, EOFError):
+                return None
+
+    def update_compiled_data(self, new_sitestats, services):
+        """Removes the compiled aggregations which are affected by changed hosts
+
+        This is only possible when the BI configuration has not been changed since
+        the last compilation. The hosts are compared with the hosts of the last
+        compilation. The aggregations which depend on changed, new or removed hosts
+        are removed, all other aggregations are kept. Returns True when the compiled
+        data has been updated, the missing jobs have to be compiled afterwards."""
+        old_sitestats = self._read_cachefile(self._bicacheinfo_file)
+        if not old_sitestats or old_sitestats["timestamps"] != new_sitestats["timestamps"]:
+            log("No incremental compilation: Configuration has changed")
+            return False
+
+        cachefile_content = self._read_cachefile(self._bicache_file)
+        if not cachefile_content or not cachefile_content.get("host_digests"):
+            log("No incremental compilation: No compiled data available")
+            return False
+
+        self.reset_cached_data()
+        self._compiled_trees = cachefile_content
+        self._compiled_trees["aggr_ref"] = {}
+        self._link_aggregations()
+
+        host_digests = get_host_digests(services)
+        old_host_digests = self._compiled_trees["host_digests"]
+        changed_hosts = {
+            host for host in set(host_digests).union(old_host_digests)
+            if host_digests.get(host) != old_host_digests.get(host)
+        }
+        log("Incremental compilation: %d changed hosts" % len(changed_hosts))
+
+        outdated_aggrs = self._remove_outdated_multi_aggr(changed_hosts, services)
+        outdated_aggrs.update(self._remove_outdated_host_aggr(changed_hosts))
+        self._remove_aggregations(outdated_aggrs)
+
+        self._compiled_trees["host_digests"] = host_digests
+        self._compiled_trees["compiled_all"] = False
+
+        # The compiled sites are determined from scratch with the next compilation info
+        self._bicacheinfo_file.truncate()
+        return True
+
+    def _remove_outdated_multi_aggr(self, changed_hosts, services):
+        outdated_aggrs: Set[str] = set()
+        compiled_multi_aggr = self._compiled_trees["compiled_multi_aggr"]
+        for job_id, compile_info in list(compiled_multi_aggr.items()):
+            if self._is_multi_aggr_outdated(compile_info, changed_hosts, services):
+                log("Recompile aggregation %r" % (job_id,))
+                outdated_aggrs.update(compile_info.get("aggrs", []))
+                del compiled_multi_aggr[job_id]
+        return outdated_aggrs
+
+    def _is_multi_aggr_outdated(self, compile_info, changed_hosts, services):
+        dependent_hosts = compile_info.get("dependent_hosts")
+        dependent_host_names = compile_info.get("dependent_host_names")
+        matchers = compile_info.get("dependent_host_matchers")
+        if dependent_hosts is None or dependent_host_names is None or matchers is None:
+            return True  # Unknown dependencies, e.g. after a compilation error
+
+        if changed_hosts.intersection(dependent_hosts):
+            return True
+
+        if any(hostname in dependent_host_names for _site, hostname in changed_hosts):
+            return True
+
+        # New hosts or hosts with changed tags, aliases, ... may match now
+        for host in changed_hosts:
+            if host in services and any(
+                    host_matches_dependency(matcher, host, services[host]) for matcher in matchers):
+                return True
+        return False
+
+    def _remove_outdated_host_aggr(self, changed_hosts):
+        outdated_aggrs: Set[str] = set()
+        for compile_info in self._compiled_trees["compiled_host_aggr"].values():
+            aggr_hosts = compile_info.get("aggr_hosts", {})
+            # The hosts of cluster aggregations need to be recompiled together
+            uncompiled_hosts = set(changed_hosts)
+            while True:
+                outdated = [
+                    aggr_hash for aggr_hash, reqhosts in aggr_hosts.items()
+                    if uncompiled_hosts.intersection(reqhosts)
+                ]
+                if not outdated:
+                    break
+                for aggr_hash in outdated:
+                    uncompiled_hosts.update(aggr_hosts.pop(aggr_hash))
+                outdated_aggrs.update(outdated)
+            compile_info["compiled_hosts"] -= uncompiled_hosts
+        return outdated_aggrs
+
+    def _remove_aggregations(self, aggr_hashes):
+        if not aggr_hashes:
+            return
+
+        for what in [
+                "forest",
+                "aggregations_by_hostname",
+                "host_aggregations",
+                "affected_hosts",
+                "affected_services",
+        ]:
+            refs = self._compiled_trees["%s_ref" % what]
+            for key, values in list(refs.items()):
+                # The forest only contains the hashes, all others (group, hash) pairs
+                kept_values = [
+                    value for value in values
+                    if (value[1] if isinstance(value, tuple) else value) not in aggr_hashes
+                ]
+                if not kept_values:
+                    del refs[key]
+                elif len(kept_values) != len(values):
+                    refs[key] = kept_values
+
+        for aggr_hash in aggr_hashes:
+            self._compiled_trees["aggr_ref"].pop(aggr_hash, None)
+            shard_name = self._compiled_trees["aggr_shards"].pop(aggr_hash, None)
+            if shard_name is not None:
+                self._dirty_shards.add(shard_name)
+
+
+def get_host_digests(services):
+    return {
+        host: hashlib.md5(ensure_binary(repr(entry))).hexdigest()
+        for host, entry in services.items()
+    }
+
+
+def host_matches_dependency(matcher, host, entry):
+    host_spec, required_tags, honor_site = matcher
+    site, hostname = host
+    tags, _services, _childs, _parents, alias = entry
+    return match_host(hostname, alias, host_spec, tags, required_tags, site, honor_site) is not None
 
 
 def get_enabled_aggregations():
@@ -1419,11 +1715,13 @@ def api_get_aggregation_state(filter_names=None, filter_groups=None):
     required_trees: Set[BIAggregationTitle] = set()
     tree_lookup: Dict[BIAggregationTitle, Any] = {}
 
-    for group, trees in g_tree_cache["forest"].items():
+    # Only load the aggregations which are requested
+    forest = get_forest_by_titles(filter_names) if filter_names else g_tree_cache["forest"]
+    for group in forest:
         if filter_groups and group not in filter_groups:
             continue
 
-        for tree in iter(trees):
+        for tree in forest[group]:
             if not is_tree_required(tree):
                 continue
             required_hosts.update(tree.get("reqhosts"))
@@ -1451,6 +1749,22 @@ def api_get_aggregation_state(filter_names=None, filter_groups=None):
     return response
 
 
+def get_forest_by_titles(titles):
+    """Returns the compiled aggregations with the given titles by aggregation group
+
+    The aggregations are looked up by the last word of their title, which is indexed in
+    "aggregations_by_hostname". This way only the trees of these aggregations are loaded."""
+    forest: Dict[str, List[Any]] = {}
+    for title in set(titles):
+        words = title.split()
+        if not words:
+            continue
+        for group, aggr in g_tree_cache["aggregations_by_hostname"].get(words[-1], []):
+            if aggr["title"] == title:
+                forest.setdefault(group, []).append(aggr)
+    return forest
+
+
 def compile_forest(only_hosts=None, only_groups=None):
     migrate_bi_configuration()
 
@@ -1634,10 +1948,12 @@ def find_matching_services(aggr_type, what, calllist):
 
     matches = set([])
 
+    dependent_host_spec = host_spec
     if isinstance(host_spec, tuple):
         host_spec, honor_site, entries = get_services_filtered_by_host_alias(host_spec)
     else:
         host_spec, honor_site, entries = get_services_filtered_by_host_name(host_spec)
+    g_dependent_host_matchers.add((dependent_host_spec, tuple(required_tags), honor_site))
 
     # TODO: Hier könnte man - wenn der Host bekannt ist, effektiver arbeiten, als komplett alles durchzugehen.
     for (site, hostname), (tags, services, childs, parents, alias) in entries:
@@ -1648,11 +1964,13 @@ def find_matching_services(aggr_type, what, calllist):
         host_matches = match_host(hostname, alias, host_spec, tags, required_tags, site, honor_site)
         list_of_matches = []
         if host_matches is not None:
+            g_dependent_hosts.add((site, hostname))
             if what == config.FOREACH_CHILD:
                 list_of_matches = [host_matches + (child_name,) for child_name in childs]
 
             elif what == config.FOREACH_CHILD_WITH:
                 for child_name in childs:
+                    g_dependent_hosts.add((g_services_by_hostname[child_name][0][0], child_name))
                     child_tags = g_services_by_hostname[child_name][0][1][0]
                     child_alias = g_services_by_hostname[child_name][0][1][4]
                     child_matches = match_host(child_name, child_alias, child_spec, child_tags,
@@ -2080,9 +2398,11 @@ def compile_leaf_node(host_re, service_re=config.HOST_STATE):
     honor_site = SITE_SEP in host_re
     if not honor_site and '*' not in host_re and '$' not in host_re and '|' not in host_re and '[' not in host_re:
         # Exact host match
+        g_dependent_host_names.add(host_re)
         entries = [((e[0], host_re), e[1]) for e in g_services_by_hostname.get(host_re, [])]
 
     else:
+        g_dependent_host_matchers.add((host_re, (), honor_site))
         if g_services_items:
             entries = g_services_items
         else:
@@ -2118,6 +2438,7 @@ def compile_leaf_node(host_re, service_re=config.HOST_STATE):
                 regex_host_miss_cache.add(cache_id)
                 continue
 
+        g_dependent_hosts.add((site, hostname))
         if service_re == config.HOST_STATE:
             found.append({
                 "type": NT_LEAF,
@@ -3323,8 +3644,16 @@ def table(view, columns, query, only_sites, limit, all_active_filters):
                 entries.append(aggr)
                 by_groups[group] = entries
             items = by_groups
+    elif only_aggr_name:
+        items = get_forest_by_titles([only_aggr_name])
     else:
-        items = g_tree_cache["forest"]
+        # Only load the trees of the requested groups
+        forest = g_tree_cache["forest"]
+        items = {
+            group: forest[group]
+            for group in forest
+            if only_group in [None, group] and (not group_prefix or group.startswith(group_prefix))
+        }
 
     online_sites = {x[0] for x in get_current_sitestats()["online_sites"]}
 
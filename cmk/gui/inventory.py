@@ -10,7 +10,8 @@ import os
 import shutil
 import time
 import xml.dom.minidom  # type: ignore[import]
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
 from pathlib import Path
 
 import dicttoxml  # type: ignore[import]
@@ -108,16 +109,31 @@ def load_filtered_inventory_tree(hostname: Optional[HostName]) -> Optional[Struc
     return _filter_tree(_load_inventory_tree(hostname))
 
 
-def load_filtered_and_merged_tree(row):
+def load_filtered_and_merged_tree(
+        row: Dict[str, Any],
+        paths: Optional[List[str]] = None,
+        index: Optional["InventoryIndex"] = None) -> Optional[StructuredDataTree]:
     """Load inventory tree from file, status data tree from row,
-    merge these trees and returns the filtered tree"""
-    inventory_tree = _load_inventory_tree(row.get("host_name"))
-    status_data_tree = _create_tree_from_raw_tree(row.get("host_structured_status"))
+    merge these trees and returns the filtered tree
+
+    In case paths are given, only these inventory paths are contained in the tree. The
+    index is used to get the values of these paths if possible, see get_inventory_index()."""
+    inventory_tree = _load_inventory_tree(row.get("host_name"), paths, index)
+    status_data_tree = _create_tree_from_raw_tree(row.get("host_structured_status"), paths)
 
     merged_tree = _merge_inventory_and_status_data_tree(inventory_tree, status_data_tree)
     return _filter_tree(merged_tree)
 
 
+def get_inventory_index(paths: Optional[List[str]]) -> Optional["InventoryIndex"]:
+    """Returns the index of the given paths in case they can all be indexed
+
+    Only single attributes, like ".hardware.cpu.cores", are indexed."""
+    if not paths or not all(_is_indexed_path(path) for path in paths):
+        return None
+    return InventoryIndex(paths)
+
+
 def get_status_data_via_livestatus(site, hostname):
     query = "GET hosts\nColumns: host_structured_status\nFilter: host_name = %s\n" % livestatus.lqencode(
         hostname)
@@ -270,33 +286,195 @@ class LoadStructuredDataError(MKException):
     pass
 
 
-def _load_inventory_tree(hostname: Optional[HostName]) -> Optional[StructuredDataTree]:
-    """Load data of a host, cache it in the current HTTP request"""
+# The inventory trees of the most recently used hosts are shared by all requests handled by
+# this process. The trees are read again once the inventory files have changed.
+_MAX_CACHED_INVENTORY_TREES = 500
+_FileKey = Tuple[int, int]
+_inventory_tree_cache: "OrderedDict[HostName, Tuple[_FileKey, Dict]]" = OrderedDict()
+
+
+def _load_inventory_tree(hostname: Optional[HostName],
+                         paths: Optional[List[str]] = None,
+                         index: Optional["InventoryIndex"] = None) -> Optional[StructuredDataTree]:
+    """Load data of a host, only the given paths of the tree in case paths are given"""
     if not hostname:
         return None
 
-    inventory_tree_cache = g.setdefault("inventory", {})
-    if hostname in inventory_tree_cache:
-        inventory_tree = inventory_tree_cache[hostname]
-    else:
-        if '/' in hostname:
-            # just for security reasons
-            return None
-        cache_path = "%s/inventory/%s" % (cmk.utils.paths.var_dir, hostname)
+    if '/' in hostname:
+        # just for security reasons
+        return None
+
+    file_key = _inventory_file_key(hostname)
+    if file_key is None:
+        return StructuredDataTree()
+
+    raw_tree = None if index is None else index.get_raw_tree(hostname, file_key)
+    if raw_tree is None:
+        raw_tree = _project_raw_tree(_load_raw_inventory_tree(hostname, file_key), paths)
+        if index is not None:
+            index.update(hostname, file_key, raw_tree)
+    return StructuredDataTree().create_tree_from_raw_tree(raw_tree)
+
+
+def _inventory_file_key(hostname: HostName) -> Optional[_FileKey]:
+    try:
+        stat = os.stat(os.path.join(cmk.utils.paths.inventory_output_dir, hostname))
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _load_raw_inventory_tree(hostname: HostName, file_key: _FileKey) -> Dict:
+    """Returns the raw inventory tree of the host which must not be modified"""
+    cached = _inventory_tree_cache.get(hostname)
+    if cached is not None and cached[0] == file_key:
+        _inventory_tree_cache.move_to_end(hostname)
+        return cached[1]
+
+    path = os.path.join(cmk.utils.paths.inventory_output_dir, hostname)
+    try:
+        raw_tree = store.load_object_from_file(path, default={})
+    except Exception as e:
+        if config.debug:
+            html.show_warning("%s" % e)
+        raise LoadStructuredDataError()
+
+    _inventory_tree_cache[hostname] = (file_key, raw_tree)
+    _inventory_tree_cache.move_to_end(hostname)
+    while len(_inventory_tree_cache) > _MAX_CACHED_INVENTORY_TREES:
+        _inventory_tree_cache.popitem(last=False)
+    return raw_tree
+
+
+def _project_raw_tree(raw_tree: Dict, paths: Optional[List[str]]) -> Dict:
+    """Copy the parts of a raw tree which are needed for the given paths
+
+    Tables and nested tables are always copied completely."""
+    if paths is None:
+        return _copy_raw_tree(raw_tree)
+
+    projected: Dict = {}
+    for path in paths:
+        parsed_path, attribute_keys = parse_tree_path(path)
+        source: Dict = raw_tree
+        target = projected
+        while parsed_path and isinstance(source.get(parsed_path[0]), dict):
+            edge = parsed_path.pop(0)
+            source = source[edge]
+            target = target.setdefault(edge, {})
+
+        if parsed_path:
+            if parsed_path[0] in source:
+                target[parsed_path[0]] = _copy_raw_tree(source[parsed_path[0]])
+        elif attribute_keys:
+            if attribute_keys[-1] in source:
+                target[attribute_keys[-1]] = _copy_raw_tree(source[attribute_keys[-1]])
+        else:
+            target.update(_copy_raw_tree(source))
+    return projected
+
+
+def _copy_raw_tree(raw_tree: Any) -> Any:
+    # Merging the status data modifies the nodes of the tree, copy them but not the values
+    if isinstance(raw_tree, dict):
+        return {edge: _copy_raw_tree(value) for edge, value in raw_tree.items()}
+    if isinstance(raw_tree, list):
+        return [_copy_raw_tree(entry) for entry in raw_tree]
+    return raw_tree
+
+
+def _is_indexed_path(path: str) -> bool:
+    # Attributes of tables are not indexed
+    return ":" not in path and bool(parse_tree_path(path)[1])
+
+
+# Index column path -> ((inode, mtime) of the column file, column)
+_index_column_cache: Dict[Path, Tuple[_FileKey, Dict[HostName, Tuple[_FileKey, Any]]]] = {}
+
+
+class InventoryIndex:
+    """Columnar index of single inventory attributes of all hosts
+
+    Each indexed path has a column file in tmp/check_mk/inventory_index which holds the
+    value of the attribute of each host together with the key of the inventory file the
+    value was taken from. Views showing or filtering by some attributes of many hosts get
+    the values from the columns instead of reading the inventory files. The values of hosts
+    with changed inventory files are updated on the fly and saved with save()."""
+    def __init__(self, paths: List[str]) -> None:
+        super(InventoryIndex, self).__init__()
+        self._columns = {path: _load_index_column(path) for path in paths}
+        self._changed_paths: Set[str] = set()
+
+    def get_raw_tree(self, hostname: HostName, file_key: _FileKey) -> Optional[Dict]:
+        """Returns the indexed part of the raw tree, None in case the index is outdated"""
+        raw_tree: Dict = {}
+        for path, column in self._columns.items():
+            entry = column.get(hostname)
+            if entry is None or entry[0] != file_key:
+                return None
+
+            if entry[1] is None:
+                continue
+
+            parsed_path, attribute_keys = parse_tree_path(path)
+            node = raw_tree
+            for edge in parsed_path:
+                node = node.setdefault(edge, {})
+            node[attribute_keys[-1]] = entry[1]
+        return raw_tree
+
+    def update(self, hostname: HostName, file_key: _FileKey, raw_tree: Dict) -> None:
+        for path, column in self._columns.items():
+            parsed_path, attribute_keys = parse_tree_path(path)
+            node: Any = raw_tree
+            for edge in parsed_path:
+                node = node.get(edge) if isinstance(node, dict) else None
+            value = node.get(attribute_keys[-1]) if isinstance(node, dict) else None
+            column[hostname] = (file_key, value)
+            self._changed_paths.add(path)
+
+    def save(self) -> None:
+        for path in self._changed_paths:
+            column_path = _index_column_path(path)
+            column_path.parent.mkdir(parents=True, exist_ok=True)
+            store.save_object_to_file(column_path, self._columns[path], fast=True)
+            stat = column_path.stat()
+            _index_column_cache[column_path] = ((stat.st_ino, stat.st_mtime_ns),
+                                                self._columns[path])
+        self._changed_paths.clear()
+
+
+def _load_index_column(path: str) -> Dict[HostName, Tuple[_FileKey, Any]]:
+    """Returns a copy of the current column, it is only read again after changes"""
+    column_path = _index_column_path(path)
+    try:
+        stat = column_path.stat()
+    except OSError:
+        return {}
+
+    key = (stat.st_ino, stat.st_mtime_ns)
+    cached = _index_column_cache.get(column_path)
+    if cached is None or cached[0] != key:
         try:
-            inventory_tree = StructuredDataTree().load_from(cache_path)
-        except Exception as e:
-            if config.debug:
-                html.show_warning("%s" % e)
-            raise LoadStructuredDataError()
-        inventory_tree_cache[hostname] = inventory_tree
-    return inventory_tree
+            column = store.load_object_from_file(column_path, default={})
+        except MKGeneralException:
+            # The index is rebuilt from the inventory files
+            column = {}
+        cached = _index_column_cache[column_path] = (key, column)
+    return cached[1].copy()
+
+
+def _index_column_path(path: str) -> Path:
+    return Path(cmk.utils.paths.tmp_dir, "inventory_index", path.strip("."))
 
 
-def _create_tree_from_raw_tree(raw_tree: bytes) -> Optional[StructuredDataTree]:
+def _create_tree_from_raw_tree(raw_tree: bytes,
+                               paths: Optional[List[str]] = None) -> Optional[StructuredDataTree]:
     if raw_tree:
-        return StructuredDataTree().create_tree_from_raw_tree(
-            ast.literal_eval(raw_tree.decode("utf-8")))
+        parsed_raw_tree = ast.literal_eval(raw_tree.decode("utf-8"))
+        if paths is not None:
+            parsed_raw_tree = _project_raw_tree(parsed_raw_tree, paths)
+        return StructuredDataTree().create_tree_from_raw_tree(parsed_raw_tree)
     return None
 
 
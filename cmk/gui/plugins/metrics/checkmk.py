@@ -146,6 +146,12 @@ metric_info["cmk_time_ds"] = {
     "color": "34/a",
 }
 
+metric_info["cmk_time_prediction"] = {
+    "title": _("Time spent waiting for historic metrics of predictions"),
+    "unit": "s",
+    "color": "42/a",
+}
+
 metric_info["log_message_rate"] = {
     "title": _("Log messages"),
     "unit": "1/s",
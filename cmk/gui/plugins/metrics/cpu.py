@@ -418,7 +418,9 @@ graph_info["used_cpu_time"] = {
          _("Total")),
     ],
     "omit_zero_metrics": True,
-    "conflicting_metrics": ["cmk_time_agent", "cmk_time_snmp", "cmk_time_ds"],
+    "conflicting_metrics": [
+        "cmk_time_agent", "cmk_time_snmp", "cmk_time_ds", "cmk_time_prediction"
+    ],
 }
 
 graph_info["cmk_cpu_time_by_phase"] = {
@@ -429,9 +431,10 @@ graph_info["cmk_cpu_time_by_phase"] = {
         ("cmk_time_agent", "stack"),
         ("cmk_time_snmp", "stack"),
         ("cmk_time_ds", "stack"),
+        ("cmk_time_prediction", "stack"),
         ("execution_time", "line"),
     ],
-    "optional_metrics": ["cmk_time_agent", "cmk_time_snmp", "cmk_time_ds"],
+    "optional_metrics": ["cmk_time_agent", "cmk_time_snmp", "cmk_time_ds", "cmk_time_prediction"],
 }
 
 graph_info["cpu_time"] = {
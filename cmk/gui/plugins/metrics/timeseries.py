@@ -6,6 +6,9 @@
 
 import operator
 import functools
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+import numpy as np  # type: ignore[import]
 
 import cmk.utils.version as cmk_version
 from cmk.utils.prediction import TimeSeries
@@ -29,9 +32,10 @@ from cmk.gui.plugins.metrics import stats
 
 def compute_graph_curves(metrics, rrd_data):
     curves = []
+    evaluation = ArrayEvaluation(rrd_data)
     for metric_definition in metrics:
         expression = metric_definition["expression"]
-        time_series = evaluate_time_series_expression(expression, rrd_data)
+        time_series = evaluation.to_values(evaluation.evaluate(expression))
         if len(time_series) == 1 and isinstance(time_series[0], tuple):
             time_series = time_series[0][3]
 
@@ -205,3 +209,221 @@ def time_series_operators():
         "AVERAGE": (_("Average"), time_series_operator_average),
         "MERGE": ("First non None", lambda x: next(iter(clean_time_series_point(x)))),
     }
+
+
+#.
+#   .--Arrays--------------------------------------------------------------.
+#   |                     _                                                |
+#   |                    / \   _ __ _ __ __ _ _   _ ___                    |
+#   |                   / _ \ | '__| '__/ _` | | | / __|                   |
+#   |                  / ___ \| |  | | | (_| | |_| \__ \                   |
+#   |                 /_/   \_\_|  |_|  \__,_|\__, |___/                   |
+#   |                                         |___/                        |
+#   +----------------------------------------------------------------------+
+#   |  Evaluate the expressions with NumPy arrays instead of lists. The    |
+#   |  operators work on all points at once, NaN stands for None.          |
+#   '----------------------------------------------------------------------'
+
+# The evaluated operands of an operator as rows of a 2D array -> The result
+ArrayOperator = Callable[[Any], Any]
+# An array or, for combined metrics, a list of (line type, color, title, array) tuples
+ArrayResult = Union[Any, List[Tuple[str, str, str, Any]]]
+
+
+class ArrayEvaluation:
+    """Evaluates the expressions of the metrics of a graph like
+    evaluate_time_series_expression()
+
+    The RRD data is converted to arrays once per graph, no matter how many expressions
+    use it. Use to_values() to get the curve data in the format of
+    evaluate_time_series_expression()."""
+    def __init__(self, rrd_data: Dict[Any, Any]) -> None:
+        super().__init__()
+        self._rrd_data = rrd_data
+        if rrd_data:
+            self._num_points = len(next(iter(rrd_data.values())))
+        else:
+            self._num_points = 1
+        self._arrays: Dict[Tuple, Any] = {}
+        # The RRD data of the arrays by the id() of the arrays
+        self._rrd_time_series: Dict[int, Any] = {}
+
+    def evaluate(self, expression: Tuple) -> ArrayResult:
+        if expression[0] == "operator":
+            operator_id, operands = expression[1:]
+            return time_series_math_array(operator_id,
+                                          [self.evaluate(operand) for operand in operands])
+
+        if expression[0] == "transformation":
+            (transform, conf), operands = expression[1:]
+            operands_evaluated = self.evaluate(operands[0])
+            if transform == "percentile":
+                return time_series_operator_perc_array(operands_evaluated, conf)
+
+            if transform == "filter_top":
+                if not isinstance(operands_evaluated, list):
+                    return operands_evaluated
+                return operands_evaluated[:conf["amount"]]
+
+            if transform == "value_sort":
+                if not isinstance(operands_evaluated, list):
+                    return operands_evaluated
+                return _value_sort_array(operands_evaluated, conf)
+
+            if transform == "forecast":
+                if cmk_version.is_raw_edition():
+                    raise MKGeneralException(
+                        _("Forecast calculations are only available with the "
+                          "Checkmk Enterprise Editions"))
+                # Suppression is needed to silence pylint in CRE environment
+                from cmk.gui.cee.plugins.metrics.forecasts import time_series_transform_forecast  # pylint: disable=no-name-in-module
+                return _to_result(
+                    time_series_transform_forecast(
+                        TimeSeries(self.to_values(operands_evaluated), self._rrd_data['__range']),
+                        conf))
+
+        if expression[0] == "rrd":
+            key = tuple(expression[1:])
+            if key not in self._rrd_data:
+                return np.full(self._num_points, np.nan)
+            array = self._arrays.get(key)
+            if array is None:
+                array = self._arrays[key] = _to_array(self._rrd_data[key])
+                self._rrd_time_series[id(array)] = self._rrd_data[key]
+            return array
+
+        if expression[0] == "constant":
+            return np.full(self._num_points, expression[1], dtype=float)
+
+        if expression[0] == "combined" and not cmk_version.is_raw_edition():
+            # Suppression is needed to silence pylint in CRE environment
+            from cmk.gui.cee.plugins.metrics.graphs import resolve_combined_single_metric_spec  # pylint: disable=no-name-in-module
+            metrics = resolve_combined_single_metric_spec(expression[1])
+
+            return [(m["line_type"], m["color"], m['title'], self.evaluate(m['expression']))
+                    for m in metrics]
+
+        raise NotImplementedError()
+
+    def to_values(self, result: ArrayResult) -> Any:
+        """Convert the result of evaluate() to lists with None for missing values
+
+        The RRD data is returned as it is, like evaluate_time_series_expression() does."""
+        if isinstance(result, list):
+            return [
+                (line, color, title, self.to_values(array)) for line, color, title, array in result
+            ]
+
+        time_series = self._rrd_time_series.get(id(result))
+        if time_series is not None:
+            return time_series
+        return _to_values(result)
+
+
+def time_series_math_array(operator_id: str, operands_evaluated: List[Any]) -> Any:
+    if operator_id not in _ARRAY_OPERATORS:
+        raise MKGeneralException(
+            _("Undefined operator '%s' in graph expression") %
+            escaping.escape_attribute(operator_id))
+
+    # Like zip(): The shortest operand determines the number of points
+    num_points = min((len(operand) for operand in operands_evaluated), default=0)
+    if not num_points:
+        return np.array([], dtype=float)
+    stacked = np.stack([operand[:num_points] for operand in operands_evaluated])
+
+    with np.errstate(all="ignore"):
+        return _ARRAY_OPERATORS[operator_id](stacked)
+
+
+def _array_sum(stacked):
+    result = np.nansum(stacked, axis=0)
+    result[np.isnan(stacked).all(axis=0)] = np.nan
+    return result
+
+
+def _array_fraction(stacked):
+    result = stacked[0] / stacked[1]
+    result[stacked[1] == 0] = np.nan
+    return result
+
+
+def _array_average(stacked):
+    valid = ~np.isnan(stacked)
+    return np.where(valid, stacked, 0).sum(axis=0) / valid.sum(axis=0)
+
+
+def _array_merge(stacked):
+    """Take the value of the first operand which is not NaN"""
+    first_valid = np.argmax(~np.isnan(stacked), axis=0)
+    return stacked[first_valid, np.arange(stacked.shape[1])]
+
+
+# Keep these in sync with time_series_operators()
+_ARRAY_OPERATORS: Dict[str, ArrayOperator] = {
+    "+": _array_sum,
+    "*": lambda stacked: np.prod(stacked, axis=0),
+    "-": lambda stacked: stacked[0] - stacked[1],
+    "/": _array_fraction,
+    "MAX": lambda stacked: np.fmax.reduce(stacked, axis=0),
+    "MIN": lambda stacked: np.fmin.reduce(stacked, axis=0),
+    "AVERAGE": _array_average,
+    "MERGE": _array_merge,
+}
+
+
+def time_series_operator_perc_array(array, percentile):
+    """Same as time_series_operator_perc() including the interpolation of
+    stats.percentile()"""
+    ordered = np.sort(array[~np.isnan(array)])
+    if not len(ordered):
+        return np.full(len(array), np.nan)
+
+    target_index = percentile / 100.0 * len(ordered) - 0.5
+    index_f = max(0, int(np.floor(target_index)))
+    index_c = int(np.ceil(target_index))
+    if target_index < 0 or index_f == index_c or index_c > len(ordered) - 1:
+        perc = ordered[index_f]
+    else:
+        perc = (ordered[index_f] + ordered[index_c]) / 2.0
+    return np.full(len(array), perc)
+
+
+def _value_sort_array(operands_evaluated, conf):
+    aggr_func = {
+        "min": np.min,
+        "max": np.max,
+        "average": np.mean,
+    }[conf['aggregation']]
+
+    def sort_key(metric):
+        array = metric[3]
+        values = array[~np.isnan(array)]
+        return float(aggr_func(values)) if len(values) else 0.0
+
+    orderlist = sorted(operands_evaluated, key=sort_key, reverse=conf["reverse"])
+
+    # fix multi-line stack line styling
+    if orderlist[0][0] == 'stack':
+        line_types = ['area'] + ['stack'] * (len(orderlist) - 1)
+        orderlist = [(lt,) + metric[1:] for lt, metric in zip(line_types, orderlist)]
+
+    return orderlist
+
+
+def _to_result(time_series):
+    if time_series and isinstance(time_series[0], tuple):
+        return [(line, color, title, _to_array(ts)) for line, color, title, ts in time_series]
+    return _to_array(time_series)
+
+
+def _to_array(values):
+    """Convert a list of values or a TimeSeries to an array, None becomes NaN"""
+    return np.array(values.values if isinstance(values, TimeSeries) else values, dtype=float)
+
+
+def _to_values(array):
+    values = array.tolist()
+    for index in np.flatnonzero(np.isnan(array)).tolist():
+        values[index] = None
+    return values
@@ -14,7 +14,7 @@ import datetime as dt
 import operator
 import re
 import time
-from typing import Any, Callable, Dict, Generator, List, Literal, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Generator, Iterator, List, Literal, Optional, Tuple, Union
 
 # TODO: Make livestatus.py a well tested package on pypi
 # TODO: Move this code to the livestatus package
@@ -400,6 +400,9 @@ program_start num_hosts num_services'
     def query_non_parallel(self, query, headers) -> Response:
         return self._lookup_next_query(query, headers)
 
+    def query_by_site(self, query, add_headers='') -> Iterator[Tuple[str, Response]]:
+        yield 'NO_SITE', self._lookup_next_query(query, add_headers)
+
     # SingleSiteConnection
     def do_query(self, query, add_headers: str = '') -> Response:
         return self._lookup_next_query(query, add_headers)
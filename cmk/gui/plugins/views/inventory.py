@@ -173,6 +173,7 @@ def _declare_inv_column(invpath, datatype, title, short=None):
         # not look good for the HW/SW inventory tree
         "printable": is_leaf_node,
         "load_inv": True,
+        "inventory_paths": None if invpath == "." else [invpath],
         "paint": lambda row: paint_host_inventory_tree(row, invpath),
         "sorter": name,
     }
@@ -189,6 +190,7 @@ def _declare_inv_column(invpath, datatype, title, short=None):
                 "title": _("Inventory") + ": " + title,
                 "columns": ["host_inventory", "host_structured_status"],
                 "load_inv": True,
+                "inventory_paths": [invpath],
                 "cmp": lambda self, a, b: _cmp_inventory_node(a, b, self._spec["_inv_path"]),
             })
 
@@ -803,7 +805,7 @@ class RowTableInventory(ABCRowTable):
 
     def _get_inv_data(self, hostrow):
         try:
-            merged_tree = inventory.load_filtered_and_merged_tree(hostrow)
+            merged_tree = inventory.load_filtered_and_merged_tree(hostrow, [self._inventory_path])
         except inventory.LoadStructuredDataError:
             html.add_user_error(
                 "load_inventory_tree",
@@ -881,7 +883,8 @@ class RowMultiTableInventory(ABCRowTable):
 
     def _get_inv_data(self, hostrow):
         try:
-            merged_tree = inventory.load_filtered_and_merged_tree(hostrow)
+            merged_tree = inventory.load_filtered_and_merged_tree(
+                hostrow, [inventory_path for _info_name, inventory_path in self._sources])
         except inventory.LoadStructuredDataError:
             html.add_user_error(
                 "load_inventory_tree",
@@ -54,6 +54,10 @@ from cmk.gui.permissions import (
 
 
 class RowTableEC(RowTableLivestatus):
+    def sorts_rows(self, view):
+        # The host names of unrelated events are only set after querying
+        return False
+
     def query(self, view, columns, headers, only_sites, limit, all_active_filters):
         for c in ["event_contact_groups", "host_contact_groups", "event_host"]:
             if c not in columns:
@@ -5,6 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import abc
+import functools
 import time
 
 import cmk.gui.config as config
@@ -23,6 +24,8 @@ from cmk.gui.plugins.views import (
     cmp_service_name_equiv,
     cmp_string_list,
     cmp_ip_address,
+    key_num_split,
+    get_custom_var,
     get_tag_groups,
     get_labels,
     get_perfdata_nth_value,
@@ -65,6 +68,10 @@ class SorterSvcstate(Sorter):
         return (cmp_state_equiv(r1) > cmp_state_equiv(r2)) - (cmp_state_equiv(r1) <
                                                               cmp_state_equiv(r2))
 
+    @property
+    def sort_key(self):
+        return cmp_state_equiv
+
 
 @sorter_registry.register
 class SorterHoststate(Sorter):
@@ -84,6 +91,10 @@ class SorterHoststate(Sorter):
         return (cmp_host_state_equiv(r1) > cmp_host_state_equiv(r2)) - (cmp_host_state_equiv(r1) <
                                                                         cmp_host_state_equiv(r2))
 
+    @property
+    def sort_key(self):
+        return cmp_host_state_equiv
+
 
 @sorter_registry.register
 class SorterSiteHost(Sorter):
@@ -103,6 +114,10 @@ class SorterSiteHost(Sorter):
         return (r1["site"] > r2["site"]) - (r1["site"] < r2["site"]) or cmp_num_split(
             "host_name", r1, r2)
 
+    @property
+    def sort_key(self):
+        return lambda row: (row["site"], key_num_split("host_name", row))
+
 
 @sorter_registry.register
 class SorterHostName(Sorter):
@@ -121,6 +136,10 @@ class SorterHostName(Sorter):
     def cmp(self, r1, r2):
         return cmp_num_split("host_name", r1, r2)
 
+    @property
+    def sort_key(self):
+        return functools.partial(key_num_split, "host_name")
+
 
 @sorter_registry.register
 class SorterSitealias(Sorter):
@@ -140,6 +159,10 @@ class SorterSitealias(Sorter):
         return (config.site(r1["site"])["alias"] > config.site(r2["site"])["alias"]) - (config.site(
             r1["site"])["alias"] < config.site(r2["site"])["alias"])
 
+    @property
+    def sort_key(self):
+        return lambda row: config.site(row["site"])["alias"]
+
 
 class ABCTagSorter(Sorter, metaclass=abc.ABCMeta):
     @abc.abstractproperty
@@ -151,6 +174,10 @@ class ABCTagSorter(Sorter, metaclass=abc.ABCMeta):
         tag_groups_2 = sorted(get_tag_groups(r2, self.object_type).items())
         return (tag_groups_1 > tag_groups_2) - (tag_groups_1 < tag_groups_2)
 
+    @property
+    def sort_key(self):
+        return lambda row: sorted(get_tag_groups(row, self.object_type).items())
+
 
 @sorter_registry.register
 class SorterHost(ABCTagSorter):
@@ -200,6 +227,10 @@ class ABCLabelSorter(Sorter, metaclass=abc.ABCMeta):
         labels_2 = sorted(get_labels(r2, self.object_type).items())
         return (labels_1 > labels_2) - (labels_1 < labels_2)
 
+    @property
+    def sort_key(self):
+        return lambda row: sorted(get_labels(row, self.object_type).items())
+
 
 @sorter_registry.register
 class SorterHostLabels(ABCTagSorter):
@@ -256,6 +287,10 @@ class SorterServicelevel(Sorter):
     def cmp(self, r1, r2):
         return cmp_custom_variable(r1, r2, 'EC_SL', cmp_simple_number)
 
+    @property
+    def sort_key(self):
+        return lambda row: get_custom_var(row, 'EC_SL')
+
 
 def cmp_service_name(column, r1, r2):
     return ((cmp_service_name_equiv(r1[column]) > cmp_service_name_equiv(r2[column])) -
@@ -263,8 +298,13 @@ def cmp_service_name(column, r1, r2):
             cmp_num_split(column, r1, r2))
 
 
+def key_service_name(column, row):
+    return cmp_service_name_equiv(row[column]), key_num_split(column, row)
+
+
 #                      name                      title                              column                       sortfunction
-declare_simple_sorter("svcdescr", _("Service description"), "service_description", cmp_service_name)
+declare_simple_sorter("svcdescr", _("Service description"), "service_description", cmp_service_name,
+                      key_service_name)
 declare_simple_sorter("svcdispname", _("Service alternative display name"), "service_display_name",
                       cmp_simple_string)
 declare_simple_sorter("svcoutput", _("Service plugin output"), "service_plugin_output",
@@ -322,6 +362,10 @@ class PerfValSorter(Sorter):
                 (utils.savefloat(get_perfdata_nth_value(r1, self._num - 1, True)) < utils.savefloat(
                     get_perfdata_nth_value(r2, self._num - 1, True))))
 
+    @property
+    def sort_key(self):
+        return lambda row: utils.savefloat(get_perfdata_nth_value(row, self._num - 1, True))
+
 
 @sorter_registry.register
 class SorterSvcPerfVal01(PerfValSorter):
@@ -424,20 +468,22 @@ class SorterHostIpv4Address(Sorter):
         return ['host_custom_variable_names', 'host_custom_variable_values']
 
     def cmp(self, r1, r2):
-        def get_address(row):
-            custom_vars = dict(
-                zip(row["host_custom_variable_names"], row["host_custom_variable_values"]))
-            return custom_vars.get("ADDRESS_4", "")
-
-        def split_ip(ip):
-            try:
-                return tuple(int(part) for part in ip.split('.'))
-            except ValueError:
-                return ip
-
-        v1, v2 = split_ip(get_address(r1)), split_ip(get_address(r2))
+        v1, v2 = self.sort_key(r1), self.sort_key(r2)
         return (v1 > v2) - (v1 < v2)
 
+    @property
+    def sort_key(self):
+        return self._address_key
+
+    def _address_key(self, row):
+        custom_vars = dict(
+            zip(row["host_custom_variable_names"], row["host_custom_variable_values"]))
+        ip = custom_vars.get("ADDRESS_4", "")
+        try:
+            return tuple(int(part) for part in ip.split('.'))
+        except ValueError:
+            return ip
+
 
 @sorter_registry.register
 class SorterNumProblems(Sorter):
@@ -461,6 +507,11 @@ class SorterNumProblems(Sorter):
                  r1["host_num_services_pending"] < r2["host_num_services"] -
                  r2["host_num_services_ok"] - r2["host_num_services_pending"]))
 
+    @property
+    def sort_key(self):
+        return lambda row: (row["host_num_services"] - row["host_num_services_ok"] - row[
+            "host_num_services_pending"])
+
 
 # Hostgroup
 declare_1to1_sorter("hg_num_services", cmp_simple_number)
@@ -8,12 +8,15 @@
 # TODO: More feature related splitting up would be better
 
 import abc
+import functools
+import heapq
+import itertools
 import time
 import re
 import hashlib
 from pathlib import Path
 import traceback
-from typing import Callable, NamedTuple, Hashable, TYPE_CHECKING, Any, Set, Tuple, List, Optional, Union, Dict, Type, cast
+from typing import Callable, NamedTuple, Hashable, TYPE_CHECKING, Any, Set, Tuple, List, Optional, Union, Dict, Iterable, Iterator, Type, cast
 
 from six import ensure_str
 
@@ -66,6 +69,7 @@ from cmk.gui.type_defs import (
     Row,
     Rows,
     SorterFunction,
+    SortKeyFunction,
     AllViewSpecs,
     PermittedViewSpecs,
     VisualContext,
@@ -674,6 +678,10 @@ class RowTable(metaclass=abc.ABCMeta):
               limit: Optional[int], all_active_filters: 'List[Filter]') -> Rows:
         raise NotImplementedError()
 
+    def sorts_rows(self, view: 'View') -> bool:
+        """Whether or not query() returns the rows already sorted by the sorters of the view"""
+        return False
+
 
 class RowTableLivestatus(RowTable):
     def __init__(self, table_name: str) -> None:
@@ -726,6 +734,12 @@ class RowTableLivestatus(RowTable):
         query += headers
         return query
 
+    def sorts_rows(self, view: 'View') -> bool:
+        """The rows can be sorted here in case the sorters only need the queried columns"""
+        return not view.datasource.merge_by and all(
+            not entry.join_key and not entry.sorter.load_inv and
+            not isinstance(entry.sorter, DerivedColumnsSorter) for entry in view.sorters)
+
     def query(self, view: 'View', columns: List[ColumnName], headers: str, only_sites: OnlySites,
               limit: Optional[int], all_active_filters: 'List[Filter]') -> Rows:
         """Retrieve data via livestatus, convert into list of dicts,
@@ -742,15 +756,18 @@ class RowTableLivestatus(RowTable):
 
         columns, dynamic_columns = self._prepare_columns(columns, view)
         query = self.prepare_lql(columns, headers + datasource.add_headers)
-        data = query_livestatus(query, only_sites, limit, datasource.auth_domain)
+        row_columns = ["site"] + columns + datasource.add_columns
 
         if datasource.merge_by:
-            data = _merge_data(data, columns)
+            data = _merge_data(query_livestatus(query, only_sites, limit, datasource.auth_domain),
+                               columns)
+            # convert lists-rows into dictionaries.
+            # performance, but makes live much easier later.
+            rows: Rows = [dict(zip(row_columns, row)) for row in data]
+        else:
+            rows = self._query_rows(view, query, row_columns, only_sites, limit)
 
-        # convert lists-rows into dictionaries.
-        # performance, but makes live much easier later.
-        columns = ["site"] + columns + datasource.add_columns
-        rows: Rows = datasource.post_process([dict(zip(columns, row)) for row in data])
+        rows = datasource.post_process(rows)
 
         for index, cell in enumerate(view.row_cells):
             painter = cell.painter()
@@ -758,26 +775,72 @@ class RowTableLivestatus(RowTable):
 
         return rows
 
+    def _query_rows(self, view: 'View', query: LivestatusQuery, columns: List[ColumnName],
+                    only_sites: OnlySites, limit: Optional[int]) -> Rows:
+        """Convert the rows of each site into dictionaries as soon as the site answered
+
+        In case the rows are sorted here, the rows of each site are sorted right away while
+        waiting for the other sites. The sorted rows of all sites are merged afterwards, up
+        to the number of rows requested from each site."""
+        sort_key = row_sort_key(view.sorters) if self.sorts_rows(view) else None
+
+        rows: Rows = []
+        sorted_sites_rows: List[Rows] = []
+        for _site_id, data in query_livestatus_by_site(query, only_sites, limit,
+                                                       view.datasource.auth_domain):
+            site_rows = [dict(zip(columns, row)) for row in data]
+            if sort_key is None:
+                rows += site_rows
+                continue
+
+            site_rows.sort(key=sort_key)
+            sorted_sites_rows.append(site_rows)
+
+        if sort_key is None:
+            return rows
+
+        # The merge is stable: Rows with equal keys keep the order of the sites. The keys
+        # are computed again, but only for the rows taken from the merge.
+        merged_rows: Iterable[Row] = heapq.merge(*sorted_sites_rows, key=sort_key)
+        if limit is not None:
+            # Like each site, answer one row more than the limit to tell that it was
+            # exceeded (see sites.set_limit())
+            merged_rows = itertools.islice(merged_rows, limit + 1)
+        return list(merged_rows)
+
 
 def query_livestatus(query: LivestatusQuery, only_sites: OnlySites, limit: Optional[int],
                      auth_domain: str) -> List[LivestatusRow]:
+    data: List[LivestatusRow] = []
+    for _site_id, site_data in query_livestatus_by_site(query, only_sites, limit, auth_domain):
+        data += site_data
+    return data
+
 
-    if all((
-            config.debug_livestatus_queries,
-            html.output_format == "html",
-            display_options.enabled(display_options.W),
-    )):
+def query_livestatus_by_site(query: LivestatusQuery, only_sites: OnlySites, limit: Optional[int],
+                             auth_domain: str) -> Iterator[Tuple[SiteId, List[LivestatusRow]]]:
+    """Yields the rows of each site as soon as the site answered"""
+    debug_queries = all((
+        config.debug_livestatus_queries,
+        html.output_format == "html",
+        display_options.enabled(display_options.W),
+    ))
+    if debug_queries:
         html.open_div(class_=["livestatus", "message"])
         html.tt(query.replace('\n', '<br>\n'))
         html.close_div()
 
     sites.live().set_auth_domain(auth_domain)
     with sites.only_sites(only_sites), sites.prepend_site(), sites.set_limit(limit):
-        data = sites.live().query(query)
+        yield from sites.live().query_by_site(query)
 
     sites.live().set_auth_domain("read")
 
-    return data
+    if debug_queries:
+        html.open_div(class_=["livestatus", "message"])
+        html.tt(", ".join("%s: %.1f ms" % (site_id, latency * 1000)
+                          for site_id, latency in sorted(sites.live().site_latencies().items())))
+        html.close_div()
 
 
 # TODO: Return value of render() could be cleaned up e.g. to a named tuple with an
@@ -894,6 +957,11 @@ class Painter(metaclass=abc.ABCMeta):
         """Whether or not to load the HW/SW inventory for this column"""
         return False
 
+    @property
+    def inventory_paths(self) -> Optional[List[str]]:
+        """The HW/SW inventory paths needed for this column, None in case the whole tree is needed"""
+        return None
+
 
 class PainterRegistry(cmk.utils.plugin_registry.Registry[Type[Painter]]):
     def plugin_name(self, instance: Type[Painter]) -> str:
@@ -921,6 +989,7 @@ def register_painter(ident: str, spec: Dict[str, Any]) -> None:
             "printable": property(lambda s: s._spec.get("printable", True)),
             "sorter": property(lambda s: s._spec.get("sorter", None)),
             "load_inv": property(lambda s: s._spec.get("load_inv", False)),
+            "inventory_paths": property(lambda s: s._spec.get("inventory_paths")),
         })
     painter_registry.register(cls)
 
@@ -958,6 +1027,14 @@ class Sorter(metaclass=abc.ABCMeta):
         one service, etc."""
         raise NotImplementedError()
 
+    @property
+    def sort_key(self) -> Optional[Callable[[Row], Any]]:
+        """Optional function computing the sort key of a row
+
+        The keys must order the rows just like cmp() does. They are computed once per row,
+        which is a lot faster than comparing the rows pairwise with cmp()."""
+        return None
+
     @property
     def _args(self) -> Optional[List]:
         """Optional list of arguments for the cmp function"""
@@ -969,6 +1046,11 @@ class Sorter(metaclass=abc.ABCMeta):
         """Whether or not to load the HW/SW inventory for this column"""
         return False
 
+    @property
+    def inventory_paths(self) -> Optional[List[str]]:
+        """The HW/SW inventory paths needed for this column, None in case the whole tree is needed"""
+        return None
+
 
 class DerivedColumnsSorter(Sorter):
     @abc.abstractmethod
@@ -995,7 +1077,10 @@ def register_sorter(ident: str, spec: Dict[str, Any]) -> None:
             "title": property(lambda s: s._spec["title"]),
             "columns": property(lambda s: s._spec["columns"]),
             "load_inv": property(lambda s: s._spec.get("load_inv", False)),
+            "inventory_paths": property(lambda s: s._spec.get("inventory_paths")),
             "cmp": spec["cmp"],
+            "sort_key": property(lambda s: functools.partial(s._spec["sort_key"], s)
+                                 if "sort_key" in s._spec else None),
         })
     sorter_registry.register(cls)
 
@@ -1183,12 +1268,23 @@ def paint_nagiosflag(row: Row, field: ColumnName, bold_if_nonzero: bool) -> Cell
             _("yes") if nonzero else _("no"))
 
 
-def declare_simple_sorter(name: str, title: str, column: ColumnName, func: SorterFunction) -> None:
-    register_sorter(name, {
+def declare_simple_sorter(name: str,
+                          title: str,
+                          column: ColumnName,
+                          func: SorterFunction,
+                          key_func: Optional[SortKeyFunction] = None) -> None:
+    spec = {
         "title": title,
         "columns": [column],
-        "cmp": lambda self, r1, r2: func(column, r1, r2)
-    })
+        "cmp": lambda self, r1, r2: func(column, r1, r2),
+    }
+
+    if key_func is None:
+        key_func = _sort_key_functions.get(func)
+    if key_func is not None:
+        spec["sort_key"] = lambda self, row, key_func=key_func: key_func(column, row)
+
+    register_sorter(name, spec)
 
 
 def declare_1to1_sorter(painter_name: PainterName,
@@ -1202,11 +1298,18 @@ def declare_1to1_sorter(painter_name: PainterName,
     else:
         cmp_func = lambda self, r1, r2: func(painter.columns[col_num], r2, r1)
 
-    register_sorter(painter_name, {
+    spec = {
         "title": painter.title,
         "columns": painter.columns,
         "cmp": cmp_func,
-    })
+    }
+
+    # The reversed sorters are sorted with cmp()
+    key_func = _sort_key_functions.get(func)
+    if key_func is not None and not reverse:
+        spec["sort_key"] = lambda self, row: key_func(painter.columns[col_num], row)
+
+    register_sorter(painter_name, spec)
     return painter_name
 
 
@@ -1270,6 +1373,45 @@ def cmp_ip_address(column: ColumnName, r1: Row, r2: Row) -> int:
     return (v1 > v2) - (v1 < v2)
 
 
+def key_simple_number(column: ColumnName, row: Row) -> Any:
+    return row[column]
+
+
+def key_num_split(column: ColumnName, row: Row) -> Tuple[Union[int, str], ...]:
+    return cmk.gui.utils.key_num_split(row[column].lower())
+
+
+def key_simple_string(column: ColumnName, row: Row) -> Tuple[str, str]:
+    return key_insensitive_string(row.get(column, ''))
+
+
+def key_insensitive_string(value: str) -> Tuple[str, str]:
+    # Equal spellings with different case are ordered by case, see cmp_insensitive_string()
+    return value.lower(), value
+
+
+def key_string_list(column: ColumnName, row: Row) -> Tuple[str, str]:
+    return key_insensitive_string(''.join(row.get(column, [])))
+
+
+def key_ip_address(column: ColumnName, row: Row) -> Union[Tuple[int, ...], str]:
+    ip = row.get(column, '')
+    try:
+        return tuple(int(part) for part in ip.split('.'))
+    except Exception:
+        return ip
+
+
+# The sort keys matching the generic compare functions
+_sort_key_functions: Dict[SorterFunction, SortKeyFunction] = {
+    cmp_simple_number: key_simple_number,
+    cmp_num_split: key_num_split,
+    cmp_simple_string: key_simple_string,
+    cmp_string_list: key_string_list,
+    cmp_ip_address: key_ip_address,
+}
+
+
 def get_custom_var(row: Row, key: str) -> str:
     return row["custom_variables"].get(key, "")
 
@@ -1973,6 +2115,47 @@ SorterEntry = NamedTuple("SorterEntry", [
 SorterEntry.__new__.__defaults__ = (None,) * len(SorterEntry._fields)  # type: ignore[attr-defined]
 
 
+class _DescendingSortKey:
+    """Inverts the order of a sort key"""
+    __slots__ = ["key"]
+
+    def __init__(self, key: Any) -> None:
+        self.key = key
+
+    def __eq__(self, other: Any) -> bool:
+        return self.key == other.key
+
+    def __lt__(self, other: Any) -> bool:
+        return other.key < self.key
+
+
+def row_sort_key(sorters: List[SorterEntry]) -> Callable[[Row], Tuple]:
+    """Returns a function computing a key of a row which orders the rows by all sorters
+
+    The sort keys of the sorters are used. The sorters without sort keys fall back to
+    comparing the rows pairwise with their cmp()."""
+    def join_row_key(sorter_key: Callable[[Row], Any], join_key: str, row: Row) -> Tuple[Any, ...]:
+        # Rows without the join columns come first
+        join_row = row["JOIN"].get(join_key)
+        return (0,) if join_row is None else (1, sorter_key(join_row))
+
+    key_funcs: List[Callable[[Row], Any]] = []
+    for entry in sorters:
+        sorter_key = entry.sorter.sort_key
+        if sorter_key is None:
+            sorter_key = functools.cmp_to_key(entry.sorter.cmp)
+
+        if entry.join_key:
+            sorter_key = functools.partial(join_row_key, sorter_key, entry.join_key)
+
+        if entry.negate:
+            key_funcs.append(lambda row, sorter_key=sorter_key: _DescendingSortKey(sorter_key(row)))
+        else:
+            key_funcs.append(sorter_key)
+
+    return lambda row: tuple(key_func(row) for key_func in key_funcs)
+
+
 def _encode_sorter_url(sorters: List[SorterSpec]) -> str:
     p = []
     for s in sorters:
@@ -366,6 +366,9 @@ class FilterInvText(Filter, metaclass=abc.ABCMeta):
     def need_inventory(self) -> bool:
         return bool(self.filtertext)
 
+    def inventory_paths(self) -> Optional[List[str]]:
+        return [self._invpath]
+
     def display(self) -> None:
         htmlvar = self.htmlvars[0]
         value = html.request.var(htmlvar)
@@ -441,6 +444,9 @@ class FilterInvFloat(Filter, metaclass=abc.ABCMeta):
     def need_inventory(self) -> bool:
         return any(self.filter_configs())
 
+    def inventory_paths(self) -> Optional[List[str]]:
+        return [self._invpath]
+
     def filter_table(self, rows: Rows) -> Rows:
         lower, upper = self.filter_configs()
         if not any((lower, upper)):
@@ -468,6 +474,9 @@ class FilterInvBool(FilterTristate, metaclass=abc.ABCMeta):
     def need_inventory(self) -> bool:
         return self.tristate_value() != -1
 
+    def inventory_paths(self) -> Optional[List[str]]:
+        return [self._invpath]
+
     def filter(self, infoname):
         return ""  # No Livestatus filtering right now
 
@@ -551,6 +560,9 @@ class FilterInvHasSoftwarePackage(Filter):
     def need_inventory(self) -> bool:
         return bool(self.filtername)
 
+    def inventory_paths(self) -> Optional[List[str]]:
+        return [".software.packages:"]
+
     def display(self) -> None:
         html.text_input(self._varprefix + "name")
         html.br()
@@ -275,6 +275,10 @@ class Filter(metaclass=abc.ABCMeta):
         """Whether this filter needs to load host inventory data"""
         return False
 
+    def inventory_paths(self) -> Optional[List[str]]:
+        """The host inventory paths needed by this filter, None in case the whole tree is needed"""
+        return None
+
     def validate_value(self, value: Dict) -> None:
         return
 
@@ -2563,6 +2563,33 @@ class ConfigVariablePiggybackMaxCachefileAge(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariablePiggybackStore(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupCheckExecution
+
+    def domain(self):
+        return ConfigDomainCore
+
+    def ident(self):
+        return "piggyback_store"
+
+    def valuespec(self):
+        return DropdownChoice(
+            title=_("Storage of piggyback data"),
+            help=_("By default the piggyback data is stored in one file per source host and "
+                   "piggybacked host. Sources which deliver data for a lot of hosts, like the "
+                   "special agents for vSphere or Kubernetes, produce a lot of files that way. "
+                   "With the spool all piggyback data of a source host is stored in one file "
+                   "together with an index, which is cheaper to update and to read. Piggyback "
+                   "data is read from both storages, so the setting can be changed at any time."),
+            choices=[
+                ("files", _("One file per source and piggybacked host")),
+                ("spool", _("One spool file per source host")),
+            ],
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableCheckMKPerfdataWithTimes(ConfigVariable):
     def group(self):
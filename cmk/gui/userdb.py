@@ -230,9 +230,8 @@ def need_to_change_pw(username: UserId) -> Union[bool, str]:
 def _is_local_user(user_id: UserId) -> bool:
     user = load_cached_profile(user_id)
     if user is None:
-        # No cached profile present. Load all users to get the users data
-        user = load_users(lock=False).get(user_id, {})
-        assert user is not None  # help mypy
+        # No cached profile present. Load the users data
+        user = load_user(user_id)
 
     return user.get('connector', 'htpasswd') == 'htpasswd'
 
@@ -240,9 +239,8 @@ def _is_local_user(user_id: UserId) -> bool:
 def _user_locked(user_id: UserId) -> bool:
     user = load_cached_profile(user_id)
     if user is None:
-        # No cached profile present. Load all users to get the users data
-        user = load_users(lock=False).get(user_id, {})
-        assert user is not None  # help mypy
+        # No cached profile present. Load the users data
+        user = load_user(user_id)
 
     return user.get('locked', False)
 
@@ -518,14 +516,37 @@ def load_users(lock: bool = False) -> Users:
     if 'users' in g:
         return g.users
 
+    # populate the users cache
+    g.users = _load_users()
+
+    return g.users
+
+
+def load_user(user_id: UserId) -> UserSpec:
+    """Returns the profile of a single user as it is contained in load_users()
+
+    Only the user specific files of this user are read in case the users have not been
+    loaded by the current request."""
+    if 'users' in g:
+        return g.users.get(user_id, {})
+    return _load_users(only_user_id=user_id).get(user_id, {})
+
+
+def _load_users(only_user_id: Optional[UserId] = None) -> Users:
     # First load monitoring contacts from Check_MK's world. If this is
     # the first time, then the file will be empty, which is no problem.
     # Execfile will the simply leave contacts = {} unchanged.
-    contacts = store.load_from_mk_file(filename, "contacts", {})
+    contacts = _load_cached_users_file(_root_dir() + "contacts.mk", _load_contacts)
 
     # Now load information about users from the GUI config world
-    filename = _multisite_dir() + "users.mk"
-    users = store.load_from_mk_file(_multisite_dir() + "users.mk", "multisite_users", {})
+    users = _load_cached_users_file(_multisite_dir() + "users.mk", _load_multisite_users)
+
+    if only_user_id is not None:
+        contacts = {uid: c for uid, c in contacts.items() if ensure_str(uid) == only_user_id}
+        users = {uid: u for uid, u in users.items() if ensure_str(uid) == only_user_id}
+
+    # The cached data is shared with other requests and must not be modified
+    contacts, users = store.copy_cached_data((contacts, users))
 
     # Merge them together. Monitoring users not known to Multisite
     # will be added later as normal users.
@@ -562,93 +583,140 @@ def load_users(lock: bool = False) -> Users:
     # they are getting according to the multisite old-style
     # configuration variables.
 
-    def readlines(f):
-        try:
-            return Path(f).open(encoding="utf-8")
-        except IOError:
-            return []
-
     # FIXME TODO: Consolidate with htpasswd user connector
-    filename = cmk.utils.paths.htpasswd_file
-    for line in readlines(filename):
-        line = line.strip()
-        if ':' in line:
-            uid, password = line.strip().split(":")[:2]
-            uid = ensure_str(uid)
-            if password.startswith("!"):
-                locked = True
-                password = password[1:]
-            else:
-                locked = False
-            if uid in result:
-                result[uid]["password"] = password
-                result[uid]["locked"] = locked
-            else:
-                # Create entry if this is an admin user
-                new_user = {
-                    "roles": config.roles_of_user(uid),
-                    "password": password,
-                    "locked": False,
-                }
-                result[uid] = new_user
-            # Make sure that the user has an alias
-            result[uid].setdefault("alias", uid)
-        # Other unknown entries will silently be dropped. Sorry...
+    for uid, password in _load_cached_users_file(cmk.utils.paths.htpasswd_file,
+                                                 _load_htpasswd_entries):
+        if only_user_id is not None and uid != only_user_id:
+            continue
+        if password.startswith("!"):
+            locked = True
+            password = password[1:]
+        else:
+            locked = False
+        if uid in result:
+            result[uid]["password"] = password
+            result[uid]["locked"] = locked
+        else:
+            # Create entry if this is an admin user
+            new_user = {
+                "roles": config.roles_of_user(uid),
+                "password": password,
+                "locked": False,
+            }
+            result[uid] = new_user
+        # Make sure that the user has an alias
+        result[uid].setdefault("alias", uid)
 
     # Now read the serials, only process for existing users
     serials_file = '%s/auth.serials' % os.path.dirname(cmk.utils.paths.htpasswd_file)
-    for line in readlines(serials_file):
-        line = line.strip()
-        if ':' in line:
-            user_id, serial = line.split(':')[:2]
-            user_id = ensure_str(user_id)
-            if user_id in result:
-                result[user_id]['serial'] = utils.saveint(serial)
+    for user_id, serial in _load_cached_users_file(serials_file, _load_serials).items():
+        if user_id in result:
+            result[user_id]['serial'] = serial
 
     # Now read the user specific files
     directory = cmk.utils.paths.var_dir + "/web/"
-    for d in os.listdir(directory):
-        if d[0] != '.':
-            uid = ensure_str(d)
+    if only_user_id is None:
+        user_dirs = _load_cached_users_file(directory, _list_user_dirs)
+    else:
+        user_dirs = [only_user_id]
 
-            # read special values from own files
-            if uid in result:
-                for attr, conv_func in [
-                    ('num_failed_logins', utils.saveint),
-                    ('last_pw_change', utils.saveint),
-                    ('last_seen', utils.savefloat),
-                    ('enforce_pw_change', lambda x: bool(utils.saveint(x))),
-                    ('idle_timeout', _convert_idle_timeout),
-                    ('session_id', _convert_session_info),
-                ]:
-                    val = load_custom_attr(uid, attr, conv_func)
-                    if val is not None:
-                        result[uid][attr] = val
-
-            # read automation secrets and add them to existing
-            # users or create new users automatically
-            try:
-                user_secret_path = Path(directory) / d / "automation.secret"
-                with user_secret_path.open(encoding="utf-8") as f:
-                    secret: Optional[str] = ensure_str(f.read().strip())
-            except IOError:
-                secret = None
-
-            if secret:
-                if uid in result:
-                    result[uid]["automation_secret"] = secret
-                else:
-                    result[uid] = {
-                        "roles": ["guest"],
-                        "automation_secret": secret,
-                    }
+    for uid in user_dirs:
+        custom_attrs, secret = _load_cached_users_file(directory + uid, _load_user_dir)
 
-    # populate the users cache
-    g.users = result
+        # read special values from own files
+        if uid in result:
+            result[uid].update(custom_attrs)
+
+        # read automation secrets and add them to existing
+        # users or create new users automatically
+        if secret:
+            if uid in result:
+                result[uid]["automation_secret"] = secret
+            else:
+                result[uid] = {
+                    "roles": ["guest"],
+                    "automation_secret": secret,
+                }
 
     return result
 
 
+# The files the users are loaded from are shared by all requests handled by this process.
+# They are only read again once they or, in case of directories, their entries have changed.
+_users_file_cache: store.FileCache = {}
+
+
+def _load_cached_users_file(path: str, load_func: Callable[[str], Any]) -> Any:
+    return store.load_cached_file(_users_file_cache, path, load_func)
+
+
+def _load_contacts(path: str) -> Dict[str, Any]:
+    return store.load_from_mk_file(path, "contacts", {})
+
+
+def _load_multisite_users(path: str) -> Dict[str, Any]:
+    return store.load_from_mk_file(path, "multisite_users", {})
+
+
+def _readlines(path: str) -> List[str]:
+    try:
+        with Path(path).open(encoding="utf-8") as f:
+            return f.readlines()
+    except IOError:
+        return []
+
+
+def _load_htpasswd_entries(path: str) -> List[Tuple[UserId, str]]:
+    entries = []
+    for line in _readlines(path):
+        line = line.strip()
+        if ':' in line:
+            uid, password = line.split(":")[:2]
+            entries.append((UserId(ensure_str(uid)), password))
+        # Other unknown entries will silently be dropped. Sorry...
+    return entries
+
+
+def _load_serials(path: str) -> Dict[UserId, int]:
+    serials = {}
+    for line in _readlines(path):
+        line = line.strip()
+        if ':' in line:
+            user_id, serial = line.split(':')[:2]
+            serials[UserId(ensure_str(user_id))] = utils.saveint(serial)
+    return serials
+
+
+def _list_user_dirs(path: str) -> List[UserId]:
+    return [UserId(ensure_str(d)) for d in os.listdir(path) if d[0] != '.']
+
+
+def _load_user_dir(path: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Load the custom attributes and the automation secret from the directory of a user"""
+    uid = UserId(os.path.basename(path))
+    custom_attrs = {}
+    for attr, conv_func in [
+        ('num_failed_logins', utils.saveint),
+        ('last_pw_change', utils.saveint),
+        ('last_seen', utils.savefloat),
+        ('enforce_pw_change', lambda x: bool(utils.saveint(x))),
+        ('idle_timeout', _convert_idle_timeout),
+        ('session_id', _convert_session_info),
+    ]:
+        val = load_custom_attr(uid, attr, conv_func)
+        if val is not None:
+            custom_attrs[attr] = val
+
+    try:
+        user_secret_path = Path(path) / "automation.secret"
+        with user_secret_path.open(encoding="utf-8") as f:
+            secret: Optional[str] = ensure_str(f.read().strip())
+    except IOError:
+        secret = None
+
+    return custom_attrs, secret
+
+
 def custom_attr_path(userid: UserId, key: str) -> str:
     return cmk.utils.paths.var_dir + "/web/" + ensure_str(userid) + "/" + key + ".mk"
 
@@ -710,6 +778,7 @@ def save_users(profiles: Users) -> None:
 
     # populate the users cache
     g.users = updated_profiles
+    _users_file_cache.clear()
 
     # Call the users_saved hook
     hooks.call("users-saved", updated_profiles)
@@ -935,9 +1004,8 @@ def _save_cached_profile(user_id: UserId, user: UserSpec, multisite_keys: List[s
 def contactgroups_of_user(user_id: UserId) -> List[ContactgroupName]:
     user = load_cached_profile(user_id)
     if user is None:
-        # No cached profile present. Load all users to get the users data
-        user = load_users(lock=False).get(user_id, {})
-        assert user is not None  # help mypy
+        # No cached profile present. Load the users data
+        user = load_user(user_id)
 
     return user.get("contactgroups", [])
 
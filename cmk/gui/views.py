@@ -10,7 +10,6 @@ import time
 import pprint
 import traceback
 import json
-import functools
 from typing import (Any, Callable, Dict, List, Optional, Sequence, Set, Tuple as _Tuple, Union,
                     Iterator, Type)
 
@@ -110,6 +109,7 @@ from cmk.gui.plugins.views.utils import (
     get_tag_groups,
     _parse_url_sorters,
     SorterEntry,
+    row_sort_key,
     make_host_breadcrumb,
     make_service_breadcrumb,
     SorterSpec,
@@ -1712,8 +1712,10 @@ def _get_view_rows(view: View,
                    only_count: bool = False) -> _Tuple[int, Rows]:
     rows = _fetch_view_rows(view, all_active_filters, only_count)
 
-    # Sorting - use view sorters and URL supplied sorters
-    _sort_data(view, rows, view.sorters)
+    # Sorting - use view sorters and URL supplied sorters. Some tables already return the
+    # rows sorted.
+    if not view.datasource.table.sorts_rows(view):
+        _sort_data(view, rows, view.sorters)
 
     unfiltered_amount_of_rows = len(rows)
 
@@ -1754,7 +1756,10 @@ def _fetch_view_rows(view: View, all_active_filters: List[Filter], only_count: b
         # inventory, then we load it and attach it as column "host_inventory"
         if _is_inventory_data_needed(view.group_cells, view.row_cells, view.sorters,
                                      all_active_filters):
-            _add_inventory_data(rows)
+            _add_inventory_data(
+                rows,
+                _get_needed_inventory_paths(view.group_cells, view.row_cells, view.sorters,
+                                            all_active_filters))
 
         if not cmk_version.is_raw_edition():
             _add_sla_data(view, rows)
@@ -1939,14 +1944,52 @@ def _is_inventory_data_needed(group_cells: List[Cell], cells: List[Cell],
     return False
 
 
-def _add_inventory_data(rows: Rows) -> None:
+def _get_needed_inventory_paths(group_cells: List[Cell], cells: List[Cell],
+                                sorters: List[SorterEntry],
+                                all_active_filters: 'List[Filter]') -> Optional[List[str]]:
+    """Returns the inventory paths needed by the view, None in case the whole tree is needed"""
+    paths: List[str] = []
+    for cell in cells:
+        if cell.has_tooltip() and cell.tooltip_painter_name().startswith("inv_"):
+            tooltip_paths = cell.tooltip_painter().inventory_paths
+            if tooltip_paths is None:
+                return None
+            paths += tooltip_paths
+
+    for entry in sorters:
+        if entry.sorter.load_inv:
+            if entry.sorter.inventory_paths is None:
+                return None
+            paths += entry.sorter.inventory_paths
+
+    for cell in group_cells + cells:
+        painter = cell.painter()
+        if painter.load_inv:
+            if painter.inventory_paths is None:
+                return None
+            paths += painter.inventory_paths
+
+    for filt in all_active_filters:
+        if filt.need_inventory():
+            filter_paths = filt.inventory_paths()
+            if filter_paths is None:
+                return None
+            paths += filter_paths
+
+    return sorted(set(paths))
+
+
+def _add_inventory_data(rows: Rows, inventory_paths: Optional[List[str]] = None) -> None:
     corrupted_inventory_files = []
+    # The rows of many hosts are built from the index in case only single attributes are shown
+    index = inventory.get_inventory_index(inventory_paths) if len(rows) > 1 else None
     for row in rows:
         if "host_name" not in row:
             continue
 
         try:
-            row["host_inventory"] = inventory.load_filtered_and_merged_tree(row)
+            row["host_inventory"] = inventory.load_filtered_and_merged_tree(
+                row, inventory_paths, index)
         except inventory.LoadStructuredDataError:
             # The inventory row may be joined with other rows (perf-o-meter, ...).
             # Therefore we initialize the corrupt inventory tree with an empty tree
@@ -1961,6 +2004,9 @@ def _add_inventory_data(rows: Rows) -> None:
                     _("Cannot load HW/SW inventory trees %s. Please remove the corrupted files.") %
                     ", ".join(sorted(corrupted_inventory_files)))
 
+    if index is not None:
+        index.save()
+
 
 def _add_sla_data(view: View, rows: Rows) -> None:
     import cmk.gui.cee.sla as sla  # pylint: disable=no-name-in-module,import-outside-toplevel
@@ -2490,31 +2536,7 @@ def _sort_data(view: View, data: 'Rows', sorters: List[SorterEntry]) -> None:
     if not sorters:
         return
 
-    # Handle case where join columns are not present for all rows
-    def safe_compare(compfunc: Callable[[Row, Row], int], row1: Row, row2: Row) -> int:
-        if row1 is None and row2 is None:
-            return 0
-        if row1 is None:
-            return -1
-        if row2 is None:
-            return 1
-        return compfunc(row1, row2)
-
-    def multisort(e1: Row, e2: Row) -> int:
-        for entry in sorters:
-            neg = -1 if entry.negate else 1
-
-            if entry.join_key:  # Sorter for join column, use JOIN info
-                c = neg * safe_compare(entry.sorter.cmp, e1["JOIN"].get(entry.join_key),
-                                       e2["JOIN"].get(entry.join_key))
-            else:
-                c = neg * entry.sorter.cmp(e1, e2)
-
-            if c != 0:
-                return c
-        return 0  # equal
-
-    data.sort(key=functools.cmp_to_key(multisort))
+    data.sort(key=row_sort_key(sorters))
 
 
 def sorters_of_datasource(ds_name):
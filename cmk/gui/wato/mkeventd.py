@@ -3379,6 +3379,33 @@ class ConfigVariableEventConsoleRuleOptimizer(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableEventConsoleEventWorkers(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupEventConsoleGeneric
+
+    def domain(self):
+        return ConfigDomainEventConsole
+
+    def ident(self):
+        return "event_workers"
+
+    def valuespec(self):
+        return Integer(
+            title=_("Event worker processes"),
+            help=_("The number of processes which parse the incoming messages and match them "
+                   "against the rules in parallel. Only the resulting changes of the event "
+                   "status are done by the event daemon itself, in the order in which the "
+                   "messages were received. This helps on sites which receive a lot of "
+                   "messages or have a large number of rules. With the default of <tt>0</tt> "
+                   "the event daemon processes all messages itself. SNMP traps are always "
+                   "processed by the event daemon."),
+            minvalue=0,
+            maxvalue=64,
+            unit=_("processes"),
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableEventConsoleActions(ConfigVariable):
     def group(self):
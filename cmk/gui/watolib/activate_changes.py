@@ -15,7 +15,6 @@ SnapshotCreator          - Packing the snapshots into snapshot archives
 ActivateChangesSite      - Executes the activation procedure for a single site.
 """
 
-import io
 import errno
 import ast
 import os
@@ -26,9 +25,11 @@ import multiprocessing
 import traceback
 import subprocess
 import hashlib
+import tempfile
 from logging import Logger
 from pathlib import Path
-from typing import Dict, Set, List, Optional, Tuple, Union, NamedTuple, Any
+from stat import S_ISLNK
+from typing import Dict, IO, Iterator, Set, List, Optional, Tuple, Union, NamedTuple, Any
 
 import psutil  # type: ignore[import]
 import werkzeug.urls
@@ -1539,22 +1540,21 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
         be deleted and the current config generation is handed over using dedicated HTTP parameters.
         """
 
-        sync_archive = _get_sync_archive(files_to_sync, site_config_dir)
-
         site = config.site(self._site_id)
-        response = cmk.gui.watolib.automations.do_remote_automation(
-            site,
-            "receive-config-sync",
-            [
-                ("site_id", self._site_id),
-                ("sync_archive", sync_archive),
-                ("to_delete", repr(files_to_delete)),
-                ("config_generation", "%d" % remote_config_generation),
-            ],
-            files={
-                "sync_archive": io.BytesIO(sync_archive),
-            },
-        )
+        with _get_sync_archive(files_to_sync, site_config_dir) as sync_archive:
+            # The remote site only reads the uploaded file
+            response = cmk.gui.watolib.automations.do_remote_automation(
+                site,
+                "receive-config-sync",
+                [
+                    ("site_id", self._site_id),
+                    ("to_delete", repr(files_to_delete)),
+                    ("config_generation", "%d" % remote_config_generation),
+                ],
+                files={
+                    "sync_archive": sync_archive,
+                },
+            )
 
         if response is not True:
             raise MKGeneralException(_("Failed to synchronize with site: %s") % response)
@@ -2009,28 +2009,35 @@ def _get_file_names_to_sync(
     return to_sync_new, to_sync_changed, to_delete
 
 
-def _get_sync_archive(to_sync: List[str], base_dir: Path) -> bytes:
-    # Use native tar instead of python tarfile for performance reasons
-    p = subprocess.Popen(
-        [
-            "tar", "-c", "-C",
-            str(base_dir), "-f", "-", "--null", "-T", "-", "--preserve-permissions"
-        ],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        close_fds=True,
-        shell=False,
-    )
+def _get_sync_archive(to_sync: List[str], base_dir: Path) -> IO[bytes]:
+    """Create the archive of the given files in a temporary file
 
-    # Since we don't stream the archive to the remote site (we could probably do this) it should be
-    # no problem to buffer it in memory for the moment
-    archive, stderr = p.communicate(b"\0".join(ensure_binary(f) for f in to_sync))
+    The archive is written by tar directly to the file, which is then read while being sent
+    to the remote site. This way the archive does not need to be buffered in memory."""
+    archive = tempfile.TemporaryFile()
+    try:
+        # Use native tar instead of python tarfile for performance reasons
+        p = subprocess.Popen(
+            [
+                "tar", "-c", "-C",
+                str(base_dir), "-f", "-", "--null", "-T", "-", "--preserve-permissions"
+            ],
+            stdin=subprocess.PIPE,
+            stdout=archive,
+            stderr=subprocess.PIPE,
+            close_fds=True,
+            shell=False,
+        )
 
-    if p.returncode != 0:
-        raise MKGeneralException(
-            _("Failed to create sync archive [%d]: %s") % (p.returncode, ensure_str(stderr)))
+        stderr = p.communicate(b"\0".join(ensure_binary(f) for f in to_sync))[1]
+        if p.returncode != 0:
+            raise MKGeneralException(
+                _("Failed to create sync archive [%d]: %s") % (p.returncode, ensure_str(stderr)))
+    except Exception:
+        archive.close()
+        raise
 
+    archive.seek(0)
     return archive
 
 
@@ -2071,6 +2078,9 @@ ConfigSyncFileInfo = NamedTuple("ConfigSyncFileInfo", [
 #])
 GetConfigSyncStateResponse = Tuple[Dict[str, Tuple[int, int, Optional[str], Optional[str]]], int]
 
+# Hashes of the synchronized files: site path -> (inode, size, mtime_ns, hash)
+ConfigSyncFileHashes = Dict[str, Tuple[int, int, int, str]]
+
 
 @automation_command_registry.register
 class AutomationGetConfigSyncState(AutomationCommand):
@@ -2107,8 +2117,14 @@ def _get_config_sync_file_infos(replication_paths: List[ReplicationPath],
 
     It produces a dictionary of sync file infos. One entry is created for each file.  Directories
     are not added to the dictionary.
+
+    The hashes of the files are cached per base directory to prevent hashing unchanged files
+    again during the next activation.
     """
     infos = {}
+    hash_cache_path = _config_sync_hash_cache_path(base_dir)
+    cached_hashes: ConfigSyncFileHashes = store.load_object_from_file(hash_cache_path, default={})
+    hashes: ConfigSyncFileHashes = {}
 
     for replication_path in replication_paths:
         path = base_dir.joinpath(replication_path.site_path)
@@ -2117,32 +2133,67 @@ def _get_config_sync_file_infos(replication_paths: List[ReplicationPath],
             continue  # Only report back existing things
 
         if replication_path.ty == "file":
-            infos[replication_path.site_path] = _get_config_sync_file_info(path)
+            infos[replication_path.site_path] = _get_config_sync_file_info(
+                str(path), replication_path.site_path, path.lstat(), cached_hashes, hashes)
 
         elif replication_path.ty == "dir":
-            for entry in path.glob("**/*"):
-                if entry.is_dir() and not entry.is_symlink():
-                    continue  # Do not add directories at all
-
-                entry_site_path = entry.relative_to(base_dir)
-                infos[str(entry_site_path)] = _get_config_sync_file_info(entry)
+            base_prefix_len = len(str(base_dir)) + 1
+            for entry in _iter_config_sync_dir_entries(str(path)):
+                entry_site_path = entry.path[base_prefix_len:]
+                infos[entry_site_path] = _get_config_sync_file_info(
+                    entry.path, entry_site_path, entry.stat(follow_symlinks=False), cached_hashes,
+                    hashes)
 
         else:
             raise NotImplementedError()
+
+    # Only the hashes of the current files are kept, which drops the ones of removed files
+    if hashes != cached_hashes:
+        store.makedirs(hash_cache_path.parent)
+        store.save_object_to_file(hash_cache_path, hashes, fast=True)
     return infos
 
 
-def _get_config_sync_file_info(file_path: Path) -> ConfigSyncFileInfo:
-    stat = file_path.lstat()
-    is_symlink = file_path.is_symlink()
+def _iter_config_sync_dir_entries(path: str) -> Iterator["os.DirEntry[str]"]:
+    """Yield all entries below the given directory, except the directories themselves
+
+    Symlinks to directories are yielded, but not followed."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_config_sync_dir_entries(entry.path)
+            else:
+                yield entry
+
+
+def _get_config_sync_file_info(file_path: str, site_path: str, stat: os.stat_result,
+                               cached_hashes: 'ConfigSyncFileHashes',
+                               hashes: 'ConfigSyncFileHashes') -> ConfigSyncFileInfo:
+    is_symlink = S_ISLNK(stat.st_mode)
     return ConfigSyncFileInfo(
         stat.st_mode,
         stat.st_size,
-        os.readlink(str(file_path)) if is_symlink else None,
-        _create_config_sync_file_hash(file_path) if not is_symlink else None,
+        os.readlink(file_path) if is_symlink else None,
+        _get_config_sync_file_hash(file_path, site_path, stat, cached_hashes, hashes)
+        if not is_symlink else None,
     )
 
 
+def _get_config_sync_file_hash(file_path: str, site_path: str, stat: os.stat_result,
+                               cached_hashes: 'ConfigSyncFileHashes',
+                               hashes: 'ConfigSyncFileHashes') -> str:
+    key = store.file_cache_key(stat)
+    cached = cached_hashes.get(site_path)
+    if cached is not None and cached[:3] == key:
+        file_hash = cached[3]
+    else:
+        file_hash = _create_config_sync_file_hash(Path(file_path))
+
+    if store.is_cacheable_file(stat):
+        hashes[site_path] = key + (file_hash,)
+    return file_hash
+
+
 def _create_config_sync_file_hash(file_path: Path) -> str:
     sha256 = hashlib.sha256()
     with file_path.open("rb") as f:
@@ -2154,6 +2205,12 @@ def _create_config_sync_file_hash(file_path: Path) -> str:
     return sha256.hexdigest()
 
 
+def _config_sync_hash_cache_path(base_dir: Path) -> Path:
+    # The central site uses one directory per remote site, a remote site its whole site
+    cache_name = hashlib.sha256(ensure_binary(str(base_dir))).hexdigest()
+    return Path(cmk.utils.paths.var_dir, "wato", "config_sync_hashes", cache_name + ".mk")
+
+
 def update_config_generation():
     """Increase the config generation ID
 
@@ -12,7 +12,7 @@ import time
 import re
 import shutil
 import uuid
-from typing import Any, Dict, List, Optional, Set, Tuple, Type, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, Union
 
 from livestatus import SiteId
 
@@ -52,6 +52,7 @@ from cmk.gui.plugins.watolib.utils import wato_fileheader
 from cmk.gui.background_job import BackgroundJobAlreadyRunning
 from cmk.gui.breadcrumb import Breadcrumb, BreadcrumbItem
 
+import cmk.utils.paths
 import cmk.utils.version as cmk_version
 
 from cmk.utils import store
@@ -153,13 +154,17 @@ class WithUniqueIdentifier(metaclass=abc.ABCMeta):
         Returns:
             The loaded data.
         """
-        data = store.load_object_from_file(self._store_file_name(), default={})
+        data = self._load_instance_data()
         data = self._upgrade_keys(data)
         unique_id = data.get('__id')
         if self._id is None:
             self._id = unique_id
         self._set_instance_data(data)
 
+    def _load_instance_data(self) -> Dict[str, Any]:
+        """Read the data of this instance from its file."""
+        return store.load_object_from_file(self._store_file_name(), default={})
+
     @abc.abstractmethod
     def _set_instance_data(self, wato_info):
         """Hook method which is called by 'load_instance'.
@@ -452,6 +457,75 @@ def update_metadata(
     return attributes
 
 
+# Cross-request cache of the parsed .wato and hosts.mk files of the folder tree. It is also
+# kept in a snapshot file, so that new processes only need to parse the files which have been
+# changed in the meantime.
+_folder_file_cache: store.FileCache = {}
+_folder_file_cache_changed = False
+_folder_cache_snapshot_key: Optional[store.FileCacheKey] = None
+
+
+def _load_cached_folder_file(path: str, load_func: Callable[[str], Any]) -> Any:
+    global _folder_file_cache_changed
+
+    cached = _folder_file_cache.get(path)
+    data = store.load_cached_file(_folder_file_cache, path, load_func)
+    if _folder_file_cache.get(path) is not cached:
+        _folder_file_cache_changed = True
+    return data
+
+
+def _folder_cache_snapshot_path() -> str:
+    return cmk.utils.paths.var_dir + "/wato/folder_cache.mk"
+
+
+def _update_folder_cache_from_snapshot() -> None:
+    """Take over the entries other processes have written to the snapshot since the last call"""
+    global _folder_cache_snapshot_key
+
+    path = _folder_cache_snapshot_path()
+    try:
+        key = store.file_cache_key(os.stat(path))
+    except OSError:
+        return
+
+    if key == _folder_cache_snapshot_key:
+        return
+
+    try:
+        snapshot = store.load_object_from_file(path, default={})
+    except (MKGeneralException, ValueError, EOFError):
+        # A broken snapshot is only a cache miss, it is overwritten with the next save
+        snapshot = {}
+
+    for file_path, (file_key, data) in snapshot.items():
+        cached = _folder_file_cache.get(file_path)
+        if cached is None or cached[0] != file_key:
+            _folder_file_cache[file_path] = (file_key, data)
+    _folder_cache_snapshot_key = key
+
+
+def _save_folder_cache_snapshot() -> None:
+    global _folder_file_cache_changed, _folder_cache_snapshot_key
+
+    if not _folder_file_cache_changed:
+        return
+    _folder_file_cache_changed = False
+
+    for file_path in [p for p in _folder_file_cache if not os.path.exists(p)]:
+        del _folder_file_cache[file_path]
+
+    path = _folder_cache_snapshot_path()
+    store.makedirs(os.path.dirname(path))
+    try:
+        store.save_object_to_file(path, _folder_file_cache, fast=True)
+    except ValueError:
+        # Hand edited hosts.mk files may contain objects which can not be marshaled. In this
+        # case the cache is only kept in memory.
+        return
+    _folder_cache_snapshot_key = store.file_cache_key(os.stat(path))
+
+
 class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolder):
     """This class represents a WATO folder that contains other folders and hosts."""
 
@@ -462,6 +536,8 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
     @staticmethod
     def all_folders():
         if 'wato_folders' not in g:
+            _update_folder_cache_from_snapshot()
+            _save_folder_cache_snapshot()
             wato_folders = g.wato_folders = {}
             Folder("", "").add_to_dictionary(wato_folders)
         return g.wato_folders
@@ -626,15 +702,25 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
             self._load_hosts()
 
     def _load_hosts(self):
-        self._locked_hosts = False
+        hosts_file = self._load_parsed_hosts_file()
+        # Can either be set to True or a string (which will be used as host lock message)
+        self._locked_hosts = hosts_file["lock"]
 
         self._hosts = {}
+        for host_name, (attributes,
+                        cluster_nodes) in store.copy_cached_data(hosts_file["hosts"]).items():
+            self._hosts[host_name] = Host(self, host_name, attributes, cluster_nodes)
+
+    def _load_parsed_hosts_file(self) -> Dict[str, Any]:
+        """Returns the cached result of _parse_hosts_file(), it must not be modified"""
+        return _load_cached_folder_file(self.hosts_file_path(),
+                                        lambda path: self._parse_hosts_file())
+
+    def _parse_hosts_file(self) -> Dict[str, Any]:
         if not os.path.exists(self.hosts_file_path()):
-            return
+            return {"lock": False, "hosts": {}}
 
         variables = self._load_hosts_file()
-        # Can either be set to True or a string (which will be used as host lock message)
-        self._locked_hosts = variables["_lock"]
 
         # Add entries in clusters{} to all_hosts, prepare cluster to node mapping
         nodes_of = {}
@@ -645,43 +731,46 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
             # process the host names as str. TODO: Can be removed with Python 3.
             nodes_of[str(cluster_with_tags.split('|')[0])] = list(map(str, nodes))
 
-        # Build list of individual hosts
+        # Build list of individual hosts: host name -> (attributes, cluster nodes)
+        hosts = {}
         for host_name_with_tags in variables["all_hosts"]:
             parts = host_name_with_tags.split('|', 1)
             # Werk #10863: In 1.6 some hosts / rulesets were saved as unicode
             # strings.  After reading the config into the GUI ensure we really
             # process the host names as str. TODO: Can be removed with Python 3.
             host_name = str(parts[0])
-            host = self._create_host_from_variables(host_name, nodes_of, variables)
-            self._hosts[host_name] = host
+            hosts[host_name] = (self._get_host_attributes_from_variables(host_name, variables),
+                                nodes_of.get(host_name))
 
-    def _create_host_from_variables(self, host_name, nodes_of, variables):
-        cluster_nodes = nodes_of.get(host_name)
+        return {
+            # Can either be set to True or a string (which will be used as host lock message)
+            "lock": variables["_lock"],
+            "hosts": hosts,
+        }
 
+    def _get_host_attributes_from_variables(self, host_name, variables):
         # If we have a valid entry in host_attributes then the hosts.mk file contained
         # valid WATO information from a last save and we use that
         if host_name in variables["host_attributes"]:
             attributes = variables["host_attributes"][host_name]
-            attributes = self._transform_old_attributes(attributes)
-
-        else:
-            # Otherwise it is an import from some manual old version of from some
-            # CMDB and we reconstruct the attributes. That way the folder inheritance
-            # information is not available and all tags are set explicitely
-            # 1.6: Tag transform from all_hosts has been dropped
-            attributes = {}
-            alias = self._get_alias_from_extra_conf(host_name, variables)
-            if alias is not None:
-                attributes["alias"] = alias
-            for attribute_key, config_dict in [
-                ("ipaddress", "ipaddresses"),
-                ("ipv6address", "ipv6addresses"),
-                ("snmp_community", "explicit_snmp_communities"),
-            ]:
-                if host_name in variables[config_dict]:
-                    attributes[attribute_key] = variables[config_dict][host_name]
-
-        return Host(self, host_name, attributes, cluster_nodes)
+            return self._transform_old_attributes(attributes)
+
+        # Otherwise it is an import from some manual old version of from some
+        # CMDB and we reconstruct the attributes. That way the folder inheritance
+        # information is not available and all tags are set explicitely
+        # 1.6: Tag transform from all_hosts has been dropped
+        attributes = {}
+        alias = self._get_alias_from_extra_conf(host_name, variables)
+        if alias is not None:
+            attributes["alias"] = alias
+        for attribute_key, config_dict in [
+            ("ipaddress", "ipaddresses"),
+            ("ipv6address", "ipv6addresses"),
+            ("snmp_community", "explicit_snmp_communities"),
+        ]:
+            if host_name in variables[config_dict]:
+                attributes[attribute_key] = variables[config_dict][host_name]
+        return attributes
 
     def _upgrade_keys(self, data):
         data['attributes'] = self._transform_old_attributes(data.get('attributes', {}))
@@ -1021,6 +1110,11 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         Folder.invalidate_caches()
         self.load_instance()
 
+    def _load_instance_data(self):
+        return store.copy_cached_data(
+            _load_cached_folder_file(self._store_file_name(),
+                                     lambda path: store.load_object_from_file(path, default={})))
+
     def _get_identifier(self):
         return uuid.uuid4().hex
 
@@ -1116,6 +1210,12 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         self._load_hosts_on_demand()
         return self._hosts
 
+    def host_names(self):
+        # The names are known without creating the host objects of the folder
+        if self._hosts is None:
+            return self._load_parsed_hosts_file()["hosts"].keys()
+        return self._hosts.keys()
+
     def num_hosts(self):
         # Do *not* load hosts here! This method must kept cheap
         return self._num_hosts
@@ -1127,11 +1227,15 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         return num
 
     def all_hosts_recursively(self):
-        hosts = {}
+        hosts: Dict[str, CREHost] = {}
+        self._add_hosts_recursively(hosts)
+        _save_folder_cache_snapshot()
+        return hosts
+
+    def _add_hosts_recursively(self, hosts):
         hosts.update(self.hosts())
         for subfolder in self.subfolders():
-            hosts.update(subfolder.all_hosts_recursively())
-        return hosts
+            subfolder._add_hosts_recursively(hosts)
 
     def subfolders(self, only_visible: bool = False) -> 'List[CREFolder]':
         """Filter subfolder collection by various means.
@@ -1360,9 +1464,9 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         return permitted_groups, host_contact_groups, cgconf.get("use_for_services", False)
 
     def find_host_recursively(self, host_name: str) -> 'Optional[CREHost]':
-        host: Optional[CREHost] = self.host(host_name)
-        if host:
-            return host
+        # Only the folder containing the host needs to create its host objects
+        if host_name in self.host_names():
+            return self.host(host_name)
 
         for subfolder in self.subfolders():
             host = subfolder.find_host_recursively(host_name)
@@ -1995,6 +2099,7 @@ class SearchFolder(WithPermissions, WithAttributes, BaseFolder):
     def hosts(self):
         if self._found_hosts is None:
             self._found_hosts = self._search_hosts_recursively(self._base_folder)
+            _save_folder_cache_snapshot()
         return self._found_hosts
 
     def locked_hosts(self):
@@ -2087,10 +2192,20 @@ class SearchFolder(WithPermissions, WithAttributes, BaseFolder):
         if not in_folder.may("read"):
             return {}
 
+        # Filter by the host names first to only create the host objects of the folders
+        # containing matching hosts
+        host_names = [
+            host_name for host_name in in_folder.host_names() if not self._criteria[".name"] or
+            host_attribute_matches(self._criteria[".name"], host_name)
+        ]
+        if not host_names:
+            return {}
+
         found = {}
-        for host_name, host in in_folder.hosts().items():
-            if self._criteria[".name"] and not host_attribute_matches(self._criteria[".name"],
-                                                                      host_name):
+        hosts = in_folder.hosts()
+        for host_name in host_names:
+            host = hosts.get(host_name)
+            if host is None:
                 continue
 
             # Compute inheritance
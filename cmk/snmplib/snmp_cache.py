@@ -6,7 +6,7 @@
 """SNMP caching"""
 
 import os
-from typing import Dict, List, Optional
+from typing import Dict, Optional
 
 import cmk.utils.cleanup
 import cmk.utils.paths
@@ -19,8 +19,6 @@ from .type_defs import OID, SNMPDecodedString, SNMPHostConfig
 _g_single_oid_hostname: Optional[HostName] = None
 _g_single_oid_ipaddress: Optional[HostAddress] = None
 _g_single_oid_cache: Optional[Dict[OID, Optional[SNMPDecodedString]]] = None
-# TODO: Move to StoredWalkSNMPBackend?
-_g_walk_cache: Dict[str, List[str]] = {}
 
 
 def initialize_single_oid_cache(snmp_config: SNMPHostConfig, from_disk: bool = False) -> None:
@@ -44,7 +42,7 @@ def write_single_oid_cache(snmp_config: SNMPHostConfig) -> None:
     if not os.path.exists(cache_dir):
         os.makedirs(cache_dir)
     cache_path = "%s/%s.%s" % (cache_dir, snmp_config.hostname, snmp_config.ipaddress)
-    store.save_object_to_file(cache_path, _g_single_oid_cache, pretty=False)
+    store.save_object_to_file(cache_path, _g_single_oid_cache, fast=True)
 
 
 def set_single_oid_cache(oid: OID, value: Optional[SNMPDecodedString]) -> None:
@@ -69,26 +67,12 @@ def _load_single_oid_cache(snmp_config: SNMPHostConfig) -> Dict[OID, Optional[SN
 
 
 def cleanup_host_caches() -> None:
-    global _g_walk_cache
-    _g_walk_cache = {}
     _clear_other_hosts_oid_cache(None)
 
 
 cmk.utils.cleanup.register_cleanup(cleanup_host_caches)
 
 
-def host_cache_contains(name: HostName) -> bool:
-    return name in _g_walk_cache
-
-
-def host_cache_get(name: HostName) -> List[str]:
-    return _g_walk_cache[name]
-
-
-def host_cache_set(name: HostName, contents: List[str]) -> None:
-    _g_walk_cache[name] = contents
-
-
 def _clear_other_hosts_oid_cache(hostname: Optional[str]) -> None:
     global _g_single_oid_cache, _g_single_oid_ipaddress, _g_single_oid_hostname
     if _g_single_oid_hostname != hostname:
@@ -5,7 +5,9 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import os
-from typing import Any, Callable, cast, List, Optional, Set, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Any, Callable, cast, Dict, Iterable, List, Mapping, Optional, Sequence, Set,
+                    Tuple, Union)
 
 from six import ensure_binary
 
@@ -31,6 +33,7 @@ from .type_defs import (
     OIDWithSubOIDsAndColumns,
     SNMPColumn,
     SNMPColumns,
+    SNMPContext,
     SNMPDecodedValues,
     SNMPHostConfig,
     SNMPRawValue,
@@ -43,16 +46,24 @@ from .type_defs import (
 ResultColumnsUnsanitized = List[Tuple[OID, SNMPRowInfo, SNMPValueEncoding]]
 ResultColumnsSanitized = List[Tuple[List[SNMPRawValue], SNMPValueEncoding]]
 ResultColumnsDecoded = List[List[SNMPDecodedValues]]
+# Walks that have been fetched in advance for all sections of a host. See prefetch_snmp_walks()
+SNMPWalkCache = Dict[Tuple[SNMPContext, OID], SNMPRowInfo]
 
 
-def get_snmp_table(section_name: Optional[SectionName], oid_info: Union[OIDInfo, SNMPTree], *,
-                   backend: ABCSNMPBackend) -> SNMPTable:
-    return _get_snmp_table(section_name, oid_info, False, backend=backend)
+def get_snmp_table(section_name: Optional[SectionName],
+                   oid_info: Union[OIDInfo, SNMPTree],
+                   *,
+                   backend: ABCSNMPBackend,
+                   walk_cache: Optional[SNMPWalkCache] = None) -> SNMPTable:
+    return _get_snmp_table(section_name, oid_info, False, backend=backend, walk_cache=walk_cache)
 
 
-def get_snmp_table_cached(section_name: Optional[SectionName], oid_info: Union[OIDInfo, SNMPTree],
-                          *, backend: ABCSNMPBackend) -> SNMPTable:
-    return _get_snmp_table(section_name, oid_info, True, backend=backend)
+def get_snmp_table_cached(section_name: Optional[SectionName],
+                          oid_info: Union[OIDInfo, SNMPTree],
+                          *,
+                          backend: ABCSNMPBackend,
+                          walk_cache: Optional[SNMPWalkCache] = None) -> SNMPTable:
+    return _get_snmp_table(section_name, oid_info, True, backend=backend, walk_cache=walk_cache)
 
 
 SPECIAL_COLUMNS = [
@@ -65,8 +76,12 @@ SPECIAL_COLUMNS = [
 
 
 # TODO: OID_END_OCTET_STRING is not used at all. Drop it.
-def _get_snmp_table(section_name: Optional[SectionName], oid_info: Union[OIDInfo, SNMPTree],
-                    use_snmpwalk_cache: bool, *, backend: ABCSNMPBackend) -> SNMPTable:
+def _get_snmp_table(section_name: Optional[SectionName],
+                    oid_info: Union[OIDInfo, SNMPTree],
+                    use_snmpwalk_cache: bool,
+                    *,
+                    backend: ABCSNMPBackend,
+                    walk_cache: Optional[SNMPWalkCache] = None) -> SNMPTable:
     oid, suboids, targetcolumns = _make_target_columns(oid_info)
 
     index_column = -1
@@ -99,7 +114,8 @@ def _get_snmp_table(section_name: Optional[SectionName], oid_info: Union[OIDInfo
                                     fetchoid,
                                     column,
                                     use_snmpwalk_cache,
-                                    backend=backend)
+                                    backend=backend,
+                                    walk_cache=walk_cache)
 
             if column in SPECIAL_COLUMNS:
                 index_column = len(columns)
@@ -233,8 +249,14 @@ def _key_oid_pairs(pair1: Tuple[OID, SNMPRawValue]) -> List[int]:
     return _oid_to_intlist(pair1[0].lstrip('.'))
 
 
-def _get_snmpwalk(section_name: Optional[SectionName], oid: OID, fetchoid: OID, column: SNMPColumn,
-                  use_snmpwalk_cache: bool, *, backend: ABCSNMPBackend) -> SNMPRowInfo:
+def _get_snmpwalk(section_name: Optional[SectionName],
+                  oid: OID,
+                  fetchoid: OID,
+                  column: SNMPColumn,
+                  use_snmpwalk_cache: bool,
+                  *,
+                  backend: ABCSNMPBackend,
+                  walk_cache: Optional[SNMPWalkCache] = None) -> SNMPRowInfo:
     if column in SPECIAL_COLUMNS:
         return []
 
@@ -243,35 +265,27 @@ def _get_snmpwalk(section_name: Optional[SectionName], oid: OID, fetchoid: OID,
     cached = _get_cached_snmpwalk(backend.hostname, fetchoid) if get_from_cache else None
     if cached is not None:
         return cached
-    rowinfo = _perform_snmpwalk(section_name, oid, fetchoid, backend=backend)
+    rowinfo = _perform_snmpwalk(section_name, oid, fetchoid, backend=backend, walk_cache=walk_cache)
     if save_to_cache:
         _save_snmpwalk_cache(backend.hostname, fetchoid, rowinfo)
     return rowinfo
 
 
-def _perform_snmpwalk(section_name: Optional[SectionName], base_oid: OID, fetchoid: OID, *,
-                      backend: ABCSNMPBackend) -> SNMPRowInfo:
+def _perform_snmpwalk(section_name: Optional[SectionName],
+                      base_oid: OID,
+                      fetchoid: OID,
+                      *,
+                      backend: ABCSNMPBackend,
+                      walk_cache: Optional[SNMPWalkCache] = None) -> SNMPRowInfo:
     added_oids: Set[OID] = set([])
     rowinfo: SNMPRowInfo = []
 
     for context_name in backend.config.snmpv3_contexts_of(section_name):
-        rows = backend.walk(
-            oid=fetchoid,
-            # revert back to legacy "possilbly-empty-string"-Type
-            # TODO: pass Optional[SectionName] along!
-            check_plugin_name=str(section_name) if section_name else "",
-            table_base_oid=base_oid,
-            context_name=context_name,
-        )
-
-        # I've seen a broken device (Mikrotik Router), that broke after an
-        # update to RouterOS v6.22. It would return 9 time the same OID when
-        # .1.3.6.1.2.1.1.1.0 was being walked. We try to detect these situations
-        # by removing any duplicate OID information
-        if len(rows) > 1 and rows[0][0] == rows[1][0]:
-            console.vverbose("Detected broken SNMP agent. Ignoring duplicate OID %s.\n" %
-                             rows[0][0])
-            rows = rows[:1]
+        cached_rows = None if walk_cache is None else walk_cache.get((context_name, fetchoid))
+        if cached_rows is not None:
+            rows = cached_rows
+        else:
+            rows = _walk(section_name, base_oid, fetchoid, context_name, backend=backend)
 
         for row_oid, val in rows:
             if row_oid in added_oids:
@@ -283,6 +297,135 @@ def _perform_snmpwalk(section_name: Optional[SectionName], base_oid: OID, fetcho
     return rowinfo
 
 
+def _walk(section_name: Optional[SectionName], base_oid: OID, fetchoid: OID,
+          context_name: SNMPContext, *, backend: ABCSNMPBackend) -> SNMPRowInfo:
+    rows = backend.walk(
+        oid=fetchoid,
+        # revert back to legacy "possilbly-empty-string"-Type
+        # TODO: pass Optional[SectionName] along!
+        check_plugin_name=str(section_name) if section_name else "",
+        table_base_oid=base_oid,
+        context_name=context_name,
+    )
+    return _remove_broken_duplicates(rows)
+
+
+def _remove_broken_duplicates(rows: SNMPRowInfo) -> SNMPRowInfo:
+    # I've seen a broken device (Mikrotik Router), that broke after an
+    # update to RouterOS v6.22. It would return 9 time the same OID when
+    # .1.3.6.1.2.1.1.1.0 was being walked. We try to detect these situations
+    # by removing any duplicate OID information
+    if len(rows) > 1 and rows[0][0] == rows[1][0]:
+        console.vverbose("Detected broken SNMP agent. Ignoring duplicate OID %s.\n" % rows[0][0])
+        return rows[:1]
+    return rows
+
+
+def prefetch_snmp_walks(oid_infos: Mapping[SectionName, Sequence[Union[OIDInfo, SNMPTree]]],
+                        use_snmpwalk_cache: bool,
+                        *,
+                        backend: ABCSNMPBackend,
+                        max_parallel_walks: int = 1) -> SNMPWalkCache:
+    """Fetch the walks needed by all given sections of a host in one batch
+
+    The fetch OIDs of all sections are merged and duplicates are removed. OIDs within a
+    sub tree that is walked anyways are not walked on their own, but sliced out of the
+    walk of the sub tree. Up to max_parallel_walks walks are executed at the same time.
+
+    The result is meant to be handed over to get_snmp_table() / get_snmp_table_cached()
+    for each of the sections.
+    """
+    if backend.config.oid_range_limits:
+        # The walked ranges depend on the section. Don't share the walks in this case.
+        return {}
+
+    requested: Dict[Tuple[SNMPContext, OID], Tuple[SectionName, OID]] = {}
+    for section_name, oid_info in oid_infos.items():
+        contexts = backend.config.snmpv3_contexts_of(section_name)
+        for entry in oid_info:
+            for oid, fetchoid, column in _iter_fetch_oids(entry):
+                if column in SPECIAL_COLUMNS:
+                    continue
+                if isinstance(column, OIDCached) and use_snmpwalk_cache:
+                    continue  # Will most likely be served by the walk cache
+                for context_name in contexts:
+                    requested.setdefault((context_name, fetchoid), (section_name, oid))
+
+    walks = _remove_covered_oids(requested)
+    console.vverbose("  Prefetching %d SNMP walks for %d requested OIDs\n" %
+                     (len(walks), len(requested)))
+
+    def walk(key: Tuple[SNMPContext, OID]) -> SNMPRowInfo:
+        context_name, fetchoid = key
+        section_name, base_oid = requested[key]
+        return _walk(section_name, base_oid, fetchoid, context_name, backend=backend)
+
+    if max_parallel_walks > 1 and len(walks) > 1:
+        executor = ThreadPoolExecutor(max_workers=max_parallel_walks)
+        futures = [executor.submit(walk, key) for key in walks]
+        try:
+            results = {key: future.result() for key, future in zip(walks, futures)}
+        except BaseException:
+            # E.g. MKTimeout or MKTerminate, which are only raised in this thread. Stop the
+            # running walks and don't wait for them.
+            for future in futures:
+                future.cancel()
+            backend.cancel_walks()
+            executor.shutdown(wait=False)
+            raise
+        executor.shutdown()
+    else:
+        results = {key: walk(key) for key in walks}
+
+    walk_cache: SNMPWalkCache = {}
+    for (context_name, fetchoid), covering_key in _covering_walks(requested, walks):
+        rows = results[covering_key]
+        if covering_key[1] != fetchoid:
+            prefix = fetchoid + "."
+            rows = _remove_broken_duplicates(
+                [row for row in rows if row[0] == fetchoid or row[0].startswith(prefix)])
+        walk_cache[(context_name, fetchoid)] = rows
+    return walk_cache
+
+
+def _iter_fetch_oids(oid_info: Union[OIDInfo, SNMPTree]) -> Iterable[Tuple[OID, OID, SNMPColumn]]:
+    oid, suboids, targetcolumns = _make_target_columns(oid_info)
+    for suboid in suboids:
+        for column in targetcolumns:
+            yield oid, _compute_fetch_oid(oid, suboid, column), column
+
+
+def _remove_covered_oids(
+        requested: Iterable[Tuple[SNMPContext, OID]]) -> List[Tuple[SNMPContext, OID]]:
+    """Drop all OIDs that are part of the sub tree of another requested OID"""
+    walks: List[Tuple[SNMPContext, OID]] = []
+    # The descendants of an OID directly follow the OID in numeric order
+    for context_name, fetchoid in sorted(requested,
+                                         key=lambda k: (str(k[0]), _key_oids(k[1].strip(".")))):
+        if walks and walks[-1][0] == context_name and _is_in_subtree(fetchoid, walks[-1][1]):
+            continue
+        walks.append((context_name, fetchoid))
+    return walks
+
+
+def _covering_walks(
+    requested: Iterable[Tuple[SNMPContext, OID]], walks: List[Tuple[SNMPContext, OID]]
+) -> Iterable[Tuple[Tuple[SNMPContext, OID], Tuple[SNMPContext, OID]]]:
+    by_context: Dict[SNMPContext, List[OID]] = {}
+    for context_name, fetchoid in walks:
+        by_context.setdefault(context_name, []).append(fetchoid)
+
+    for context_name, fetchoid in requested:
+        for walked_oid in by_context[context_name]:
+            if _is_in_subtree(fetchoid, walked_oid):
+                yield (context_name, fetchoid), (context_name, walked_oid)
+                break
+
+
+def _is_in_subtree(oid: OID, tree_oid: OID) -> bool:
+    return oid == tree_oid or oid.startswith(tree_oid + ".")
+
+
 def _compute_fetch_oid(oid: Union[OID, OIDSpec], suboid: Optional[OID], column: SNMPColumn) -> OID:
     if suboid:
         fetchoid = "%s.%s" % (oid, suboid)
@@ -400,7 +543,7 @@ def _save_snmpwalk_cache(hostname: HostName, fetchoid: OID, rowinfo: SNMPRowInfo
         os.makedirs(os.path.dirname(path))
 
     console.vverbose("  Saving walk of %s to walk cache %s\n" % (fetchoid, path))
-    store.save_object_to_file(path, rowinfo, pretty=False)
+    store.save_object_to_file(path, rowinfo, fast=True)
 
 
 def _snmpwalk_cache_path(hostname: HostName, fetchoid: OID) -> str:
@@ -217,6 +217,13 @@ class ABCSNMPBackend(metaclass=abc.ABCMeta):
              context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
         return []
 
+    def cancel_walks(self) -> None:
+        """Stop the walks running in other threads and don't start any new walk
+
+        prefetch_snmp_walks() calls this when it is interrupted, e.g. by a timeout, which
+        is only raised in the main thread. Backends which run their walks in the calling
+        thread have nothing to do."""
+
 
 OID_END = 0  # Suffix-part of OID that was not specified
 OID_STRING = -1  # Complete OID as string ".1.3.6.1.4.1.343...."
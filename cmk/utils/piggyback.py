@@ -9,10 +9,12 @@ import logging
 import os
 from pathlib import Path
 import tempfile
-from typing import Optional, Dict, Iterator, List, Tuple, NamedTuple
+import time
+from typing import Callable, Optional, Dict, Iterator, List, Tuple, NamedTuple
 
 import cmk.utils
 import cmk.utils.paths
+import cmk.utils.piggyback_spool as piggyback_spool
 import cmk.utils.translations
 import cmk.utils.store as store
 from cmk.utils.exceptions import MKGeneralException
@@ -24,12 +26,14 @@ from cmk.utils.log import VERBOSE
 log.setup_console_logging()
 logger = logging.getLogger("cmk.base")
 
+# The spool_index is only set for spooled data, see cmk.utils.piggyback_spool
 PiggybackFileInfo = NamedTuple('PiggybackFileInfo', [
     ('source_hostname', str),
     ('file_path', Path),
     ('successfully_processed', bool),
     ('reason', str),
     ('reason_status', int),
+    ('spool_index', Optional[piggyback_spool.SpoolIndex]),
 ])
 
 PiggybackRawDataInfo = NamedTuple('PiggybackRawDataInfo', [
@@ -42,6 +46,8 @@ PiggybackRawDataInfo = NamedTuple('PiggybackRawDataInfo', [
 ])
 
 PiggybackTimeSettings = List[Tuple[Optional[str], str, int]]
+# Source host -> [(piggybacked host, time settings), ...] of the spooled data
+SpooledHostsSettings = Dict[str, List[Tuple[str, Dict[Tuple[Optional[str], str], int]]]]
 
 # ***** Terminology *****
 # "piggybacked_host_folder":
@@ -59,6 +65,10 @@ PiggybackTimeSettings = List[Tuple[Optional[str], str, int]]
 # "source_hostname":
 # - Path(tmp/check_mk/piggyback/HOST/SOURCE).name
 # - Path(tmp/check_mk/piggyback_sources/SOURCE).name
+# - Path(tmp/check_mk/piggyback_spool/SOURCE).name
+#
+# Piggyback data is either stored in the files above or in the spool of the source host
+# (see cmk.utils.piggyback_spool). The data of both stores is read.
 
 
 def get_piggyback_raw_data(piggybacked_hostname: str,
@@ -87,7 +97,11 @@ def get_piggyback_raw_data(piggybacked_hostname: str,
             # Raw data is always stored as bytes. Later the content is
             # converted to unicode in abstact.py:_parse_info which respects
             # 'encoding' in section options.
-            raw_data = store.load_bytes_from_file(file_info.file_path)
+            if file_info.spool_index is None:
+                raw_data = store.load_bytes_from_file(file_info.file_path)
+            else:
+                raw_data = piggyback_spool.read_raw_data(file_info.spool_index,
+                                                         piggybacked_hostname)
 
         except IOError as e:
             reason = "Cannot read piggyback raw data from source '%s'" % file_info.source_hostname
@@ -134,14 +148,14 @@ def get_source_and_piggyback_hosts(
     """Generates all piggyback pig/piggybacked host pairs that have up-to-date data"""
 
     # Pylint bug (https://github.com/PyCQA/pylint/issues/1660). Fixed with pylint 2.x
-    for piggybacked_host_folder in _get_piggybacked_host_folders():
+    for piggybacked_hostname in _get_piggybacked_hostnames():
         for file_info in _get_piggyback_processed_file_infos(
-                piggybacked_host_folder.name,
+                piggybacked_hostname,
                 time_settings,
         ):
             if not file_info.successfully_processed:
                 continue
-            yield file_info.source_hostname, piggybacked_host_folder.name
+            yield file_info.source_hostname, piggybacked_hostname
 
 
 def has_piggyback_raw_data(piggybacked_hostname: str, time_settings: PiggybackTimeSettings) -> bool:
@@ -160,7 +174,12 @@ def _get_piggyback_processed_file_infos(
     functions. Therefor all these functions needs to deal with suddenly vanishing or
     updated files/directories.
     """
-    source_hostnames = get_source_hostnames(piggybacked_hostname)
+    piggybacked_host_folder = cmk.utils.paths.piggyback_dir / Path(piggybacked_hostname)
+    file_source_hostnames = [
+        source_host.name for source_host in _get_piggybacked_host_sources(piggybacked_host_folder)
+    ]
+    spool_indexes = _get_spool_indexes(piggybacked_hostname)
+    source_hostnames = sorted(set(file_source_hostnames).union(spool_indexes))
     matching_time_settings = _get_matching_time_settings(source_hostnames, piggybacked_hostname,
                                                          time_settings)
 
@@ -170,16 +189,46 @@ def _get_piggyback_processed_file_infos(
             continue
 
         piggyback_file_path = _get_piggybacked_file_path(source_hostname, piggybacked_hostname)
-
-        successfully_processed, reason, reason_status = _get_piggyback_processed_file_info(
-            source_hostname, piggybacked_hostname, piggyback_file_path, matching_time_settings)
+        spool_index = spool_indexes.get(source_hostname)
+        if spool_index is not None and (source_hostname not in file_source_hostnames or
+                                        _is_spool_entry_newer(spool_index, piggybacked_hostname,
+                                                              piggyback_file_path)):
+            successfully_processed, reason, reason_status = _get_spooled_processed_info(
+                spool_index, piggybacked_hostname, matching_time_settings)
+            piggyback_file_path = spool_index.data_path
+        else:
+            spool_index = None
+            successfully_processed, reason, reason_status = _get_piggyback_processed_file_info(
+                source_hostname, piggybacked_hostname, piggyback_file_path, matching_time_settings)
 
         piggyback_file_info = PiggybackFileInfo(source_hostname, piggyback_file_path,
-                                                successfully_processed, reason, reason_status)
+                                                successfully_processed, reason, reason_status,
+                                                spool_index)
         file_infos.append(piggyback_file_info)
     return file_infos
 
 
+def _get_spool_indexes(piggybacked_hostname: str) -> Dict[str, piggyback_spool.SpoolIndex]:
+    return {
+        index.source_hostname: index
+        for index in piggyback_spool.get_indexes()
+        if index.entry(piggybacked_hostname) is not None
+    }
+
+
+def _is_spool_entry_newer(spool_index: piggyback_spool.SpoolIndex, piggybacked_hostname: str,
+                          piggyback_file_path: Path) -> bool:
+    """Decide between the data of both stores in case the source switched between them"""
+    entry = spool_index.entry(piggybacked_hostname)
+    assert entry is not None
+    try:
+        return entry.mtime >= piggyback_file_path.stat().st_mtime
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return True
+        raise
+
+
 def _get_matching_time_settings(
         source_hostnames: List[str], piggybacked_hostname: str,
         time_settings: PiggybackTimeSettings) -> Dict[Tuple[Optional[str], str], int]:
@@ -201,25 +250,57 @@ def _get_matching_time_settings(
 def _get_piggyback_processed_file_info(
         source_hostname: str, piggybacked_hostname: str, piggyback_file_path: Path,
         time_settings: Dict[Tuple[Optional[str], str], int]) -> Tuple[bool, str, int]:
-
-    max_cache_age = _get_max_cache_age(source_hostname, piggybacked_hostname, time_settings)
-    validity_period = _get_validity_period(source_hostname, piggybacked_hostname, time_settings)
-    validity_state = _get_validity_state(source_hostname, piggybacked_hostname, time_settings)
-
     try:
         file_age = cmk.utils.cachefile_age(piggyback_file_path)
     except MKGeneralException:
         return False, "Piggyback file might have been deleted", 0
 
+    status_file_path = _get_source_status_file_path(source_hostname)
+    return _eval_piggyback_data_age(
+        source_hostname,
+        piggybacked_hostname,
+        time_settings,
+        file_age,
+        is_source_sending=status_file_path.exists,
+        is_outdated=lambda: _is_piggyback_file_outdated(status_file_path, piggyback_file_path),
+    )
+
+
+def _get_spooled_processed_info(
+        spool_index: piggyback_spool.SpoolIndex, piggybacked_hostname: str,
+        time_settings: Dict[Tuple[Optional[str], str], int]) -> Tuple[bool, str, int]:
+    """Same as _get_piggyback_processed_file_info() but answered by the index of the spool"""
+    entry = spool_index.entry(piggybacked_hostname)
+    if entry is None:
+        return False, "Piggyback file might have been deleted", 0
+
+    last_contact = spool_index.last_contact
+    return _eval_piggyback_data_age(
+        spool_index.source_hostname,
+        piggybacked_hostname,
+        time_settings,
+        time.time() - entry.mtime,
+        is_source_sending=lambda: last_contact is not None,
+        is_outdated=lambda: last_contact is not None and last_contact > entry.mtime,
+    )
+
+
+def _eval_piggyback_data_age(source_hostname: str, piggybacked_hostname: str,
+                             time_settings: Dict[Tuple[Optional[str], str], int], file_age: float,
+                             is_source_sending: Callable[[], bool],
+                             is_outdated: Callable[[], bool]) -> Tuple[bool, str, int]:
+    max_cache_age = _get_max_cache_age(source_hostname, piggybacked_hostname, time_settings)
+    validity_period = _get_validity_period(source_hostname, piggybacked_hostname, time_settings)
+    validity_state = _get_validity_state(source_hostname, piggybacked_hostname, time_settings)
+
     if file_age > max_cache_age:
         return False, "Piggyback file too old: %s" % Age(file_age - max_cache_age), 0
 
-    status_file_path = _get_source_status_file_path(source_hostname)
-    if not status_file_path.exists():
+    if not is_source_sending():
         reason = "Source '%s' not sending piggyback data" % source_hostname
         return _eval_file_in_validity_period(file_age, validity_period, validity_state, reason)
 
-    if _is_piggyback_file_outdated(status_file_path, piggyback_file_path):
+    if is_outdated():
         reason = "Piggyback file not updated by source '%s'" % source_hostname
         return _eval_file_in_validity_period(file_age, validity_period, validity_state, reason)
 
@@ -285,11 +366,24 @@ def remove_source_status_file(source_hostname: str) -> bool:
     """Remove the source_status_file of this piggyback host which will
     mark the piggyback data from this source as outdated."""
     source_status_path = _get_source_status_file_path(source_hostname)
-    return _remove_piggyback_file(source_status_path)
+    removed_last_contact = piggyback_spool.remove_last_contact(source_hostname)
+    return _remove_piggyback_file(source_status_path) or removed_last_contact
+
+
+def store_piggyback_raw_data(source_hostname: str,
+                             piggybacked_raw_data: Dict[str, List[bytes]],
+                             spool: bool = False) -> None:
+    """Store the piggyback data received from the source host
 
+    With spool=True the data is stored in the spool of the source host instead of one
+    file per piggybacked host. The data previously stored in the other store is marked
+    as outdated."""
+    if spool:
+        _store_spooled_raw_data(source_hostname, piggybacked_raw_data)
+        return
+
+    piggyback_spool.remove_last_contact(source_hostname)
 
-def store_piggyback_raw_data(source_hostname: str, piggybacked_raw_data: Dict[str,
-                                                                              List[bytes]]) -> None:
     piggyback_file_paths = []
     for piggybacked_hostname, lines in piggybacked_raw_data.items():
         piggyback_file_path = _get_piggybacked_file_path(source_hostname, piggybacked_hostname)
@@ -318,6 +412,30 @@ def store_piggyback_raw_data(source_hostname: str, piggybacked_raw_data: Dict[st
         remove_source_status_file(source_hostname)
 
 
+def _store_spooled_raw_data(
+    source_hostname: str,
+    piggybacked_raw_data: Dict[str, List[bytes]],
+) -> None:
+    for piggybacked_hostname in piggybacked_raw_data:
+        logger.log(
+            VERBOSE,
+            "Storing piggyback data for: %s",
+            piggybacked_hostname,
+        )
+
+    if piggybacked_raw_data:
+        logger.log(VERBOSE, "Received piggyback data for %d hosts", len(piggybacked_raw_data))
+    else:
+        logger.log(VERBOSE, "Received no piggyback data")
+
+    piggyback_spool.store_raw_data(
+        source_hostname, {
+            piggybacked_hostname: b"%s\n" % b"\n".join(lines)
+            for piggybacked_hostname, lines in piggybacked_raw_data.items()
+        })
+    _remove_piggyback_file(_get_source_status_file_path(source_hostname))
+
+
 def _store_status_file_of(status_file_path: Path, piggyback_file_paths: List[Path]) -> None:
     store.makedirs(status_file_path.parent)
 
@@ -364,16 +482,34 @@ def _store_status_file_of(status_file_path: Path, piggyback_file_paths: List[Pat
 
 def get_source_hostnames(piggybacked_hostname: Optional[str] = None) -> List[str]:
     if piggybacked_hostname is None:
-        return [
+        # A source may have plain piggyback files and spooled data for several hosts
+        source_hostnames = {
             source_host.name
             for piggybacked_host_folder in _get_piggybacked_host_folders()
             for source_host in _get_piggybacked_host_sources(piggybacked_host_folder)
-        ]
+        }
+        source_hostnames.update(index.source_hostname
+                                for index in piggyback_spool.get_indexes()
+                                if index.piggybacked_hostnames())
+        return sorted(source_hostnames)
 
     piggybacked_host_folder = cmk.utils.paths.piggyback_dir / Path(piggybacked_hostname)
-    return [
+    source_hostnames = [
         source_host.name for source_host in _get_piggybacked_host_sources(piggybacked_host_folder)
     ]
+    return source_hostnames + [
+        source_hostname for source_hostname in _get_spool_indexes(piggybacked_hostname)
+        if source_hostname not in source_hostnames
+    ]
+
+
+def _get_piggybacked_hostnames() -> List[str]:
+    piggybacked_hostnames = {
+        piggybacked_host_folder.name for piggybacked_host_folder in _get_piggybacked_host_folders()
+    }
+    for index in piggyback_spool.get_indexes():
+        piggybacked_hostnames.update(index.piggybacked_hostnames())
+    return sorted(piggybacked_hostnames)
 
 
 def _get_piggybacked_host_folders() -> List[Path]:
@@ -449,9 +585,11 @@ def cleanup_piggyback_files(time_settings: List[Tuple[Optional[str], str, int]])
     )
 
     piggybacked_hosts_settings = _get_piggybacked_hosts_settings(time_settings)
+    spooled_hosts_settings = _get_spooled_hosts_settings(time_settings)
 
-    _cleanup_old_source_status_files(piggybacked_hosts_settings)
+    _cleanup_old_source_status_files(piggybacked_hosts_settings, spooled_hosts_settings)
     _cleanup_old_piggybacked_files(piggybacked_hosts_settings)
+    _cleanup_old_spooled_data(spooled_hosts_settings)
 
 
 def _get_piggybacked_hosts_settings(
@@ -461,7 +599,7 @@ def _get_piggybacked_hosts_settings(
     for piggybacked_host_folder in _get_piggybacked_host_folders():
         source_hosts = _get_piggybacked_host_sources(piggybacked_host_folder)
         matching_time_settings = _get_matching_time_settings(
-            [source_host.name for source_host in source_hosts],
+            get_source_hostnames(piggybacked_host_folder.name),
             piggybacked_host_folder.name,
             time_settings,
         )
@@ -470,8 +608,28 @@ def _get_piggybacked_hosts_settings(
     return piggybacked_hosts_settings
 
 
+def _get_spooled_hosts_settings(time_settings: PiggybackTimeSettings) -> SpooledHostsSettings:
+    """The piggybacked hosts and their time settings by the source hosts of the spools"""
+    matching_time_settings_by_host: Dict[str, Dict[Tuple[Optional[str], str], int]] = {}
+    spooled_hosts_settings: SpooledHostsSettings = {}
+    for index in piggyback_spool.get_indexes():
+        hosts_settings = spooled_hosts_settings.setdefault(index.source_hostname, [])
+        for piggybacked_hostname in index.piggybacked_hostnames():
+            matching_time_settings = matching_time_settings_by_host.get(piggybacked_hostname)
+            if matching_time_settings is None:
+                matching_time_settings = matching_time_settings_by_host[
+                    piggybacked_hostname] = _get_matching_time_settings(
+                        get_source_hostnames(piggybacked_hostname),
+                        piggybacked_hostname,
+                        time_settings,
+                    )
+            hosts_settings.append((piggybacked_hostname, matching_time_settings))
+    return spooled_hosts_settings
+
+
 def _cleanup_old_source_status_files(
-    piggybacked_hosts_settings: List[Tuple[Path, List[Path], Dict[Tuple[Optional[str], str], int]]]
+    piggybacked_hosts_settings: List[Tuple[Path, List[Path], Dict[Tuple[Optional[str], str], int]]],
+    spooled_hosts_settings: SpooledHostsSettings,
 ) -> None:
     """Remove source status files which exceed configured maximum cache age.
     There may be several 'Piggybacked Host Files' rules where the max age is configured.
@@ -490,6 +648,12 @@ def _cleanup_old_source_status_files(
             elif max_cache_age >= max_cache_age_of_source:
                 max_cache_age_by_sources[source_host.name] = max_cache_age
 
+    for source_hostname, hosts_settings in spooled_hosts_settings.items():
+        for piggybacked_hostname, time_settings in hosts_settings:
+            max_cache_age = _get_max_cache_age(source_hostname, piggybacked_hostname, time_settings)
+            max_cache_age_by_sources[source_hostname] = max(
+                max_cache_age, max_cache_age_by_sources.get(source_hostname, max_cache_age))
+
     for source_state_file in _get_source_state_files():
         try:
             file_age = cmk.utils.cachefile_age(source_state_file)
@@ -515,6 +679,20 @@ def _cleanup_old_source_status_files(
             )
             _remove_piggyback_file(source_state_file)
 
+    # The last contact time in the index of a spool replaces its source status file
+    for source_hostname in spooled_hosts_settings:
+        max_cache_age_of_source = max_cache_age_by_sources.get(source_hostname)
+        if max_cache_age_of_source is None:
+            logger.log(VERBOSE, "No piggyback data from source '%s'", source_hostname)
+            continue
+
+        if piggyback_spool.remove_last_contact(source_hostname, max_age=max_cache_age_of_source):
+            logger.log(
+                VERBOSE,
+                "Last contact with piggyback source '%s' is outdated. Remove it.",
+                source_hostname,
+            )
+
 
 def _cleanup_old_piggybacked_files(
     piggybacked_hosts_settings: List[Tuple[Path, List[Path], Dict[Tuple[Optional[str], str], int]]]
@@ -552,3 +730,31 @@ def _cleanup_old_piggybacked_files(
                 "Piggyback folder '%s' is empty. Removed it.",
                 piggybacked_host_folder,
             )
+
+
+def _cleanup_old_spooled_data(spooled_hosts_settings: SpooledHostsSettings) -> None:
+    """Remove spooled piggyback data which exceeds the configured maximum cache age."""
+
+    for source_hostname, hosts_settings in spooled_hosts_settings.items():
+        # The last contact may have been removed in the meantime
+        index = piggyback_spool.load_index(source_hostname)
+        if index is None:
+            continue
+
+        outdated_hostnames = []
+        for piggybacked_hostname, time_settings in hosts_settings:
+            successfully_processed, reason, _reason_status = _get_spooled_processed_info(
+                index, piggybacked_hostname, time_settings)
+            if not successfully_processed:
+                logger.log(
+                    VERBOSE,
+                    "Spooled piggyback data of '%s' from source '%s' is outdated (%s). "
+                    "Remove it.",
+                    piggybacked_hostname,
+                    source_hostname,
+                    reason,
+                )
+                outdated_hostnames.append(piggybacked_hostname)
+
+        if outdated_hostnames or (not index.piggybacked_hostnames() and index.last_contact is None):
+            piggyback_spool.remove_entries(source_hostname, outdated_hostnames)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Consolidated store of the piggyback data of a source host
+
+The default piggyback store (see cmk.utils.piggyback) keeps one file per pair of
+source host and piggybacked host plus a status file per source host. Special agents
+which deliver data for thousands of piggybacked hosts produce a lot of files to stat
+and read that way. The spool keeps everything of a source host in one directory:
+
+* tmp/check_mk/piggyback_spool/SOURCE/data.N holds the piggyback data of all
+  piggybacked hosts of the source. New data is appended. The file is rewritten (as
+  generation N+1) once most of its content is not referenced anymore.
+* tmp/check_mk/piggyback_spool/SOURCE/index holds the offset, the length and the
+  update time of the data of each piggybacked host and the time of the last contact
+  with the source, which replaces the status file of the default store.
+
+Readers keep the indexes in memory until an index file is replaced. The data of a
+piggybacked host is found with one lookup and its validity is decided by the times
+recorded in the index.
+"""
+
+import errno
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import cmk.utils.paths
+import cmk.utils.store as store
+
+_INDEX_VERSION = 1
+# Data files are only rewritten in case they are bigger than this and the data which is
+# not referenced anymore is bigger than the referenced data
+_MIN_COMPACT_SIZE = 1024 * 1024
+
+SpoolEntry = NamedTuple("SpoolEntry", [
+    ("offset", int),
+    ("length", int),
+    ("mtime", float),
+])
+
+# Source host name -> ((inode, mtime) of the index file, index)
+_index_cache: Dict[str, Tuple[Tuple[int, int], "SpoolIndex"]] = {}
+
+
+class SpoolIndex:
+    """The index of the spooled piggyback data of one source host"""
+    def __init__(self,
+                 source_hostname: str,
+                 generation: int = 0,
+                 size: int = 0,
+                 last_contact: Optional[float] = None,
+                 entries: Optional[Dict[str, Tuple[int, int, float]]] = None) -> None:
+        super().__init__()
+        self.source_hostname = source_hostname
+        self.generation = generation
+        self.size = size
+        # None: The source did not send piggyback data the last time it was contacted
+        self.last_contact = last_contact
+        self._entries = {} if entries is None else entries
+
+    @property
+    def data_path(self) -> Path:
+        return _spool_dir(self.source_hostname) / ("data.%d" % self.generation)
+
+    def piggybacked_hostnames(self) -> List[str]:
+        return list(self._entries)
+
+    def entries(self) -> List[Tuple[str, SpoolEntry]]:
+        return [(piggybacked_hostname, SpoolEntry(*entry))
+                for piggybacked_hostname, entry in self._entries.items()]
+
+    def entry(self, piggybacked_hostname: str) -> Optional[SpoolEntry]:
+        entry = self._entries.get(piggybacked_hostname)
+        return None if entry is None else SpoolEntry(*entry)
+
+    def set_entry(self, piggybacked_hostname: str, entry: SpoolEntry) -> None:
+        self._entries[piggybacked_hostname] = tuple(entry)  # type: ignore[assignment]
+
+    def remove_entry(self, piggybacked_hostname: str) -> None:
+        self._entries.pop(piggybacked_hostname, None)
+
+    def used_size(self) -> int:
+        return sum(length for _offset, length, _mtime in self._entries.values())
+
+    def to_object(self) -> Dict:
+        return {
+            "version": _INDEX_VERSION,
+            "generation": self.generation,
+            "size": self.size,
+            "last_contact": self.last_contact,
+            "entries": self._entries,
+        }
+
+
+def get_source_hostnames() -> List[str]:
+    try:
+        return [
+            spool_dir.name
+            for spool_dir in cmk.utils.paths.piggyback_spool_dir.iterdir()
+            if not spool_dir.name.startswith(".")
+        ]
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return []
+        raise
+
+
+def get_indexes() -> List[SpoolIndex]:
+    indexes = []
+    for source_hostname in get_source_hostnames():
+        index = load_index(source_hostname)
+        if index is not None:
+            indexes.append(index)
+    return indexes
+
+
+def load_index(source_hostname: str) -> Optional[SpoolIndex]:
+    """Returns the current index of the source, it is only read again after changes
+
+    The returned index must not be modified."""
+    index_path = _index_path(source_hostname)
+    try:
+        stat = index_path.stat()
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            _index_cache.pop(source_hostname, None)
+            return None
+        raise
+
+    key = (stat.st_ino, stat.st_mtime_ns)
+    cached = _index_cache.get(source_hostname)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    index = _read_index(source_hostname)
+    if index is None:
+        _index_cache.pop(source_hostname, None)
+    else:
+        _index_cache[source_hostname] = (key, index)
+    return index
+
+
+def _read_index(source_hostname: str) -> Optional[SpoolIndex]:
+    data = store.load_object_from_file(_index_path(source_hostname), default={})
+    if data.get("version") != _INDEX_VERSION:
+        return None
+    return SpoolIndex(source_hostname, data["generation"], data["size"], data["last_contact"],
+                      data["entries"])
+
+
+def read_raw_data(index: SpoolIndex, piggybacked_hostname: str) -> bytes:
+    """Read the spooled data of a piggybacked host
+
+    Raises IOError in case the data can not be read."""
+    for attempt in range(2):
+        entry = index.entry(piggybacked_hostname)
+        if entry is None:
+            break
+
+        try:
+            with index.data_path.open("rb") as f:
+                raw_data = os.pread(f.fileno(), entry.length, entry.offset)
+        except IOError as e:
+            if e.errno != errno.ENOENT or attempt:
+                raise
+            # The data file has been rewritten in the meantime: Use the current index
+            new_index = load_index(index.source_hostname)
+            if new_index is None:
+                break
+            index = new_index
+            continue
+
+        if len(raw_data) != entry.length:
+            raise IOError("Incomplete piggyback data in '%s'" % index.data_path)
+        return raw_data
+
+    raise IOError(
+        errno.ENOENT, "No piggyback data of '%s' in '%s'" %
+        (piggybacked_hostname, _spool_dir(index.source_hostname)))
+
+
+def store_raw_data(source_hostname: str, piggybacked_raw_data: Dict[str, bytes]) -> None:
+    """Append the data of the piggybacked hosts to the spool of the source
+
+    The data of other piggybacked hosts of the source is kept, but it is outdated from
+    now on. In case no data was sent, the data of all piggybacked hosts is outdated."""
+    index_path = _index_path(source_hostname)
+    with store.locked(index_path):
+        index = _read_index(source_hostname) or SpoolIndex(source_hostname)
+        if piggybacked_raw_data:
+            now = time.time()
+            fd = os.open(str(index.data_path), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o660)
+            with os.fdopen(fd, "wb") as f:
+                # Start behind the data of interrupted calls which is not referenced
+                offset = f.seek(0, os.SEEK_END)
+                for piggybacked_hostname, raw_data in piggybacked_raw_data.items():
+                    f.write(raw_data)
+                    index.set_entry(piggybacked_hostname, SpoolEntry(offset, len(raw_data), now))
+                    offset += len(raw_data)
+            index.size = offset
+            index.last_contact = now
+        else:
+            index.last_contact = None
+        _save_index(index)
+
+
+def remove_last_contact(source_hostname: str, max_age: Optional[float] = None) -> bool:
+    """Forget the last contact with the source which outdates all of its data
+
+    In case max_age is given, the last contact is only forgotten when it is older."""
+    index_path = _index_path(source_hostname)
+    if not index_path.exists():
+        return False
+
+    with store.locked(index_path):
+        index = _read_index(source_hostname)
+        if index is None or index.last_contact is None:
+            return False
+        if max_age is not None and time.time() - index.last_contact <= max_age:
+            return False
+        index.last_contact = None
+        _save_index(index)
+    return True
+
+
+def remove_entries(source_hostname: str, piggybacked_hostnames: Iterable[str]) -> None:
+    """Remove the data of the piggybacked hosts from the spool of the source
+
+    The spool of the source is removed once it is empty."""
+    index_path = _index_path(source_hostname)
+    with store.locked(index_path):
+        index = _read_index(source_hostname) or SpoolIndex(source_hostname)
+        for piggybacked_hostname in piggybacked_hostnames:
+            index.remove_entry(piggybacked_hostname)
+
+        if index.piggybacked_hostnames() or index.last_contact is not None:
+            _save_index(index)
+            return
+
+        _remove_file(index.data_path)
+        _remove_file(index_path)
+
+    try:
+        _spool_dir(source_hostname).rmdir()
+    except OSError as e:
+        if e.errno not in (errno.ENOENT, errno.ENOTEMPTY):
+            raise
+
+
+def _save_index(index: SpoolIndex) -> None:
+    """Save the index while holding the lock, the data file is compacted before"""
+    old_data_path = index.data_path
+    used_size = index.used_size()
+    compact = index.size > _MIN_COMPACT_SIZE and index.size - used_size > used_size
+    if compact:
+        _compact(index)
+
+    store.save_object_to_file(_index_path(index.source_hostname), index.to_object(), fast=True)
+
+    if compact:
+        # Readers still using the old index switch to the new one
+        _remove_file(old_data_path)
+
+
+def _compact(index: SpoolIndex) -> None:
+    old_data_path = index.data_path
+    index.generation += 1
+    offset = 0
+    fd = os.open(str(index.data_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o660)
+    with old_data_path.open("rb") as old_file, os.fdopen(fd, "wb") as new_file:
+        old_fd = old_file.fileno()
+        for piggybacked_hostname, entry in sorted(index.entries(), key=lambda e: e[1].offset):
+            new_file.write(os.pread(old_fd, entry.length, entry.offset))
+            index.set_entry(piggybacked_hostname, entry._replace(offset=offset))
+            offset += entry.length
+    index.size = offset
+
+
+def _remove_file(path: Path) -> None:
+    try:
+        path.unlink()
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def _spool_dir(source_hostname: str) -> Path:
+    return cmk.utils.paths.piggyback_spool_dir / source_hostname
+
+
+def _index_path(source_hostname: str) -> Path:
+    return _spool_dir(source_hostname) / "index"
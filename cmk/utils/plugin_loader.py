@@ -3,12 +3,69 @@
 # Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
+"""Import the plugin modules of packages
 
+Plugin modules register their plugins in registries (see cmk.utils.plugin_registry) when
+they are imported. Once lazy loading is enabled, a manifest of the plugin modules which
+do nothing else is created per plugin package. These modules are not imported anymore
+when the package is loaded. Their entries are registered lazily instead, which imports
+the module once one of the entries is needed. A manifest is created again when a file
+of its package has changed.
+
+The import of the plugin modules can be measured to find expensive modules, see
+enable_import_time_measurement().
+"""
+
+import ast
 import importlib
+import os
 from pathlib import Path
 import pkgutil
 import sys
-from typing import Tuple, Optional, List, Generator
+import time
+from types import ModuleType
+from typing import Dict, Tuple, Optional, List, Generator, Set
+
+import cmk.utils.plugin_registry as plugin_registry
+import cmk.utils.store as store
+
+_MANIFEST_VERSION = 1
+
+# The directory of the manifests in case lazy loading is enabled
+_manifest_dir: Optional[Path] = None
+# The modules of which the registry entries have been registered lazily
+_lazy_module_names: Set[str] = set()
+
+# Name of the plugin module -> (cumulated, own) import time in seconds
+_import_times: Optional[Dict[str, Tuple[float, float]]] = None
+# The import time of the nested plugin modules of the modules which are being imported
+_nested_import_times: List[float] = []
+
+# (module name, attribute name) of the registry and the name of the registered entry
+LazyRegistration = Tuple[str, str, str]
+
+
+def enable_lazy_loading(manifest_dir: Path) -> None:
+    """Register the entries of plugin modules lazily from now on
+
+    This has to be done before the plugin packages are imported."""
+    global _manifest_dir
+    _manifest_dir = manifest_dir
+
+
+def enable_import_time_measurement() -> None:
+    """Measure the import of the plugin modules from now on, see import_times()"""
+    global _import_times
+    if _import_times is None:
+        _import_times = {}
+
+
+def import_times() -> Dict[str, Tuple[float, float]]:
+    """Returns the cumulated and the own import time of the imported plugin modules
+
+    The own time of a module does not contain the time of the plugin modules it imported
+    itself (e.g. by importing another plugin package)."""
+    return dict(_import_times or {})
 
 
 def load_plugins_with_exceptions(
@@ -38,14 +95,14 @@ def load_plugins_with_exceptions(
     if module_path:
         for _loader, plugin_name, _is_pkg in pkgutil.walk_packages(module_path):
             try:
-                importlib.import_module("%s.%s" % (package_name, plugin_name))
+                _import_plugin("%s.%s" % (package_name, plugin_name))
             except Exception as exc:
                 yield plugin_name, exc
 
     for file_path in init_file_paths:
         for _loader, plugin_name, _is_pkg in pkgutil.walk_packages([str(file_path)]):
             try:
-                importlib.import_module("%s.%s" % (package_name, plugin_name))
+                _import_plugin("%s.%s" % (package_name, plugin_name))
             except Exception as exc:
                 yield plugin_name, exc
 
@@ -70,8 +127,187 @@ def load_plugins(init_file_path: str, package_name: str) -> None:
     package = sys.modules[package_name]
     module_path: Optional[List[str]] = getattr(package, '__path__')
     if module_path:
-        for _loader, plugin_name, _is_pkg in pkgutil.walk_packages(module_path):
-            importlib.import_module("%s.%s" % (package_name, plugin_name))
+        if _manifest_dir is not None:
+            _load_plugins_lazily(package_name, module_path, _manifest_dir)
+        else:
+            for _loader, plugin_name, _is_pkg in pkgutil.walk_packages(module_path):
+                _import_plugin("%s.%s" % (package_name, plugin_name))
 
     for _loader, plugin_name, _is_pkg in pkgutil.walk_packages([init_file_path]):
-        importlib.import_module("%s.%s" % (package_name, plugin_name))
+        _import_plugin("%s.%s" % (package_name, plugin_name))
+
+
+def _import_plugin(module_name: str) -> None:
+    if _import_times is None or module_name in sys.modules:
+        importlib.import_module(module_name)
+        return
+
+    _nested_import_times.append(0.0)
+    start = time.perf_counter()
+    try:
+        importlib.import_module(module_name)
+    finally:
+        duration = time.perf_counter() - start
+        nested_duration = _nested_import_times.pop()
+        if _nested_import_times:
+            _nested_import_times[-1] += duration
+        _import_times[module_name] = (duration, duration - nested_duration)
+
+
+def _load_plugins_lazily(package_name: str, module_path: List[str], manifest_dir: Path) -> None:
+    fingerprint = _package_fingerprint(module_path)
+    manifest_path = manifest_dir / ("%s.mk" % package_name)
+    manifest = store.load_object_from_file(manifest_path, default={})
+    if manifest.get("version") == _MANIFEST_VERSION and manifest["fingerprint"] == fingerprint:
+        lazy_modules: Dict[str, List[LazyRegistration]] = manifest["modules"]
+        for _loader, plugin_name, _is_pkg in pkgutil.walk_packages(module_path):
+            module_name = "%s.%s" % (package_name, plugin_name)
+            # The modules of sub packages may have been registered lazily by the sub package
+            if module_name in _lazy_module_names or module_name in sys.modules:
+                continue
+            registrations = lazy_modules.get(module_name)
+            if registrations is None or not _register_lazy(module_name, registrations):
+                _import_plugin(module_name)
+        return
+
+    lazy_modules = {}
+    for _loader, plugin_name, _is_pkg in pkgutil.walk_packages(module_path):
+        module_name = "%s.%s" % (package_name, plugin_name)
+        if module_name in _lazy_module_names or module_name in sys.modules:
+            continue
+        registrations = _import_and_record_registrations(module_name)
+        if registrations is not None:
+            lazy_modules[module_name] = registrations
+
+    store.makedirs(manifest_dir)
+    store.save_object_to_file(manifest_path, {
+        "version": _MANIFEST_VERSION,
+        "fingerprint": fingerprint,
+        "modules": lazy_modules,
+    },
+                              fast=True)
+
+
+def _package_fingerprint(module_path: List[str]) -> List[Tuple[str, int, int]]:
+    fingerprint = []
+    for path in module_path:
+        for dir_path, dir_names, file_names in os.walk(path):
+            dir_names[:] = sorted(d for d in dir_names if d != "__pycache__")
+            for file_name in sorted(file_names):
+                if file_name.endswith(".py"):
+                    file_path = os.path.join(dir_path, file_name)
+                    stat = os.stat(file_path)
+                    fingerprint.append((file_path, stat.st_mtime_ns, stat.st_size))
+    return fingerprint
+
+
+def _register_lazy(module_name: str, registrations: List[LazyRegistration]) -> bool:
+    entries = []
+    for registry_module_name, registry_name, name in registrations:
+        try:
+            registry_module = importlib.import_module(registry_module_name)
+        except ImportError:
+            return False
+        registry = getattr(registry_module, registry_name, None)
+        if not isinstance(registry, plugin_registry.Registry):
+            return False
+        entries.append((registry, name))
+
+    for registry, name in entries:
+        registry.register_lazy(name, module_name)
+    _lazy_module_names.add(module_name)
+    return True
+
+
+def _import_and_record_registrations(module_name: str) -> Optional[List[LazyRegistration]]:
+    """Import the module and return its registrations in case they can be made lazily"""
+    outer_registrations = plugin_registry.recorded_registrations
+    plugin_registry.recorded_registrations = recorded = []
+    try:
+        _import_plugin(module_name)
+    finally:
+        plugin_registry.recorded_registrations = outer_registrations
+        if outer_registrations is not None:
+            outer_registrations.extend(recorded)
+
+    if not recorded:
+        return None
+
+    registrations = []
+    for registry, name in recorded:
+        reference = _registry_reference(registry)
+        if reference is None:
+            return None
+        registrations.append(reference + (name,))
+
+    if not _only_registers(sys.modules[module_name]):
+        return None
+    return registrations
+
+
+def _registry_reference(registry: plugin_registry.Registry) -> Optional[Tuple[str, str]]:
+    registry_class = type(registry)
+    if (registry_class.register is not plugin_registry.Registry.register or
+            registry_class.registration_hook is not plugin_registry.Registry.registration_hook):
+        # Registering the entries has side effects which are needed right from the start
+        return None
+
+    # The registries are created by the modules their classes are defined in
+    registry_module = sys.modules.get(registry_class.__module__)
+    for name, value in vars(registry_module).items():
+        if value is registry:
+            return registry_class.__module__, name
+    return None
+
+
+def _only_registers(module: ModuleType) -> bool:
+    """Whether or not the module does nothing but defining things and registering them"""
+    file_path = getattr(module, "__file__", None)
+    if not file_path or not file_path.endswith(".py"):
+        return False
+
+    try:
+        tree = ast.parse(Path(file_path).read_text(encoding="utf-8"))
+    except (IOError, SyntaxError):
+        return False
+
+    for statement in tree.body:
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            continue
+
+        if isinstance(statement, ast.If) and isinstance(
+                statement.test, ast.Name) and statement.test.id == "TYPE_CHECKING":
+            continue
+
+        if isinstance(statement, (ast.FunctionDef, ast.ClassDef)):
+            if all(_is_register(decorator, module) for decorator in statement.decorator_list):
+                continue
+            return False
+
+        if isinstance(statement, ast.Expr):
+            if isinstance(statement.value, ast.Constant) and isinstance(statement.value.value, str):
+                continue  # docstring
+            if _is_register(statement.value, module):
+                continue
+            return False
+
+        if isinstance(statement, ast.Assign) and all(
+                isinstance(target, ast.Name) for target in statement.targets):
+            continue
+
+        if isinstance(statement, ast.AnnAssign) and isinstance(statement.target, ast.Name):
+            continue
+
+        return False
+    return True
+
+
+def _is_register(node: ast.AST, module: ModuleType) -> bool:
+    """Whether or not the node registers something in a registry
+
+    These are calls or decorators like x_registry.register or x_registry.register_page(...)."""
+    if isinstance(node, ast.Call):
+        node = node.func
+    return (isinstance(node, ast.Attribute) and node.attr.startswith("register") and
+            isinstance(node.value, ast.Name) and
+            isinstance(getattr(module, node.value.id, None), plugin_registry.Registry))
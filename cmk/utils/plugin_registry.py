@@ -4,11 +4,21 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import importlib
+import sys
 from abc import abstractmethod
-from typing import Dict, Iterator, Mapping, TypeVar
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, TypeVar
 
 _VT = TypeVar('_VT')
 
+# Placeholder of the entries which are registered by a plugin module that has not been
+# imported yet, see Registry.register_lazy()
+_LAZY: Any = object()
+
+# While cmk.utils.plugin_loader creates the manifest of a plugin package, the
+# registrations made by the plugin modules are recorded here
+recorded_registrations: Optional[List[Tuple["Registry", str]]] = None
+
 # TODO: Refactor all plugins to one way of telling the registry it's name.
 #       for example let all use a static/class method .name().
 #       We could standardize this by making all plugin classes inherit
@@ -41,10 +51,17 @@ class Registry(Mapping[str, _VT]):
         >>> _ = my_registry.register(my_a)
         >>> assert my_registry['my_a'] == my_a
 
+    Entries can also be registered lazily with the name of the module which registers
+    them once it is imported (see cmk.utils.plugin_loader). The module is imported when
+    the entry is looked up for the first time or when the registry is iterated. It is
+    also imported before a lazy entry is replaced or removed by someone else, e.g. by a
+    local plugin, just like the modules are imported in order without lazy loading.
     """
     def __init__(self) -> None:
         super().__init__()
         self._entries: Dict[str, _VT] = {}
+        # Name of the lazily registered entry -> name of the module registering it
+        self._lazy_modules: Dict[str, str] = {}
 
     @abstractmethod
     def plugin_name(self, instance: _VT) -> str:
@@ -54,18 +71,64 @@ class Registry(Mapping[str, _VT]):
         pass
 
     def register(self, instance: _VT) -> _VT:
+        name = self.plugin_name(instance)
+        self._load_lazy_entry_of_other_module(name)
         self.registration_hook(instance)
-        self._entries[self.plugin_name(instance)] = instance
+        # A lazily registered entry keeps its position
+        self._entries[name] = instance
+        self._lazy_modules.pop(name, None)
+        if recorded_registrations is not None:
+            recorded_registrations.append((self, name))
         return instance
 
+    def register_lazy(self, name: str, module_name: str) -> None:
+        """Register an entry which is registered by the given module once it is imported"""
+        if name not in self._entries:
+            self._entries[name] = _LAZY
+            self._lazy_modules[name] = module_name
+
     def unregister(self, name: str) -> None:
+        self._load_lazy_entry_of_other_module(name)
         del self._entries[name]
+        self._lazy_modules.pop(name, None)
+
+    def _load_lazy_entry_of_other_module(self, name: str) -> None:
+        """Import the module of a lazy entry before the entry is changed from elsewhere
+
+        Otherwise the module would overwrite the change once it is imported. Nothing is
+        done while the module is being imported, it is the one changing the entry."""
+        module_name = self._lazy_modules.get(name)
+        if module_name is not None and module_name not in sys.modules:
+            self._load_lazy_entry(name)
+
+    def _load_lazy_entry(self, name: str) -> None:
+        module_name = self._lazy_modules[name]
+        importlib.import_module(module_name)
+        # The module did not register all entries of the manifest it was found in. Forget
+        # about them to not import the module again and again.
+        for lazy_name, lazy_module_name in list(self._lazy_modules.items()):
+            if lazy_module_name == module_name:
+                del self._entries[lazy_name]
+                del self._lazy_modules[lazy_name]
+
+    def _load_lazy_entries(self) -> None:
+        while self._lazy_modules:
+            self._load_lazy_entry(next(iter(self._lazy_modules)))
 
     def __getitem__(self, key: str) -> _VT:
-        return self._entries.__getitem__(key)
+        instance = self._entries.__getitem__(key)
+        if instance is _LAZY:
+            self._load_lazy_entry(key)
+            instance = self._entries.__getitem__(key)
+        return instance
+
+    def __contains__(self, key: object) -> bool:
+        return self._entries.__contains__(key)
 
     def __len__(self) -> int:
+        self._load_lazy_entries()
         return self._entries.__len__()
 
     def __iter__(self) -> Iterator[str]:
+        self._load_lazy_entries()
         return self._entries.__iter__()
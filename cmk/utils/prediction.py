@@ -159,6 +159,23 @@ class TimeSeries:
             return dwsa
         return self.values
 
+    def cut(self, fromtime: Timestamp, untiltime: Timestamp) -> "TimeSeries":
+        """Extract the part covering [fromtime; untiltime[ in the resolution of the series
+
+        The bounds are extended to the steps of the series just like livestatus does it
+        when fetching the time range. Values outside of the series are None."""
+        if self.step == 0:
+            return TimeSeries([], (fromtime, untiltime, 0))
+
+        start = fromtime - (fromtime - self.start) % self.step
+        end = untiltime + (self.start - untiltime) % self.step
+        offset = (start - self.start) // self.step
+        values: TimeSeriesValues = [
+            self.values[i] if 0 <= i < len(self.values) else None
+            for i in range(offset, offset + (end - start) // self.step)
+        ]
+        return TimeSeries(values, (start, end, self.step))
+
     def time_data_pairs(self) -> List[Tuple[Timestamp, TimeSeriesValue]]:
         return list(zip(rrd_timestamps(self.twindow), self.values))
 
@@ -227,28 +244,42 @@ def get_rrd_data(hostname: HostName,
           x---v---v---v---v---y
 
     """
+    return get_bulk_rrd_data(hostname, service_description,
+                             [(varname, cf, fromtime, untiltime, max_entries)])[0]
+
+
+def get_bulk_rrd_data(
+    hostname: HostName,
+    service_description: ServiceName,
+    queries: List[Tuple[MetricName, ConsolidationFunctionName, Timestamp, Timestamp, int]],
+) -> List[TimeSeries]:
+    """Fetch several RRD time series of a specific service with a single livestatus query
 
+    Each query is a tuple of (varname, cf, fromtime, untiltime, max_entries), see
+    get_rrd_data(). The time series are returned in the order of the queries."""
     step = 1
-    rpn = "%s.%s" % (varname, cf.lower())  # "MAX" -> "max"
-    point_range = ":".join(
-        livestatus.lqencode(str(x)) for x in (fromtime, untiltime, step, max_entries))
-    column = "rrddata:m1:%s:%s" % (rpn, point_range)
+    columns = []
+    for index, (varname, cf, fromtime, untiltime, max_entries) in enumerate(queries, 1):
+        rpn = "%s.%s" % (varname, cf.lower())  # "MAX" -> "max"
+        point_range = ":".join(
+            livestatus.lqencode(str(x)) for x in (fromtime, untiltime, step, max_entries))
+        columns.append("rrddata:m%d:%s:%s" % (index, rpn, point_range))
 
-    lql = livestatus_lql([hostname], [column], service_description) + "OutputFormat: python\n"
+    lql = livestatus_lql([hostname], columns, service_description) + "OutputFormat: python\n"
 
     try:
         connection = livestatus.SingleSiteConnection("unix:%s" %
                                                      cmk.utils.paths.livestatus_unix_socket)
-        response = connection.query_value(lql)
+        response = connection.query_row(lql)
     except livestatus.MKLivestatusNotFoundError as e:
         if cmk.utils.debug.enabled():
             raise
         raise MKGeneralException("Cannot get historic metrics via Livestatus: %s" % e)
 
-    if response is None:
+    if any(data is None for data in response):
         raise MKGeneralException("Cannot retrieve historic data with Nagios Core")
 
-    return TimeSeries(response)
+    return [TimeSeries(data) for data in response]
 
 
 def rrd_datacolum(hostname: HostName, service_description: ServiceName, varname: MetricName,
@@ -5,7 +5,8 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """This module provides generic Check_MK ruleset processing functionality"""
 
-from typing import TYPE_CHECKING, Any, Dict, Generator, List, Optional, Pattern, Set, Tuple
+from typing import (TYPE_CHECKING, Any, Dict, Generator, Iterable, List, Optional, Pattern, Set,
+                    Tuple)
 
 from cmk.utils.rulesets.tuple_rulesets import (
     ALL_HOSTS,
@@ -273,11 +274,6 @@ class RulesetOptimizer:
         # may contain a reduced set of hosts, since each process handles a subset
         self._all_processed_hosts = self._all_configured_hosts
 
-        # A factor which indicates how much hosts share the same host tag configuration (excluding folders).
-        # len(all_processed_hosts) / len(different tag combinations)
-        # It is used to determine the best rule evualation method
-        self._all_processed_hosts_similarity = 1.0
-
         self._service_ruleset_cache: Dict = {}
         self._host_ruleset_cache: Dict = {}
         self._all_matching_hosts_match_cache: Dict = {}
@@ -285,17 +281,21 @@ class RulesetOptimizer:
         # Reference dirname -> hosts in this dir including subfolders
         self._folder_host_lookup: Dict[Tuple[bool, str], Set[HostName]] = {}
 
-        # Provides a list of hosts with the same hosttags, excluding the folder
-        self._hosts_grouped_by_tags: Dict = {}
-        # Reference hostname -> tag group reference
-        self._host_grouped_ref: Dict = {}
-
-        # TODO: The folder will not be part of new dict tags anymore. This can
-        # be cleaned up then.
-        self._hosttags_without_folder: Dict[HostName, TagList] = {}
+        # The host conditions of the rules are resolved using an inverted index from
+        # tags and labels to the hosts having them. The host sets are represented as
+        # bitmaps (Python ints), one bit per host. This turns the matching of a rule
+        # into a few bitwise operations instead of a loop over all hosts.
+        self._bit_of_host: Dict[HostName, int] = {}
+        self._hosts_by_bit: List[HostName] = []
+        self._tag_bitmaps: Dict[str, int] = {}
+        # Labels are only indexed on demand for the hosts that need to be checked
+        self._label_bitmaps: Dict[Tuple[str, str], int] = {}
+        self._labels_indexed_bitmap = 0
+        self._folder_bitmaps: Dict[Tuple[bool, str], int] = {}
 
-        # TODO: Clean this one up?
         self._initialize_host_lookup()
+        self._all_configured_hosts_bitmap = self._hosts_bitmap(self._all_configured_hosts)
+        self._all_processed_hosts_bitmap = self._all_configured_hosts_bitmap
 
     def clear_host_ruleset_cache(self) -> None:
         self._host_ruleset_cache.clear()
@@ -322,23 +322,12 @@ class RulesetOptimizer:
         # the scope of relevant hosts has changed. This is -good-, since the values in this
         # lookup are iterated one by one later on in all_matching_hosts
         self._folder_host_lookup = {}
+        self._folder_bitmaps = {}
 
-        self._adjust_processed_hosts_similarity()
-
-    def _adjust_processed_hosts_similarity(self) -> None:
-        """ This function computes the tag similarities between of the processed hosts
-        The result is a similarity factor, which helps finding the most perfomant operation
-        for the current hostset """
-        used_groups = set()
-        for hostname in self._all_processed_hosts:
-            used_groups.add(self._host_grouped_ref.get(hostname, ()))
-
-        if not used_groups:
-            self._all_processed_hosts_similarity = 1.0
-            return
-
-        self._all_processed_hosts_similarity = (1.0 * len(self._all_processed_hosts) /
-                                                len(used_groups))
+        self._add_hosts_to_index(
+            sorted(hostname for hostname in self._all_processed_hosts
+                   if hostname not in self._bit_of_host))
+        self._all_processed_hosts_bitmap = self._hosts_bitmap(self._all_processed_hosts)
 
     def get_host_ruleset(self, ruleset: Ruleset, with_foreign_hosts: bool,
                          is_binary: bool) -> PreprocessedHostRuleset:
@@ -424,6 +413,11 @@ class RulesetOptimizer:
 
         return negate, regex("(?:%s)" % "|".join("(?:%s)" % p for p in pattern_parts))
 
+    def all_matching_hosts(self, condition: Dict[str, Any],
+                           with_foreign_hosts: bool) -> Set[HostName]:
+        """Returns the names of all hosts matching the host conditions of a rule"""
+        return self._all_matching_hosts(condition, with_foreign_hosts)
+
     def _all_matching_hosts(self, condition: Dict[str, Any],
                             with_foreign_hosts: bool) -> Set[HostName]:
         """Returns a set containing the names of hosts that match the given
@@ -441,56 +435,39 @@ class RulesetOptimizer:
             pass
 
         if with_foreign_hosts:
-            valid_hosts = self._all_configured_hosts
+            valid_hosts = self._all_configured_hosts_bitmap
         else:
-            valid_hosts = self._all_processed_hosts
+            valid_hosts = self._all_processed_hosts_bitmap
 
         # Thin out the valid hosts further. If the rule is located in a folder
         # we only need the intersection of the folders hosts and the previously determined valid_hosts
-        valid_hosts = self.get_hosts_within_folder(rule_path,
-                                                   with_foreign_hosts).intersection(valid_hosts)
-
-        if tags and hostlist is None and not labels:
-            # TODO: Labels could also be optimized like the tags
-            matched_by_tags = self._match_hosts_by_tags(cache_id, valid_hosts, tags)
-            if matched_by_tags is not None:
-                return matched_by_tags
+        candidates = valid_hosts & self._folder_bitmap(rule_path, with_foreign_hosts)
 
-        matching: Set[str] = set()
         only_specific_hosts = hostlist is not None \
             and not isinstance(hostlist, dict) \
             and all(not isinstance(x, dict) for x in hostlist)
 
         if hostlist == []:
-            pass  # Empty host list -> Nothing matches
-        elif not tags and not labels and not hostlist:
-            # If no tags are specified and the hostlist only include @all (all hosts)
-            matching = valid_hosts
-        elif not tags and not labels and only_specific_hosts and hostlist is not None:
-            # If no tags are specified and there are only specific hosts we already have the matches
-            matching = valid_hosts.intersection(hostlist)
-        else:
+            candidates = 0  # Empty host list -> Nothing matches
+        elif only_specific_hosts and hostlist is not None:
             # If the rule has only exact host restrictions, we can thin out the list of hosts to check
-            if only_specific_hosts and hostlist is not None:
-                hosts_to_check = valid_hosts.intersection(hostlist)
-            else:
-                hosts_to_check = valid_hosts
+            candidates &= self._hosts_bitmap(hostlist)
 
-            for hostname in hosts_to_check:
-                # When no tag matching is requested, do not filter by tags. Accept all hosts
-                # and filter only by hostlist
-                if tags and not self.matches_host_tags(self._host_tag_lists[hostname], tags):
-                    continue
+        for tag_spec in tags.values():
+            if not candidates:
+                break
+            candidates &= self._tag_spec_bitmap(tag_spec)
 
-                if labels:
-                    host_labels = self._labels.labels_of_host(self._ruleset_matcher, hostname)
-                    if not _matches_labels(host_labels, labels):
-                        continue
+        if labels and candidates:
+            candidates &= self._labels_bitmap(labels, candidates)
 
-                if not self.matches_host_name(hostlist, hostname):
-                    continue
+        matching = self._bitmap_to_hosts(candidates)
 
-                matching.add(hostname)
+        # Regular expressions and negated host lists can not be resolved by the index
+        if hostlist and not only_specific_hosts:
+            matching = {
+                hostname for hostname in matching if self.matches_host_name(hostlist, hostname)
+            }
 
         self._all_matching_hosts_match_cache[cache_id] = matching
         return matching
@@ -576,61 +553,76 @@ class RulesetOptimizer:
             rule_path,
         )
 
-    # TODO: Generalize this optimization: Build some kind of key out of the tag conditions
-    # (positive, negative, ...). Make it work with the new tag group based "$or" handling.
-    def _match_hosts_by_tags(self, cache_id, valid_hosts, tags):
-        matching = set()
-        negative_match_tags = set()
-        positive_match_tags = set()
-        for tag in tags.values():
-            if isinstance(tag, dict):
-                if "$ne" in tag:
-                    negative_match_tags.add(tag["$ne"])
-                    continue
-
-                if "$or" in tag:
-                    return None  # Can not be optimized, makes _all_matching_hosts proceed
+    def _tag_spec_bitmap(self, tag_spec) -> int:
+        """Returns the bitmap of the hosts matching the tag spec
 
-                if "$nor" in tag:
-                    return None  # Can not be optimized, makes _all_matching_hosts proceed
-
-                raise NotImplementedError()
-
-            positive_match_tags.add(tag)
-
-        # TODO:
-        #if has_specific_folder_tag or self._all_processed_hosts_similarity < 3.0:
-        if self._all_processed_hosts_similarity < 3.0:
-            # Without shared folders
-            for hostname in valid_hosts:
-                host_tags = self._host_tag_lists[hostname]
-                if not positive_match_tags - host_tags:
-                    if not negative_match_tags.intersection(host_tags):
-                        matching.add(hostname)
-
-            self._all_matching_hosts_match_cache[cache_id] = matching
-            return matching
-
-        # With shared folders
-        checked_hosts: Set[str] = set()
-        for hostname in valid_hosts:
-            if hostname in checked_hosts:
-                continue
-
-            hosts_with_same_tag = self._filter_hosts_with_same_tags_as_host(hostname, valid_hosts)
-            checked_hosts.update(hosts_with_same_tag)
-
-            tags = self._host_tag_lists[hostname]
-            if not positive_match_tags - tags:
-                if not negative_match_tags.intersection(tags):
-                    matching.update(hosts_with_same_tag)
+        Negations are computed against an infinite set of ones, so the result has
+        to be intersected with a host bitmap before use."""
+        if isinstance(tag_spec, dict):
+            if "$ne" in tag_spec:
+                return ~self._tag_spec_bitmap(tag_spec["$ne"])
+
+            if "$or" in tag_spec:
+                bitmap = 0
+                for sub_tag_spec in tag_spec["$or"]:
+                    bitmap |= self._tag_spec_bitmap(sub_tag_spec)
+                return bitmap
+
+            if "$nor" in tag_spec:
+                bitmap = 0
+                for sub_tag_spec in tag_spec["$nor"]:
+                    bitmap |= self._tag_spec_bitmap(sub_tag_spec)
+                return ~bitmap
+
+            raise NotImplementedError()
+
+        return self._tag_bitmaps.get(tag_spec, 0)
+
+    def _labels_bitmap(self, required_labels, candidates: int) -> int:
+        not_indexed = candidates & ~self._labels_indexed_bitmap
+        if not_indexed:
+            bits_of_labels: Dict[Tuple[str, str], List[int]] = {}
+            for hostname in self._bitmap_to_hosts(not_indexed):
+                bit = self._bit_of_host[hostname]
+                for label in self._labels.labels_of_host(self._ruleset_matcher, hostname).items():
+                    bits_of_labels.setdefault(label, []).append(bit)
+            self._merge_bits(self._label_bitmaps, bits_of_labels)
+            self._labels_indexed_bitmap |= not_indexed
+
+        for label_id, label_spec in required_labels.items():
+            if isinstance(label_spec, dict):
+                candidates &= ~self._label_bitmaps.get((label_id, label_spec["$ne"]), 0)
+            else:
+                candidates &= self._label_bitmaps.get((label_id, label_spec), 0)
+        return candidates
 
-        self._all_matching_hosts_match_cache[cache_id] = matching
+    def _folder_bitmap(self, folder_path: str, with_foreign_hosts: bool) -> int:
+        cache_id = with_foreign_hosts, folder_path
+        try:
+            return self._folder_bitmaps[cache_id]
+        except KeyError:
+            bitmap = self._folder_bitmaps[cache_id] = self._hosts_bitmap(
+                self.get_hosts_within_folder(folder_path, with_foreign_hosts))
+            return bitmap
+
+    def _hosts_bitmap(self, hostnames: Iterable[HostName]) -> int:
+        bit_of_host = self._bit_of_host
+        return _bits_to_bitmap(
+            (bit_of_host[hostname] for hostname in hostnames if hostname in bit_of_host),
+            len(self._hosts_by_bit))
+
+    def _bitmap_to_hosts(self, bitmap: int) -> Set[HostName]:
+        # Finding the set bits in the string representation is much faster than
+        # shifting and masking the (possibly) large integer bit by bit.
+        bits = bin(bitmap)[:1:-1]
+        hosts = self._hosts_by_bit
+        matching = set()
+        index = bits.find("1")
+        while index != -1:
+            matching.add(hosts[index])
+            index = bits.find("1", index + 1)
         return matching
 
-    def _filter_hosts_with_same_tags_as_host(self, hostname, hosts):
-        return self._hosts_grouped_by_tags[self._host_grouped_ref[hostname]].intersection(hosts)
-
     def get_hosts_within_folder(self, folder_path: str, with_foreign_hosts: bool) -> Set[HostName]:
         cache_id = with_foreign_hosts, folder_path
         if cache_id not in self._folder_host_lookup:
@@ -648,21 +640,34 @@ class RulesetOptimizer:
         return self._folder_host_lookup[cache_id]
 
     def _initialize_host_lookup(self):
-        # Determine hosttags without folder tag
-        for hostname in self._all_configured_hosts:
-            tags_without_folder = set(self._host_tag_lists[hostname])
-            try:
-                tags_without_folder.remove(self._host_paths.get(hostname, "/"))
-            except (KeyError, ValueError):
-                pass
-
-            self._hosttags_without_folder[hostname] = tags_without_folder
-
-        # Determine hosts with same tag setup (ignoring folder tag)
-        for hostname in self._all_configured_hosts:
-            group_ref = tuple(sorted(self._hosttags_without_folder[hostname]))
-            self._hosts_grouped_by_tags.setdefault(group_ref, set()).add(hostname)
-            self._host_grouped_ref[hostname] = group_ref
+        self._add_hosts_to_index(sorted(self._all_configured_hosts))
+
+    def _add_hosts_to_index(self, hostnames: Iterable[HostName]) -> None:
+        """Assign the next free bits to the hosts and add them to the tag bitmaps
+
+        The bits of a tag are collected in one pass over the hosts and turned into the
+        bitmap at once. Or-ing each host bit into the bitmap would create a new large
+        integer per host and tag."""
+        bits_of_tags: Dict[str, List[int]] = {}
+        for hostname in hostnames:
+            bit = len(self._hosts_by_bit)
+            self._bit_of_host[hostname] = bit
+            self._hosts_by_bit.append(hostname)
+            for tag in self._host_tag_lists.get(hostname, ()):
+                bits_of_tags.setdefault(tag, []).append(bit)
+        self._merge_bits(self._tag_bitmaps, bits_of_tags)
+
+    def _merge_bits(self, bitmaps: Dict[Any, int], bits_by_key: Dict[Any, List[int]]) -> None:
+        num_bits = len(self._hosts_by_bit)
+        for key, bits in bits_by_key.items():
+            bitmaps[key] = bitmaps.get(key, 0) | _bits_to_bitmap(bits, num_bits)
+
+
+def _bits_to_bitmap(bits: Iterable[int], num_bits: int) -> int:
+    bitmap = bytearray((num_bits + 7) // 8)
+    for bit in bits:
+        bitmap[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(bitmap, "little")
 
 
 def _tags_or_labels_cache_id(tag_or_label_spec):
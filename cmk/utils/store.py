@@ -12,11 +12,14 @@ from contextlib import contextmanager
 import errno
 import fcntl
 import logging
+import marshal
 import os
 from pathlib import Path
+import pickle
 import pprint
 import tempfile
-from typing import Any, Union, Dict, Iterator, Optional, AnyStr, cast
+import time
+from typing import Any, Callable, Union, Dict, Iterator, Optional, AnyStr, Tuple, cast
 
 from six import ensure_binary
 
@@ -184,10 +187,20 @@ def save_to_mk_file(path: Union[Path, str],
 # directly read via file/open and then parsed using eval.
 # TODO: Consolidate with load_mk_file?
 def load_object_from_file(path: Union[Path, str], default: Any = None, lock: bool = False) -> Any:
-    content = cast(str, _load_data_from_file(path, lock=lock, encoding="utf-8"))
+    content = cast(bytes, _load_data_from_file(path, lock=lock))
     if not content:
         return default
-    return ast.literal_eval(content)
+
+    if content.startswith(_FAST_OBJECT_MAGIC):
+        return marshal.loads(content[len(_FAST_OBJECT_MAGIC):])
+
+    try:
+        text = content.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if lock:
+            release_lock(path)
+        raise MKGeneralException(_("Cannot read file \"%s\": %s") % (path, e))
+    return ast.literal_eval(text)
 
 
 def load_text_from_file(path: Union[Path, str], default: str = u"", lock: bool = False) -> str:
@@ -238,9 +251,29 @@ def _load_data_from_file(path: Union[Path, str],
         raise MKGeneralException(_("Cannot read file \"%s\": %s") % (path, e))
 
 
+# Files written in the fast format start with this header. It can not be the beginning
+# of a Python literal, so load_object_from_file() can read files of both formats.
+_FAST_OBJECT_MAGIC = b"\x00CMKOBJ\x01"
+_FAST_OBJECT_MARSHAL_VERSION = 4
+
+
 # A simple wrapper for cases where you want to store a python data
 # structure that is then read by load_data_from_file() again
-def save_object_to_file(path: Union[Path, str], data: Any, pretty: bool = False) -> None:
+def save_object_to_file(path: Union[Path, str],
+                        data: Any,
+                        pretty: bool = False,
+                        fast: bool = False) -> None:
+    """Write data as Python literal to the given file
+
+    With fast=True the data is marshaled instead, which is much faster to save and
+    load for big structures. Only use it for files that are exclusively read with
+    load_object_from_file() by the same Python version, e.g. caches and state files.
+    """
+    if fast:
+        _save_data_to_file(path,
+                           _FAST_OBJECT_MAGIC + marshal.dumps(data, _FAST_OBJECT_MARSHAL_VERSION))
+        return
+
     if pretty:
         try:
             formatted_data = pprint.pformat(data)
@@ -341,6 +374,67 @@ def _save_data_to_file(path: Union[Path, str], content: bytes, mode: int = 0o660
         release_lock(path)
 
 
+#.
+#   .--Caching-------------------------------------------------------------.
+#   |                  ____           _     _                              |
+#   |                 / ___|__ _  ___| |__ (_)_ __   __ _                  |
+#   |                | |   / _` |/ __| '_ \| | '_ \ / _` |                 |
+#   |                | |__| (_| | (__| | | | | | | | (_| |                 |
+#   |                 \____\__,_|\___|_| |_|_|_| |_|\__, |                 |
+#   |                                               |___/                  |
+#   +----------------------------------------------------------------------+
+#   | Caching of data loaded from files, which is valid as long as the     |
+#   | files are not changed                                                |
+#   '----------------------------------------------------------------------'
+
+# Identifies the content of a file: (inode, size, modification time in ns)
+FileCacheKey = Tuple[int, int, int]
+# Data loaded from files: path -> (file cache key, loaded data)
+FileCache = Dict[str, Tuple[FileCacheKey, Any]]
+
+# Files changed within this number of seconds are not cached, because a following change
+# could happen without changing the modification time
+_RACY_FILE_AGE = 2.0
+
+
+def file_cache_key(stat: os.stat_result) -> FileCacheKey:
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def is_cacheable_file(stat: os.stat_result) -> bool:
+    """Whether data derived from the file may be cached as long as its cache key is unchanged"""
+    return time.time() - stat.st_mtime > _RACY_FILE_AGE
+
+
+def load_cached_file(cache: FileCache, path: str, load_func: Callable[[str], Any]) -> Any:
+    """Returns load_func(path), which is only called again once the file has been changed
+
+    load_func is also called for missing files. The result is shared by all callers and must
+    not be modified, use copy_cached_data() to get a modifiable copy."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        cache.pop(path, None)
+        return load_func(path)
+
+    key = file_cache_key(stat)
+    cached = cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    data = load_func(path)
+    if is_cacheable_file(stat):
+        cache[path] = (key, data)
+    else:
+        cache.pop(path, None)
+    return data
+
+
+def copy_cached_data(data: Any) -> Any:
+    # Much faster than copy.deepcopy() for the plain data structures loaded from files
+    return pickle.loads(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+
 #.
 #   .--File locking--------------------------------------------------------.
 #   |          _____ _ _        _            _    _                        |
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Helpers shared by the benchmark scripts in this directory
+
+The scripts are started from the root of the repository with PYTHONPATH=. to use the
+modules of the repository. This directory is the first entry of sys.path then, which
+makes this module importable.
+"""
+
+import time
+from typing import Any, Callable, Tuple
+
+
+def measure(func: Callable[[], Any], rounds: int) -> Tuple[float, Any]:
+    """Return the best duration of the given number of calls and the last result"""
+    best = float("inf")
+    result = None
+    for _round in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Replay syslog lines to the event server of the Event Console
+
+    PYTHONPATH=. doc/benchmark/ec_load_generator.py [--workers N] [--rate N] [--lines N]
+        [--rules N] [--file PATH]
+
+The lines are read from the given file (one syslog message per line) or generated
+synthetically. They are fed to an event server running in this process with a
+synthetic rule set, at the given rate (lines per second, 0: as fast as possible).
+The number of events processed per second and the percentiles of the latency from
+receiving a line up to applying its result to the event status are reported.
+
+Use --workers to compare the processing in the event server (0) with the processing
+by event worker processes.
+"""
+
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# The state of the event server is written below the site directory
+os.environ.setdefault("OMD_ROOT", tempfile.mkdtemp(prefix="ec_load_generator"))
+
+# pylint: disable=wrong-import-position
+import cmk.utils.paths
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+
+APPLICATIONS = ["sshd", "kernel", "cron", "postfix/smtpd", "nginx", "systemd"]
+TEXTS = [
+    "Accepted publickey for root from 10.1.%d.%d port 22",
+    "Failed password for invalid user admin from 10.2.%d.%d port 22",
+    "eth%d: link down (%d)",
+    "Out of memory: Kill process %d (java) score %d",
+    "disk /var/%d is %d%% full",
+    "connect from unknown[192.168.%d.%d]",
+    "Started Session %d of user u%d.",
+]
+
+
+def _synthetic_lines(num_lines: int, rand: random.Random) -> List[str]:
+    return [
+        "<%d>Oct 18 10:00:00 host%03d %s[%d]: %s" % (rand.randint(0, 191), rand.randint(
+            0, 499), rand.choice(APPLICATIONS), rand.randint(100, 30000), rand.choice(TEXTS) %
+                                                     (rand.randint(0, 255), rand.randint(0, 99)))
+        for _line in range(num_lines)
+    ]
+
+
+def _rule_packs(num_rules: int, rand: random.Random) -> List[Dict[str, Any]]:
+    rules: List[Dict[str, Any]] = []
+    for index in range(num_rules):
+        rule: Dict[str, Any] = {
+            "id": "rule%d" % index,
+            "state": -1,
+            "sl": {
+                "value": 0,
+                "precedence": "message"
+            },
+            "actions": [],
+            "livetime": (3600, ["open"]),
+        }
+        kind = rand.random()
+        if kind < 0.4:
+            rule["match"] = "%s %d" % (rand.choice(["link down", "full", "score", "port"]), index)
+        elif kind < 0.6:
+            rule["match"] = "(user|session) u?%d" % index
+        elif kind < 0.8:
+            rule["match_host"] = "host%03d" % rand.randint(0, 499)
+            rule["match"] = rand.choice(["Failed password", "link down", "Kill process"])
+        else:
+            rule["match_application"] = rand.choice(APPLICATIONS)
+            rule["match"] = "%d" % index
+        if rand.random() < 0.5:
+            rule["drop"] = True
+        rules.append(rule)
+
+    # Keep the state of the event server bounded: Count all remaining messages
+    rules.append({
+        "id": "catch_all",
+        "match": "",
+        "state": 0,
+        "sl": {
+            "value": 0,
+            "precedence": "message"
+        },
+        "actions": [],
+        "count": {
+            "count": 1000000000,
+            "period": 86400,
+            "algorithm": "interval",
+            "count_ack": False,
+            "separate_host": False,
+            "separate_application": False,
+            "separate_match_groups": False,
+        },
+    })
+    return [{"id": "default", "disabled": False, "rules": rules}]
+
+
+def _event_server(num_workers: int) -> cmk.ec.main.EventServer:
+    settings = ec.settings(
+        "1.2.3i45",
+        Path(cmk.utils.paths.omd_root),
+        Path(cmk.utils.paths.default_config_dir),
+        ["mkeventd"],
+    )
+    config = ec.default_config()
+    config["event_workers"] = num_workers
+    perfcounters = cmk.ec.main.Perfcounters(logging.getLogger("cmk.mkeventd.lock.perfcounters"))
+    history = cmk.ec.history.History(settings, config, logging.getLogger("cmk.mkeventd"),
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    event_status = cmk.ec.main.EventStatus(settings, config, perfcounters, history,
+                                           logging.getLogger("cmk.mkeventd.EventStatus"))
+    return cmk.ec.main.EventServer(logging.getLogger("cmk.mkeventd.EventServer"), settings, config,
+                                   cmk.ec.main.default_slave_status_master(), perfcounters,
+                                   cmk.ec.main.ECLock(logging.getLogger("cmk.mkeventd.lock")),
+                                   history, event_status, cmk.ec.main.StatusTableEvents.columns,
+                                   False)
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=0, help="Number of event workers")
+    parser.add_argument("--rate",
+                        type=float,
+                        default=0,
+                        help="Lines per second (default: as fast as possible)")
+    parser.add_argument("--lines", type=int, default=50000, help="Number of lines to replay")
+    parser.add_argument("--rules", type=int, default=500, help="Number of rules")
+    parser.add_argument("--batch", type=int, default=64, help="Lines received at once")
+    parser.add_argument("--file", type=Path, help="Replay the lines of this file")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the random generator")
+    args = parser.parse_args()
+
+    # The host lookup in the (not running) core would flood the log
+    logging.disable(logging.CRITICAL)
+
+    rand = random.Random(args.seed)
+    if args.file:
+        with args.file.open(encoding="utf-8", errors="replace") as f:
+            lines = [line.rstrip("\n") for line in f if line.strip()]
+        lines = (lines * (args.lines // len(lines) + 1))[:args.lines]
+    else:
+        lines = _synthetic_lines(args.lines, rand)
+
+    event_server = _event_server(args.workers)
+    event_server.compile_rules([], _rule_packs(args.rules, rand))
+
+    # Record the time the result of each line was applied
+    received: List[float] = []
+    applied: List[float] = []
+    process_translated_event = event_server.process_translated_event
+
+    def record_applied(event, event_matches):
+        process_translated_event(event, event_matches)
+        applied.append(time.perf_counter())
+
+    event_server.process_translated_event = record_applied  # type: ignore[assignment]
+
+    event_server._update_worker_pool()
+    try:
+        start = time.perf_counter()
+        for offset in range(0, len(lines), args.batch):
+            batch = lines[offset:offset + args.batch]
+            if args.rate:
+                # Wait until the last line of the batch is due. Poll for the results of the
+                # workers meanwhile, like the event server does.
+                due = start + (offset + len(batch)) / args.rate
+                while time.perf_counter() < due:
+                    event_server._handle_pending_lines(block=False)
+                    time.sleep(min(0.01, max(0.0, due - time.perf_counter())))
+            now = time.perf_counter()
+            received.extend([now] * len(batch))
+            event_server.process_raw_lines("\n".join(batch).encode("utf-8"))
+            event_server._handle_pending_lines(block=False)
+        event_server._handle_pending_lines(block=True)
+        duration = time.perf_counter() - start
+    finally:
+        event_server._stop_worker_pool()
+
+    if len(applied) != len(received):
+        raise SystemExit("%d of %d lines were not processed" %
+                         (len(received) - len(applied), len(received)))
+
+    latencies = sorted(done - begin for begin, done in zip(received, applied))
+    print("lines: %d, rules: %d, workers: %d, rate: %s" %
+          (len(lines), args.rules, args.workers, "%.0f/s" % args.rate if args.rate else "max"))
+    print("throughput:  %10.0f events/s" % (len(lines) / duration))
+    for percent in [50, 90, 99, 99.9]:
+        print("latency p%-5s %8.2f ms" % (percent, _percentile(latencies, percent) * 1000))
+    print("latency max   %8.2f ms" % (latencies[-1] * 1000))
+
+
+if __name__ == "__main__":
+    main()
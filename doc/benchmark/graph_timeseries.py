@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the list and the array evaluation of graph expressions
+
+    PYTHONPATH=. doc/benchmark/graph_timeseries.py [--services N] [--points N] [--rounds N]
+
+Synthetic RRD data of the given number of services (with some missing values) is
+combined by typical graph expressions. Each expression is evaluated with
+evaluate_time_series_expression() and with the ArrayEvaluation, including the
+conversion of the result to the curve data. Both results are compared.
+"""
+
+import argparse
+import random
+from typing import Any, Callable, Dict, List, Tuple
+
+from cmk.utils.prediction import TimeSeries
+from cmk.gui.plugins.metrics import timeseries
+
+from benchmark_utils import measure
+
+
+def _rrd_data(num_services: int, num_points: int,
+              rand: random.Random) -> Dict[Tuple[Any, ...], TimeSeries]:
+    return {
+        ("site", "host%d" % index, "CPU load", "load1", "max", 1): TimeSeries(
+            [rand.random() * 10 if rand.random() > 0.05 else None for _point in range(num_points)],
+            (1600000000, 1600000000 + 60 * num_points, 60)) for index in range(num_services)
+    }
+
+
+def _expressions(rrd_data: Dict[Tuple[Any, ...], TimeSeries]) -> Dict[str, Tuple]:
+    rrds = [("rrd",) + key for key in rrd_data]
+    return {
+        "sum": ("operator", "+", rrds),
+        "maximum": ("operator", "MAX", rrds),
+        "average": ("operator", "AVERAGE", rrds),
+        "merge": ("operator", "MERGE", rrds),
+        "fraction": ("operator", "/", [("operator", "+", rrds), ("constant", len(rrds))]),
+        "percentile": ("transformation", ("percentile", 95), [("operator", "MAX", rrds)]),
+    }
+
+
+def _value_sort_lists(rrd_data: Dict[Tuple[Any, ...], TimeSeries]) -> List[Tuple]:
+    aggr_func = lambda x: sum(x) / float(len(x) or 1)
+    metrics = [("stack", "#000000", key[1],
+                timeseries.evaluate_time_series_expression(("rrd",) + key, rrd_data))
+               for key in rrd_data]
+    return sorted(metrics,
+                  key=lambda metric: aggr_func(timeseries.clean_time_series_point(metric[3])),
+                  reverse=True)[:10]
+
+
+def _value_sort_arrays(rrd_data: Dict[Tuple[Any, ...], TimeSeries]) -> List[Tuple]:
+    evaluation = timeseries.ArrayEvaluation(rrd_data)
+    metrics = [("stack", "#000000", key[1], evaluation.evaluate(("rrd",) + key)) for key in rrd_data
+              ]
+    sorted_metrics = timeseries._value_sort_array(metrics, {
+        "aggregation": "average",
+        "reverse": True
+    })
+    return evaluation.to_values(sorted_metrics[:10])
+
+
+def _evaluate_array(expression: Tuple, rrd_data: Dict[Tuple[Any, ...], TimeSeries]) -> Any:
+    evaluation = timeseries.ArrayEvaluation(rrd_data)
+    return evaluation.to_values(evaluation.evaluate(expression))
+
+
+def _same(list_result: List[Any], array_result: List[Any]) -> bool:
+    return len(list_result) == len(array_result) and all(
+        a == b or (a is not None and b is not None and abs(a - b) <= 1e-9 * max(1, abs(a)))
+        for a, b in zip(list_result, array_result))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--services", type=int, default=200, help="Number of services")
+    parser.add_argument("--points", type=int, default=10000, help="Number of points per service")
+    parser.add_argument("--rounds", type=int, default=3, help="Take the best of N rounds")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the random generator")
+    args = parser.parse_args()
+
+    rrd_data = _rrd_data(args.services, args.points, random.Random(args.seed))
+    cases: List[Tuple[str, Callable[[], Any], Callable[[], Any]]] = [
+        (name, lambda e=expression: timeseries.evaluate_time_series_expression(e, rrd_data),
+         lambda e=expression: _evaluate_array(e, rrd_data))
+        for name, expression in _expressions(rrd_data).items()
+    ]
+    cases.append(("value_sort top 10", lambda: _value_sort_lists(rrd_data),
+                  lambda: _value_sort_arrays(rrd_data)))
+
+    print("services: %d, points: %d" % (args.services, args.points))
+    print("%-20s %10s %10s %8s" % ("expression", "list [ms]", "array [ms]", "speedup"))
+    for name, evaluate_lists, evaluate_arrays in cases:
+        list_time, list_result = measure(evaluate_lists, args.rounds)
+        array_time, array_result = measure(evaluate_arrays, args.rounds)
+        if name.startswith("value_sort"):
+            assert [m[2] for m in list_result] == [m[2] for m in array_result]
+        else:
+            assert _same(list_result, array_result), name
+        print("%-20s %10.1f %10.1f %7.1fx" %
+              (name, list_time * 1000, array_time * 1000, list_time / array_time))
+
+
+if __name__ == "__main__":
+    main()
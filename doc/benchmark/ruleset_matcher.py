@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Measure the host condition matching of the RulesetOptimizer
+
+    PYTHONPATH=. doc/benchmark/ruleset_matcher.py [--hosts N] [--rules N] [--seed N]
+
+A synthetic population of hosts (tags, labels, folders) and rules (tag, label,
+folder and host name conditions) is generated. The time needed to resolve the
+matching hosts of all rules is compared to a per host evaluation of the same
+conditions, which also serves as a cross check of the results.
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List, Set
+
+from cmk.utils.labels import LabelManager
+from cmk.utils.rulesets.ruleset_matcher import (
+    _matches_labels,
+    RulesetMatcher,
+    RulesetOptimizer,
+)
+from cmk.utils.type_defs import HostName, TagList
+
+TAG_GROUPS = {
+    "criticality": ["prod", "critical", "test", "offline"],
+    "networking": ["lan", "wan", "dmz"],
+    "agent": ["cmk-agent", "no-agent", "special-agents"],
+    "snmp_ds": ["no-snmp", "snmp-v1", "snmp-v2"],
+    "site": ["site%d" % i for i in range(10)],
+}
+LABELS = {
+    "os": ["linux", "windows", "aix"],
+    "env": ["prod", "stage", "dev"],
+    "team": ["team%d" % i for i in range(20)],
+}
+FOLDERS = ["/wato/dc%d/rack%d/" % (dc, rack) for dc in range(5) for rack in range(20)]
+
+
+class SyntheticLabelManager(LabelManager):
+    def __init__(self, host_labels: Dict[HostName, Dict[str, str]]) -> None:
+        super(SyntheticLabelManager, self).__init__(host_labels, [], [], lambda h, s: {})
+
+    def _discovered_labels_of_host(self, hostname: HostName) -> Dict[str, str]:
+        return {}
+
+
+def _make_hosts(num_hosts: int, rand: random.Random) -> Dict[str, Any]:
+    host_tag_lists: Dict[HostName, TagList] = {}
+    host_paths: Dict[HostName, str] = {}
+    host_labels: Dict[HostName, Dict[str, str]] = {}
+    for index in range(num_hosts):
+        hostname = "host%06d" % index
+        path = rand.choice(FOLDERS)
+        host_paths[hostname] = path
+        host_tag_lists[hostname] = {rand.choice(tags) for tags in TAG_GROUPS.values()} | {path}
+        host_labels[hostname] = {
+            key: rand.choice(values) for key, values in LABELS.items() if rand.random() < 0.7
+        }
+    return {
+        "host_tag_lists": host_tag_lists,
+        "host_paths": host_paths,
+        "host_labels": host_labels,
+    }
+
+
+def _make_condition(hostnames: List[HostName], rand: random.Random) -> Dict[str, Any]:
+    condition: Dict[str, Any] = {}
+    for group_id in rand.sample(sorted(TAG_GROUPS), rand.randint(0, 3)):
+        tag_id = rand.choice(TAG_GROUPS[group_id])
+        kind = rand.random()
+        if kind < 0.6:
+            condition.setdefault("host_tags", {})[group_id] = tag_id
+        elif kind < 0.8:
+            condition.setdefault("host_tags", {})[group_id] = {"$ne": tag_id}
+        else:
+            condition.setdefault("host_tags", {})[group_id] = {
+                "$or": rand.sample(TAG_GROUPS[group_id], 2)
+            }
+
+    if rand.random() < 0.3:
+        key = rand.choice(sorted(LABELS))
+        value = rand.choice(LABELS[key])
+        condition["host_labels"] = {key: value if rand.random() < 0.8 else {"$ne": value}}
+
+    if rand.random() < 0.3:
+        condition["host_folder"] = rand.choice(FOLDERS)
+
+    kind = rand.random()
+    if kind < 0.1:
+        condition["host_name"] = rand.sample(hostnames, min(len(hostnames), 20))
+    elif kind < 0.15:
+        condition["host_name"] = [{"$regex": "host0*%d" % rand.randint(0, 9)}]
+    elif kind < 0.2:
+        condition["host_name"] = {"$nor": rand.sample(hostnames, min(len(hostnames), 5))}
+    return condition
+
+
+def _reference_matching_hosts(optimizer: RulesetOptimizer, matcher: RulesetMatcher,
+                              labels: LabelManager, hosts: Dict[str, Any],
+                              condition: Dict[str, Any]) -> Set[HostName]:
+    """Evaluate the condition host by host"""
+    hostlist = condition.get("host_name")
+    if hostlist == []:
+        return set()
+    matching = set()
+    for hostname, tags in hosts["host_tag_lists"].items():
+        if not hosts["host_paths"][hostname].startswith(condition.get("host_folder", "/")):
+            continue
+        if not optimizer.matches_host_tags(tags, condition.get("host_tags", {})):
+            continue
+        if condition.get("host_labels") and not _matches_labels(
+                labels.labels_of_host(matcher, hostname), condition["host_labels"]):
+            continue
+        if not optimizer.matches_host_name(hostlist, hostname):
+            continue
+        matching.add(hostname)
+    return matching
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=10000, help="Number of hosts")
+    parser.add_argument("--rules", type=int, default=1000, help="Number of rules")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the random generator")
+    parser.add_argument("--no-reference",
+                        action="store_true",
+                        help="Skip the per host reference evaluation")
+    args = parser.parse_args()
+
+    rand = random.Random(args.seed)
+    hosts = _make_hosts(args.hosts, rand)
+    hostnames = sorted(hosts["host_tag_lists"])
+    conditions = [_make_condition(hostnames, rand) for _rule in range(args.rules)]
+    labels = SyntheticLabelManager(hosts["host_labels"])
+
+    start = time.perf_counter()
+    matcher = RulesetMatcher(
+        tag_to_group_map={},
+        host_tag_lists=hosts["host_tag_lists"],
+        host_paths=hosts["host_paths"],
+        labels=labels,
+        all_configured_hosts=set(hostnames),
+        clusters_of={},
+        nodes_of={},
+    )
+    optimizer = matcher.ruleset_optimizer
+    setup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [optimizer._all_matching_hosts(c, with_foreign_hosts=False) for c in conditions]
+    index_time = time.perf_counter() - start
+
+    print("hosts: %d, rules: %d" % (args.hosts, args.rules))
+    print("index setup:           %8.3f s" % setup_time)
+    print("indexed matching:      %8.3f s (%d matches)" % (index_time, sum(map(len, results))))
+
+    if args.no_reference:
+        return
+
+    start = time.perf_counter()
+    expected = [_reference_matching_hosts(optimizer, matcher, labels, hosts, c) for c in conditions]
+    reference_time = time.perf_counter() - start
+    print("per host matching:     %8.3f s" % reference_time)
+
+    mismatches = [c for c, r, e in zip(conditions, results, expected) if r != e]
+    if mismatches:
+        raise SystemExit("%d results differ, e.g. for %r" % (len(mismatches), mismatches[0]))
+
+
+if __name__ == "__main__":
+    main()
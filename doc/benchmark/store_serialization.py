@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the literal and the fast format of cmk.utils.store object files
+
+    PYTHONPATH=. doc/benchmark/store_serialization.py [--scale N] [--rounds N]
+
+For each payload the time needed to save and load the file as well as the peak
+memory allocated while loading are reported.
+"""
+
+import argparse
+import os
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import cmk.utils.store as store
+
+from benchmark_utils import measure
+
+
+def _counters(scale: int) -> Dict[Tuple[str, str, str], Tuple[float, float]]:
+    # Item states of a switch: (check plugin, item, counter) -> (timestamp, value)
+    return {
+        ("if64", "%d" % i, counter): (1600000000.123 + i, float(i * 4711))
+        for i in range(2000 * scale)
+        for counter in ("in", "out", "inucast", "outucast", "indisc", "outdisc")
+    }
+
+
+def _persisted_sections(scale: int) -> Dict[str, Tuple[int, int, List[List[str]]]]:
+    return {
+        "lnx_if": (1600000000, 1600000060,
+                   [["eth%d" % i] + [str(i * n) for n in range(16)] for i in range(500 * scale)]),
+        "ps":
+            (1600000000, 1600000060,
+             [["(root,1234,567,00:00:01/1-00:00:00,%d)" % i, "/usr/bin/x", "--foo",
+               "--bar=%d" % i] for i in range(2000 * scale)]),
+    }
+
+
+def _autochecks(scale: int) -> List[Dict[str, Any]]:
+    return [{
+        "check_plugin_name": "if64",
+        "item": "%d" % i,
+        "parameters": {
+            "state": ["1"],
+            "speed": 1000000000
+        },
+        "service_labels": {},
+    } for i in range(1000 * scale)]
+
+
+def _inventory_tree(scale: int) -> Dict[str, Any]:
+    return {
+        "hardware": {
+            "cpu": {
+                "cores": 16,
+                "model": "Intel(R) Xeon(R) CPU"
+            },
+        },
+        "networking": {
+            "interfaces": [{
+                "index": i,
+                "description": "Interface %d" % i,
+                "alias": "Uplink %d" % i,
+                "speed": 10000000000,
+                "phys_address": "00:11:22:33:44:%02x" % (i % 256),
+                "oper_status": 1,
+                "admin_status": 1,
+                "available": True,
+            } for i in range(1000 * scale)],
+        },
+        "software": {
+            "packages": [{
+                "name": "package-%d" % i,
+                "version": "1.%d.0" % i,
+                "arch": "x86_64",
+                "package_type": "rpm",
+            } for i in range(3000 * scale)],
+        },
+    }
+
+
+PAYLOADS: Dict[str, Callable[[int], Any]] = {
+    "counters": _counters,
+    "persisted sections": _persisted_sections,
+    "autochecks": _autochecks,
+    "inventory tree": _inventory_tree,
+}
+
+
+def _peak_memory(func: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="Multiplier for the payload sizes")
+    parser.add_argument("--rounds", type=int, default=5, help="Take the best of N rounds")
+    args = parser.parse_args()
+
+    print("%-20s %-8s %10s %10s %10s %12s" %
+          ("payload", "format", "size [kB]", "save [ms]", "load [ms]", "peak [kB]"))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, make_payload in PAYLOADS.items():
+            data = make_payload(args.scale)
+            for fmt, fast in [("literal", False), ("fast", True)]:
+                path = Path(tmp_dir, "%s-%s" % (name.replace(" ", "_"), fmt))
+                save_time, _result = measure(
+                    lambda: store.save_object_to_file(path, data, fast=fast), args.rounds)
+                load_time, loaded = measure(lambda: store.load_object_from_file(path), args.rounds)
+                assert loaded == data
+                peak = _peak_memory(lambda: store.load_object_from_file(path))
+                print("%-20s %-8s %10d %10.1f %10.1f %12d" %
+                      (name, fmt, os.stat(str(path)).st_size / 1024, save_time * 1000,
+                       load_time * 1000, peak / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare loading the user database with and without the cache of the user files
+
+    PYTHONPATH=. doc/benchmark/userdb.py [--users N] [--logins N] [--rounds N]
+
+The contacts, the GUI users, the htpasswd file, the serials and the user specific
+files of the given number of users are created in a temporary directory. The "page
+render" case loads all users as a request of the GUI does, the "login" case looks up
+the lock state and the connector of a single user as the login does when no profile
+of the user is present. Before, every case read all files of all users. After, the
+files are cached by the process and a login only reads the files of the user. The
+"cold cache" case shows a login of a process which has not cached anything yet.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, List, Tuple
+
+import cmk.utils.paths
+
+from cmk.gui.globals import AppContext
+import cmk.gui.userdb as userdb
+
+from benchmark_utils import measure
+
+
+def _create_users(base_dir: Path, num_users: int) -> List[str]:
+    user_ids = ["user%05d" % index for index in range(num_users)]
+    contacts = {
+        user_id: {
+            "alias": "User %s" % user_id,
+            "email": "%s@example.com" % user_id,
+            "contactgroups": ["all"],
+        } for user_id in user_ids
+    }
+    users = {
+        user_id: {
+            "roles": ["user"],
+            "connector": "htpasswd",
+            "locked": False,
+            "start_url": "dashboard.py",
+        } for user_id in user_ids
+    }
+
+    _write(base_dir / "conf.d" / "wato" / "contacts.mk", "contacts.update(%r)\n" % contacts)
+    _write(base_dir / "etc" / "multisite.d" / "wato" / "users.mk", "multisite_users = %r\n" % users)
+    _write(base_dir / "etc" / "htpasswd",
+           "".join("%s:$5$rounds=535000$salt$hash\n" % user_id for user_id in user_ids))
+    _write(base_dir / "etc" / "auth.serials", "".join("%s:1\n" % user_id for user_id in user_ids))
+    for user_id in user_ids:
+        user_dir = base_dir / "var" / "web" / user_id
+        _write(user_dir / "num_failed_logins.mk", "0\n")
+        _write(user_dir / "last_pw_change.mk", "1600000000\n")
+        _write(user_dir / "last_seen.mk", "1600000000.0\n")
+        _write(user_dir / "session_id.mk", "%s-session|1600000000\n" % user_id)
+
+    # Files which have just been changed are not cached
+    old = time.time() - 60
+    for path in [base_dir] + list(base_dir.glob("**/*")):
+        os.utime(str(path), (old, old))
+    return user_ids
+
+
+def _write(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def _page_render() -> Any:
+    with AppContext(None):  # type: ignore[arg-type]
+        return userdb.load_users()
+
+
+def _login(user_ids: List[str]) -> Any:
+    # The fallback of _user_locked() and _is_local_user() in case no profile is present
+    result = []
+    for user_id in user_ids:
+        with AppContext(None):  # type: ignore[arg-type]
+            user = userdb.load_user(userdb.UserId(user_id))
+            result.append((user.get("locked", False), user.get("connector",
+                                                               "htpasswd") == "htpasswd"))
+    return result
+
+
+def _login_all_users(user_ids: List[str]) -> Any:
+    # Before, each login without a profile of the user read the files of all users
+    result = []
+    for user_id in user_ids:
+        userdb._users_file_cache.clear()
+        with AppContext(None):  # type: ignore[arg-type]
+            user = userdb.load_users().get(user_id, {})
+            result.append((user.get("locked", False), user.get("connector",
+                                                               "htpasswd") == "htpasswd"))
+    return result
+
+
+def _uncached(func: Callable[[], Any]) -> Callable[[], Any]:
+    def wrapped() -> Any:
+        userdb._users_file_cache.clear()
+        return func()
+
+    return wrapped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=3000, help="Number of users")
+    parser.add_argument("--logins", type=int, default=10, help="Number of logins per round")
+    parser.add_argument("--rounds", type=int, default=5, help="Take the best of N rounds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_dir = Path(tmp_dir)
+        cmk.utils.paths.check_mk_config_dir = str(base_dir / "conf.d")
+        cmk.utils.paths.default_config_dir = str(base_dir / "etc")
+        cmk.utils.paths.htpasswd_file = str(base_dir / "etc" / "htpasswd")
+        cmk.utils.paths.var_dir = str(base_dir / "var")
+        user_ids = _create_users(base_dir, args.users)
+        login_ids = user_ids[::max(1, len(user_ids) // args.logins)][:args.logins]
+
+        cases: List[Tuple[str, Callable[[], Any], Callable[[], Any]]] = [
+            ("page render", _uncached(_page_render), _page_render),
+            ("login", lambda: _login_all_users(login_ids), lambda: _login(login_ids)),
+            ("login (cold cache)", lambda: _login_all_users(login_ids),
+             _uncached(lambda: _login(login_ids))),
+        ]
+
+        print("users: %d, logins per round: %d" % (args.users, len(login_ids)))
+        print("%-20s %12s %12s %8s" % ("case", "before [ms]", "after [ms]", "speedup"))
+        for name, load_before, load_after in cases:
+            before_time, before_result = measure(load_before, args.rounds)
+            load_after()  # warm up the cache
+            after_time, after_result = measure(load_after, args.rounds)
+            assert before_result == after_result, name
+            print("%-20s %12.1f %12.1f %7.1fx" %
+                  (name, before_time * 1000, after_time * 1000, before_time / after_time))
+
+
+if __name__ == "__main__":
+    main()
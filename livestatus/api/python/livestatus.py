@@ -10,8 +10,11 @@ import time
 import re
 import os
 import ast
+import select
+import selectors
 import ssl
-from typing import NewType, AnyStr, Any, Type, List, Tuple, Union, Dict, Pattern, Optional, Set
+from typing import (NewType, AnyStr, Any, Type, List, Tuple, Union, Dict, Iterator, Pattern,
+                    Optional, Set)
 
 # TODO: Find a better solution for this issue. Astroid 2.x bug prevents us from using NewType :(
 # (https://github.com/PyCQA/pylint/issues/2296)
@@ -36,9 +39,8 @@ LivestatusResponse = NewType("LivestatusResponse", List[LivestatusRow])
 #   |  Global variables and Exception classes                              |
 #   '----------------------------------------------------------------------'
 
-# TODO: This mechanism does not take different connection options into account
-# Keep a global array of persistant connections
-persistent_connections: Dict[str, socket.socket] = {}
+# Socket URL, TLS, verification of the certificate and CA file of a connection
+ConnectionPoolKey = Tuple[str, bool, bool, Optional[str]]
 
 # Regular expression for removing Cache: headers if caching is not allowed
 remove_cache_regex: Pattern = re.compile("\nCache:[^\n]*")
@@ -62,6 +64,10 @@ class MKLivestatusSocketClosed(MKLivestatusSocketError):
     pass
 
 
+class MKLivestatusSocketTimeout(MKLivestatusSocketError):
+    pass
+
+
 class MKLivestatusConfigError(MKLivestatusException):
     pass
 
@@ -128,6 +134,59 @@ def create_client_socket(family: socket.AddressFamily, tls: bool, verify: bool,
     return context.wrap_socket(sock)
 
 
+class ConnectionPool:
+    """The sockets of the persistent connections of this process
+
+    Livestatus keeps the connections open between the queries (KeepAlive). Later
+    connections with the same settings reuse them, e.g. the connections of the following
+    requests handled by the same WSGI worker process. A forked process starts with an
+    empty pool, the inherited sockets are still used by the parent process."""
+    def __init__(self) -> None:
+        super(ConnectionPool, self).__init__()
+        self._pid = os.getpid()
+        self._sockets: Dict[ConnectionPoolKey, socket.socket] = {}
+
+    def _current_sockets(self) -> Dict[ConnectionPoolKey, socket.socket]:
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._sockets = {}
+        return self._sockets
+
+    def get(self, key: ConnectionPoolKey) -> Optional[socket.socket]:
+        """Returns the socket of the connection in case it can be reused"""
+        sockets = self._current_sockets()
+        sock = sockets.get(key)
+        if sock is not None and not _is_idle(sock):
+            del sockets[key]
+            return None
+        return sock
+
+    def put(self, key: ConnectionPoolKey, sock: socket.socket) -> None:
+        self._current_sockets()[key] = sock
+
+    def discard(self, key: ConnectionPoolKey) -> None:
+        self._current_sockets().pop(key, None)
+
+    def clear(self) -> None:
+        self._current_sockets().clear()
+
+
+def _is_idle(sock: socket.socket) -> bool:
+    """An idle connection has nothing to read
+
+    Otherwise the connection has been closed by the other side, e.g. after the idle
+    timeout of Livestatus, or the connection is out of sync."""
+    if isinstance(sock, ssl.SSLSocket) and sock.pending():
+        return False
+    try:
+        readable, _writable, _exceptional = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+connection_pool = ConnectionPool()
+
 #.
 #   .--Helpers-------------------------------------------------------------.
 #   |                  _   _      _                                        |
@@ -250,7 +309,8 @@ class Query:
 
     def __init__(self,
                  query: Union[str, bytes],
-                 suppress_exceptions: Optional[List[Type[Exception]]] = None) -> None:
+                 suppress_exceptions: Optional[List[Type[Exception]]] = None,
+                 deadline: Optional[float] = None) -> None:
         super(Query, self).__init__()
 
         self._query = _ensure_unicode(query)
@@ -260,6 +320,10 @@ class Query:
         else:
             self.suppress_exceptions = suppress_exceptions
 
+        # Number of seconds to wait for the responses of the sites when querying multiple
+        # sites in parallel. Sites which did not answer in time are treated as dead sites.
+        self.deadline = deadline
+
     def __str__(self) -> str:
         return self._query
 
@@ -329,11 +393,16 @@ class SingleSiteConnection(Helpers):
         if self.socket:
             self.socket.settimeout(float(timeout))
 
+    def _pool_key(self) -> ConnectionPoolKey:
+        return (self.socketurl, self.tls, self.tls_verify, self._tls_ca_file_path)
+
     def connect(self) -> None:
-        if self.persist and self.socketurl in persistent_connections:
-            self.socket = persistent_connections[self.socketurl]
-            self.successful_persistence = True
-            return
+        if self.persist:
+            sock = connection_pool.get(self._pool_key())
+            if sock is not None:
+                self.socket = sock
+                self.successful_persistence = True
+                return
 
         self.successful_persistence = False
         family, address = self._parse_socket_url(self.socketurl)
@@ -375,7 +444,7 @@ class SingleSiteConnection(Helpers):
                 raise MKLivestatusSocketError("Cannot connect to '%s': %s" % (self.socketurl, e))
 
         if self.persist:
-            persistent_connections[self.socketurl] = self.socket
+            connection_pool.put(self._pool_key(), self.socket)
 
     def _parse_socket_url(self, url: str) -> Tuple[socket.AddressFamily, Union[str, tuple]]:
         """Parses a Livestatus socket URL to address family and address"""
@@ -407,10 +476,7 @@ class SingleSiteConnection(Helpers):
     def disconnect(self) -> None:
         self.socket = None
         if self.persist:
-            try:
-                del persistent_connections[self.socketurl]
-            except KeyError:
-                pass
+            connection_pool.discard(self._pool_key())
 
     def receive_data(self, size: int) -> bytes:
         if self.socket is None:
@@ -468,7 +534,7 @@ class SingleSiteConnection(Helpers):
             self.socket.send(query.encode("utf-8"))
         except IOError as e:
             if self.persist:
-                del persistent_connections[self.socketurl]
+                connection_pool.discard(self._pool_key())
                 self.successful_persistence = False
             self.socket = None
 
@@ -489,31 +555,8 @@ class SingleSiteConnection(Helpers):
                       add_headers: str = "",
                       timeout_at: Optional[float] = None) -> LivestatusResponse:
         try:
-            # Headers are always ASCII encoded
-            resp = self.receive_data(16)
-            code = resp[0:3].decode("ascii")
-            try:
-                length = int(resp[4:15].lstrip())
-            except Exception:
-                self.disconnect()
-                raise MKLivestatusSocketError(
-                    "Malformed output. Livestatus TCP socket might be unreachable or wrong"
-                    "encryption settings are used.")
-
-            data = self.receive_data(length).decode("utf-8")
-
-            if code == "200":
-                try:
-                    return ast.literal_eval(data)
-                except Exception:
-                    self.disconnect()
-                    raise MKLivestatusSocketError("Malformed output")
-
-            elif code == "404":
-                raise MKLivestatusTableNotFoundError("Not Found (%s): %s" % (code, data.strip()))
-
-            else:
-                raise MKLivestatusQueryError("%s: %s" % (code, data.strip()))
+            code, length = self.parse_response_header(self.receive_data(16))
+            return self.parse_response(code, self.receive_data(length))
 
         except (MKLivestatusSocketClosed, IOError) as e:
             # In case of an IO error or the other side having
@@ -546,6 +589,35 @@ class SingleSiteConnection(Helpers):
             # FIXME: ? self.disconnect()
             raise MKLivestatusSocketError("Unhandled exception: %s" % e)
 
+    def parse_response_header(self, header: bytes) -> Tuple[str, int]:
+        """Returns the status code and the length of the response (ResponseHeader: fixed16)"""
+        # Headers are always ASCII encoded
+        code = header[0:3].decode("ascii")
+        try:
+            length = int(header[4:15].lstrip())
+        except Exception:
+            self.disconnect()
+            raise MKLivestatusSocketError(
+                "Malformed output. Livestatus TCP socket might be unreachable or wrong"
+                "encryption settings are used.")
+        return code, length
+
+    def parse_response(self, code: str, data: bytes) -> LivestatusResponse:
+        text = data.decode("utf-8")
+
+        if code == "200":
+            try:
+                return ast.literal_eval(text)
+            except Exception:
+                self.disconnect()
+                raise MKLivestatusSocketError("Malformed output")
+
+        elif code == "404":
+            raise MKLivestatusTableNotFoundError("Not Found (%s): %s" % (code, text.strip()))
+
+        else:
+            raise MKLivestatusQueryError("%s: %s" % (code, text.strip()))
+
     def set_prepend_site(self, p: bool) -> None:
         self.prepend_site = p
 
@@ -592,7 +664,7 @@ class SingleSiteConnection(Helpers):
         except IOError as e:
             self.socket = None
             if self.persist:
-                del persistent_connections[self.socketurl]
+                connection_pool.discard(self._pool_key())
             raise MKLivestatusSocketError(str(e))
 
     # Set user to be used in certain authorization domain
@@ -646,6 +718,8 @@ class MultiSiteConnection(Helpers):
         self.only_sites: OnlySites = None
         self.limit: Optional[int] = None
         self.parallelize = True
+        # The time in seconds the sites needed to answer the last query
+        self.latencies: Dict[SiteId, float] = {}
 
         # Status host: A status host helps to prevent trying to connect
         # to a remote site which is unreachable. This is done by looking
@@ -820,6 +894,10 @@ class MultiSiteConnection(Helpers):
     def alive_sites(self) -> List[SiteId]:
         return [s[0] for s in self.connections]
 
+    def site_latencies(self) -> Dict[SiteId, float]:
+        """The time in seconds each site needed to answer the last query"""
+        return self.latencies
+
     def successfully_persisted(self) -> bool:
         for _sitename, _site, connection in self.connections:
             if connection.successfully_persisted():
@@ -846,10 +924,35 @@ class MultiSiteConnection(Helpers):
             return self.query_parallel(normalized_query, normalized_add_headers)
         return self.query_non_parallel(normalized_query, normalized_add_headers)
 
+    def query_by_site(
+            self,
+            query: 'QueryTypes',
+            add_headers: Union[str, bytes] = u"") -> Iterator[Tuple[SiteId, LivestatusResponse]]:
+        """Yields the response of each site separately, in the order the sites answer
+
+        This makes it possible to process the rows of a site while waiting for the other
+        sites. The iterator must be consumed completely, the dead sites are only known
+        afterwards."""
+        normalized_add_headers = _ensure_unicode(add_headers)
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        if self.parallelize:
+            return self._query_parallel_by_site(normalized_query, normalized_add_headers)
+        return self._query_non_parallel_by_site(normalized_query, normalized_add_headers)
+
     def query_non_parallel(self, query: Query, add_headers: str = u"") -> LivestatusResponse:
         result = LivestatusResponse([])
+        for _sitename, response in self._query_non_parallel_by_site(query, add_headers):
+            result += response
+        return result
+
+    def _query_non_parallel_by_site(
+            self,
+            query: Query,
+            add_headers: str = u"") -> Iterator[Tuple[SiteId, LivestatusResponse]]:
         stillalive = []
         limit = self.limit
+        self.latencies = {}
         for sitename, site, connection in self.connections:
             if self.only_sites is not None and sitename not in self.only_sites:
                 stillalive.append((sitename, site, connection))  # state unknown, assume still alive
@@ -859,13 +962,14 @@ class MultiSiteConnection(Helpers):
                     limit_header = "Limit: %d\n" % limit
                 else:
                     limit_header = ""
+                started = time.time()
                 r = connection.query(query, add_headers + limit_header)
+                self.latencies[sitename] = time.time() - started
                 if self.prepend_site:
                     for row in r:
                         row.insert(0, sitename)
                 if limit is not None:
                     limit -= len(r)  # Account for portion of limit used by this site
-                result += r
                 stillalive.append((sitename, site, connection))
             except Exception as e:
                 connection.disconnect()
@@ -873,13 +977,23 @@ class MultiSiteConnection(Helpers):
                     "exception": e,
                     "site": site,
                 }
+                continue
+            yield sitename, r
         self.connections = stillalive
-        return result
 
     # New parallelized version of query(). The semantics differs in the handling
     # of Limit: since all sites are queried in parallel, the Limit: is simply
     # applied to all sites - resulting in possibly more results then Limit requests.
     def query_parallel(self, query: Query, add_headers: str = u"") -> LivestatusResponse:
+        result = LivestatusResponse([])
+        for _sitename, response in self._query_parallel_by_site(query, add_headers):
+            result += response
+        return result
+
+    def _query_parallel_by_site(
+            self,
+            query: Query,
+            add_headers: str = u"") -> Iterator[Tuple[SiteId, LivestatusResponse]]:
         stillalive = []
         if self.only_sites is not None:
             connect_to_sites = [c for c in self.connections if c[0] in self.only_sites]
@@ -895,9 +1009,12 @@ class MultiSiteConnection(Helpers):
             limit_header = u""
 
         # First send all queries
+        self.latencies = {}
+        readers = []
         for sitename, site, connection in connect_to_sites:
             try:
                 connection.send_query(query, add_headers + limit_header)
+                readers.append(_ResponseReader(sitename, site, connection))
             except Exception as e:
                 self.deadsites[sitename] = {
                     "exception": e,
@@ -906,30 +1023,84 @@ class MultiSiteConnection(Helpers):
 
         suppress_exceptions = tuple(query.suppress_exceptions)
 
-        # Then retrieve all answers. We will be as slow as the slowest of all
-        # connections.
-        result = LivestatusResponse([])
-        for sitename, site, connection in connect_to_sites:
-            try:
-                r = connection.recv_response(query, add_headers + limit_header)
+        # Then retrieve all answers. The answer of each site is read and parsed as soon as
+        # its data arrives, so the slow sites do not hold up reading the others. We will
+        # be as slow as the slowest of all connections, unless the query has a deadline.
+        for reader, response, exception in self._receive_responses(readers, query,
+                                                                   add_headers + limit_header):
+            sitename, site, connection = reader.sitename, reader.site, reader.connection
+            if exception is None:
                 stillalive.append((sitename, site, connection))
+                self.latencies[sitename] = reader.latency
                 if self.prepend_site:
-                    for row in r:
+                    for row in response:
                         row.insert(0, sitename)
-                result += r
-            except suppress_exceptions:  # pylint: disable=catching-non-exception
+                yield sitename, response
+
+            elif isinstance(exception, suppress_exceptions):
                 stillalive.append((sitename, site, connection))
-                continue
+                self.latencies[sitename] = reader.latency
 
-            except Exception as e:
+            else:
                 connection.disconnect()
                 self.deadsites[sitename] = {
-                    "exception": e,
+                    "exception": exception,
                     "site": site,
                 }
 
         self.connections = stillalive
-        return result
+
+    def _receive_responses(
+        self, readers: List["_ResponseReader"], query: Query, add_headers: str
+    ) -> Iterator[Tuple["_ResponseReader", LivestatusResponse, Optional[Exception]]]:
+        """Yields the response or the exception of each site in the order of arrival"""
+        deadline_at = None if query.deadline is None else time.time() + query.deadline
+        with selectors.DefaultSelector() as selector:
+            for reader in readers:
+                reader.register(selector)
+
+            while selector.get_map():
+                timeout = None if deadline_at is None else max(0.0, deadline_at - time.time())
+                events = selector.select(timeout)
+                if not events and deadline_at is not None and time.time() >= deadline_at:
+                    break
+
+                for key, _mask in events:
+                    reader = key.data
+                    try:
+                        if not reader.read():
+                            continue
+                        reader.unregister(selector)
+                        yield reader, reader.response(), None
+
+                    except MKLivestatusTableNotFoundError as e:
+                        reader.unregister(selector)
+                        yield reader, LivestatusResponse([]), e
+
+                    except (MKLivestatusSocketClosed, IOError) as e:
+                        # In case of an IO error or the other side having closed the socket
+                        # (e.g. due to timeouts during keepalive) reconnect and send the
+                        # query again, but only once.
+                        reader.unregister(selector)
+                        if reader.reconnected:
+                            yield reader, LivestatusResponse([]), MKLivestatusSocketError(str(e))
+                            continue
+                        try:
+                            reader.reconnect(query, add_headers)
+                            reader.register(selector)
+                        except Exception as connect_error:
+                            yield reader, LivestatusResponse([]), connect_error
+
+                    except Exception as e:
+                        reader.unregister(selector)
+                        yield reader, LivestatusResponse([]), MKLivestatusSocketError(
+                            "Unhandled exception: %s" % e)
+
+            for key in list(selector.get_map().values()):
+                reader = key.data
+                reader.unregister(selector)
+                yield reader, LivestatusResponse([]), MKLivestatusSocketTimeout(
+                    "No response within %.1f seconds" % query.deadline)
 
     # TODO: Is this SiteId(...) the way to go? Without this mypy complains about incompatible bytes
     # vs. Optional[SiteId]
@@ -957,6 +1128,79 @@ class MultiSiteConnection(Helpers):
         raise KeyError("Connection does not exist")
 
 
+class _ResponseReader:
+    """Reads the response of a site without blocking, piece by piece as the data arrives"""
+    def __init__(self, sitename: SiteId, site: SiteConfiguration,
+                 connection: SingleSiteConnection) -> None:
+        super(_ResponseReader, self).__init__()
+        self.sitename = sitename
+        self.site = site
+        self.connection = connection
+        self.reconnected = False
+        self._started = time.time()
+        self.latency = 0.0
+        self._header: Optional[Tuple[str, int]] = None
+        self._data = bytearray()
+        self._socket: Optional[socket.socket] = None
+
+    def register(self, selector: selectors.BaseSelector) -> None:
+        self._socket = self.connection.socket
+        if self._socket is None:
+            raise MKLivestatusSocketError("Socket to '%s' is not connected" %
+                                          self.connection.socketurl)
+        self._socket.setblocking(False)
+        selector.register(self._socket, selectors.EVENT_READ, self)
+
+    def unregister(self, selector: selectors.BaseSelector) -> None:
+        sock, self._socket = self._socket, None
+        if sock is None:
+            return
+        selector.unregister(sock)
+        try:
+            sock.setblocking(True)
+        except OSError:
+            pass
+
+    def reconnect(self, query: Query, add_headers: str) -> None:
+        self.connection.disconnect()
+        self.reconnected = True
+        self._header = None
+        self._data = bytearray()
+        self.connection.connect()
+        self.connection.send_query(query, add_headers)
+
+    def read(self) -> bool:
+        """Reads the available data and returns whether or not the response is complete"""
+        sock = self._socket
+        assert sock is not None
+        while True:
+            missing = (16 if self._header is None else self._header[1]) - len(self._data)
+            if missing > 0:
+                try:
+                    # TLS sockets may have buffered more data than the socket reports as
+                    # readable, so read until there is nothing left.
+                    packet = sock.recv(min(missing, 1024 * 1024))
+                except (BlockingIOError, ssl.SSLWantReadError):
+                    return False
+                if not packet:
+                    raise MKLivestatusSocketClosed(
+                        "Read zero data from socket, nagios server closed connection")
+                self._data += packet
+                continue
+
+            if self._header is None:
+                self._header = self.connection.parse_response_header(bytes(self._data))
+                self._data = bytearray()
+                continue
+
+            self.latency = time.time() - self._started
+            return True
+
+    def response(self) -> LivestatusResponse:
+        assert self._header is not None
+        return self.connection.parse_response(self._header[0], bytes(self._data))
+
+
 #.
 #   .--LocalConn-----------------------------------------------------------.
 #   |            _                    _  ____                              |
@@ -23,6 +23,7 @@ from cmk.base.data_sources import Mode
 from cmk.base.data_sources.agent import (
     AgentConfigurator,
     AgentChecker,
+    AgentHostSections,
     AgentParser,
     AgentSummarizer,
 )
@@ -145,6 +146,59 @@ class TestParser:
             SectionName("section"): (1000, 1050, [["first", "line"], ["second", "line"]]),
         }
 
+    @pytest.mark.usefixtures("scenario")
+    @pytest.mark.parametrize("lazy", [True, False])
+    def test_section_options_of_lines(self, hostname, logger, lazy):
+        raw_data = b"\n".join((
+            b"<<<a_section:sep(59)>>>",
+            b" first;line \r",
+            b"",
+            b"<<<nostrip:nostrip>>>",
+            b" first line \r",
+            b"<<<latin:encoding(latin-1)>>>",
+            b"\xe4 \xc3\xa4",
+            b"<<<a_section>>>",
+            b"second line",
+        ))
+
+        ahs = AgentParser(hostname, logger, lazy=lazy).parse(raw_data)
+
+        assert ahs.sections == {
+            SectionName("a_section"): [["first", "line"], ["second", "line"]],
+            SectionName("nostrip"): [["first", "line"]],
+            SectionName("latin"): [["\xe4", "\xc3\xa4"]],
+        }
+        assert ahs.sections.is_parsed(SectionName("a_section"))
+
+    @pytest.mark.usefixtures("scenario")
+    def test_lazy_parsing(self, hostname, logger):
+        raw_data = b"\n".join((
+            b"<<<a_section>>>",
+            b"first line",
+            b"<<<another_section>>>",
+            b"first line",
+            b"<<<a_section>>>",
+            b"second line",
+        ))
+
+        ahs = AgentParser(hostname, logger, lazy=True).parse(raw_data)
+        assert list(ahs.sections) == [SectionName("a_section"), SectionName("another_section")]
+        assert not ahs.sections.is_parsed(SectionName("a_section"))
+
+        host_sections = AgentHostSections()
+        host_sections.update(ahs)
+        host_sections.update(AgentHostSections({SectionName("a_section"): [["third", "line"]]}))
+        assert not host_sections.sections.is_parsed(SectionName("another_section"))
+
+        assert host_sections.sections[SectionName("a_section")] == [
+            ["first", "line"],
+            ["second", "line"],
+            ["third", "line"],
+        ]
+        assert host_sections.sections.is_parsed(SectionName("a_section"))
+        assert not host_sections.sections.is_parsed(SectionName("another_section"))
+        assert not ahs.sections.is_parsed(SectionName("a_section"))
+
     @pytest.mark.parametrize(
         "headerline, section_name, section_options",
         [
@@ -4,6 +4,7 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import os
 from pathlib import Path
 
 import pytest  # type: ignore[import]
@@ -1972,3 +1973,82 @@ def test_packed_config(pack_string):
     packed_config = config.PackedConfig()
     packed_config._write(pack_string)
     packed_config.load()
+
+
+def test_legacy_plugin_files():
+    CheckManager().load(["df", "agent_vsphere"])
+    assert config._legacy_plugin_files["df"] == [
+        "%s/%s" % (cmk.utils.paths.checks_dir, file_name)
+        for file_name in ["size_trend.include", "df.include", "df"]
+    ]
+    # Plugins are also known by the name of their file, e.g. special agents
+    assert config._legacy_plugin_files["agent_vsphere"] == [
+        "%s/agent_vsphere" % cmk.utils.paths.checks_dir
+    ]
+
+
+@pytest.fixture(name="legacy_plugin_loads")
+def fixture_legacy_plugin_loads(monkeypatch):
+    ts = Scenario().add_host("node1")
+    ts.add_cluster("cluster1", nodes=["node1"])
+    ts.apply(monkeypatch)
+    Path(cmk.utils.paths.main_config_file).parent.mkdir(parents=True, exist_ok=True)
+    Path(cmk.utils.paths.main_config_file).touch()
+    CheckManager().load(["df", "mem", "agent_vsphere"])
+    config.save_legacy_plugin_manifest({
+        "node1": {"df"},
+        "cluster1": {"mem.linux", "agent_vsphere"}
+    })
+
+    loads = []
+    monkeypatch.setattr(config, "_initialize_data_structures", lambda: None)
+    monkeypatch.setattr(config.agent_based_register, "load_all_plugins", lambda: None)
+    monkeypatch.setattr(config, "load_checks", lambda _get_context, files: loads.append(files))
+    monkeypatch.setattr(config, "load_all_checks", lambda _get_context: loads.append("all"))
+    return loads
+
+
+def _load_checks_of_hosts(loads, hostnames):
+    del loads[:]
+    config.load_checks_of_hosts(lambda: {}, hostnames)
+    return [files if files == "all" else [os.path.basename(f) for f in files] for files in loads]
+
+
+def test_load_checks_of_hosts(legacy_plugin_loads):
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["node1"]) == [
+        ["size_trend.include", "df.include", "df"],
+    ]
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["node1", "cluster1"]) == [
+        ["size_trend.include", "df.include", "df", "agent_vsphere", "mem.include", "mem"],
+    ]
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["unknown"]) == ["all"]
+
+
+def test_load_checks_of_hosts_changed_autochecks(legacy_plugin_loads):
+    autochecks_path = Path(cmk.utils.paths.autochecks_dir, "node1.mk")
+    autochecks_path.parent.mkdir(parents=True, exist_ok=True)
+    autochecks_path.write_text(u"[]\n")
+
+    # The cluster depends on the autochecks of its nodes
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["node1"]) == ["all"]
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["cluster1"]) == ["all"]
+
+
+def test_load_checks_of_hosts_changed_discovered_labels(legacy_plugin_loads):
+    labels_path = cmk.utils.paths.discovered_host_labels_dir / "node1.mk"
+    labels_path.parent.mkdir(parents=True, exist_ok=True)
+    labels_path.write_text(u"{}\n")
+
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["node1"]) == ["all"]
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["cluster1"]) == ["all"]
+
+
+def test_load_checks_of_hosts_changed_config(legacy_plugin_loads):
+    with Path(cmk.utils.paths.main_config_file).open("a") as f:
+        f.write(u"all_hosts += ['new-host']\n")
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["node1"]) == ["all"]
+
+
+def test_load_checks_of_hosts_without_manifest(legacy_plugin_loads):
+    config._legacy_plugin_manifest_path().unlink()
+    assert _load_checks_of_hosts(legacy_plugin_loads, ["node1"]) == ["all"]
@@ -12,9 +12,11 @@ import pytest  # type: ignore[import]
 
 from testlib.base import Scenario
 
+import cmk.utils.paths
 import cmk.utils.version as cmk_version
 import cmk.base.core_config as core_config
 import cmk.base.core_nagios as core_nagios
+import cmk.base.incremental_core_config as incremental_core_config
 
 
 def test_format_nagios_object():
@@ -198,3 +200,139 @@ def test_create_nagios_host_spec(hostname, result, monkeypatch):
 
     host_spec = core_nagios._create_nagios_host_spec(cfg, config_cache, hostname, host_attrs)
     assert host_spec == result
+
+
+def _create_incremental_config(config_cache, host_objects_cache, objects_file):
+    host_objects = incremental_core_config.HostObjectCache(
+        host_objects_cache, objects_file,
+        incremental_core_config.HostConfigFingerprints(config_cache))
+    try:
+        tmp_file = objects_file.with_name("tmp")
+        with tmp_file.open("w", encoding="utf-8") as outfile:
+            core_nagios.create_config(outfile, hostnames=None, host_objects=host_objects)
+        tmp_file.rename(objects_file)
+        host_objects.save()
+    finally:
+        host_objects.close()
+    return objects_file.read_text(encoding="utf-8")
+
+
+def test_create_config_incremental(monkeypatch, tmp_path):
+    ts = Scenario().add_host("host1")
+    ts.add_host("host2")
+    ts.add_host("host3")
+    ts.set_option("ipaddresses", {
+        "host1": "127.0.0.1",
+        "host2": "127.0.0.2",
+        "host3": "127.0.0.3",
+    })
+    ts.set_option("extra_host_conf", {
+        "alias": [{
+            "condition": {
+                "host_name": ["host2"]
+            },
+            "value": u"Älias 1",
+        }],
+    })
+    config_cache = ts.apply(monkeypatch)
+
+    host_objects_cache = tmp_path / "host_objects.cache"
+    objects_file = tmp_path / "check_mk_objects.cfg"
+
+    full_config = _create_incremental_config(config_cache, host_objects_cache, objects_file)
+    # The offsets of the host objects following the non-ASCII alias are counted in bytes
+    assert u"Älias 1" in full_config
+
+    reused = []
+    monkeypatch.setattr(core_nagios, "_create_nagios_config_host",
+                        lambda cfg, config_cache, hostname: reused.append(hostname))
+    assert _create_incremental_config(config_cache, host_objects_cache, objects_file) == full_config
+    assert reused == []
+
+    monkeypatch.undo()
+    ts.set_option("extra_host_conf", {
+        "alias": [{
+            "condition": {
+                "host_name": ["host2"]
+            },
+            "value": u"Älias 2",
+        }],
+    })
+    config_cache = ts.apply(monkeypatch)
+    generated = []
+    create_host = core_nagios._create_nagios_config_host
+    monkeypatch.setattr(
+        core_nagios, "_create_nagios_config_host", lambda cfg, config_cache, hostname:
+        (generated.append(hostname), create_host(cfg, config_cache, hostname)))
+
+    changed_config = _create_incremental_config(config_cache, host_objects_cache, objects_file)
+    assert generated == ["host2"]
+    assert changed_config == full_config.replace(u"Älias 1", u"Älias 2")
+
+
+@pytest.fixture
+def precompile_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "precompiled_hostchecks_dir",
+                        str(tmp_path / "host_checks"))
+    # The cache of the precompiled host checks is saved below the var_dir
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path / "var"))
+    monkeypatch.setattr(core_nagios, "_get_needed_plugin_names", lambda host_config:
+                        ({"uptime"}, set(), set()))
+    monkeypatch.setattr(core_nagios, "_get_legacy_check_file_names_to_load",
+                        lambda names: ["/checks/%s" % name for name in names])
+    (tmp_path / "host_checks").mkdir()
+    return tmp_path / "host_checks"
+
+
+def _precompile_scenario(monkeypatch, max_processes, incremental, ipaddress):
+    ts = Scenario().add_host("host1")
+    ts.add_host("host2")
+    ts.set_option("ipaddresses", {"host1": "127.0.0.1", "host2": ipaddress})
+    ts.set_option("precompile_hostchecks_max_processes", max_processes)
+    ts.set_option("incremental_core_config", incremental)
+    return ts.apply(monkeypatch)
+
+
+def _precompile(config_cache):
+    precompiler = core_nagios.HostCheckPrecompiler(config_cache)
+    results = {
+        result.hostname: result
+        for result in precompiler.precompile(sorted(config_cache.all_active_hosts()))
+    }
+    precompiler.save()
+    assert all(result.error is None for result in results.values())
+    assert all(result.needed_legacy_check_plugin_names == {"uptime"} for result in results.values())
+    return sorted(hostname for hostname, result in results.items() if result.regenerated)
+
+
+@pytest.mark.parametrize("max_processes", [1, 2])
+def test_precompile_hostchecks_unchanged_source(monkeypatch, precompile_dir, max_processes):
+    config_cache = _precompile_scenario(monkeypatch, max_processes, False, "127.0.0.2")
+    assert _precompile(config_cache) == ["host1", "host2"]
+    assert (precompile_dir / "host2").exists()
+    assert "127.0.0.2" in (precompile_dir / "host2.py").read_text()
+    assert _precompile(config_cache) == []
+
+    config_cache = _precompile_scenario(monkeypatch, max_processes, False, "127.0.0.3")
+    assert _precompile(config_cache) == ["host2"]
+    assert "127.0.0.3" in (precompile_dir / "host2.py").read_text()
+
+    (precompile_dir / "host1").unlink()
+    assert _precompile(config_cache) == ["host1"]
+
+
+def test_precompile_hostchecks_unchanged_fingerprint(monkeypatch, precompile_dir):
+    config_cache = _precompile_scenario(monkeypatch, 1, True, "127.0.0.2")
+    assert _precompile(config_cache) == ["host1", "host2"]
+
+    generated = []
+    precompile_hostcheck = core_nagios._precompile_hostcheck
+    monkeypatch.setattr(
+        core_nagios, "_precompile_hostcheck", lambda config_cache, hostname:
+        (generated.append(hostname), precompile_hostcheck(config_cache, hostname))[1])
+    assert _precompile(config_cache) == []
+    assert generated == []
+
+    config_cache = _precompile_scenario(monkeypatch, 1, True, "127.0.0.3")
+    assert _precompile(config_cache) == ["host2"]
+    assert generated == ["host2"]
@@ -6,6 +6,8 @@
 
 import os
 import socket
+import threading
+import time
 from pathlib import Path
 
 import pytest  # type: ignore[import]
@@ -153,6 +155,98 @@ def test_update_dns_cache(monkeypatch, _cache_file):
     assert ("dual", 6) not in cache
 
 
+class _StubResolver:
+    """Resolves every host name after the given delay, except hanging hosts"""
+    def __init__(self, delay=0.0, hanging=()):
+        self._delay = delay
+        self._hanging = hanging
+        self._lock = threading.Lock()
+        self._parallel = 0
+        self.max_parallel = 0
+        self.release = threading.Event()
+
+    def getaddrinfo(self, host, port, family=None, socktype=None, proto=None, flags=None):
+        with self._lock:
+            self._parallel += 1
+            self.max_parallel = max(self.max_parallel, self._parallel)
+        try:
+            if host in self._hanging:
+                self.release.wait()
+            time.sleep(self._delay)
+            if host.startswith("unknown"):
+                raise socket.gaierror(-2, "Name or service not known")
+            return [(family, None, None, None, ("127.0.0.%d" % int(host[4:]), 1337))]
+        finally:
+            with self._lock:
+                self._parallel -= 1
+
+
+def test_resolve_concurrently(monkeypatch):
+    resolver = _StubResolver(delay=0.02)
+    monkeypatch.setattr(socket, "getaddrinfo", resolver.getaddrinfo)
+    lookups = [("host%d" % index, 4) for index in range(20)] + [("unknown", 4)]
+
+    results = ip_lookup._resolve_concurrently(lookups, 4, 5.0)
+
+    assert 1 < resolver.max_parallel <= 4
+    assert sorted(results) == sorted(lookups)
+    assert results[("host7", 4)].address == "127.0.0.7"
+    assert results[("unknown", 4)].address is None
+    assert "not known" in results[("unknown", 4)].error
+    assert not any(result.timed_out for result in results.values())
+
+
+def test_resolve_concurrently_timeout(monkeypatch):
+    resolver = _StubResolver(hanging=("host1", "host2"))
+    monkeypatch.setattr(socket, "getaddrinfo", resolver.getaddrinfo)
+    lookups = [("host%d" % index, 4) for index in range(1, 11)]
+
+    try:
+        # The hanging lookups don't block the other ones
+        results = ip_lookup._resolve_concurrently(lookups, 2, 0.1)
+    finally:
+        resolver.release.set()
+
+    assert [cache_id for cache_id, result in results.items() if result.timed_out] == [("host1", 4),
+                                                                                      ("host2", 4)]
+    assert results[("host1", 4)].address is None
+    assert results[("host10", 4)].address == "127.0.0.10"
+
+
+def test_update_dns_cache_timeout(monkeypatch, _cache_file):
+    resolver = _StubResolver(hanging=("host2",))
+    monkeypatch.setattr(socket, "getaddrinfo", resolver.getaddrinfo)
+    monkeypatch.setattr(config, "dns_cache_update_lookup_timeout", 0.1)
+
+    ts = Scenario()
+    ts.add_host("host1")
+    ts.add_host("host2")
+    ts.add_host("host3", tags={"address_family": "no-ip"})
+    ts.add_host("host4")
+    ts.apply(monkeypatch)
+    monkeypatch.setattr(config, "ipaddresses", {"host4": "10.0.0.4"})
+
+    try:
+        assert ip_lookup.update_dns_cache() == (1, ["host2"])
+    finally:
+        resolver.release.set()
+
+    assert ip_lookup._load_ip_lookup_cache(lock=False) == {("host1", 4): "127.0.0.1"}
+
+
+def test_dns_lookup_summary():
+    results = {
+        ("host%d" % index, 4): ip_lookup.DNSLookupResult("127.0.0.1", None, index / 1000.0, False)
+        for index in range(1, 101)
+    }
+    results[("host100", 4)] = ip_lookup.DNSLookupResult(None, "Timed out", 5.0, True)
+
+    assert ip_lookup._dns_lookup_summary(results) == (
+        "100 DNS lookups, 1 failed (1 timed out), latency: "
+        "p50 50.0 ms, p90 90.0 ms, p99 99.0 ms, max 5000.0 ms\n")
+    assert ip_lookup._dns_lookup_summary({}) == "No DNS lookups needed\n"
+
+
 def test_clear_ip_lookup_cache(_cache_file):
     with _cache_file.open(mode="w", encoding="utf-8") as f:
         f.write(u"%r" % {("host1", 4): "127.0.0.1"})
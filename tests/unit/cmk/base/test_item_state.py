@@ -7,6 +7,9 @@
 # pylint: disable=protected-access
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+import cmk.utils.store as store
+
 from cmk.base import item_state
 
 
@@ -68,3 +71,86 @@ def test_get_average(ini_zero, backlog_min, timeseries):
             initialize_zero=ini_zero,
         )
         assert avg == expected_average, "at [%r]: got %r expected %r" % (idx, avg, expected_average)
+
+
+@pytest.fixture(name="counters_dir")
+def fixture_counters_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "counters_dir", str(tmp_path))
+    return tmp_path
+
+
+def _cycle(item_state_store, updates=None, removes=()):
+    cached = item_state.CachedItemStates(item_state_store)
+    cached.load("heute")
+    for key, value in (updates or {}).items():
+        cached.set_item_state(key, value)
+    for key in removes:
+        cached.clear_item_state(key)
+    cached.save("heute")
+    return cached.get_all_item_states()
+
+
+@pytest.mark.parametrize("item_state_format", ["repr", "binary"])
+def test_item_state_store_roundtrip(counters_dir, item_state_format):
+    _cycle(item_state.make_item_state_store(item_state_format), {"a": (1, 2.0), "b": "x"})
+    _cycle(item_state.make_item_state_store(item_state_format), {"c": None}, ["a"])
+    assert _cycle(item_state.make_item_state_store(item_state_format)) == {
+        ("b",): "x",
+        ("c",): None,
+    }
+
+
+def test_binary_item_state_store_appends_changes(counters_dir):
+    _cycle(item_state.BinaryItemStateStore(), {str(i): i for i in range(100)})
+    size = (counters_dir / "heute").stat().st_size
+
+    _cycle(item_state.BinaryItemStateStore(), {"1": 42})
+    # Only the changed key has been appended
+    assert size < (counters_dir / "heute").stat().st_size < size + 50
+    assert _cycle(item_state.BinaryItemStateStore())[("1",)] == 42
+
+
+def test_binary_item_state_store_compacts(counters_dir, monkeypatch):
+    monkeypatch.setattr(item_state.BinaryItemStateStore, "min_compaction_size", 0)
+    _cycle(item_state.BinaryItemStateStore(), {str(i): i for i in range(10)})
+    size = (counters_dir / "heute").stat().st_size
+
+    for i in range(30):
+        _cycle(item_state.BinaryItemStateStore(), {"0": i})
+    assert (counters_dir / "heute").stat().st_size <= 2 * size
+
+    expected = dict([(("0",), 29)] + [((str(i),), i) for i in range(1, 10)])
+    assert _cycle(item_state.BinaryItemStateStore()) == expected
+
+
+def test_binary_item_state_store_migrates_repr_file(counters_dir):
+    store.save_object_to_file(counters_dir / "heute", {("a",): 1, ("b",): (1, 2)})
+    assert _cycle(item_state.BinaryItemStateStore(), {"a": 2}) == {("a",): 2, ("b",): (1, 2)}
+    assert (counters_dir / "heute").read_bytes().startswith(b"CMKSTATE")
+    assert _cycle(item_state.BinaryItemStateStore()) == {("a",): 2, ("b",): (1, 2)}
+
+
+def test_repr_item_state_store_migrates_binary_file(counters_dir):
+    _cycle(item_state.BinaryItemStateStore(), {"a": 1, "b": (1, 2)})
+    _cycle(item_state.BinaryItemStateStore(), {"c": 3}, ["b"])
+    assert _cycle(item_state.ReprItemStateStore(), {"a": 2}) == {("a",): 2, ("c",): 3}
+    assert store.load_object_from_file(counters_dir / "heute", default={}) == {
+        ("a",): 2,
+        ("c",): 3,
+    }
+    assert _cycle(item_state.BinaryItemStateStore()) == {("a",): 2, ("c",): 3}
+
+
+def test_binary_item_state_store_ignores_truncated_record(counters_dir):
+    _cycle(item_state.BinaryItemStateStore(), {"a": 1})
+    _cycle(item_state.BinaryItemStateStore(), {"b": 2})
+    path = counters_dir / "heute"
+    path.write_bytes(path.read_bytes()[:-3])
+
+    assert _cycle(item_state.BinaryItemStateStore(), {"c": 3}) == {("a",): 1, ("c",): 3}
+    assert _cycle(item_state.BinaryItemStateStore()) == {("a",): 1, ("c",): 3}
+
+
+def test_make_item_state_store_invalid_format():
+    with pytest.raises(item_state.MKGeneralException):
+        item_state.make_item_state_store("json")
@@ -4,11 +4,16 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import json
 import math
+import os
 import time
 from pprint import pprint
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+import cmk.utils.prediction
+from cmk.utils.prediction import TimeSeries
 from cmk.base import prediction
 from testlib import on_time
 
@@ -120,3 +125,70 @@ def test_time_slices(utcdate, timezone, horizon, period_info, timegroup, result)
     ])
 def test_data_stats(slices, result):
     assert prediction.data_stats(slices) == result
+
+
+@pytest.fixture(name="bulk_queries")
+def fixture_bulk_queries(monkeypatch):
+    queries = []
+
+    def get_bulk_rrd_data(hostname, service_description, column_queries):
+        queries.append(column_queries)
+        time_series = []
+        for _varname, _cf, fromtime, untiltime, _max_entries in column_queries:
+            values = [float(i) for i in range((untiltime - fromtime) // 100)]
+            time_series.append(TimeSeries(values, (fromtime, untiltime, 100)))
+        return time_series
+
+    monkeypatch.setattr(cmk.utils.prediction, "get_bulk_rrd_data", get_bulk_rrd_data)
+    monkeypatch.setattr(prediction, "_prefetched_time_series", {})
+    return queries
+
+
+def test_bulk_rrd_datacolumn(bulk_queries):
+    time_windows = [(3000, 4000), (2000, 3000), (0, 1000)]
+    rrd_column = prediction.bulk_rrd_datacolumn("host", "svc", "in", "MAX", time_windows, ["out"])
+
+    assert bulk_queries == [[
+        ("in", "MAX", 3000, 4000, 400),
+        ("in", "MAX", 0, 3000, 1200),
+        ("out", "MAX", 3000, 4000, 400),
+        ("out", "MAX", 0, 3000, 1200),
+    ]]
+    assert rrd_column(3000, 4000).twindow == (3000, 4000, 100)
+    assert rrd_column(0, 1000) == TimeSeries([float(i) for i in range(10)], (0, 1000, 100))
+    assert rrd_column(2000, 3000).values == [float(i) for i in range(20, 30)]
+
+    # The time series of the other metric is not fetched again
+    rrd_column = prediction.bulk_rrd_datacolumn("host", "svc", "out", "MAX", time_windows, [])
+    assert rrd_column(2000, 3000).values == [float(i) for i in range(20, 30)]
+    assert len(bulk_queries) == 1
+
+    rrd_column = prediction.bulk_rrd_datacolumn("host", "svc", "out", "MAX", time_windows, [])
+    assert len(bulk_queries) == 2
+
+
+def test_other_outdated_dsnames(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path))
+    params = {"period": "wday", "horizon": 90, "levels_upper": ("absolute", (1, 2))}
+
+    def save_info(dsname, age, cf="MAX", **changed_params):
+        pred_dir = cmk.utils.prediction.predictions_dir("host", "svc", dsname)
+        os.makedirs(pred_dir)
+        with open(os.path.join(pred_dir, "monday.info"), "w") as info_file:
+            json.dump(
+                {
+                    "time": time.time() - age,
+                    "cf": cf,
+                    "dsname": dsname,
+                    "params": dict(params, **changed_params),
+                }, info_file)
+
+    save_info("in", 86400 * 8)
+    save_info("out", 86400 * 8)
+    save_info("errors", 86400 * 8, levels_upper=("absolute", (3, 4)))
+    save_info("discards", 60)
+    save_info("drops", 86400 * 8, cf="AVERAGE")
+    save_info("util", 86400 * 8, horizon=30)
+
+    assert prediction._other_outdated_dsnames("host", "svc", "in", "MAX", "monday",
+                                              params) == ["errors", "out"]
@@ -6,6 +6,7 @@
 
 from testlib.base import Scenario
 
+import cmk.utils.paths
 import cmk.utils.version as cmk_version
 import cmk.base.automations
 import cmk.base.automations.check_mk as automations
@@ -116,3 +117,27 @@ def test_analyse_host(monkeypatch):
             "explicit": "explicit"
         },
     }
+
+
+def test_rename_snmp_walk(monkeypatch, tmp_path):
+    monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path))
+    automation = automations.AutomationRenameHosts()
+
+    # The index is moved along with the walk, replacing the index of the former walk
+    (tmp_path / "host1").write_text(u".1.3.6.1.2.1.1.1.0 host1\n")
+    (tmp_path / ".host1.idx").write_bytes(b"index of host1")
+    (tmp_path / "host2").write_text(u".1.3.6.1.2.1.1.1.0 host2\n")
+    (tmp_path / ".host2.idx").write_bytes(b"index of host2")
+    assert automation._rename_snmp_walk("host1", "host2") == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == [".host2.idx", "host2"]
+    assert (tmp_path / ".host2.idx").read_bytes() == b"index of host1"
+
+    # A walk without index does not keep the index of the former walk
+    (tmp_path / "host3").write_text(u".1.3.6.1.2.1.1.1.0 host3\n")
+    assert automation._rename_snmp_walk("host3", "host2") == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["host2"]
+
+    # The index of a walk which no longer exists is removed
+    (tmp_path / ".host4.idx").write_bytes(b"index of host4")
+    assert automation._rename_snmp_walk("host4", "host5") == 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["host2"]
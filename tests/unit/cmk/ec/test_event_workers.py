@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import logging
+import os
+import pathlib  # pylint: disable=import-error
+import socket
+import time
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+import cmk.ec.history
+import cmk.ec.main
+import cmk.ec.export as ec
+
+
+@pytest.fixture(name="settings", scope="function")
+def fixture_settings():
+    return ec.settings('1.2.3i45', pathlib.Path(cmk.utils.paths.omd_root),
+                       pathlib.Path(cmk.utils.paths.default_config_dir), ['mkeventd'])
+
+
+@pytest.fixture(name="config", scope="function")
+def fixture_config():
+    return ec.default_config()
+
+
+@pytest.fixture(name="perfcounters", scope="function")
+def fixture_perfcounters():
+    return cmk.ec.main.Perfcounters(logging.getLogger("cmk.mkeventd.lock.perfcounters"))
+
+
+@pytest.fixture(name="event_status", scope="function")
+def fixture_event_status(settings, config, perfcounters):
+    history = cmk.ec.history.History(settings, config, logging.getLogger("cmk.mkeventd"),
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    return cmk.ec.main.EventStatus(settings, config, perfcounters, history,
+                                   logging.getLogger("cmk.mkeventd.EventStatus"))
+
+
+@pytest.fixture(name="event_server", scope="function")
+def fixture_event_server(settings, config, perfcounters, event_status):
+    event_server = cmk.ec.main.EventServer(
+        logging.getLogger("cmk.mkeventd.EventServer"), settings, config,
+        cmk.ec.main.default_slave_status_master(), perfcounters,
+        cmk.ec.main.ECLock(logging.getLogger("cmk.mkeventd.configuration")), event_status._history,
+        event_status, cmk.ec.main.StatusTableEvents.columns, False)
+    event_server.compile_rules([], [
+        {
+            "id": "skipped",
+            "disabled": False,
+            "rules": [
+                _rule("skip", match="skip", drop="skip_pack"),
+                _rule("never", match="skip"),
+            ],
+        },
+        {
+            "id": "default",
+            "disabled": False,
+            "rules": [
+                _rule("disk", match="disk (.*) full"),
+                _rule("catch all", match=""),
+            ],
+        },
+    ])
+    return event_server
+
+
+def _rule(rule_id, **conditions):
+    return dict(conditions, id=rule_id, drop=conditions.get("drop", True))
+
+
+def _syslog_line(text):
+    return "<78>Oct 18 10:00:00 host1 app: %s" % text
+
+
+@pytest.mark.parametrize("rule_optimizer", [True, False])
+def test_match_event_skip_pack(event_server, config, rule_optimizer):
+    config["rule_optimizer"] = rule_optimizer
+    event = event_server.create_event_from_line(_syslog_line("skip disk /var full"), None)
+
+    event_matches = event_server.match_event(event, event_server.event_rule_matches)
+
+    assert [(rule["id"], result) for rule, result in event_matches.matches] == [
+        ("skip", (False, {
+            "match_groups_message": ()
+        })),
+        ("disk", (False, {
+            "match_groups_message": ("/var",)
+        })),
+    ]
+    assert event_matches.rule_tries == 2
+
+
+def test_match_event_catch_all(event_server, config):
+    config["rule_optimizer"] = True
+    event = event_server.create_event_from_line(_syslog_line("cpu load"), None)
+
+    assert event_server.match_event(event, event_server.event_rule_matches).matches == [
+        (event_server._rule_by_id["catch all"], (False, {
+            "match_groups_message": ()
+        })),
+    ]
+
+
+@pytest.mark.parametrize("event_workers", [0, 2])
+def test_process_raw_lines(event_server, event_status, perfcounters, config, event_workers):
+    config["event_workers"] = event_workers
+    event_server._update_worker_pool()
+    try:
+        event_server.process_raw_lines(b"\n".join(
+            _syslog_line(text).encode("utf-8")
+            for text in ["disk /var full", "skip it", "cpu load", "skip disk /tmp full"]))
+        event_server._handle_pending_lines(block=True)
+    finally:
+        event_server._stop_worker_pool()
+
+    assert event_status._rule_stats == {"disk": 2, "catch all": 2, "skip": 2}
+    assert perfcounters._counters["messages"] == 4
+    assert perfcounters._counters["drops"] == 4
+
+
+def test_rules_reloaded_while_pending(event_server, event_status, config):
+    config["event_workers"] = 1
+    event_server._update_worker_pool()
+    try:
+        event_server.process_raw_lines(_syslog_line("disk /var full").encode("utf-8"))
+        event_server.compile_rules([], [{
+            "id": "default",
+            "disabled": False,
+            "rules": [_rule("reloaded")],
+        }])
+        event_server._handle_pending_lines(block=True)
+    finally:
+        event_server._stop_worker_pool()
+
+    # The lines submitted before the reload are matched against the new rules
+    assert event_status._rule_stats == {"reloaded": 1}
+
+
+def test_processing_time_without_queueing(event_server, perfcounters, config):
+    config["event_workers"] = 1
+    event_server._update_worker_pool()
+    try:
+        event_server.process_raw_lines(_syslog_line("disk /var full").encode("utf-8"))
+        time.sleep(0.5)
+        event_server._handle_pending_lines(block=True)
+    finally:
+        event_server._stop_worker_pool()
+
+    assert 0 < perfcounters._times["processing"] < 0.5
+
+
+def test_workers_do_not_inherit_sockets(event_server, config):
+    config["event_workers"] = 1
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.set_inheritable(True)
+        fd_path = "/proc/self/fd/%d" % sock.fileno()
+        event_server._update_worker_pool()
+        try:
+            # The number of the descriptor may be in use for something else in the worker
+            assert event_server._worker_pool._pool.apply(_readlink,
+                                                         (fd_path,)) != os.readlink(fd_path)
+        finally:
+            event_server._stop_worker_pool()
+
+
+def _readlink(path):
+    try:
+        return os.readlink(path)
+    except OSError:
+        return None
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import logging
+
+import pytest  # type: ignore[import]
+
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+from cmk.ec.history_index import HistoryFileIndex
+from cmk.ec.query import QueryGET
+
+
+class FakeStatusServer:
+    def __init__(self, history):
+        self._table = cmk.ec.main.StatusTableHistory(logging.getLogger("cmk.mkeventd"), history)
+
+    def table(self, name):
+        assert name == "history"
+        return self._table
+
+
+@pytest.fixture(name="history")
+def fixture_history(tmp_path, monkeypatch):
+    settings = ec.settings('1.2.3i45', tmp_path, tmp_path / "etc", ['mkeventd'])
+    history = cmk.ec.history.History(settings, ec.default_config(),
+                                     logging.getLogger("cmk.mkeventd"),
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    now = [1600000000.0]
+
+    def fake_time():
+        now[0] += 10
+        return now[0]
+
+    monkeypatch.setattr(cmk.ec.history.time, "time", fake_time)
+    for num in range(20):
+        history.add(
+            {
+                "id": num,
+                "host": "host%d" % (num % 4),
+                "rule_id": "rule%d" % (num % 3),
+                "text": "Message %d" % num,
+            }, "NEW")
+    return history
+
+
+def _query(history, *headers):
+    return QueryGET(FakeStatusServer(history), ["GET history"] + list(headers),
+                    logging.getLogger("cmk.mkeventd"))
+
+
+def _log_path(history):
+    paths = list(history._settings.paths.history_dir.value.glob("*.log"))
+    assert len(paths) == 1
+    return paths[0]
+
+
+def _entries_from_index(history, query):
+    path = _log_path(history)
+    index, line_numbers = cmk.ec.history._indexed_lines(history, path, query)
+    assert index is not None and line_numbers is not None
+    return cmk.ec.history._parse_history_lines(history, path, index.read_lines(line_numbers), query,
+                                               query.limit, history._logger)
+
+
+def _entries_from_grep(history, query):
+    return cmk.ec.history._parse_history_file(history, _log_path(history), query, [], query.limit,
+                                              history._logger)
+
+
+def _event_ids(entries):
+    return [entry[5] for entry in entries]
+
+
+@pytest.mark.parametrize("headers,event_ids", [
+    (["Filter: event_id = 7"], [7]),
+    (["Filter: event_host = host1"], [17, 13, 9, 5, 1]),
+    (["Filter: event_host in host1 host2"], [18, 17, 14, 13, 10, 9, 6, 5, 2, 1]),
+    (["Filter: event_host = host1", "Filter: event_rule_id = rule2"], [17, 5]),
+    (["Filter: history_time >= 1600000180"], [19, 18, 17]),
+    (["Filter: history_time > 1600000180", "Filter: history_time < 1600000200"], [18]),
+    (["Filter: history_time <= 1600000020", "Filter: event_text ~~ message"], [1, 0]),
+    (["Filter: event_host = host1", "Limit: 2"], [17, 13, 9]),
+])
+def test_indexed_lines(history, headers, event_ids):
+    query = _query(history, *headers)
+    entries = _entries_from_index(history, query)
+    assert _event_ids(entries) == event_ids
+    assert entries == [e for e in _entries_from_grep(history, query) if e[5] in event_ids]
+
+
+def test_not_indexed_filters(history):
+    query = _query(history, "Filter: event_text ~~ message 1")
+    assert cmk.ec.history._indexed_lines(history, _log_path(history), query)[1] is None
+    assert _event_ids(history.get(query)) == [19, 18, 17, 16, 15, 14, 13, 12, 11, 10, 1]
+
+
+def test_history_get_uses_index(history):
+    assert _event_ids(history.get(_query(history, "Filter: event_id = 3"))) == [3]
+    history.add({"id": 3, "host": "host3", "rule_id": "rule0"}, "DELETE")
+    assert _event_ids(history.get(_query(history, "Filter: event_id = 3"))) == [3, 3]
+
+
+def test_index_persistence(history):
+    path = _log_path(history)
+    history.housekeeping()
+    assert path.with_suffix(".idx").exists()
+
+    index = HistoryFileIndex(path, [n for n, _d in cmk.ec.main.StatusTableHistory.columns[1:]])
+    index.load()
+    assert not index.dirty
+    assert len(index) == 20
+
+    with path.open("ab") as f:
+        f.write(b"invalid line\n")
+    history.add({"id": 42, "host": "host0"}, "NEW")
+    index.update()
+    assert len(index) == 21
+    assert index.matching_lines(_query(history, "Filter: event_id = 42").filters) == [20]
+
+
+def test_index_replaced_history_file(history):
+    path = _log_path(history)
+    history.housekeeping()
+    path.write_bytes(path.read_bytes().replace(b"\tNEW\t\t\t3\t", b"\tNEW\t\t\t4711\t"))
+
+    index = HistoryFileIndex(path, [n for n, _d in cmk.ec.main.StatusTableHistory.columns[1:]])
+    index.load()
+    index.update()
+    assert index.matching_lines(_query(history, "Filter: event_id = 3").filters) == []
+    assert index.matching_lines(_query(history, "Filter: event_id = 4711").filters) == [3]
+
+    path.write_bytes(b"".join(reversed(path.read_bytes().splitlines(keepends=True))))
+    index.update()
+    assert index.matching_lines(_query(history, "Filter: event_id = 4711").filters) == [16]
+    filters = _query(history, "Filter: history_time < 1600000030").filters
+    assert index.matching_lines(filters) == [18, 19]
+
+
+def test_flush_removes_indexes(history):
+    path = _log_path(history)
+    history.housekeeping()
+    history.flush()
+    assert not path.exists()
+    assert not path.with_suffix(".idx").exists()
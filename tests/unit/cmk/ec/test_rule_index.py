@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import itertools
+import logging
+
+import pytest  # type: ignore[import]
+
+import cmk.ec.rule_index
+from cmk.ec.main import EventServer, RuleMatcher
+from cmk.ec.rule_index import _required_literals, build_rule_indexes, RuleIndex
+
+
+def _rule(rule_id, **conditions):
+    rule = {"id": rule_id, "pack": "default"}
+    for key, value in conditions.items():
+        rule[key] = EventServer._compile_matching_value(key, value)
+    return rule
+
+
+@pytest.mark.parametrize("pattern,result", [
+    ("Foo", (("foo",), True)),
+    ("disk (full|empty)$", (("disk ",), False)),
+    ("^Interface (eth[0-9]+) down", (("interface ", " down", "eth"), False)),
+    ("(Link) is down", (("link is down",), False)),
+    ("a+bcd", (("bcd", "a"), False)),
+    ("x*yz", (("yz",), False)),
+    ("(foo|bar)", None),
+    ("[0-9]+", None),
+    ("ümlaut$", (("mlaut",), False)),
+])
+def test_required_literals(pattern, result):
+    assert _required_literals(EventServer._compile_matching_value("match", pattern)) == result
+
+
+def test_candidates_keep_rule_order():
+    rules = [
+        _rule("generic"),
+        _rule("host", match_host="Host1"),
+        _rule("message", match="disk full$"),
+        _rule("other host", match_host="host2"),
+        _rule("host and message", match_host="host1", match="disk full"),
+    ]
+    index = RuleIndex(rules)
+    assert len(index) == 5
+
+    candidates = index.candidates({"host": "HOST1", "text": "Disk FULL"})
+    assert [r["id"] for r in candidates] == ["generic", "host", "message", "host and message"]
+
+    candidates = index.candidates({"host": "host2", "text": "cpu load"})
+    assert [r["id"] for r in candidates] == ["generic", "other host"]
+
+
+def test_build_rule_indexes(monkeypatch):
+    rules = [_rule("disk", match="disk (.*) full$"), _rule("host", match_host="host1")]
+    analyzed = []
+    monkeypatch.setattr(cmk.ec.rule_index, "_message_literals",
+                        lambda rule: analyzed.append(rule["id"]) or None)
+
+    indexes = build_rule_indexes({1: {2: rules, 3: rules[:1]}, 4: {0: rules[1:]}})
+
+    priorities = {facility: sorted(prio_hash) for facility, prio_hash in indexes.items()}
+    assert priorities == {
+        1: [2, 3],
+        4: [0],
+    }
+    assert [len(indexes[1][2]), len(indexes[1][3]), len(indexes[4][0])] == [2, 1, 1]
+    assert sorted(analyzed) == ["disk", "host"]
+
+
+def test_candidates_cancelling_message():
+    index = RuleIndex([_rule("cancel", match="service (.*) down$", match_ok="service (.*) up$")])
+    assert index.candidates({"host": "h", "text": "Service x up"})
+    assert index.candidates({"host": "h", "text": "Service x down"})
+    assert not index.candidates({"host": "h", "text": "Service x restarted"})
+
+
+def test_candidates_inverted_rules():
+    rule = _rule("inverted", match="disk full")
+    rule["invert_matching"] = True
+    assert RuleIndex([rule]).candidates({"host": "h", "text": "cpu load"}) == [rule]
+
+
+def test_candidates_non_ascii_text():
+    index = RuleIndex([_rule("regex", match="disk full$"), _rule("plain", match="disk full")])
+    # Case insensitive regex matching of non ASCII texts is not covered by the index
+    assert [r["id"] for r in index.candidates({"host": "h", "text": "Dißk"})] == ["regex"]
+
+
+def test_candidates_same_first_match():
+    rules = [
+        _rule("host1 disk", match_host="host1", match="disk (.*) full"),
+        _rule("regex host", match_host="^host[0-9]$", match="interface"),
+        _rule("cancel", match="service (.*) down$", match_ok="service (.*) up$"),
+        _rule("plain", match="Kernel panic"),
+        _rule("host2", match_host="host2"),
+        _rule("catch all"),
+    ]
+    matcher = RuleMatcher(logging.getLogger("cmk.mkeventd"), {"debug_rules": False})
+    index = RuleIndex(rules)
+
+    def first_match(candidates, event):
+        for rule in candidates:
+            if matcher.event_rule_matches_non_inverted(rule, event) is not False:
+                return rule["id"]
+        return None
+
+    hosts = ["host1", "HOST2", "host3", "other"]
+    texts = [
+        "Disk /var is full",
+        "Interface eth0 down",
+        "Service sshd down",
+        "service sshd up",
+        "kernel panic - not syncing",
+        "nothing special",
+    ]
+    for host, text in itertools.product(hosts, texts):
+        event = {
+            "host": host,
+            "text": text,
+            "ipaddress": "127.0.0.1",
+            "facility": 1,
+            "priority": 2,
+            "application": "",
+        }
+        assert first_match(index.candidates(event), event) == first_match(rules, event)
@@ -5,12 +5,17 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import collections
+import signal
+import subprocess
+import time
 
 import pytest  # type: ignore[import]
 
-from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.exceptions import MKGeneralException, MKTimeout
+from cmk.utils.type_defs import SectionName
 
-from cmk.snmplib.type_defs import SNMPHostConfig
+import cmk.snmplib.snmp_table as snmp_table
+from cmk.snmplib.type_defs import SNMPHostConfig, SNMPTree
 
 from cmk.fetchers.snmp_backend import ClassicSNMPBackend
 import cmk.fetchers.snmp_backend.classic as classic_snmp
@@ -246,3 +251,63 @@ def test_priv_proto(proto, result):
 def test_priv_proto_unknown(proto):
     with pytest.raises(MKGeneralException):
         classic_snmp._priv_proto_for(proto)
+
+
+def test_prefetch_snmp_walks_timeout(monkeypatch):
+    processes = []
+    popen = subprocess.Popen
+
+    def _popen(*args, **kwargs):
+        processes.append(popen(*args, **kwargs))
+        return processes[-1]
+
+    def _raise_timeout(signum, frame):
+        raise MKTimeout("Timed out")
+
+    monkeypatch.setattr(classic_snmp.subprocess, "Popen", _popen)
+    backend = ClassicSNMPBackend(
+        SNMPHostConfig(
+            is_ipv6_primary=False,
+            hostname="localhost",
+            ipaddress="127.0.0.1",
+            credentials="public",
+            port=161,
+            is_bulkwalk_host=True,
+            is_snmpv2or3_without_bulkwalk_host=False,
+            bulk_walk_size_of=10,
+            timing={},
+            oid_range_limits=[],
+            snmpv3_contexts=[],
+            character_encoding=None,
+            is_usewalk_host=False,
+            is_inline_snmp_host=False,
+            record_stats=False,
+        ))
+    # The walks hang far beyond the timeout
+    monkeypatch.setattr(backend, "_snmp_walk_command",
+                        lambda context_name: ["sh", "-c", "exec sleep 60", "sh"])
+
+    old_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, 0.5)
+    start = time.time()
+    try:
+        with pytest.raises(MKTimeout):
+            snmp_table.prefetch_snmp_walks(
+                {
+                    SectionName("one"): [SNMPTree(base=".1.2.3", oids=["1"])],
+                    SectionName("two"): [SNMPTree(base=".1.2.4", oids=["1"])],
+                    SectionName("three"): [SNMPTree(base=".1.2.5", oids=["1"])],
+                },
+                False,
+                backend=backend,
+                max_parallel_walks=2,
+            )
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+    # The running walks have been stopped and the pending walk has not been started
+    assert len(processes) == 2
+    while any(process.poll() is None for process in processes) and time.time() - start < 5:
+        time.sleep(0.01)
+    assert [process.returncode for process in processes] == [-signal.SIGTERM] * 2
@@ -192,42 +192,50 @@ class TestProgramFetcher:
 
 
 class TestSNMPFetcher:
+    @pytest.fixture(name="serialized")
+    def serialized_fixture(self, fc_conf):
+        return json_identity({
+            "file_cache": fc_conf.configure(),
+            "oid_infos": {
+                "pim": [SNMPTree(base=".1.1.1", oids=["1.2", "3.4"]).to_json()],
+                "pam": [SNMPTree(base=".1.2.3", oids=["4.5", "6.7", "8.9"]).to_json()],
+                "pum": [
+                    SNMPTree(base=".2.2.2", oids=["2.2"]).to_json(),
+                    SNMPTree(base=".3.3.3", oids=["2.2"]).to_json(),
+                ],
+            },
+            "use_snmpwalk_cache": False,
+            "snmp_config": SNMPHostConfig(
+                is_ipv6_primary=False,
+                hostname="bob",
+                ipaddress="1.2.3.4",
+                credentials=(),
+                port=42,
+                is_bulkwalk_host=False,
+                is_snmpv2or3_without_bulkwalk_host=False,
+                bulk_walk_size_of=0,
+                timing={},
+                oid_range_limits=[],
+                snmpv3_contexts=[],
+                character_encoding=None,
+                is_usewalk_host=False,
+                is_inline_snmp_host=False,
+                record_stats=False,
+            )._asdict(),
+            "max_parallel_walks": 4,
+        })
+
     @pytest.fixture(name="fetcher")
-    def fetcher_fixture(self, fc_conf):
-        return SNMPFetcher.from_json(
-            json_identity({
-                "file_cache": fc_conf.configure(),
-                "oid_infos": {
-                    "pim": [SNMPTree(base=".1.1.1", oids=["1.2", "3.4"]).to_json()],
-                    "pam": [SNMPTree(base=".1.2.3", oids=["4.5", "6.7", "8.9"]).to_json()],
-                    "pum": [
-                        SNMPTree(base=".2.2.2", oids=["2.2"]).to_json(),
-                        SNMPTree(base=".3.3.3", oids=["2.2"]).to_json(),
-                    ],
-                },
-                "use_snmpwalk_cache": False,
-                "snmp_config": SNMPHostConfig(
-                    is_ipv6_primary=False,
-                    hostname="bob",
-                    ipaddress="1.2.3.4",
-                    credentials=(),
-                    port=42,
-                    is_bulkwalk_host=False,
-                    is_snmpv2or3_without_bulkwalk_host=False,
-                    bulk_walk_size_of=0,
-                    timing={},
-                    oid_range_limits=[],
-                    snmpv3_contexts=[],
-                    character_encoding=None,
-                    is_usewalk_host=False,
-                    is_inline_snmp_host=False,
-                    record_stats=False,
-                )._asdict(),
-            }))
+    def fetcher_fixture(self, serialized):
+        return SNMPFetcher.from_json(serialized)
 
     def test_deserialization(self, fetcher):
         assert isinstance(fetcher, SNMPFetcher)
 
+    def test_deserialization_of_older_version(self, serialized):
+        del serialized["max_parallel_walks"]
+        assert SNMPFetcher.from_json(serialized)._max_parallel_walks == 1
+
     def test_file_cache_deserialization(self, fetcher):
         assert isinstance(fetcher.file_cache, SNMPFileCache)
 
@@ -4,10 +4,17 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import os
+
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+
+from cmk.snmplib.type_defs import SNMPHostConfig
+
 import cmk.fetchers.snmp_backend._utils as utils
-from cmk.fetchers.snmp_backend import StoredWalkSNMPBackend
+import cmk.fetchers.snmp_backend.stored_walk as stored_walk
+from cmk.fetchers.snmp_backend import StoredWalkIndex, StoredWalkSNMPBackend
 
 
 @pytest.mark.parametrize("value,expected", [
@@ -20,15 +27,103 @@ def test_strip_snmp_value(value, expected):
     assert utils.strip_snmp_value(value) == expected
 
 
-class TestStoredWalkSNMPBackend:
-    @pytest.mark.parametrize("a, b, result", [
-        ("1.2.3", "1.2.3", 0),
-        ("1.2.3", ".1.2.3", 0),
-        (".1.2.3", "1.2.3", 0),
-        (".1.2.3", ".1.2.3", 0),
-        ("1.2.3", "1.2.3.4", 0),
-        ("1.2.3.4", "1.2.3", 1),
-        ("1.2.3", "4.5.6", -1),
+WALK = """.1.3.6.1.2.1.1.1.0 "Linux bob"
+.1.3.6.1.2.1.2.2.1.2.1 "lo"
+.1.3.6.1.2.1.2.2.1.2.2 "eth0"
+.1.3.6.1.2.1.2.2.1.2.10 "eth1"
+.1.3.6.1.2.1.2.2.1.3.1 24
+.1.3.6.1.2.1.2.2.1.3.2 6
+.1.3.6.1.2.1.25.1.1.0 123
+"""
+
+
+@pytest.fixture(name="walk_path")
+def fixture_walk_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path))
+    path = tmp_path / "bob"
+    path.write_text(WALK)
+    yield path
+    stored_walk.cleanup_walk_indexes()
+
+
+class TestStoredWalkIndex:
+    @pytest.mark.parametrize("oid, include_exact, expected", [
+        ("1.3.6.1.2.1.1.1.0", True, [("1.3.6.1.2.1.1.1.0", b'"Linux bob"')]),
+        (".1.3.6.1.2.1.1.1.0", False, []),
+        ("1.3.6.1.2.1.2.2.1.2", True, [
+            ("1.3.6.1.2.1.2.2.1.2.1", b'"lo"'),
+            ("1.3.6.1.2.1.2.2.1.2.2", b'"eth0"'),
+            ("1.3.6.1.2.1.2.2.1.2.10", b'"eth1"'),
+        ]),
+        ("1.3.6.1.2.1.2.2.1.2.1", True, [("1.3.6.1.2.1.2.2.1.2.1", b'"lo"')]),
+        ("1.3.6.1.2.1.2.2.1.4", True, []),
+        ("1.3.6.1.2.1.25", True, [("1.3.6.1.2.1.25.1.1.0", b"123")]),
     ])
-    def test_compare_oids(self, a, b, result):
-        assert StoredWalkSNMPBackend._compare_oids(a, b) == result
+    def test_lookup(self, walk_path, oid, include_exact, expected):
+        index = StoredWalkIndex(walk_path)
+        assert list(index.lookup(oid, include_exact=include_exact)) == expected
+        index.close()
+
+    def test_index_is_persisted(self, walk_path):
+        index = StoredWalkIndex(walk_path)
+        index.close()
+        assert index.index_path.exists()
+
+        mtime = index.index_path.stat().st_mtime_ns
+        StoredWalkIndex(walk_path).close()
+        assert index.index_path.stat().st_mtime_ns == mtime
+
+    def test_index_is_rebuilt_on_walk_change(self, walk_path):
+        StoredWalkIndex(walk_path).close()
+
+        walk_path.write_text(WALK + ".1.3.6.1.4.1.42.1.0 1\n")
+        stat = walk_path.stat()
+        os.utime(str(walk_path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+        index = StoredWalkIndex(walk_path)
+        assert list(index.lookup("1.3.6.1.4.1.42")) == [("1.3.6.1.4.1.42.1.0", b"1")]
+        index.close()
+
+    def test_unsorted_walk(self, walk_path):
+        walk_path.write_text("".join(reversed(WALK.splitlines(True))))
+        index = StoredWalkIndex(walk_path)
+        assert [o for o, _v in index.lookup("1.3.6.1.2.1.2.2.1.3")] == [
+            "1.3.6.1.2.1.2.2.1.3.1",
+            "1.3.6.1.2.1.2.2.1.3.2",
+        ]
+        index.close()
+
+
+class TestStoredWalkSNMPBackend:
+    @pytest.fixture(name="backend")
+    def fixture_backend(self, walk_path):
+        return StoredWalkSNMPBackend(
+            SNMPHostConfig(
+                is_ipv6_primary=False,
+                hostname="bob",
+                ipaddress="1.2.3.4",
+                credentials="public",
+                port=161,
+                is_bulkwalk_host=False,
+                is_snmpv2or3_without_bulkwalk_host=False,
+                bulk_walk_size_of=0,
+                timing={},
+                oid_range_limits=[],
+                snmpv3_contexts=[],
+                character_encoding=None,
+                is_usewalk_host=True,
+                is_inline_snmp_host=False,
+                record_stats=False,
+            ))
+
+    def test_walk(self, backend):
+        assert backend.walk(".1.3.6.1.2.1.2.2.1.3") == [
+            (".1.3.6.1.2.1.2.2.1.3.1", b"24"),
+            (".1.3.6.1.2.1.2.2.1.3.2", b"6"),
+        ]
+
+    def test_get(self, backend):
+        assert backend.get(".1.3.6.1.2.1.1.1.0") == b"Linux bob"
+        assert backend.get(".1.3.6.1.2.1.2.2.1.2.*") == b"lo"
+        assert backend.get(".1.3.6.1.2.1.2.2.1.2") is None
+        assert backend.get(".1.3.6.1.2.1.1.2.0") is None
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import pytest  # type: ignore[import]
+
+from cmk.utils.prediction import TimeSeries
+from cmk.gui.plugins.metrics import timeseries
+
+RRD_VALUES = {
+    "a": [1.0, None, 3.0, 0.0, None, -2.5],
+    "b": [2.0, 4.0, None, 0.0, None, 0.5],
+    "c": [0.0, 1.5, 6.0, 2.0, None, 7.0],
+}
+RRD_DATA = {
+    ("site", "host", "svc", name, "max", 1): TimeSeries([0, 60, 10] + values)
+    for name, values in RRD_VALUES.items()
+}
+
+
+def _rrd(name):
+    return ("rrd", "site", "host", "svc", name, "max", 1)
+
+
+def _evaluate_array(expression):
+    evaluation = timeseries.ArrayEvaluation(RRD_DATA)
+    return evaluation.to_values(evaluation.evaluate(expression))
+
+
+def test_array_operators_in_sync():
+    assert sorted(timeseries._ARRAY_OPERATORS) == sorted(timeseries.time_series_operators())
+
+
+@pytest.mark.parametrize("operator_id", sorted(timeseries.time_series_operators()))
+@pytest.mark.parametrize("operands", [
+    [_rrd("a"), _rrd("b")],
+    [_rrd("b"), _rrd("a"), _rrd("c")],
+    [_rrd("c"), ("constant", 2)],
+    [_rrd("a"), _rrd("missing")],
+])
+def test_array_operators(operator_id, operands):
+    expression = ("operator", operator_id, operands)
+    assert _evaluate_array(expression) == timeseries.evaluate_time_series_expression(
+        expression, RRD_DATA)
+
+
+def test_undefined_operator():
+    with pytest.raises(timeseries.MKGeneralException):
+        _evaluate_array(("operator", "%", [_rrd("a"), _rrd("b")]))
+
+
+@pytest.mark.parametrize("percentile", [0, 25, 50, 95, 100])
+@pytest.mark.parametrize("operand", [_rrd("a"), _rrd("c"), _rrd("missing")])
+def test_percentile(percentile, operand):
+    expression = ("transformation", ("percentile", percentile), [operand])
+    assert _evaluate_array(expression) == timeseries.evaluate_time_series_expression(
+        expression, RRD_DATA)
+
+
+@pytest.mark.parametrize("aggregation,reverse,titles", [
+    ("min", False, ["a", "b", "c", "missing"]),
+    ("max", False, ["missing", "a", "b", "c"]),
+    ("average", True, ["c", "b", "a", "missing"]),
+])
+def test_value_sort_and_filter_top(aggregation, reverse, titles):
+    evaluation = timeseries.ArrayEvaluation(RRD_DATA)
+    metrics = [("stack", "#000000", name, evaluation.evaluate(_rrd(name)))
+               for name in ["a", "b", "c", "missing"]]
+
+    sorted_metrics = timeseries._value_sort_array(metrics, {
+        "aggregation": aggregation,
+        "reverse": reverse
+    })
+    assert [m[2] for m in sorted_metrics] == titles
+    assert [m[0] for m in sorted_metrics] == ["area", "stack", "stack", "stack"]
+
+    top = evaluation.to_values(sorted_metrics[:1])
+    assert top[0][3] == timeseries.evaluate_time_series_expression(_rrd(titles[0]), RRD_DATA)
+
+
+def test_compute_graph_curves():
+    metrics = [
+        {
+            "expression": _rrd("a"),
+            "line_type": "line",
+            "color": "#000000",
+            "title": "A",
+        },
+        {
+            "expression": ("operator", "/", [_rrd("a"), _rrd("b")]),
+            "line_type": "area",
+            "color": "#ffffff",
+            "title": "A / B",
+        },
+    ]
+    curves = timeseries.compute_graph_curves(metrics, RRD_DATA)
+
+    # The RRD data is used as it is, including its time window
+    assert curves[0]["rrddata"] is RRD_DATA[("site", "host", "svc", "a", "max", 1)]
+    assert curves[1]["rrddata"] == [0.5, None, None, None, None, -5.0]
@@ -4,6 +4,8 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import os
+
 import pytest  # type: ignore[import]
 
 import cmk.gui.bi as bi
@@ -42,3 +44,311 @@ def test_get_aggregation_group_trees(monkeypatch, host_aggregations, expected):
     monkeypatch.setattr(bi.config, "aggregations", [])
     monkeypatch.setattr(bi.config, "host_aggregations", host_aggregations)
     assert bi.get_aggregation_group_trees() == expected
+
+
+def _compiled_job_data(aggr_type, groups, aggrs, idx=0):
+    new_data = bi.BICacheManager.empty_compiled_tree()
+    for aggr_hash, aggr in aggrs.items():
+        for group in groups:
+            new_data["forest_ref"].setdefault(group, []).append(aggr_hash)
+            new_data["aggregations_by_hostname_ref"].setdefault(aggr["title"].split()[-1],
+                                                                []).append((group, aggr_hash))
+            for host in aggr["reqhosts"]:
+                new_data["affected_hosts_ref"].setdefault(host, []).append((group, aggr_hash))
+                if len(aggr["reqhosts"]) == 1:
+                    new_data["host_aggregations_ref"].setdefault(host, []).append(
+                        (group, aggr_hash))
+        new_data["aggr_ref"][aggr_hash] = aggr
+    if aggr_type == bi.AGGR_HOST:
+        new_data["compiled_hosts"] = {host for aggr in aggrs.values() for host in aggr["reqhosts"]}
+    return {"id": (aggr_type, idx, tuple(groups))}, new_data
+
+
+@pytest.fixture(name="bi_cache_manager")
+def fixture_bi_cache_manager(monkeypatch, tmp_path):
+    monkeypatch.setattr(bi.cmk.utils.paths, "tmp_dir", str(tmp_path))
+    monkeypatch.setattr(bi.BICacheManager, "can_handle_sitestats", lambda self, sitestats: True)
+    monkeypatch.setattr(bi, "get_current_sitestats", lambda: {})
+
+    cache_manager = bi.BICacheManager()
+    cache_manager._merge_compiled_data(*_compiled_job_data(
+        bi.AGGR_HOST, ["Hosts"], {
+            "hash-%d" % index: {
+                "title": "Host host%d" % index,
+                "reqhosts": [("site", "host%d" % index)],
+            } for index in range(10)
+        }))
+    cache_manager._merge_compiled_data(*_compiled_job_data(
+        bi.AGGR_MULTI, ["Applications", "All"], {
+            "hash-app": {
+                "title": "Application app",
+                "reqhosts": [("site", "host1"), ("site", "host2")],
+            },
+        }))
+    cache_manager._save_cachefile()
+    return cache_manager
+
+
+def _loaded_shards(cache_manager):
+    return sorted(name for name, shard_file in cache_manager._shard_files.items()
+                  if shard_file._cached_data is not None)
+
+
+def test_bi_cache_shards(bi_cache_manager):
+    shards = bi_cache_manager.get_compiled_trees()["aggr_shards"]
+    assert shards["hash-app"].startswith("group.")
+    assert all(shards["hash-%d" % index].startswith("host.") for index in range(10))
+    # An aggregation is stored once, even if it is part of several groups
+    assert sorted(bi_cache_manager._get_shard_names()) == sorted(set(shards.values()))
+
+
+def test_bi_cache_load_shards_on_demand(bi_cache_manager):
+    cache_manager = bi.BICacheManager()
+    assert cache_manager.load_cachefile()
+    compiled_trees = cache_manager.get_compiled_trees()
+    assert _loaded_shards(cache_manager) == []
+
+    # Looking up the index does not load any tree
+    assert ("site", "host3") in compiled_trees["affected_hosts"]
+    assert ("site", "unknown") not in compiled_trees["affected_hosts"]
+    assert sorted(compiled_trees["forest"]) == ["All", "Applications", "Hosts"]
+    assert _loaded_shards(cache_manager) == []
+
+    assert compiled_trees["host_aggregations"][("site", "host3")] == [
+        ("Hosts", {
+            "title": "Host host3",
+            "reqhosts": [("site", "host3")],
+        }),
+    ]
+    assert _loaded_shards(cache_manager) == [
+        compiled_trees["aggr_shards"]["hash-3"],
+    ]
+
+    assert [aggr["title"] for aggr in compiled_trees["forest"]["Applications"]
+           ] == ["Application app"]
+    assert len(_loaded_shards(cache_manager)) == 2
+
+    assert len(compiled_trees["forest"]["Hosts"]) == 10
+
+
+def test_bi_cache_compile_into_loaded_shard(bi_cache_manager):
+    cache_manager = bi.BICacheManager()
+    assert cache_manager.load_cachefile()
+
+    # The host shards are shared between the groups, the aggregations already in the
+    # shard have not been compiled by this cache manager
+    cache_manager._merge_compiled_data(
+        *_compiled_job_data(bi.AGGR_HOST, ["Other hosts"], {
+            "hash-other-3": {
+                "title": "Other host3",
+                "reqhosts": [("site", "host3")],
+            },
+        }))
+    shards = cache_manager.get_compiled_trees()["aggr_shards"]
+    assert shards["hash-other-3"] == shards["hash-3"]
+    cache_manager._save_cachefile()
+
+    cache_manager = bi.BICacheManager()
+    assert cache_manager.load_cachefile()
+    assert [(group, aggr["title"])
+            for group, aggr in cache_manager.get_compiled_trees()["host_aggregations"][("site",
+                                                                                        "host3")]
+           ] == [("Hosts", "Host host3"), ("Other hosts", "Other host3")]
+
+
+def test_bi_cache_truncate(bi_cache_manager):
+    bi_cache_manager.truncate_cachefiles()
+    bi_cache_manager.reset_cached_data()
+
+    cache_manager = bi.BICacheManager()
+    cache_manager.load_cachefile()
+    assert list(cache_manager.get_compiled_trees()["forest"]) == []
+    assert cache_manager.get_aggregation("hash-3") is None
+
+
+def test_get_forest_by_titles(monkeypatch, bi_cache_manager):
+    monkeypatch.setattr(bi, "g_tree_cache", bi_cache_manager.get_compiled_trees())
+    forest = bi.get_forest_by_titles(["Application app", "Host host3", "Host unknown", ""])
+    assert {
+        group: [aggr["title"] for aggr in aggrs] for group, aggrs in forest.items()
+    } == {
+        "All": ["Application app"],
+        "Applications": ["Application app"],
+        "Hosts": ["Host host3"],
+    }
+
+
+def test_job_worker_sends_compiled_data_in_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(bi.cmk.utils.paths, "tmp_dir", str(tmp_path))
+    monkeypatch.setattr(
+        bi.JobWorker, "compile_job", lambda self, job_id, job_info: {
+            "aggr_ref": {
+                "hash": {
+                    "title": "Aggr %s" % job_id[2][0]
+                }
+            },
+        })
+    job = {"id": (bi.AGGR_MULTI, 0, ("Group",)), "info": {"compiled": False}}
+
+    worker = bi.JobWorker({}, [job])
+    worker.start()
+    assert worker.get_compiled_aggregations() == [(job, {
+        "aggr_ref": {
+            "hash": {
+                "title": "Aggr Group"
+            }
+        },
+    })]
+    assert worker.get_compilation_errors() == []
+    worker.join()
+
+    assert not [
+        filename for filename in os.listdir(bi.get_cache_dir())
+        if filename.startswith("bi_cache_worker.")
+    ]
+
+
+def test_compile_records_dependencies(monkeypatch):
+    services = {
+        ("site", "host1"): (["linux"], ["CPU"], [], [], "alias1"),
+        ("site", "host2"): (["windows"], ["CPU"], [], [], "alias2"),
+        ("site", "db1"): (["linux"], ["CPU", "Memory"], [], [], "alias3"),
+    }
+    monkeypatch.setattr(bi, "g_services", services)
+    monkeypatch.setattr(bi, "g_services_items", list(services.items()))
+    monkeypatch.setattr(bi, "g_services_by_hostname", {
+        host: [(site, entry)] for (site, host), entry in services.items()
+    })
+    monkeypatch.setattr(bi, "g_dependent_hosts", set())
+    monkeypatch.setattr(bi, "g_dependent_host_names", set())
+    monkeypatch.setattr(bi, "g_dependent_host_matchers", set())
+
+    assert bi.find_matching_services(bi.AGGR_MULTI, bi.config.FOREACH_HOST,
+                                     [["linux"], "(host.*)"]) == [(("host1", "alias1"), ("host1",))]
+    assert [leaf["service"] for leaf in bi.compile_leaf_node("db1", "Mem.*")] == ["Memory"]
+
+    assert bi.g_dependent_hosts == {("site", "host1"), ("site", "db1")}
+    assert bi.g_dependent_host_names == {"db1"}
+    assert bi.g_dependent_host_matchers == {("(host.*)", ("linux",), False)}
+
+
+@pytest.mark.parametrize("matcher, host, entry, expected", [
+    (("host.*", (), False), ("site", "host1"), ([], [], [], [], "alias"), True),
+    (("host.*", ("linux",), False), ("site", "host1"), (["windows"], [], [], [], "alias"), False),
+    (("site#host.*", (), True), ("other", "host1"), ([], [], [], [], "alias"), False),
+    ((("alias", "db.*"), (), False), ("site", "host1"), ([], [], [], [], "db"), True),
+])
+def test_host_matches_dependency(matcher, host, entry, expected):
+    assert bi.host_matches_dependency(matcher, host, entry) is expected
+
+
+@pytest.fixture(name="compiled_services")
+def fixture_compiled_services(monkeypatch, tmp_path):
+    monkeypatch.setattr(bi.cmk.utils.paths, "tmp_dir", str(tmp_path))
+    monkeypatch.setattr(bi.BICacheManager, "can_handle_sitestats", lambda self, sitestats: True)
+    monkeypatch.setattr(bi, "get_current_sitestats", lambda: {})
+
+    services = {
+        ("site", "host%d" % index): (["linux"], ["CPU"], [], [], "alias%d" % index)
+        for index in range(3)
+    }
+    services[("site", "db1")] = (["linux"], ["CPU"], [], [], "db1")
+
+    cache_manager = bi.BICacheManager()
+    cache_manager._merge_compiled_data(*_compiled_job_data(
+        bi.AGGR_HOST, ["Hosts"], {
+            "hash-%d" % index: {
+                "title": "Host host%d" % index,
+                "reqhosts": [("site", "host%d" % index)],
+            } for index in range(3)
+        }))
+
+    job, new_data = _compiled_job_data(bi.AGGR_MULTI, ["Apps"], {
+        "hash-app": {
+            "title": "Application app",
+            "reqhosts": [("site", "host1"), ("site", "host2")],
+        },
+    },
+                                       idx=1)
+    new_data["dependent_hosts"] = {("site", "host1"), ("site", "host2")}
+    new_data["dependent_host_names"] = {"host3"}
+    new_data["dependent_host_matchers"] = {("host[12]", (), False)}
+    cache_manager._merge_compiled_data(job, new_data)
+
+    job, new_data = _compiled_job_data(bi.AGGR_MULTI, ["Apps"], {
+        "hash-db": {
+            "title": "Application db",
+            "reqhosts": [("site", "db1")],
+        },
+    },
+                                       idx=2)
+    new_data["dependent_hosts"] = {("site", "db1")}
+    new_data["dependent_host_names"] = set()
+    new_data["dependent_host_matchers"] = {("db.*", ("linux",), False)}
+    cache_manager._merge_compiled_data(job, new_data)
+
+    cache_manager.set_host_digests(services)
+    cache_manager._bicacheinfo_file.save({
+        "timestamps": [],
+        "compiled_sites": set(),
+        "error_info": "",
+    })
+    cache_manager._save_cachefile()
+    return services
+
+
+def _titles(aggrs):
+    return sorted(aggr["title"] for aggr in aggrs)
+
+
+def test_bi_cache_update_compiled_data(compiled_services):
+    services = dict(compiled_services)
+    services[("site", "host2")] = (["linux"], ["CPU", "Memory"], [], [], "alias2")
+    services[("site", "db2")] = (["windows"], [], [], [], "db2")
+
+    cache_manager = bi.BICacheManager()
+    assert cache_manager.update_compiled_data({"timestamps": []}, services)
+    compiled_trees = cache_manager.get_compiled_trees()
+
+    assert list(compiled_trees["compiled_multi_aggr"]) == [(bi.AGGR_MULTI, 2, ("Apps",))]
+    assert compiled_trees["compiled_host_aggr"][(bi.AGGR_HOST, 0,
+                                                 ("Hosts",))]["compiled_hosts"] == {
+                                                     ("site", "host0"),
+                                                     ("site", "host1"),
+                                                 }
+    assert ("site", "host2") not in compiled_trees["host_aggregations"]
+    assert _titles(compiled_trees["forest"]["Hosts"]) == ["Host host0", "Host host1"]
+    assert _titles(compiled_trees["forest"]["Apps"]) == ["Application db"]
+    assert not compiled_trees["compiled_all"]
+
+    # The outdated aggregations are also removed from the shards
+    cache_manager._save_cachefile()
+    cache_manager = bi.BICacheManager()
+    cache_manager.load_cachefile()
+    assert cache_manager.get_aggregation("hash-2") is None
+    assert cache_manager.get_aggregation("hash-app") is None
+    assert _titles(
+        cache_manager.get_compiled_trees()["forest"]["Hosts"]) == ["Host host0", "Host host1"]
+
+
+@pytest.mark.parametrize("new_host, new_entry, kept_aggr_title", [
+    (("site", "db2"), (["linux"], [], [], [], "db2"), "Application app"),
+    (("other_site", "host3"), ([], [], [], [], "host3"), "Application db"),
+])
+def test_bi_cache_update_compiled_data_new_matching_host(compiled_services, new_host, new_entry,
+                                                         kept_aggr_title):
+    services = dict(compiled_services)
+    services[new_host] = new_entry
+
+    cache_manager = bi.BICacheManager()
+    assert cache_manager.update_compiled_data({"timestamps": []}, services)
+    compiled_trees = cache_manager.get_compiled_trees()
+    assert len(compiled_trees["compiled_multi_aggr"]) == 1
+    assert _titles(compiled_trees["forest"]["Apps"]) == [kept_aggr_title]
+    assert _titles(compiled_trees["forest"]["Hosts"]) == ["Host host0", "Host host1", "Host host2"]
+
+
+def test_bi_cache_update_compiled_data_changed_config(compiled_services):
+    cache_manager = bi.BICacheManager()
+    assert not cache_manager.update_compiled_data({"timestamps": [("bi.mk", 1.0)]},
+                                                  compiled_services)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import collections
+import os
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+import cmk.utils.store as store
+
+import cmk.gui.inventory as inventory
+
+RAW_TREE = {
+    "hardware": {
+        "cpu": {
+            "cores": 4,
+            "model": "Xeon",
+        },
+        "memory": {
+            "total_ram_usable": 1024,
+        },
+    },
+    "networking": {
+        "interfaces": [
+            {
+                "index": 1,
+                "description": "eth0",
+            },
+            {
+                "index": 2,
+                "description": "eth1",
+            },
+        ],
+    },
+}
+
+
+@pytest.fixture(autouse=True)
+def inventory_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "inventory_output_dir", str(tmp_path / "inventory"))
+    monkeypatch.setattr(cmk.utils.paths, "tmp_dir", str(tmp_path / "tmp"))
+    monkeypatch.setattr(inventory, "_inventory_tree_cache", collections.OrderedDict())
+    monkeypatch.setattr(inventory, "_index_column_cache", {})
+    monkeypatch.setattr(inventory, "_get_permitted_inventory_paths", lambda: None)
+    os.makedirs(cmk.utils.paths.inventory_output_dir)
+
+
+def _save_inventory(hostname, raw_tree):
+    store.save_object_to_file(os.path.join(cmk.utils.paths.inventory_output_dir, hostname),
+                              raw_tree)
+
+
+def test_load_inventory_tree_cached():
+    _save_inventory("host1", RAW_TREE)
+    tree = inventory.load_filtered_inventory_tree("host1")
+    assert tree is not None
+    assert tree.get_raw_tree() == RAW_TREE
+    assert list(inventory._inventory_tree_cache) == ["host1"]
+
+    _save_inventory("host1", {"hardware": {"cpu": {"cores": 8}}})
+    tree = inventory.load_filtered_inventory_tree("host1")
+    assert tree is not None
+    assert inventory.get_inventory_data(tree, ".hardware.cpu.cores") == 8
+
+
+def test_load_inventory_tree_lru(monkeypatch):
+    monkeypatch.setattr(inventory, "_MAX_CACHED_INVENTORY_TREES", 2)
+    for hostname in ["host1", "host2", "host3"]:
+        _save_inventory(hostname, RAW_TREE)
+
+    for hostname in ["host1", "host2", "host1", "host3"]:
+        inventory.load_filtered_inventory_tree(hostname)
+    assert list(inventory._inventory_tree_cache) == ["host1", "host3"]
+
+
+def test_load_missing_inventory_tree():
+    tree = inventory.load_filtered_inventory_tree("missing")
+    assert tree is not None and tree.is_empty()
+    assert inventory.load_filtered_inventory_tree(None) is None
+
+
+@pytest.mark.parametrize("paths,projected", [
+    (None, RAW_TREE),
+    ([".hardware.cpu.cores"], {
+        "hardware": {
+            "cpu": {
+                "cores": 4
+            }
+        }
+    }),
+    ([".hardware.cpu.cores", ".hardware.cpu.", ".hardware.memory.missing"], {
+        "hardware": {
+            "cpu": RAW_TREE["hardware"]["cpu"],
+            "memory": {},
+        }
+    }),
+    ([".networking.interfaces:", ".software.packages:"], {
+        "networking": RAW_TREE["networking"]
+    }),
+    ([".networking.interfaces:0.description"], {
+        "networking": RAW_TREE["networking"]
+    }),
+])
+def test_project_raw_tree(paths, projected):
+    assert inventory._project_raw_tree(RAW_TREE, paths) == projected
+
+
+def test_merged_tree_does_not_modify_cache():
+    _save_inventory("host1", RAW_TREE)
+    row = {
+        "host_name": "host1",
+        "host_structured_status": repr({
+            "networking": {
+                "interfaces": [{
+                    "index": 1,
+                    "oper_status": 1,
+                }]
+            }
+        }).encode("utf-8"),
+    }
+    for paths in [None, [".networking.interfaces:"]]:
+        tree = inventory.load_filtered_and_merged_tree(row, paths)
+        assert inventory.get_inventory_data(tree, ".networking.interfaces:") == [
+            {
+                "index": 1,
+                "description": "eth0",
+                "oper_status": 1,
+            },
+            {
+                "index": 2,
+                "description": "eth1",
+            },
+        ]
+    assert inventory._inventory_tree_cache["host1"][1] == RAW_TREE
+
+
+@pytest.mark.parametrize("paths,indexed", [
+    (None, False),
+    ([], False),
+    ([".hardware.cpu.cores", ".hardware.memory.total_ram_usable"], True),
+    ([".hardware.cpu.cores", ".hardware.cpu."], False),
+    ([".networking.interfaces:"], False),
+    ([".networking.interfaces:0.description"], False),
+])
+def test_get_inventory_index(paths, indexed):
+    assert (inventory.get_inventory_index(paths) is not None) is indexed
+
+
+def test_inventory_index(monkeypatch):
+    _save_inventory("host1", RAW_TREE)
+    _save_inventory("host2", {"hardware": {"cpu": {"cores": 2}}})
+    paths = [".hardware.cpu.cores", ".hardware.memory.total_ram_usable"]
+
+    index = inventory.get_inventory_index(paths)
+    assert index is not None
+    for hostname in ["host1", "host2"]:
+        inventory.load_filtered_and_merged_tree({"host_name": hostname}, paths, index)
+    index.save()
+
+    # The trees are built from the saved index without reading the inventory files
+    load_raw_inventory_tree = inventory._load_raw_inventory_tree
+    monkeypatch.setattr(inventory, "_index_column_cache", {})
+    monkeypatch.setattr(inventory, "_load_raw_inventory_tree", None)
+    index = inventory.get_inventory_index(paths)
+    assert index is not None
+    trees = [
+        inventory.load_filtered_and_merged_tree({"host_name": hostname}, paths, index)
+        for hostname in ["host1", "host2"]
+    ]
+    assert [tree.get_raw_tree() for tree in trees] == [
+        {
+            "hardware": {
+                "cpu": {
+                    "cores": 4
+                },
+                "memory": {
+                    "total_ram_usable": 1024
+                },
+            }
+        },
+        {
+            "hardware": {
+                "cpu": {
+                    "cores": 2
+                }
+            }
+        },
+    ]
+
+    monkeypatch.setattr(inventory, "_load_raw_inventory_tree", load_raw_inventory_tree)
+    _save_inventory("host2", {"hardware": {"cpu": {"cores": 6}}})
+    tree = inventory.load_filtered_and_merged_tree({"host_name": "host2"}, paths, index)
+    assert inventory.get_inventory_data(tree, ".hardware.cpu.cores") == 6
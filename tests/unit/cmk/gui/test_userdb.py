@@ -4,6 +4,14 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import os
+import time
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+
+from cmk.gui.globals import g
 from cmk.gui.valuespec import Dictionary
 import cmk.gui.config as config
 import cmk.gui.userdb as userdb
@@ -57,3 +65,125 @@ def test_user_attribute_sync_plugins(monkeypatch):
 
     assert "vip" not in utils.user_attribute_registry
     assert "vip" not in ldap.ldap_attribute_plugin_registry
+
+
+@pytest.fixture(name="user_files")
+def fixture_user_files(tmp_path, monkeypatch, register_builtin_html):
+    monkeypatch.setattr(cmk.utils.paths, "check_mk_config_dir", str(tmp_path / "conf.d"))
+    monkeypatch.setattr(cmk.utils.paths, "default_config_dir", str(tmp_path / "etc"))
+    monkeypatch.setattr(cmk.utils.paths, "var_dir", str(tmp_path / "var"))
+    monkeypatch.setattr(cmk.utils.paths, "htpasswd_file", str(tmp_path / "etc" / "htpasswd"))
+    monkeypatch.setattr(userdb, "_users_file_cache", {})
+
+    contacts = {
+        "alice": {
+            "alias": "Alice",
+            "contactgroups": ["all"],
+        },
+        "bob": {
+            "alias": "Bob",
+            "email": "bob@example.com",
+        },
+        "contact": {
+            "alias": "Contact only",
+        },
+    }
+    users = {
+        "alice": {
+            "roles": ["admin"],
+            "connector": "htpasswd",
+        },
+        "bob": {
+            "roles": ["user"],
+            "connector": "ldap",
+        },
+    }
+    _write(tmp_path / "conf.d" / "wato" / "contacts.mk", "contacts.update(%r)\n" % contacts)
+    _write(tmp_path / "etc" / "multisite.d" / "wato" / "users.mk", "multisite_users = %r\n" % users)
+    _write(tmp_path / "etc" / "htpasswd", "alice:$5$alice\nbob:!$5$bob\n")
+    _write(tmp_path / "etc" / "auth.serials", "alice:3\n")
+    _write(tmp_path / "var" / "web" / "alice" / "num_failed_logins.mk", "2\n")
+    _write(tmp_path / "var" / "web" / "alice" / "session_id.mk", "sess|1600000000\n")
+    _write(tmp_path / "var" / "web" / "bob" / "last_seen.mk", "1600000000.5\n")
+    _write(tmp_path / "var" / "web" / "automation" / "automation.secret", "secret\n")
+    _make_old(tmp_path)
+    return tmp_path
+
+
+def _write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def _make_old(tmp_path):
+    # Recently changed files are not cached
+    for path in [tmp_path] + list(tmp_path.glob("**/*")):
+        os.utime(str(path), (time.time() - 60, time.time() - 60))
+
+
+EXPECTED_USERS = {
+    "alice": {
+        "alias": "Alice",
+        "contactgroups": ["all"],
+        "roles": ["admin"],
+        "connector": "htpasswd",
+        "password": "$5$alice",
+        "locked": False,
+        "serial": 3,
+        "num_failed_logins": 2,
+        "session_id": ("sess", 1600000000),
+    },
+    "bob": {
+        "alias": "Bob",
+        "email": "bob@example.com",
+        "roles": ["user"],
+        "connector": "ldap",
+        "password": "$5$bob",
+        "locked": True,
+        "last_seen": 1600000000.5,
+    },
+    "contact": {
+        "alias": "Contact only",
+        "roles": ["user"],
+        "locked": True,
+        "password": "",
+    },
+    "automation": {
+        "roles": ["guest"],
+        "automation_secret": "secret",
+    },
+}
+
+
+def test_load_users(user_files):
+    assert userdb.load_users() == EXPECTED_USERS
+
+
+def test_load_users_cached(user_files, monkeypatch):
+    users = userdb.load_users()
+    users["alice"]["contactgroups"].append("modified")
+    del users["bob"]
+
+    # The files are not read again by the next request
+    g.pop("users")
+    monkeypatch.setattr(userdb.store, "load_from_mk_file", None)
+    monkeypatch.setattr(userdb, "load_custom_attr", None)
+    assert userdb.load_users() == EXPECTED_USERS
+
+
+def test_load_users_changed_files(user_files):
+    assert userdb.load_users() == EXPECTED_USERS
+
+    _write(user_files / "etc" / "htpasswd", "alice:$5$changed\nbob:!$5$bob\n")
+    _write(user_files / "var" / "web" / "bob" / "num_failed_logins.mk", "1\n")
+    g.pop("users")
+    users = userdb.load_users()
+    assert users["alice"]["password"] == "$5$changed"
+    assert users["bob"]["num_failed_logins"] == 1
+
+
+def test_load_user(user_files, monkeypatch):
+    monkeypatch.setattr(userdb, "_list_user_dirs", None)
+    for user_id, user in EXPECTED_USERS.items():
+        assert userdb.load_user(user_id) == user
+    assert userdb.load_user("unknown") == {}
@@ -7,6 +7,7 @@
 # yapf: disable
 
 import copy
+import functools
 from typing import Any, Dict
 
 import pytest  # type: ignore[import]
@@ -19,7 +20,7 @@ pytestmark = pytest.mark.usefixtures("load_plugins")
 from cmk.gui.globals import html
 from cmk.gui.valuespec import ValueSpec
 import cmk.gui.plugins.views
-from cmk.gui.plugins.views.utils import transform_painter_spec
+from cmk.gui.plugins.views.utils import SorterEntry, transform_painter_spec
 from cmk.gui.type_defs import PainterSpec
 import cmk.gui.views
 
@@ -5699,6 +5700,112 @@ def test_register_sorter(monkeypatch):
     assert sorter.cmp.__name__ == cmpfunc.__name__
 
 
+def _sort_test_rows():
+    rows = []
+    for num, (site, host_name, state, svc_descr, svc_state, address) in enumerate([
+        ("site2", "host10", 0, "Check_MK", 2, "10.0.0.2"),
+        ("site1", "host9", 1, "CPU load", 3, "10.0.0.10"),
+        ("site1", "Host9", 0, "Interface 10", 0, "10.0.0.1"),
+        ("site2", "host2", 2, "Interface 9", 1, "10.1.0.1"),
+        ("site1", "host10", 0, "Check_MK Discovery", 2, "10.0.0.2"),
+        ("site2", "host1", 1, "cpu load", 0, "9.0.0.1"),
+    ]):
+        rows.append({
+            "site": site,
+            "host_name": host_name,
+            "host_state": state,
+            "host_has_been_checked": num % 5,
+            "service_description": svc_descr,
+            "service_state": svc_state,
+            "service_has_been_checked": num % 4,
+            "service_check_command": svc_descr,
+            "service_current_attempt": num % 3,
+            "host_num_services": 10,
+            "host_num_services_ok": num,
+            "host_num_services_pending": num % 2,
+            "host_custom_variable_names": ["ADDRESS_4"],
+            "host_custom_variable_values": [address],
+        })
+    return rows
+
+
+@pytest.mark.parametrize("sorter_name", [
+    "svcstate",
+    "hoststate",
+    "site_host",
+    "host_name",
+    "svcdescr",
+    "svc_check_command",
+    "svc_attempt",
+    "num_problems",
+    "host_ipv4_address",
+])
+def test_sorter_sort_key(sorter_name):
+    sorter = cmk.gui.plugins.views.utils.sorter_registry[sorter_name]()
+    assert sorter.sort_key is not None
+
+    rows = _sort_test_rows()
+    assert sorted(rows, key=sorter.sort_key) == sorted(rows,
+                                                       key=functools.cmp_to_key(sorter.cmp))
+
+
+def test_row_sort_key():
+    registry = cmk.gui.plugins.views.utils.sorter_registry
+
+    class SorterWithoutKey(cmk.gui.plugins.views.utils.Sorter):
+        ident = "without_key"
+        title = "Without key"
+        columns = ["host_state"]
+
+        def cmp(self, r1, r2):
+            return r1["host_state"] - r2["host_state"]
+
+    rows = _sort_test_rows()
+    for index, row in enumerate(rows):
+        row["JOIN"] = {} if index % 2 else {"CPU load": {"service_current_attempt": index * 2 % 3}}
+
+    sorters = [
+        SorterEntry(registry["svc_attempt"](), True, "CPU load"),
+        SorterEntry(SorterWithoutKey(), False, None),
+        SorterEntry(registry["host_name"](), True, None),
+    ]
+    cmk.gui.views._sort_data(None, rows, sorters)
+    assert [(r["host_name"], r["service_current_attempt"]) for r in rows] == [
+        ("host10", 1),
+        ("Host9", 2),
+        ("host10", 0),
+        ("host9", 1),
+        ("host1", 2),
+        ("host2", 0),
+    ]
+
+
+@pytest.mark.parametrize("limit,expected", [
+    (None, [("s1", "host1"), ("s2", "host1"), ("s2", "host2"), ("s1", "host3"), ("s2", "host4")]),
+    (2, [("s1", "host1"), ("s2", "host1"), ("s2", "host2")]),
+])
+def test_query_rows_merges_sorted_sites(monkeypatch, limit, expected):
+    class Datasource:
+        merge_by = None
+        auth_domain = "read"
+
+    class View:
+        datasource = Datasource()
+        sorters = [SorterEntry(cmk.gui.plugins.views.utils.sorter_registry["host_name"](), False,
+                               None)]
+
+    sites_data = [
+        ("s1", [["s1", "host3"], ["s1", "host1"]]),
+        ("s2", [["s2", "host4"], ["s2", "host1"], ["s2", "host2"]]),
+    ]
+    monkeypatch.setattr(cmk.gui.plugins.views.utils, "query_livestatus_by_site",
+                        lambda query, only_sites, limit, auth_domain: iter(sites_data))
+
+    rows = cmk.gui.plugins.views.utils.RowTableLivestatus("hosts")._query_rows(
+        View(), "GET hosts\n", ["site", "host_name"], None, limit)
+    assert [(row["site"], row["host_name"]) for row in rows] == expected
+
+
 def test_get_needed_regular_columns(view):
 
     columns = cmk.gui.views._get_needed_regular_columns(view.group_cells + view.row_cells, view.sorters, view.datasource)
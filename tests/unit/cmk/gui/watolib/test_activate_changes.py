@@ -7,6 +7,7 @@
 import tarfile
 import io
 import logging
+import os
 from pathlib import Path
 
 import pytest  # type: ignore[import]
@@ -299,6 +300,40 @@ def test_get_config_sync_file_infos():
     }
 
 
+def test_get_config_sync_file_infos_cached_hashes(monkeypatch):
+    base_dir = Path(cmk.utils.paths.omd_root) / "replication"
+    _create_get_config_sync_file_infos_test_config(base_dir)
+    # Files which have just been changed are not cached
+    for path in base_dir.glob("**/*"):
+        os.utime(str(path), (1600000000, 1600000000), follow_symlinks=False)
+
+    replication_paths = [
+        ReplicationPath("dir", "d4-multiple-files", "etc/d4", []),
+        ReplicationPath("file", "f1", "etc/f1", []),
+    ]
+    sync_infos = activate_changes._get_config_sync_file_infos(replication_paths, base_dir)
+
+    hashed = []
+    orig_create_hash = activate_changes._create_config_sync_file_hash
+
+    def _create_hash(file_path):
+        hashed.append(str(file_path.relative_to(base_dir)))
+        return orig_create_hash(file_path)
+
+    monkeypatch.setattr(activate_changes, "_create_config_sync_file_hash", _create_hash)
+    assert activate_changes._get_config_sync_file_infos(replication_paths, base_dir) == sync_infos
+    assert hashed == []
+
+    with base_dir.joinpath("etc/f1").open("w", encoding="utf-8") as f:
+        f.write(u"Ef-zwei")
+    os.utime(str(base_dir.joinpath("etc/f1")), (1600000060, 1600000060))
+
+    changed_sync_infos = activate_changes._get_config_sync_file_infos(replication_paths, base_dir)
+    assert hashed == ["etc/f1"]
+    assert changed_sync_infos["etc/f1"].file_hash != sync_infos["etc/f1"].file_hash
+    assert changed_sync_infos["etc/d4/x1"] == sync_infos["etc/d4/x1"]
+
+
 def _create_get_config_sync_file_infos_test_config(base_dir):
     base_dir.joinpath("etc/d1").mkdir(parents=True, exist_ok=True)
 
@@ -505,14 +540,15 @@ def _get_test_sync_archive(tmp_path):
     tmp_path.joinpath("broken-symlink").symlink_to("eeg")
     tmp_path.joinpath("working-symlink").symlink_to("ding")
 
-    return activate_changes._get_sync_archive([
-        "etc/abc",
-        "file-to-dir/aaa",
-        "ding",
-        "dir-to-file",
-        "broken-symlink",
-        "working-symlink",
-    ], tmp_path)
+    with activate_changes._get_sync_archive([
+            "etc/abc",
+            "file-to-dir/aaa",
+            "ding",
+            "dir-to-file",
+            "broken-symlink",
+            "working-symlink",
+    ], tmp_path) as sync_archive:
+        return sync_archive.read()
 
 
 def test_automation_receive_config_sync(monkeypatch, tmp_path):
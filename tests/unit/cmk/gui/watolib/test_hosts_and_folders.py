@@ -7,6 +7,7 @@
 import contextlib
 import os
 import shutil
+import time
 
 import pytest  # type: ignore[import]
 from werkzeug.test import create_environ
@@ -391,3 +392,100 @@ def test_subfolder_creation():
     # Upon instantiation, all the subfolders should be already known.
     folder = hosts_and_folders.Folder.root_folder()
     assert len(folder._subfolders) == 1
+
+
+@pytest.fixture(name="folder_cache")
+def fixture_folder_cache(monkeypatch):
+    monkeypatch.setattr(hosts_and_folders, "_folder_file_cache", {})
+    monkeypatch.setattr(hosts_and_folders, "_folder_file_cache_changed", False)
+    monkeypatch.setattr(hosts_and_folders, "_folder_cache_snapshot_key", None)
+
+
+def _write_hosts_files(hosts_of_folders):
+    root_dir = hosts_and_folders.Folder.root_folder().filesystem_path()
+    for folder_path, host_names in hosts_of_folders.items():
+        os.makedirs(os.path.join(root_dir, folder_path), exist_ok=True)
+        with open(os.path.join(root_dir, folder_path, "hosts.mk"), "w") as f:
+            f.write("all_hosts += %r\n" % host_names)
+            f.write("host_attributes.update(%r)\n" %
+                    {host_name: {
+                        "alias": host_name.upper()
+                    } for host_name in host_names})
+
+    # Files which have just been changed are not cached
+    old = time.time() - 60
+    for dir_path, _dir_names, file_names in os.walk(root_dir):
+        for file_name in file_names:
+            os.utime(os.path.join(dir_path, file_name), (old, old))
+    hosts_and_folders.Folder.invalidate_caches()
+
+
+def test_load_hosts_cached(folder_cache, mocker):
+    _write_hosts_files({"a": ["host1", "host2"]})
+    load_hosts_file = mocker.spy(hosts_and_folders.Folder, "_load_hosts_file")
+
+    hosts = hosts_and_folders.Folder.folder("a").hosts()
+    assert sorted(hosts) == ["host1", "host2"]
+    assert hosts["host1"].attribute("alias") == "HOST1"
+    assert load_hosts_file.call_count == 1
+
+    # The cached attributes are copied for each request
+    hosts["host1"].attributes()["alias"] = "changed"
+    hosts_and_folders.Folder.invalidate_caches()
+    hosts = hosts_and_folders.Folder.folder("a").hosts()
+    assert hosts["host1"].attribute("alias") == "HOST1"
+    assert load_hosts_file.call_count == 1
+
+    _write_hosts_files({"a": ["host1", "host2", "host3"]})
+    assert sorted(hosts_and_folders.Folder.folder("a").hosts()) == ["host1", "host2", "host3"]
+    assert load_hosts_file.call_count == 2
+
+
+def test_load_hosts_not_cached_when_recently_changed(folder_cache, mocker):
+    _write_hosts_files({"a": ["host1"]})
+    hosts_file_path = hosts_and_folders.Folder.folder("a").hosts_file_path()
+    os.utime(hosts_file_path)
+    load_hosts_file = mocker.spy(hosts_and_folders.Folder, "_load_hosts_file")
+
+    for _round in range(2):
+        hosts_and_folders.Folder.invalidate_caches()
+        assert list(hosts_and_folders.Folder.folder("a").hosts()) == ["host1"]
+    assert load_hosts_file.call_count == 2
+    assert hosts_file_path not in hosts_and_folders._folder_file_cache
+
+
+def test_folder_cache_snapshot(folder_cache, monkeypatch, mocker):
+    _write_hosts_files({"a": ["host1"], "b": ["host2"]})
+    assert sorted(hosts_and_folders.Host.all()) == ["host1", "host2"]
+    assert os.path.exists(hosts_and_folders._folder_cache_snapshot_path())
+
+    # A new process only reads the snapshot
+    monkeypatch.setattr(hosts_and_folders, "_folder_file_cache", {})
+    monkeypatch.setattr(hosts_and_folders, "_folder_cache_snapshot_key", None)
+    load_hosts_file = mocker.spy(hosts_and_folders.Folder, "_load_hosts_file")
+    hosts_and_folders.Folder.invalidate_caches()
+    assert sorted(hosts_and_folders.Host.all()) == ["host1", "host2"]
+    assert load_hosts_file.call_count == 0
+
+
+def test_find_host_only_loads_folder_of_host(folder_cache, mocker):
+    _write_hosts_files({"a": ["host1"], "b": ["host2"]})
+    hosts_and_folders.Host.all()  # fill the cache
+    hosts_and_folders.Folder.invalidate_caches()
+    load_hosts = mocker.spy(hosts_and_folders.Folder, "_load_hosts")
+
+    host = hosts_and_folders.Host.host("host2")
+    assert host is not None
+    assert host.folder().path() == "b"
+    assert hosts_and_folders.Host.host("unknown") is None
+    assert load_hosts.call_count == 1
+
+
+def test_search_folder_filters_host_names(folder_cache, mocker):
+    _write_hosts_files({"a": ["host1", "other1"], "b": ["other2"]})
+    load_hosts = mocker.spy(hosts_and_folders.Folder, "_load_hosts")
+
+    search_folder = hosts_and_folders.SearchFolder(hosts_and_folders.Folder.root_folder(),
+                                                   {".name": "host"})
+    assert list(search_folder.hosts()) == ["host1"]
+    assert load_hosts.call_count == 1
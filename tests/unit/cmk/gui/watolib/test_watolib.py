@@ -100,6 +100,7 @@ def test_registered_configvars():
         'enable_sounds',
         'escape_plugin_output',
         'event_limit',
+        'event_workers',
         'eventsocket_queue_len',
         'failed_notification_horizon',
         'hard_query_limit',
@@ -134,6 +135,7 @@ def test_registered_configvars():
         'pagetitle_date_format',
         'password_policy',
         'piggyback_max_cachefile_age',
+        'piggyback_store',
         'profile',
         'quicksearch_dropdown_limit',
         'quicksearch_search_order',
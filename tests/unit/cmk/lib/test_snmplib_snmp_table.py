@@ -4,10 +4,15 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import signal
+import threading
+import time
+
 import pytest  # type: ignore[import]
 
 from testlib.base import Scenario
 
+from cmk.utils.exceptions import MKTimeout
 from cmk.utils.type_defs import SectionName
 import cmk.snmplib.snmp_table as snmp_table
 from cmk.snmplib.type_defs import ABCSNMPBackend, OID_END, OIDBytes, OIDEnd, SNMPHostConfig, SNMPTree
@@ -147,3 +152,106 @@ def test_is_bulkwalk_host(monkeypatch):
     config_cache = ts.apply(monkeypatch)
     assert config_cache.get_host_config("abc").snmp_config("").is_bulkwalk_host is False
     assert config_cache.get_host_config("localhost").snmp_config("").is_bulkwalk_host is True
+
+
+class SNMPRecordingBackend(ABCSNMPBackend):
+    walk_data = [
+        (".1.2.3.1.1", b"eth0"),
+        (".1.2.3.1.2", b"eth1"),
+        (".1.2.3.2.1", b"1000"),
+        (".1.2.3.2.2", b"100"),
+        (".1.2.4.1.0", b"uptime"),
+    ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.walked = []
+
+    def get(self, oid, context_name=None):
+        pass
+
+    def walk(self, oid, check_plugin_name=None, table_base_oid=None, context_name=None):
+        self.walked.append(oid)
+        return [(o, v) for o, v in self.walk_data if o == oid or o.startswith(oid + ".")]
+
+
+@pytest.mark.parametrize("max_parallel_walks", [1, 3])
+def test_prefetch_snmp_walks(max_parallel_walks):
+    oid_infos = {
+        SectionName("table"): [SNMPTree(base=".1.2.3", oids=[OIDEnd(), "1", "2"])],
+        SectionName("column"): [SNMPTree(base=".1.2.3", oids=["2"])],
+        SectionName("whole"): [SNMPTree(base=".1.2", oids=["3"])],
+        SectionName("scalar"): [SNMPTree(base=".1.2.4.1", oids=["0"])],
+    }
+    expected = {
+        section_name: [
+            snmp_table.get_snmp_table(section_name, tree, backend=SNMPRecordingBackend(SNMPConfig))
+            for tree in trees
+        ] for section_name, trees in oid_infos.items()
+    }
+
+    backend = SNMPRecordingBackend(SNMPConfig)
+    walk_cache = snmp_table.prefetch_snmp_walks(oid_infos,
+                                                False,
+                                                backend=backend,
+                                                max_parallel_walks=max_parallel_walks)
+    assert sorted(backend.walked) == [".1.2.3", ".1.2.4.1.0"]
+
+    assert {
+        section_name: [
+            snmp_table.get_snmp_table(section_name, tree, backend=backend, walk_cache=walk_cache)
+            for tree in trees
+        ] for section_name, trees in oid_infos.items()
+    } == expected
+    # All sections have been served by the prefetched walks
+    assert sorted(backend.walked) == [".1.2.3", ".1.2.4.1.0"]
+
+
+def test_prefetch_snmp_walks_with_oid_range_limits():
+    backend = SNMPRecordingBackend(SNMPConfig._replace(oid_range_limits=[("table", [])]))
+    assert snmp_table.prefetch_snmp_walks(
+        {SectionName("table"): [SNMPTree(base=".1.2.3", oids=["1"])]},
+        False,
+        backend=backend,
+    ) == {}
+    assert backend.walked == []
+
+
+class SNMPBlockingBackend(SNMPRecordingBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = threading.Event()
+
+    def walk(self, oid, check_plugin_name=None, table_base_oid=None, context_name=None):
+        self.walked.append(oid)
+        self.release.wait(10)
+        return []
+
+
+def test_prefetch_snmp_walks_timeout():
+    def _raise_timeout(signum, frame):
+        raise MKTimeout("Timed out")
+
+    backend = SNMPBlockingBackend(SNMPConfig)
+    old_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, 0.2)
+    start = time.time()
+    try:
+        with pytest.raises(MKTimeout):
+            snmp_table.prefetch_snmp_walks(
+                {
+                    SectionName("one"): [SNMPTree(base=".1.2.3", oids=["1"])],
+                    SectionName("two"): [SNMPTree(base=".1.2.4", oids=["1"])],
+                    SectionName("three"): [SNMPTree(base=".1.2.5", oids=["1"])],
+                },
+                False,
+                backend=backend,
+                max_parallel_walks=2,
+            )
+        # The running walks are not waited for and the pending walk is not started
+        assert time.time() - start < 5
+        assert sorted(backend.walked) == [".1.2.3.1", ".1.2.4.1"]
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+        backend.release.set()
@@ -431,6 +431,87 @@ def test_ruleset_matcher_get_host_ruleset_values_tags(monkeypatch, hostname, exp
                                         is_binary=False)) == expected_result
 
 
+@pytest.mark.parametrize("host_tags", [
+    {
+        "networking": "lan"
+    },
+    {
+        "networking": {
+            "$ne": "lan"
+        }
+    },
+    {
+        "networking": {
+            "$or": ["lan", "wan"]
+        }
+    },
+    {
+        "networking": {
+            "$nor": ["lan", "wan"]
+        }
+    },
+    {
+        "networking": {
+            "$or": [{
+                "$ne": "lan"
+            }, "prod"]
+        }
+    },
+    {
+        "networking": {
+            "$nor": [{
+                "$ne": "test"
+            }, "wan"]
+        }
+    },
+    {
+        "networking": {
+            "$ne": "unknown"
+        },
+        "criticality": {
+            "$nor": ["prod"]
+        },
+    },
+    {
+        "criticality": {
+            "$or": ["prod", "unknown"]
+        },
+        "agent": {
+            "$ne": "cmk-agent"
+        },
+    },
+])
+def test_ruleset_optimizer_tag_bitmaps_match_like_host_tags(monkeypatch, host_tags):
+    ts = Scenario()
+    ts.add_host("host1", tags={
+        "criticality": "prod",
+        "agent": "cmk-agent",
+        "networking": "lan",
+    })
+    ts.add_host("host2", tags={
+        "criticality": "test",
+        "networking": "wan",
+    })
+    ts.add_host("host3", tags={
+        "criticality": "test",
+        "networking": "dmz",
+    })
+    ts.add_host("host4", tags={
+        "criticality": "prod",
+        "agent": "no-agent",
+        "networking": "wan",
+    })
+    config_cache = ts.apply(monkeypatch)
+    optimizer = config_cache.ruleset_matcher.ruleset_optimizer
+
+    expected = {
+        hostname for hostname in ["host1", "host2", "host3", "host4"]
+        if optimizer.matches_host_tags(config_cache.tag_list_of_host(hostname), host_tags)
+    }
+    assert optimizer._all_matching_hosts({"host_tags": host_tags},
+                                         with_foreign_hosts=False) == expected
+
+
 service_label_ruleset = [
     # test simple label match
     {
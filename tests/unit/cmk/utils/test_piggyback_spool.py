@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+import cmk.utils.piggyback as piggyback
+import cmk.utils.piggyback_spool as piggyback_spool
+
+TIME_SETTINGS: piggyback.PiggybackTimeSettings = [(None, "max_cache_age", 3600)]
+
+
+@pytest.fixture(autouse=True)
+def piggyback_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "piggyback_dir", tmp_path / "piggyback")
+    monkeypatch.setattr(cmk.utils.paths, "piggyback_source_dir", tmp_path / "piggyback_sources")
+    monkeypatch.setattr(cmk.utils.paths, "piggyback_spool_dir", tmp_path / "piggyback_spool")
+    monkeypatch.setattr(piggyback_spool, "_index_cache", {})
+
+
+def _raw_data(piggybacked_hostname, time_settings=None):
+    return [(info.source_hostname, info.successfully_processed, info.raw_data)
+            for info in piggyback.get_piggyback_raw_data(
+                piggybacked_hostname, TIME_SETTINGS if time_settings is None else time_settings)]
+
+
+def test_store_spooled_raw_data():
+    raw_data = {
+        "pig1": [b"<<<a>>>", b"1"],
+        "pig2": [b"<<<b>>>", b"2"],
+    }
+    piggyback.store_piggyback_raw_data("source1", raw_data, spool=True)
+    piggyback.store_piggyback_raw_data("source2", {"pig1": [b"<<<c>>>"]}, spool=True)
+
+    assert not cmk.utils.paths.piggyback_dir.exists()
+    assert sorted(
+        p.name for p in cmk.utils.paths.piggyback_spool_dir.iterdir()) == ["source1", "source2"]
+    assert _raw_data("pig1") == [
+        ("source1", True, b"<<<a>>>\n1\n"),
+        ("source2", True, b"<<<c>>>\n"),
+    ]
+    assert _raw_data("pig2") == [("source1", True, b"<<<b>>>\n2\n")]
+    assert _raw_data("pig3") == []
+    assert piggyback.has_piggyback_raw_data("pig2", TIME_SETTINGS)
+    assert sorted(piggyback.get_source_and_piggyback_hosts(TIME_SETTINGS)) == [
+        ("source1", "pig1"),
+        ("source1", "pig2"),
+        ("source2", "pig1"),
+    ]
+    assert sorted(piggyback.get_source_hostnames("pig1")) == ["source1", "source2"]
+
+
+def test_source_hostnames_of_plain_and_spooled_data():
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"a"], "pig2": [b"b"]})
+    piggyback.store_piggyback_raw_data("source1", {"pig3": [b"c"], "pig4": [b"d"]}, spool=True)
+    piggyback.store_piggyback_raw_data("source2", {"pig1": [b"e"]}, spool=True)
+
+    assert piggyback.get_source_hostnames() == ["source1", "source2"]
+
+
+def test_index_cache():
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"a"]}, spool=True)
+    index = piggyback_spool.load_index("source1")
+    assert index is not None
+    assert piggyback_spool.load_index("source1") is index
+
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"b"]}, spool=True)
+    new_index = piggyback_spool.load_index("source1")
+    assert new_index is not index
+    assert piggyback_spool.read_raw_data(new_index, "pig1") == b"b\n"
+
+
+def test_spooled_data_not_updated_by_source(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(piggyback_spool.time, "time", lambda: now[0])
+    monkeypatch.setattr(piggyback.time, "time", lambda: now[0])
+
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"a"], "pig2": [b"b"]}, spool=True)
+    now[0] += 10
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"c"]}, spool=True)
+
+    assert _raw_data("pig1") == [("source1", True, b"c\n")]
+    assert _raw_data("pig2") == [("source1", False, b"b\n")]
+    assert _raw_data("pig2", TIME_SETTINGS + [(None, "validity_period", 60)]) == [
+        ("source1", True, b"b\n"),
+    ]
+    [info] = piggyback.get_piggyback_raw_data("pig2", TIME_SETTINGS)
+    assert info.reason == "Piggyback file not updated by source 'source1'"
+
+    now[0] += 3600 + 10
+    [info] = piggyback.get_piggyback_raw_data("pig1", TIME_SETTINGS)
+    assert info.reason.startswith("Piggyback file too old")
+
+
+def test_remove_last_contact():
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"a"]}, spool=True)
+    assert piggyback.remove_source_status_file("source1") is True
+    assert piggyback.remove_source_status_file("source1") is False
+
+    [info] = piggyback.get_piggyback_raw_data("pig1", TIME_SETTINGS)
+    assert not info.successfully_processed
+    assert info.reason == "Source 'source1' not sending piggyback data"
+
+    piggyback.store_piggyback_raw_data("source1", {}, spool=True)
+    assert _raw_data("pig1") == [("source1", False, b"a\n")]
+
+
+def test_switch_store():
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"file"]})
+    assert (cmk.utils.paths.piggyback_source_dir / "source1").exists()
+
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"spool"]}, spool=True)
+    assert not (cmk.utils.paths.piggyback_source_dir / "source1").exists()
+    assert _raw_data("pig1") == [("source1", True, b"spool\n")]
+
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"file again"]})
+    index = piggyback_spool.load_index("source1")
+    assert index is not None and index.last_contact is None
+    assert _raw_data("pig1") == [("source1", True, b"file again\n")]
+
+
+def test_compact_data_file(monkeypatch):
+    monkeypatch.setattr(piggyback_spool, "_MIN_COMPACT_SIZE", 0)
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"a"], "pig2": [b"b"]}, spool=True)
+    old_index = piggyback_spool.load_index("source1")
+    assert old_index is not None
+
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"c" * 10]}, spool=True)
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"ddd"]}, spool=True)
+
+    index = piggyback_spool.load_index("source1")
+    assert index is not None
+    assert index.generation == 1
+    assert [p.name for p in index.data_path.parent.glob("data.*")] == ["data.1"]
+    assert index.size == index.used_size() == 6
+    assert piggyback_spool.read_raw_data(index, "pig2") == b"b\n"
+    # Readers of the old index switch to the new data file
+    assert piggyback_spool.read_raw_data(old_index, "pig1") == b"ddd\n"
+
+
+def test_cleanup_spooled_data():
+    piggyback.store_piggyback_raw_data("source1", {"pig1": [b"a"], "pig2": [b"b"]}, spool=True)
+    piggyback.store_piggyback_raw_data("source2", {"pig1": [b"c"]}, spool=True)
+
+    piggyback.cleanup_piggyback_files(TIME_SETTINGS)
+    assert len(_raw_data("pig1")) == 2
+
+    piggyback.cleanup_piggyback_files(TIME_SETTINGS + [("pig1", "max_cache_age", -1)])
+    assert _raw_data("pig1") == []
+    assert _raw_data("pig2") == [("source1", True, b"b\n")]
+
+    piggyback.cleanup_piggyback_files([(None, "max_cache_age", -1)])
+    assert _raw_data("pig2") == []
+    assert list(cmk.utils.paths.piggyback_spool_dir.iterdir()) == []
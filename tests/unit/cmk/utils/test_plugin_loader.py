@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import os
+import sys
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.plugin_loader as plugin_loader
+import cmk.utils.plugin_registry
+
+PACKAGE_FILES = {
+    "__init__.py": "",
+    "registry.py": """
+import cmk.utils.plugin_registry
+
+class PluginRegistry(cmk.utils.plugin_registry.Registry):
+    def plugin_name(self, instance):
+        return instance.__name__
+
+plugin_registry = PluginRegistry()
+""",
+    "a_lazy.py": """
+\"\"\"Only registers plugins\"\"\"
+from lazy_test_plugins.registry import plugin_registry
+
+TITLE = "Lazy"
+
+@plugin_registry.register
+class LazyPlugin:
+    pass
+
+class OtherLazyPlugin:
+    pass
+
+plugin_registry.register(OtherLazyPlugin)
+""",
+    "b_eager.py": """
+from lazy_test_plugins.registry import plugin_registry
+
+SIDE_EFFECTS = []
+SIDE_EFFECTS.append("imported")
+
+@plugin_registry.register
+class EagerPlugin:
+    pass
+""",
+}
+
+
+@pytest.fixture(name="package_dir")
+def fixture_package_dir(tmp_path, monkeypatch):
+    package_dir = tmp_path / "lazy_test_plugins"
+    package_dir.mkdir()
+    for file_name, content in PACKAGE_FILES.items():
+        (package_dir / file_name).write_text(content)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(plugin_loader, "_lazy_module_names", set())
+    monkeypatch.setattr(plugin_loader, "_manifest_dir", tmp_path / "manifests")
+    yield package_dir
+    _forget_package()
+
+
+def _forget_package():
+    for module_name in list(sys.modules):
+        if module_name.startswith("lazy_test_plugins"):
+            del sys.modules[module_name]
+    plugin_loader._lazy_module_names.clear()
+
+
+def _load_package(package_dir):
+    _forget_package()
+    plugin_loader.load_plugins(str(package_dir / "__init__.py"), "lazy_test_plugins")
+    return sys.modules["lazy_test_plugins.registry"].plugin_registry
+
+
+def test_load_plugins_lazily(package_dir):
+    # Without a manifest all modules are imported and the manifest is created
+    registry = _load_package(package_dir)
+    assert "lazy_test_plugins.a_lazy" in sys.modules
+    assert (package_dir.parent / "manifests" / "lazy_test_plugins.mk").exists()
+
+    registry = _load_package(package_dir)
+    assert "lazy_test_plugins.a_lazy" not in sys.modules
+    assert "lazy_test_plugins.b_eager" in sys.modules
+    assert "LazyPlugin" in registry
+    assert "lazy_test_plugins.a_lazy" not in sys.modules
+
+    assert registry["OtherLazyPlugin"].__name__ == "OtherLazyPlugin"
+    assert "lazy_test_plugins.a_lazy" in sys.modules
+    assert list(registry.keys()) == ["LazyPlugin", "OtherLazyPlugin", "EagerPlugin"]
+
+
+def test_load_plugins_lazily_local_override(package_dir):
+    _load_package(package_dir)
+    registry = _load_package(package_dir)
+    assert "lazy_test_plugins.a_lazy" not in sys.modules
+
+    # A local plugin replacing a lazily registered one
+    local_plugin = type("LazyPlugin", (), {})
+    registry.register(local_plugin)
+    assert registry["LazyPlugin"] is local_plugin
+
+    assert list(registry.keys()) == ["LazyPlugin", "OtherLazyPlugin", "EagerPlugin"]
+    assert registry["LazyPlugin"] is local_plugin
+
+
+def test_load_plugins_changed_package(package_dir):
+    _load_package(package_dir)
+    _load_package(package_dir)
+    assert "lazy_test_plugins.a_lazy" not in sys.modules
+
+    module_path = package_dir / "a_lazy.py"
+    module_path.write_text(module_path.read_text() + "\nplugin_registry.TITLE = TITLE\n")
+    os.utime(str(module_path), (0, 0))
+    _load_package(package_dir)
+    assert "lazy_test_plugins.a_lazy" in sys.modules
+
+    _load_package(package_dir)
+    assert "lazy_test_plugins.a_lazy" in sys.modules
+
+
+@pytest.mark.parametrize("source,only_registers", [
+    ("import os\nfrom typing import TYPE_CHECKING\nif TYPE_CHECKING:\n    import sys\n", True),
+    ("X: int = 1\nY = dict(a=1)\ndef f(a=1):\n    pass\n", True),
+    ("@plugin_registry.register_page('page')\nclass P:\n    pass\n", True),
+    ("plugin_registry.register(object)\n", True),
+    ("other_registry.register(object)\n", False),
+    ("VALUES = {}\nVALUES['a'] = 1\n", False),
+    ("VALUES = []\nVALUES.append(1)\n", False),
+    ("@decorate\ndef f():\n    pass\n", False),
+    ("for x in []:\n    pass\n", False),
+    ("try:\n    import x\nexcept ImportError:\n    pass\n", False),
+])
+def test_only_registers(tmp_path, source, only_registers):
+    class PluginRegistry(cmk.utils.plugin_registry.Registry):
+        def plugin_name(self, instance):
+            return instance.__name__
+
+    module_path = tmp_path / "plugin.py"
+    module_path.write_text(source)
+    module = type(sys)("plugin")
+    module.__file__ = str(module_path)
+    module.plugin_registry = PluginRegistry()  # type: ignore[attr-defined]
+    module.other_registry = {}  # type: ignore[attr-defined]
+    assert plugin_loader._only_registers(module) is only_registers
+
+
+def test_import_times(package_dir, monkeypatch):
+    monkeypatch.setattr(plugin_loader, "_manifest_dir", None)
+    monkeypatch.setattr(plugin_loader, "_import_times", None)
+    plugin_loader.enable_import_time_measurement()
+    _load_package(package_dir)
+
+    # The registry has been imported by the plugins
+    times = plugin_loader.import_times()
+    assert sorted(times) == ["lazy_test_plugins.a_lazy", "lazy_test_plugins.b_eager"]
+    assert all(cumulated >= own >= 0 for cumulated, own in times.values())
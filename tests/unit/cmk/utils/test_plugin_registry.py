@@ -3,6 +3,7 @@
 # Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
+import sys
 from typing import Type
 
 # pylint: disable=redefined-outer-name
@@ -94,3 +95,78 @@ def test_get(basic_registry):
     assert basic_registry.get("bla", "blub") == "blub"
 
     assert basic_registry.get("Plugin") == Plugin
+
+
+@pytest.fixture()
+def lazy_plugin_module(tmp_path, monkeypatch):
+    """A module which registers the plugins LazyPlugin1 and LazyPlugin2 in lazy_registry"""
+    registry = PluginRegistry()
+    monkeypatch.setattr(cmk.utils.plugin_registry, "lazy_registry", registry, raising=False)
+    (tmp_path / "lazy_plugin_module.py").write_text(
+        "import cmk.utils.plugin_registry\n"
+        "registry = cmk.utils.plugin_registry.lazy_registry\n"
+        "for name in ['LazyPlugin1', 'LazyPlugin2']:\n"
+        "    registry.register(type(name, (), {}))\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_plugin_module", raising=False)
+    yield registry
+    sys.modules.pop("lazy_plugin_module", None)
+
+
+def test_register_lazy(lazy_plugin_module):
+    registry = lazy_plugin_module
+    registry.register(Plugin)
+    registry.register_lazy("LazyPlugin1", "lazy_plugin_module")
+    registry.register_lazy("LazyPlugin2", "lazy_plugin_module")
+
+    assert "LazyPlugin1" in registry
+    assert "lazy_plugin_module" not in sys.modules
+
+    assert registry["LazyPlugin2"].__name__ == "LazyPlugin2"
+    assert "lazy_plugin_module" in sys.modules
+    # The position of lazily registered entries is kept
+    assert list(registry.keys()) == ["Plugin", "LazyPlugin1", "LazyPlugin2"]
+
+
+def test_register_lazy_iterate(lazy_plugin_module):
+    registry = lazy_plugin_module
+    registry.register_lazy("LazyPlugin1", "lazy_plugin_module")
+
+    assert len(registry) == 2
+    assert "lazy_plugin_module" in sys.modules
+    assert [plugin.__name__ for plugin in registry.values()] == ["LazyPlugin1", "LazyPlugin2"]
+
+
+def test_register_lazy_not_registered(lazy_plugin_module):
+    registry = lazy_plugin_module
+    registry.register_lazy("Missing", "lazy_plugin_module")
+
+    with pytest.raises(KeyError):
+        _unused = registry["Missing"]  # noqa: F841
+    assert "Missing" not in registry
+    assert list(registry.keys()) == ["LazyPlugin1", "LazyPlugin2"]
+
+
+def test_register_lazy_unregister(lazy_plugin_module):
+    registry = lazy_plugin_module
+    registry.register_lazy("LazyPlugin1", "lazy_plugin_module")
+    registry.register_lazy("LazyPlugin2", "lazy_plugin_module")
+    registry.unregister("LazyPlugin1")
+
+    # The module was imported first, so it does not register the entry again
+    assert "lazy_plugin_module" in sys.modules
+    assert list(registry.keys()) == ["LazyPlugin2"]
+
+
+def test_register_lazy_overridden(lazy_plugin_module):
+    registry = lazy_plugin_module
+    registry.register_lazy("LazyPlugin1", "lazy_plugin_module")
+    registry.register_lazy("LazyPlugin2", "lazy_plugin_module")
+    # E.g. a local plugin replacing a builtin one
+    local_plugin = type("LazyPlugin1", (), {})
+    registry.register(local_plugin)
+
+    assert registry["LazyPlugin1"] is local_plugin
+    assert registry["LazyPlugin2"].__name__ == "LazyPlugin2"
+    assert list(registry.keys()) == ["LazyPlugin1", "LazyPlugin2"]
+    assert registry["LazyPlugin1"] is local_plugin
@@ -76,6 +76,18 @@ def test_time_series_downsampling(rrddata, twindow, cf, downsampled):
     assert ts.downsample(twindow, cf) == downsampled
 
 
+@pytest.mark.parametrize("fromtime, untiltime, twindow, values", [
+    (20, 40, (20, 40, 10), [2, 3]),
+    (25, 45, (20, 50, 10), [2, 3, 4]),
+    (0, 30, (0, 30, 10), [None, 1, 2]),
+    (50, 80, (50, 80, 10), [5, None, None]),
+])
+def test_time_series_cut(fromtime, untiltime, twindow, values):
+    ts = prediction.TimeSeries([10, 60, 10, 1, 2, 3, 4, 5])
+    cut = ts.cut(fromtime, untiltime)
+    assert (cut.twindow, cut.values) == (twindow, values)
+
+
 @pytest.mark.parametrize("ref_value, stdev, sig, params, levels_factor, result", [
     (2, 0.5, 1, ("absolute", (3, 5)), 0.5, (3.5, 4.5)),
     (2, 0.5, -1, ("relative", (20, 50)), 0.5, (1.6, 1)),
@@ -169,6 +169,37 @@ def test_save_data_to_file(tmp_path, path_type, data):
     assert store.load_object_from_file(path) == data
 
 
+@pytest.mark.parametrize("path_type", [str, Path])
+@pytest.mark.parametrize("data", [
+    None,
+    [2, 3],
+    [u"föö"],
+    [b'foob\xc3\xa4r'],
+    {
+        ("a", None): (1.5, {
+            "x": [True, 3]
+        })
+    },
+])
+def test_save_data_to_file_fast(tmp_path, path_type, data):
+    path = path_type(tmp_path / "lala")
+    store.save_object_to_file(path, data, fast=True)
+    assert not open(str(path), "rb").read().startswith(repr(data).encode("utf-8"))
+    assert store.load_object_from_file(path) == data
+
+
+@pytest.mark.parametrize("path_type", [str, Path])
+def test_save_data_to_file_fast_replaces_literal(tmp_path, path_type):
+    path = path_type(tmp_path / "lala")
+    store.save_object_to_file(path, {"a": 1})
+    assert store.load_object_from_file(path) == {"a": 1}
+
+    store.save_object_to_file(path, {"a": 2}, fast=True)
+    assert store.load_object_from_file(path, lock=True) == {"a": 2}
+    assert store.have_lock(path) is True
+    store.release_lock(path)
+
+
 @pytest.mark.parametrize("path_type", [str, Path])
 @pytest.mark.parametrize("data", [
     u"föö",
@@ -220,6 +251,48 @@ def test_save_mk_file(tmp_path, path_type):
     assert store.load_mk_file(path, default={}) == {"x": 1}
 
 
+def test_load_cached_file(tmp_path, mocker):
+    path = str(tmp_path / "lala")
+    store.save_object_to_file(path, {"a": 1})
+    old = time.time() - 60
+    os.utime(path, (old, old))
+    load_func = mocker.Mock(side_effect=lambda p: store.load_object_from_file(p, default={}))
+    cache: store.FileCache = {}
+
+    assert store.load_cached_file(cache, path, load_func) == {"a": 1}
+    assert store.load_cached_file(cache, path, load_func) == {"a": 1}
+    assert load_func.call_count == 1
+
+    store.save_object_to_file(path, {"a": 2})
+    os.utime(path, (old, old + 1))
+    assert store.load_cached_file(cache, path, load_func) == {"a": 2}
+    assert load_func.call_count == 2
+
+    os.unlink(path)
+    assert store.load_cached_file(cache, path, load_func) == {}
+    assert path not in cache
+
+
+def test_load_cached_file_recently_changed(tmp_path, mocker):
+    path = str(tmp_path / "lala")
+    store.save_object_to_file(path, {"a": 1})
+    load_func = mocker.Mock(side_effect=store.load_object_from_file)
+    cache: store.FileCache = {}
+
+    for _round in range(2):
+        assert store.load_cached_file(cache, path, load_func) == {"a": 1}
+    assert load_func.call_count == 2
+    assert path not in cache
+
+
+def test_copy_cached_data():
+    data = {"a": [1, {"b": (2, "c")}]}
+    copy = store.copy_cached_data(data)
+    assert copy == data
+    copy["a"].append(3)
+    assert data == {"a": [1, {"b": (2, "c")}]}
+
+
 @pytest.mark.parametrize("path_type", [str, Path])
 def test_save_to_mk_file(tmp_path, path_type):
     path = path_type(tmp_path / "huhu")
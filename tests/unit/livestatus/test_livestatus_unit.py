@@ -9,6 +9,8 @@
 import errno
 import socket
 import ssl
+import threading
+import time
 from contextlib import closing
 
 import pytest  # type: ignore[import]
@@ -195,3 +197,154 @@ def test_create_socket_no_cert(tmp_path):
     with pytest.raises(livestatus.MKLivestatusConfigError,
                        match="(unknown error|no certificate or crl found)"):
         live._create_socket(socket.AF_INET)
+
+
+class FakeLivestatusServer:
+    """Answers each query with the given rows after the given delay"""
+    def __init__(self, path, rows, delay=0.0, close_after_response=False):
+        self.rows = rows
+        self.delay = delay
+        self.close_after_response = close_after_response
+        self._num_connections = 0
+        self._connected = threading.Condition()
+        self._sock = socket.socket(socket.AF_UNIX)
+        self._sock.bind(str(path))
+        self._sock.listen(5)
+        self.socketurl = "unix:%s" % path
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            conn, _addr = self._sock.accept()
+            with self._connected:
+                self._num_connections += 1
+                self._connected.notify_all()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def wait_for_connections(self, num, timeout=5.0):
+        """Return the number of accepted connections as soon as it reaches num
+
+        The connections are accepted by another thread, the client may be done before."""
+        with self._connected:
+            self._connected.wait_for(lambda: self._num_connections >= num, timeout)
+            return self._num_connections
+
+    def _handle(self, conn):
+        with closing(conn):
+            data = b""
+            while True:
+                packet = conn.recv(4096)
+                if not packet:
+                    return
+                data += packet
+                if b"\n\n" not in data:
+                    continue
+                data = data.split(b"\n\n", 1)[1]
+                time.sleep(self.delay)
+                body = repr(self.rows).encode("utf-8") + b"\n"
+                conn.sendall(b"200 %11d\n" % len(body) + body)
+                if self.close_after_response:
+                    return
+
+
+@pytest.fixture(name="connection_pool")
+def fixture_connection_pool(monkeypatch):
+    connection_pool = livestatus.ConnectionPool()
+    monkeypatch.setattr(livestatus, "connection_pool", connection_pool)
+    return connection_pool
+
+
+def test_query_parallel(tmp_path, connection_pool):
+    servers = {
+        "slow": FakeLivestatusServer(tmp_path / "slow", [["a"], ["b"]], delay=0.2),
+        "fast": FakeLivestatusServer(tmp_path / "fast", [["c"]]),
+    }
+    live = livestatus.MultiSiteConnection({
+        site_id: {
+            "socket": server.socketurl
+        } for site_id, server in servers.items()
+    })
+    live.set_prepend_site(True)
+
+    assert sorted(live.query("GET hosts\nColumns: name\n")) == [
+        ["fast", "c"],
+        ["slow", "a"],
+        ["slow", "b"],
+    ]
+    assert live.dead_sites() == {}
+    latencies = live.site_latencies()
+    assert sorted(latencies) == ["fast", "slow"]
+    assert latencies["fast"] < 0.2 <= latencies["slow"]
+
+
+@pytest.mark.parametrize("parallelize", [True, False])
+def test_query_by_site(tmp_path, connection_pool, parallelize):
+    servers = {
+        "slow": FakeLivestatusServer(tmp_path / "slow", [["a"], ["b"]], delay=0.2),
+        "fast": FakeLivestatusServer(tmp_path / "fast", [["c"]]),
+    }
+    live = livestatus.MultiSiteConnection({
+        site_id: {
+            "socket": server.socketurl
+        } for site_id, server in servers.items()
+    })
+    live.parallelize = parallelize
+    live.set_prepend_site(True)
+
+    responses = list(live.query_by_site("GET hosts\nColumns: name\n"))
+    assert sorted(responses) == [
+        ("fast", [["fast", "c"]]),
+        ("slow", [["slow", "a"], ["slow", "b"]]),
+    ]
+    if parallelize:
+        assert [site_id for site_id, _response in responses] == ["fast", "slow"]
+    assert sorted(live.alive_sites()) == ["fast", "slow"]
+
+
+def test_query_parallel_deadline(tmp_path, connection_pool):
+    servers = {
+        "slow": FakeLivestatusServer(tmp_path / "slow", [["a"]], delay=2.0),
+        "fast": FakeLivestatusServer(tmp_path / "fast", [["c"]]),
+    }
+    live = livestatus.MultiSiteConnection({
+        site_id: {
+            "socket": server.socketurl
+        } for site_id, server in servers.items()
+    })
+
+    started = time.time()
+    assert live.query(livestatus.Query("GET hosts\nColumns: name\n", deadline=0.2)) == [["c"]]
+    assert time.time() - started < 1.0
+    assert live.alive_sites() == ["fast"]
+    assert isinstance(live.dead_sites()["slow"]["exception"], livestatus.MKLivestatusSocketTimeout)
+    assert list(live.site_latencies()) == ["fast"]
+
+
+def test_persistent_connections(tmp_path, connection_pool):
+    server = FakeLivestatusServer(tmp_path / "live", [["a"]])
+    sites = {"local": {"socket": server.socketurl, "persist": True}}
+
+    for _request in range(3):
+        live = livestatus.MultiSiteConnection(sites)
+        assert live.query("GET hosts\nColumns: name\n") == [["a"]]
+    assert live.successfully_persisted()
+    assert server.wait_for_connections(1) == 1
+
+    # Sockets inherited by a forked process are not reused
+    connection_pool._pid = -1
+    live = livestatus.MultiSiteConnection(sites)
+    assert not live.successfully_persisted()
+    assert server.wait_for_connections(2) == 2
+
+
+def test_persistent_connection_closed_by_server(tmp_path, connection_pool):
+    server = FakeLivestatusServer(tmp_path / "live", [["a"]], close_after_response=True)
+    sites = {"local": {"socket": server.socketurl, "persist": True}}
+
+    for _request in range(3):
+        live = livestatus.MultiSiteConnection(sites)
+        assert live.query("GET hosts\nColumns: name\n") == [["a"]]
+        # Within a request the closed connection is reopened
+        assert live.query("GET hosts\nColumns: name\n") == [["a"]]
+        assert live.dead_sites() == {}
+    assert server.wait_for_connections(6) == 6